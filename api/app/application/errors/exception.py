@@ -5,7 +5,7 @@
 #Author  :Emcikem
 @File    :exception.py
 """
-from typing import Any
+from typing import Any, Dict, Optional
 
 
 class AppException(RuntimeError):
@@ -17,12 +17,14 @@ class AppException(RuntimeError):
             status_code: int = 400,
             msg: str = "应用发生错误请稍后尝试",
             data: Any = None,
+            headers: Optional[Dict[str, str]] = None,  # 附加的HTTP响应头
     ):
         """构造函数，完成错误数据初始化"""
         self.code = code
         self.status_code = status_code
         self.msg = msg
         self.data = data
+        self.headers = headers
         super().__init__()
 
 
@@ -50,8 +52,13 @@ class ValidationError(AppException):
 class TooManyRequestsError(AppException):
     """请求过多错误（触发限流）"""
 
-    def __init__(self, msg: str = "请求过多，触发限流，请稍后重试"):
-        super().__init__(status_code=429, code=429, msg=msg)
+    def __init__(self, msg: str = "请求过多，触发限流，请稍后重试", retry_after: Optional[int] = None):
+        super().__init__(
+            status_code=429,
+            code=429,
+            msg=msg,
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
+        )
 
 
 class ServerRequestsError(AppException):
@@ -12,6 +12,7 @@ from typing import AsyncGenerator, Optional, List, Type, Callable
 
 from pydantic import TypeAdapter
 
+from app.application.errors.exception import TooManyRequestsError
 from app.domain.repositories.uow import IUnitOfWork
 from app.domain.services.agent_task_runner import AgentTaskRunner
 from app.domain.external.file_storage import FileStorage
@@ -20,10 +21,15 @@ from app.domain.external.llm import LLM
 from app.domain.external.sandbox import Sandbox
 from app.domain.external.search import SearchEngine
 from app.domain.external.task import Task
+from app.domain.external.tokenizer import Tokenizer
+from app.domain.external.web_fetcher import WebFetcher
 from app.domain.models.app_config import AgentConfig, MCPConfig, A2AConfig
-from app.domain.models.event import BaseEvent, ErrorEvent, MessageEvent, Event, DoneEvent, WaitEvent
+from app.domain.models.checkpoint import FlowCheckpoint
+from app.domain.models.event import BaseEvent, ErrorEvent, MessageEvent, Event, DoneEvent, WaitEvent, QueueEvent
 from app.domain.models.file import File
 from app.domain.models.session import Session, SessionStatus
+from app.domain.services.agents.llm_profiles import LLMProfileSelector
+from app.domain.services.task_scheduler import TaskScheduler, TaskPriority, SchedulerTicket, SchedulerOverloadedError
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +48,12 @@ class AgentService:
             json_parser: JSONParser,
             search_engine: SearchEngine,
             file_storage: FileStorage,
+            web_fetcher: Optional[WebFetcher] = None,
+            tokenizer: Optional[Tokenizer] = None,
+            summary_llm: Optional[LLM] = None,
+            llm_profiles: Optional[LLMProfileSelector] = None,
+            worker_mode: bool = False,
+            task_scheduler: Optional[TaskScheduler] = None,
     ) -> None:
         """构造函数，完成Agent服务初始化"""
         self._uow_factory = uow_factory
@@ -55,6 +67,12 @@ class AgentService:
         self._json_parser = json_parser
         self._search_engine = search_engine
         self._file_storage = file_storage
+        self._web_fetcher = web_fetcher
+        self._tokenizer = tokenizer
+        self._summary_llm = summary_llm
+        self._llm_profiles = llm_profiles  # 模型档位选择器，为None时所有调用使用llm
+        self._worker_mode = worker_mode  # worker模式下任务投递到任务队列，由独立的worker进程执行
+        self._task_scheduler = task_scheduler  # 任务调度器，为None时不限制任务启动
         logger.info(f"AgentService初始化成功")
 
     async def _get_task(self, session: Session) -> Optional[Task]:
@@ -64,11 +82,24 @@ class AgentService:
         if not task_id:
             return None
 
-        # 2.调用人物类的get方法获取对应的任务实例
-        return self._task_cls.get(task_id)
+        # 2.调用人物类的get方法获取当前进程中的任务实例，不存在时关联其他副本中正在运行的任务
+        task = self._task_cls.get(task_id)
+        if task is None:
+            task = await self._task_cls.attach(task_id)
+        return task
+
+    @classmethod
+    def _is_orphaned(cls, session: Session, task: Optional[Task]) -> bool:
+        """判断会话是否为可以从检查点恢复的孤儿会话: 处于运行中、存在检查点，但没有任何副本持有任务(租约已过期)"""
+        return (
+                task is None
+                and session.status == SessionStatus.RUNNING
+                and session.checkpoint is not None
+                and session.task_id is not None
+        )
 
-    async def _create_task(self, session: Session) -> Task:
-        """根据传递的会话创建一个新任务"""
+    def _create_task_runner(self, session: Session, checkpoint: Optional[FlowCheckpoint] = None) -> AgentTaskRunner:
+        """根据传递的会话创建任务运行器，传递检查点时从检查点恢复"""
         # 1.获取沙箱实例
         # todo:沙箱部署
         sandbox = None
@@ -91,7 +122,7 @@ class AgentService:
         #     raise RuntimeError(f"获取沙箱[{sandbox.id}]中的浏览器实例失败")
 
         # 5.创建AgentTaskRunner
-        task_runner = AgentTaskRunner(
+        return AgentTaskRunner(
             uow_factory=self._uow_factory,
             llm=self._llm,
             agent_config=self._agent_config,
@@ -102,17 +133,89 @@ class AgentService:
             json_parser=self._json_parser,
             browser=None,
             search_engine=self._search_engine,
+            web_fetcher=self._web_fetcher,
+            tokenizer=self._tokenizer,
+            summary_llm=self._summary_llm,
+            llm_profiles=self._llm_profiles,
             sandbox=None,
+            checkpoint=checkpoint,
         )
 
-        # 6.创建任务Task并更新会话中的信息
-        task = self._task_cls.create(task_runner=task_runner)
+    async def _create_task(self, session: Session, checkpoint: Optional[FlowCheckpoint] = None) -> Task:
+        """根据传递的会话创建一个新任务，传递检查点时沿用原任务的输入/输出流并从检查点恢复"""
+        # 1.worker模式下只创建投递到任务队列的任务，由worker进程创建任务运行器并执行
+        task_id = session.task_id if checkpoint else None
+        if self._worker_mode:
+            task = self._task_cls.dispatch(session.id, task_id=task_id, resume=checkpoint is not None)
+        else:
+            task = self._task_cls.create(task_runner=self._create_task_runner(session, checkpoint), task_id=task_id)
+
+        # 2.更新会话中的任务信息
         session.task_id = task.id
         async with self._uow:
             await self._uow.session.save(session)
 
         return task
 
+    async def execute_task(self, session_id: str, task_id: str, resume: bool = False) -> Optional[Task]:
+        """worker进程执行任务队列中的任务，任务无需执行或已由其他进程执行时返回None"""
+        # 1.查询会话，会话已删除时忽略任务
+        async with self._uow:
+            session = await self._uow.session.get_by_id(session_id)
+        if not session:
+            logger.warning(f"任务[{task_id}]对应的会话[{session_id}]不存在，忽略该任务")
+            return None
+
+        # 2.恢复任务时会话必须仍处于运行中且存在检查点(重复投递的恢复任务可能已经执行完成)
+        checkpoint = None
+        if resume:
+            if session.status != SessionStatus.RUNNING or session.checkpoint is None or session.task_id != task_id:
+                logger.info(f"会话[{session_id}]无需从检查点恢复任务[{task_id}]，忽略该任务")
+                return None
+            checkpoint = session.checkpoint
+
+        # 3.创建任务并执行，获取租约失败时任务已由其他进程执行
+        task = self._task_cls.create(task_runner=self._create_task_runner(session, checkpoint), task_id=task_id)
+        await task.invoke()
+        return None if task.done else task
+
+    async def admit(
+            self,
+            session_id: str,
+            user_id: str,
+            priority: TaskPriority = TaskPriority.INTERACTIVE,
+    ) -> Optional[SchedulerTicket]:
+        """准入控制：对话需要启动新任务时申请调度票据，排队任务过多时抛出429错误
+
+        需要在开始流式响应之前调用，这样拒绝时才能返回429状态码与Retry-After响应头。
+        worker模式下任务的并发由worker进程控制，消息发送到运行中的任务(含可从检查点恢复的任务)时不占用名额，均无需申请票据。
+        """
+        # 1.未启用调度器或worker模式下无需申请票据
+        if self._task_scheduler is None or self._worker_mode:
+            return None
+
+        # 2.会话不存在时交由chat返回错误事件，运行中的任务会复用，不会启动新任务
+        async with self._uow:
+            session = await self._uow.session.get_by_id(session_id)
+        if not session:
+            return None
+        if session.status == SessionStatus.RUNNING:
+            task = await self._get_task(session)
+            if task is not None or self._is_orphaned(session, task):
+                return None
+
+        # 3.申请调度票据，等待队列已满时拒绝
+        try:
+            return self._task_scheduler.submit(user_id, priority)
+        except SchedulerOverloadedError as e:
+            logger.warning(f"用户[{user_id}]的{priority.value}任务被拒绝: {str(e)}")
+            raise TooManyRequestsError(msg=str(e), retry_after=e.retry_after)
+
+    def release(self, ticket: Optional[SchedulerTicket]) -> None:
+        """归还没有绑定到新任务的调度票据，已绑定的票据在任务结束时自动释放"""
+        if ticket is not None and self._task_scheduler is not None:
+            self._task_scheduler.release(ticket)
+
     async def _safe_update_unread_count(self, session_id: str) -> None:
         """在独立的后台任务中安全地更新未读消息计数
 
@@ -134,8 +237,10 @@ class AgentService:
             attachments: Optional[List[str]] = None,
             latest_event_id: Optional[str] = None,
             timestamp: Optional[datetime] = None,
+            ticket: Optional[SchedulerTicket] = None,
     ) -> AsyncGenerator[BaseEvent, None]:
-        """根据传递的信息调用Agent服务发起对话请求"""
+        """根据传递的信息调用Agent服务发起对话请求，传递调度票据时新任务需要等待调度器放行后启动"""
+        scheduled = False  # 调度票据是否已经绑定到新任务
         try:
             # 1.检查会话是否存在
             async with self._uow:
@@ -147,17 +252,32 @@ class AgentService:
             # 2.获取对应会话任务
             task = await self._get_task(session)
 
-            # 3.判断是否传递了message
+            # 3.执行任务的副本已经退出(租约过期)时，由当前副本从检查点恢复并接管任务
+            if self._is_orphaned(session, task):
+                logger.info(f"会话[{session_id}]任务租约已过期，从检查点恢复任务")
+                task = await self._create_task(session, checkpoint=session.checkpoint)
+                await task.invoke()
+
+                # 4.其他副本同时接管了任务时改为关联该副本中的任务
+                if task.done:
+                    task = await self._task_cls.attach(session.task_id)
+
+            # 5.判断是否传递了message
             if message:
-                # 4.判断会话的状态是什么,如果不是运行中则表示已完成或者空闲中
+                # 6.判断会话的状态是什么,如果不是运行中则表示已完成或者空闲中
                 if session.status != SessionStatus.RUNNING or task is None:
-                    # 5.不在运行中需要创建一个新的task并启动
+                    # 7.不在运行中需要创建一个新的task并启动，启动前等待调度器放行并推送排队位置
+                    if ticket is not None:
+                        async for position in self._task_scheduler.wait(ticket):
+                            logger.info(f"会话[{session_id}]任务排队中，当前位置: {position}")
+                            yield QueueEvent(position=position)
+                        scheduled = True
                     task = await self._create_task(session)
                     if not task:
                         logger.error(f"会话[{session_id}]创建任务失败")
                         raise RuntimeError(f"会话[{session_id}]创建任务失败")
 
-                # 6.传递了消息则更新会话中的最后一条消息
+                # 8.传递了消息则更新会话中的最后一条消息
                 async with self._uow:
                     await self._uow.session.update_latest_message(
                         session_id=session_id,
@@ -169,55 +289,57 @@ class AgentService:
                 async with self._uow:
                     db_attachments = [await self._uow.file.get_by_id(id) for id in attachments]
 
-                # 7.创建一个人类消息事件
+                # 9.创建一个人类消息事件
                 message_event = MessageEvent(
                     role="user",
                     message=message,
                     attachments=[attachment for attachment in db_attachments if attachment is not None],
                 )
 
-                # 8.将事件添加到任务的输入流中，好让Agent获取到数据
+                # 10.将事件添加到任务的输入流中，好让Agent获取到数据
                 event_id = await task.input_stream.put(message_event.model_dump_json())
                 message_event.id = event_id
                 yield message_event
                 async with self._uow:
                     await self._uow.session.add_event(session_id, message_event)
 
-                # 9.执行任务
+                # 11.执行任务，新任务启动后绑定调度票据，任务结束时释放并发名额
                 await task.invoke()
+                if scheduled:
+                    self._task_scheduler.bind(ticket, task)
                 logger.info(f"往会话[{session_id}]输入消息队列写入消息: {message[:50]}...")
 
-            # 10.记录日志展示会话已启动
+            # 12.记录日志展示会话已启动
             logger.info(f"会话[{session_id}]已启动")
             logger.info(f"会话[{session_id}]任务实例: {task}")
 
-            # 11.从任务的输出流中读取数据
+            # 13.从任务的输出流中读取数据
             while task and not task.done:
-                # 12.从输出消息队列中获取数据
+                # 14.从输出消息队列中获取数据
                 event_id, event_str = await task.output_stream.get(start_id=latest_event_id, block_ms=0)
                 latest_event_id = event_id
                 if event_str is None:
                     logger.debug(f"在会话[{session_id}]输出队列中未发现事件内容")
                     continue
 
-                # 13.使用Pydantic提供的类型适配器将event_str转换为指定类实例
+                # 15.使用Pydantic提供的类型适配器将event_str转换为指定类实例
                 event = TypeAdapter(Event).validate_json(event_str)
                 event.id = event_id
                 logger.debug(f"从会话[{session_id}]中获取事件: {type(event).__name__}")
 
-                # 14.将未读消息数重置为0
+                # 16.将未读消息数重置为0
                 async with self._uow:
                     await self._uow.session.update_unread_message_count(session_id, 0)
 
-                # 15.将事件返回并判断事件类型是否为结束类型
+                # 17.将事件返回并判断事件类型是否为结束类型
                 yield event
                 if isinstance(event, (DoneEvent, ErrorEvent, WaitEvent)):
                     break
 
-            # 16.循环外面表示这次任务AI端的已结束
+            # 18.循环外面表示这次任务AI端的已结束
             logger.info(f"会话[{session_id}]本轮运行结束")
         except Exception as e:
-            # 17.记录日志并返回错误事件
+            # 19.记录日志并返回错误事件
             logger.error(f"任务会话[{session_id}]对话出错: {str(e)}")
             event = ErrorEvent(error=str(e))
             try:
@@ -227,7 +349,11 @@ class AgentService:
                 logger.warning(f"会话[{session_id}]添加错误事件失败(可能是客户端断开连接): {add_err}")
             yield event
         finally:
-            # 18.会话完整传递给前端后，表示至少用户肯定收到了这些消息，所以不应该有未读消息数
+            # 20.没有用于启动新任务的调度票据(复用运行中的任务、排队时客户端断开连接等)需要归还
+            if not scheduled or (ticket is not None and ticket.task is None):
+                self.release(ticket)
+
+            # 21.会话完整传递给前端后，表示至少用户肯定收到了这些消息，所以不应该有未读消息数
             # 注意：当SSE客户端断开连接时，sse_starlette使用anyio cancel scope取消当前Task中
             # 所有的await操作（asyncio.shield也无法对抗anyio的cancel scope）。
             # 如果在finally块中直接执行数据库操作，该操作会被立即取消，并且SQLAlchemy在尝试
@@ -6,7 +6,8 @@
 @File    :session_service.py
 """
 import logging
-from typing import List, Callable, Type
+from contextlib import aclosing
+from typing import List, Callable, Type, AsyncGenerator
 
 from app.application.errors.exception import NotFoundError, ServerRequestsError
 from app.domain.external.sandbox import Sandbox
@@ -125,10 +126,9 @@ class SessionService:
 
         raise ServerRequestsError(result.message)
 
-    async def get_vnc_url(self, session_id: str) -> str:
-        """获取指定会话的vnc链接"""
+    async def _get_sandbox(self, session_id: str) -> Sandbox:
+        """获取指定会话的沙箱实例"""
         # 1.检查会话是否存在
-        logger.info(f"获取会话[{session_id}]的VNC链接")
         async with self._uow:
             session = await self._uow.session.get_by_id(session_id)
         if not session:
@@ -141,4 +141,23 @@ class SessionService:
         if not sandbox:
             raise NotFoundError("当前会话沙箱不存在或已销毁")
 
-        return sandbox.vnc_url
\ No newline at end of file
+        return sandbox
+
+    async def get_vnc_url(self, session_id: str) -> str:
+        """获取指定会话的vnc链接"""
+        # 1.获取会话对应的沙箱
+        logger.info(f"获取会话[{session_id}]的VNC链接")
+        sandbox = await self._get_sandbox(session_id)
+
+        # 2.浏览器与VNC均为按需启动，连接VNC前需要先确保相关进程已就绪
+        await sandbox.ensure_browser(vnc=True)
+
+        return sandbox.vnc_url
+
+    async def live_view(self, session_id: str) -> AsyncGenerator[bytes, None]:
+        """获取指定会话沙箱浏览器的实时画面(JPEG帧)"""
+        logger.info(f"开启会话[{session_id}]的浏览器实时画面")
+        sandbox = await self._get_sandbox(session_id)
+        async with aclosing(sandbox.live_view()) as frames:
+            async for frame in frames:
+                yield frame
@@ -11,6 +11,11 @@ from typing import Protocol, Optional, Any, Union, List, Dict
 class JSONParser(Protocol):
     """JSON解析器，用于解析Json字符串并修复"""
 
-    async def invoke(self, text: str, default_value: Optional[Any] = None) -> Union[Dict, List, Any]:
-        """调用函数，用于将传递过来的文本进行解析并返回"""
+    async def invoke(
+            self,
+            text: str,
+            default_value: Optional[Any] = None,
+            source: str = "default",
+    ) -> Union[Dict, List, Any]:
+        """调用函数，用于将传递过来的文本进行解析并返回，source标记文本来源(用于统计哪些提示词产生了不合法的json)"""
         ...
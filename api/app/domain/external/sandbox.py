@@ -5,7 +5,7 @@
 #Author  :Emcikem
 @File    :sandbox.py
 """
-from typing import Protocol, Optional, BinaryIO, Self
+from typing import Protocol, Optional, BinaryIO, Self, AsyncGenerator
 
 from app.domain.external.browser import Browser
 from app.domain.models.tool_result import ToolResult
@@ -117,6 +117,14 @@ class Sandbox(Protocol):
         """获取沙箱中的浏览器实例"""
         ...
 
+    async def ensure_browser(self, vnc: bool = False) -> None:
+        """确保沙箱中的浏览器(以及VNC)已按需启动并就绪，请求VNC时浏览器会切换为有头模式"""
+        ...
+
+    def live_view(self) -> AsyncGenerator[bytes, None]:
+        """获取沙箱浏览器的实时画面，持续生成JPEG帧"""
+        ...
+
     @property
     def id(self) -> str:
         """只读属性，返回沙箱的id"""
@@ -41,6 +41,15 @@ class Task(Protocol):
         """取消当前任务"""
         ...
 
+    def suspend(self) -> bool:
+        """挂起当前任务：停止本地执行但保留会话的运行状态与检查点，由其他进程从检查点恢复"""
+        ...
+
+    @property
+    def suspended(self) -> bool:
+        """只读属性，返回任务是否被挂起"""
+        ...
+
     @property
     def input_stream(self) -> MessageQueue:
         """只读属性，返回任务的输入流"""
@@ -67,8 +76,18 @@ class Task(Protocol):
         ...
 
     @classmethod
-    def create(cls, task_runner: TaskRunner) -> "Task":
-        """根据传递的任务运行器创建任务"""
+    async def attach(cls, task_id: str) -> Optional["Task"]:
+        """类方法，根据任务id关联其他进程/副本中正在运行的任务(读取输出流、写入输入流)，任务未运行时返回None"""
+        ...
+
+    @classmethod
+    def create(cls, task_runner: TaskRunner, task_id: Optional[str] = None) -> "Task":
+        """根据传递的任务运行器创建任务，传递task_id时沿用已有任务的输入/输出流(用于恢复被中断的任务)"""
+        ...
+
+    @classmethod
+    def dispatch(cls, session_id: str, task_id: Optional[str] = None, resume: bool = False) -> "Task":
+        """创建由独立worker进程执行的任务，任务在invoke时投递到任务队列，resume为True时worker从会话检查点恢复"""
         ...
 
     @classmethod
@@ -0,0 +1,16 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 21:05
+#Author  :Emcikem
+@File    :tokenizer.py
+"""
+from typing import Protocol
+
+
+class Tokenizer(Protocol):
+    """本地分词器接口协议，用于在调用LLM前估算提示词的token数"""
+
+    def count(self, text: str) -> int:
+        """计算文本的token数"""
+        ...
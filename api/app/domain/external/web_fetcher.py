@@ -0,0 +1,19 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 19:45
+#Author  :Emcikem
+@File    :web_fetcher.py
+"""
+from typing import Protocol
+
+from app.domain.models.search import WebPage
+from app.domain.models.tool_result import ToolResult
+
+
+class WebFetcher(Protocol):
+    """轻量网页获取接口协议(不经过浏览器，直接请求并提取正文)"""
+
+    async def fetch(self, url: str, max_bytes: int) -> ToolResult[WebPage]:
+        """获取指定URL的网页并提取正文，最多读取max_bytes字节"""
+        ...
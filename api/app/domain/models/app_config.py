@@ -7,7 +7,7 @@
 """
 import uuid
 from enum import Enum
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Literal
 
 from pydantic import BaseModel, ConfigDict, Field, model_validator
 
@@ -21,11 +21,64 @@ class LLMConfig(BaseModel):
     max_tokens: int = Field(default=8192, ge=0)  # 最大输出token数
 
 
+class LLMRouterConfig(BaseModel):
+    """多供应商LLM路由配置，providers为空时只使用llm_config"""
+    providers: List[LLMConfig] = Field(default_factory=list)  # 备用供应商/模型(llm_config始终作为第一个路由)
+    deadline_seconds: float = Field(default=300, gt=0)  # 单次调用的截止时间(含对冲与故障转移)
+    hedge_enabled: bool = True  # 是否在超过耗时分位数后向下一个路由发送对冲请求
+    hedge_percentile: float = Field(default=0.95, gt=0, le=1)  # 对冲请求的耗时分位数
+    default_hedge_seconds: float = Field(default=30, gt=0)  # 历史样本不足时的对冲延迟
+    max_attempts: int = Field(default=3, ge=1, le=10)  # 所有路由都失败时的最大重试轮数
+    backoff_base_seconds: float = Field(default=0.5, ge=0)  # 重试退避基础时长(指数增长并加入随机抖动)
+    backoff_max_seconds: float = Field(default=8.0, ge=0)  # 重试退避最大时长
+    error_rate_threshold: float = Field(default=0.5, gt=0, le=1)  # 错误率超过该阈值的路由排在健康路由之后
+
+
+class LLMProfileConfig(BaseModel):
+    """模型档位配置，未填写的连接/模型字段继承llm_config"""
+    base_url: Optional[str] = None  # 基础URL地址
+    api_key: Optional[str] = None  # API秘钥
+    model_name: Optional[str] = None  # 模型名字
+    temperature: Optional[float] = None  # 温度
+    max_tokens: Optional[int] = Field(default=None, ge=0)  # 最大输出token数
+    prompt_price: float = Field(default=0, ge=0)  # 每百万提示词token的价格，用于估算成本
+    completion_price: float = Field(default=0, ge=0)  # 每百万生成token的价格，用于估算成本
+
+
+class LLMProfilesConfig(BaseModel):
+    """按Agent与调用用途选择模型档位的配置"""
+    profiles: Dict[str, LLMProfileConfig] = Field(default_factory=dict)  # 档位名字->档位配置，default表示llm_config本身
+    # 路由规则: "agent.purpose"/"purpose"/"agent" -> 档位名字，按此顺序匹配，都未匹配时使用default档位
+    # agent: planner/react，purpose: plan_create/plan_update/step_execute/summarize/memory_summary
+    routes: Dict[str, str] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def validate_llm_profiles_config(self):
+        """校验路由规则引用的档位均已配置"""
+        for key, profile in self.routes.items():
+            if profile != "default" and profile not in self.profiles:
+                raise ValueError(f"模型路由规则[{key}]引用了不存在的档位: {profile}")
+        return self
+
+
 class AgentConfig(BaseModel):
     """Agent通用配置"""
     max_iterations: int = Field(default=100, gt=0, le=100)  # 最大迭代次数
     max_retries: int = Field(default=3, ge=1, le=10)  # LLM/工具最大重试次数
     max_search_result: int = Field(default=10, ge=1, le=30)  # 最大搜索结果数
+    search_read_top_k: int = Field(default=3, ge=1, le=10)  # 搜索并阅读时默认读取的网页数
+    search_read_concurrency: int = Field(default=3, ge=1, le=10)  # 搜索并阅读时并发读取的网页数
+    search_read_max_page_bytes: int = Field(default=512 * 1024, ge=16 * 1024)  # 单个网页最多读取的字节数
+    search_read_token_budget: int = Field(default=6000, ge=500)  # 搜索并阅读结果的总token预算
+    memory_max_prompt_tokens: int = Field(default=64000, ge=4000)  # 每次调用LLM的提示词token预算
+    memory_keep_recent_messages: int = Field(default=12, ge=2)  # 记忆压缩时保留原文的最近消息数
+    memory_tool_result_max_tokens: int = Field(default=300, ge=50)  # 最近窗口之外单个工具结果保留的token数
+    parallel_tool_calls: bool = False  # 是否开启并行工具调用(同一轮中相邻的只读工具并发执行)
+    max_parallel_tool_calls: int = Field(default=4, ge=1, le=16)  # 并行工具调用的最大并发数
+    max_parallel_steps: int = Field(default=1, ge=1, le=8)  # 并行执行的最大步骤数，1表示按顺序逐个执行
+    plan_update_policy: Literal["always", "on_failure", "every_n", "heuristic"] = "always"  # 步骤执行完成后更新计划的策略
+    plan_update_interval: int = Field(default=3, ge=1)  # every_n策略下每执行N个步骤更新一次计划
+    plan_update_concurrent: bool = False  # 是否在执行下一轮步骤的同时更新计划，完成后再合并
 
 
 class MCPTransport(str, Enum):
@@ -89,6 +142,8 @@ class A2AConfig(BaseModel):
 class AppConfig(BaseModel):
     """应用配置信息，包含Agent配置、LLM提供商、A2A网络、MCP服务配置等"""
     llm_config: LLMConfig  # 语言模型配置
+    llm_router_config: LLMRouterConfig = Field(default_factory=LLMRouterConfig)  # 多供应商LLM路由配置
+    llm_profiles_config: LLMProfilesConfig = Field(default_factory=LLMProfilesConfig)  # 按Agent与调用用途选择的模型档位配置
     agent_config: AgentConfig  # Agent通用配置
     mcp_config: MCPConfig  # MCP服务配置
     a2a_config: A2AConfig # A2A服务配置
@@ -0,0 +1,24 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 23:10
+#Author  :Emcikem
+@File    :checkpoint.py
+"""
+from datetime import datetime
+from typing import Optional, List, Dict
+
+from pydantic import BaseModel, Field
+
+from app.domain.models.message import Message
+from app.domain.models.plan import Plan
+
+
+class FlowCheckpoint(BaseModel):
+    """流检查点，记录流每一次状态流转后的进度，用于进程退出后从最后一个完成的步骤恢复"""
+    flow_status: str  # 流状态(FlowStatus)
+    plan: Optional[Plan] = None  # 检查点时的计划(包含每个步骤的状态与结果)
+    message: Message = Field(default_factory=Message)  # 正在处理的用户消息
+    completed_step_ids: List[str] = Field(default_factory=list)  # 本轮执行完成、等待更新计划的步骤id
+    memory_cursors: Dict[str, int] = Field(default_factory=dict)  # 各Agent检查点时的记忆游标(消息数)
+    created_at: datetime = Field(default_factory=datetime.now)  # 检查点时间
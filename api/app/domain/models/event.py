@@ -63,6 +63,7 @@ class StepEvent(BaseEvent):
     type: Literal["step"] = "step"
     step: Step  # 步骤信息
     status: StepEventStatus = StepEventStatus.STARTED
+    screenshot: Optional[str] = None  # 步骤结束时的浏览器截图(仅在步骤中使用过浏览器时生成)
 
 
 class MessageEvent(BaseEvent):
@@ -75,7 +76,7 @@ class MessageEvent(BaseEvent):
 
 class BrowserToolContent(BaseModel):
     """浏览器工具扩展内容"""
-    screenshot: str  # 浏览器快照截图
+    screenshot: Optional[str] = None  # 浏览器快照截图，截图只在步骤边界持久化，工具调用期间通过实时画面查看
 
 
 class SearchToolContent(BaseModel):
@@ -123,6 +124,7 @@ class ToolEvent(BaseEvent):
     function_args: Dict[str, Any]  # LLM生成的工具调用参数
     function_result: Optional[ToolResult] = None  # 工具调用结果
     status: ToolEventStatus = ToolEventStatus.CALLING  # 工具事件状态
+    step_id: Optional[str] = None  # 产生该工具调用的步骤id(并行执行步骤时用于区分工具调用所属的步骤)
 
 
 class WaitEvent(BaseEvent):
@@ -141,6 +143,12 @@ class DoneEvent(BaseEvent):
     type: Literal["done"] = "done"
 
 
+class QueueEvent(BaseEvent):
+    """排队事件，任务等待调度时推送当前的排队位置"""
+    type: Literal["queue"] = "queue"
+    position: int = 0  # 排队位置(从1开始)
+
+
 # 定义应用事件类型声明
 Event = Annotated[
     Union[
@@ -152,6 +160,7 @@ Event = Annotated[
         WaitEvent,
         ErrorEvent,
         DoneEvent,
+        QueueEvent,
     ],
     Field(discriminator="type"),
 ]
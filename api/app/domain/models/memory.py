@@ -6,16 +6,45 @@
 @File    :memory.py
 """
 import logging
-from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 logger = logging.getLogger(__name__)
 
+"""
+增量记忆压缩设计思路：
+1.原先每个步骤结束后都会从头遍历全部消息进行压缩，再把整份记忆覆盖写回数据库，长会话中每一步的开销都是O(全部消息)；
+2.compacted_index作为压缩水位线随记忆一起持久化，水位线之前的消息都已经压缩过，compact只处理水位线之后的新消息；
+3.记忆在内存中记录变更集(不参与序列化)：
+    - persisted_count: 已持久化的消息数，之后的消息需要追加；
+    - dirty_indexes: 已持久化但被原地修改过的消息下标；
+    - rewrite: 发生了回滚/区间替换等结构性变化，需要整份写回；
+4.仓库根据变更集只写入变化的区间，写入完成后调用mark_persisted重置变更集，每一步的开销变为O(新消息)；
+"""
+
+
+@dataclass
+class MemoryChanges:
+    """记忆自上次持久化以来的变更集"""
+    rewrite: bool  # 是否需要整份写回
+    updated: Dict[int, Dict[str, Any]] = field(default_factory=dict)  # 被原地修改的消息(下标->消息)
+    appended: List[Dict[str, Any]] = field(default_factory=list)  # 新追加的消息
+
+    @property
+    def empty(self) -> bool:
+        """变更集是否为空"""
+        return not self.rewrite and not self.updated and not self.appended
+
 
 class Memory(BaseModel):
     """记忆类，定义Agent的记忆基础信息"""
     messages: List[Dict[str, Any]] = Field(default_factory=list)
+    compacted_index: int = 0  # 压缩水位线，该下标之前的消息均已压缩
+    _persisted_count: Optional[int] = PrivateAttr(default=None)  # 已持久化的消息数，None代表从未持久化
+    _dirty_indexes: Set[int] = PrivateAttr(default_factory=set)  # 已持久化但被修改过的消息下标
+    _rewrite: bool = PrivateAttr(default=False)  # 是否发生了结构性变化
 
     @classmethod
     def get_message_role(cls, message: Dict[str, Any]) -> str:
@@ -41,21 +70,74 @@ class Memory(BaseModel):
     def roll_back(self) -> None:
         """回滚记忆，删除最后一条消息"""
         self.messages = self.messages[:-1]
+        self.compacted_index = min(self.compacted_index, len(self.messages))
+        self._rewrite = True
+
+    def truncate(self, count: int) -> None:
+        """只保留前count条消息，用于将记忆恢复到检查点"""
+        if count >= len(self.messages):
+            return
+        self.messages = self.messages[:count]
+        self.compacted_index = min(self.compacted_index, count)
+        self._rewrite = True
+
+    def replace_messages(self, start: int, end: int, replacement: List[Dict[str, Any]]) -> None:
+        """将[start, end)区间的消息替换为replacement，并同步调整压缩水位线"""
+        self.messages = self.messages[:start] + replacement + self.messages[end:]
+        if self.compacted_index >= end:
+            self.compacted_index += len(replacement) - (end - start)
+        elif self.compacted_index > start:
+            self.compacted_index = start
+        self._rewrite = True
+
+    def mark_dirty(self, index: int) -> None:
+        """标记指定下标的消息被原地修改过"""
+        self._dirty_indexes.add(index)
 
     def compact(self) -> None:
         """记忆压缩，将记忆中已经执行的工具(搜索/网页源码获取/浏览器访问结果等)这类已经执行过的消息进行压缩检索"""
-        # 1.循环遍历所有的消息列表
-        for message in self.messages:
+        # 1.只遍历压缩水位线之后的新消息
+        for index in range(self.compacted_index, len(self.messages)):
+            message = self.messages[index]
+
             # 2.判断消息的角色是否为tool
             if self.get_message_role(message) == "tool":
                 if message.get("function_name") in ["browser_view", "browser_navigate"]:
                     message["content"] = "(removed)"
+                    self.mark_dirty(index)
                     logger.debug(f"从记忆中移除对应工具的结果: {message['function_name']}")
 
             # 3.压缩记忆时reasoning_content内容可以去除压缩上下文
             if "reasoning_content" in message:
                 logger.debug(f"从记忆中移除工具思考结果: {message['reasoning_content'][:50]}...")
                 del message["reasoning_content"]
+                self.mark_dirty(index)
+
+        # 4.推进压缩水位线
+        self.compacted_index = len(self.messages)
+
+    def get_changes(self) -> MemoryChanges:
+        """获取自上次持久化以来的变更集"""
+        # 1.从未持久化、发生结构性变化或者消息数少于已持久化数量时需要整份写回
+        if self._rewrite or self._persisted_count is None or self._persisted_count > len(self.messages):
+            return MemoryChanges(rewrite=True)
+
+        # 2.否则只返回被修改的已持久化消息与新追加的消息
+        return MemoryChanges(
+            rewrite=False,
+            updated={
+                index: self.messages[index]
+                for index in sorted(self._dirty_indexes)
+                if index < self._persisted_count
+            },
+            appended=self.messages[self._persisted_count:],
+        )
+
+    def mark_persisted(self) -> None:
+        """标记记忆已经完成持久化，重置变更集"""
+        self._persisted_count = len(self.messages)
+        self._dirty_indexes = set()
+        self._rewrite = False
 
     @property
     def empty(self) -> bool:
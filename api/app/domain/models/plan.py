@@ -7,9 +7,9 @@
 """
 import uuid
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Any
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 
 class ExecutionStatus(str, Enum):
@@ -29,6 +29,21 @@ class Step(BaseModel):
     error: Optional[str] = None  # 错误信息
     success: bool = False  # 是否执行成功
     attachments: List[str] = Field(default_factory=list)  # 附件列表信息
+    dependencies: Optional[List[str]] = None  # 依赖的步骤id列表，None代表依赖前一个步骤(按顺序执行)
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def _coerce_id(cls, value: Any) -> Any:
+        """LLM有可能输出数字类型的步骤id，统一转换成字符串"""
+        return str(value) if isinstance(value, int) else value
+
+    @field_validator("dependencies", mode="before")
+    @classmethod
+    def _coerce_dependencies(cls, value: Any) -> Any:
+        """LLM有可能输出数字类型的依赖id，统一转换成字符串"""
+        if isinstance(value, list):
+            return [str(item) for item in value]
+        return value
 
     @property
     def done(self) -> bool:
@@ -55,3 +70,33 @@ class Plan(BaseModel):
     def get_next_step(self) -> Optional[Step]:
         """获取需要执行的下一个步骤"""
         return next((step for step in self.steps if not step.done), None)
+
+    def get_ready_steps(self, limit: int) -> List[Step]:
+        """获取依赖已经全部结束、可以立即执行的步骤(最多limit个)
+
+        未声明依赖(dependencies为None)的步骤依赖前一个步骤，保持原有的顺序执行语义；
+        依赖不存在的步骤id视为已满足；存在循环依赖导致没有可执行步骤时回退为第一个未完成的步骤。
+        """
+        # 1.计算已结束与已存在的步骤id
+        done_ids = {step.id for step in self.steps if step.done}
+        step_ids = {step.id for step in self.steps}
+
+        # 2.按顺序筛选依赖已满足的未完成步骤
+        ready_steps = []
+        for index, step in enumerate(self.steps):
+            if step.done:
+                continue
+            if step.dependencies is None:
+                ready = all(previous.done for previous in self.steps[:index])
+            else:
+                ready = all(dependency in done_ids or dependency not in step_ids for dependency in step.dependencies)
+            if ready:
+                ready_steps.append(step)
+                if len(ready_steps) >= limit:
+                    break
+
+        # 3.没有可执行步骤但仍有未完成步骤时(循环依赖)回退为第一个未完成的步骤
+        if not ready_steps:
+            next_step = self.get_next_step()
+            return [next_step] if next_step else []
+        return ready_steps
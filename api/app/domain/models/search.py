@@ -23,3 +23,25 @@ class SearchResults(BaseModel):
     date_range: Optional[str] = None  # 日期筛选范围
     total_results: int = 0  # 搜索结果条数
     results: List[SearchResultItem] = Field(default_factory=list)  # 搜索结果
+
+
+class WebPage(BaseModel):
+    """网页正文数据模型"""
+    url: str  # 网页最终URL链接(跟随重定向后)
+    title: str = ""  # 网页标题
+    content: str = ""  # 提取出的正文内容
+    truncated: bool = False  # 是否因为超过字节上限被截断
+
+
+class SearchPageDigest(BaseModel):
+    """搜索并阅读时单个网页的正文摘要"""
+    index: int  # 引用编号，与results中的位置对应(从1开始)
+    url: str  # 网页URL链接
+    title: str = ""  # 网页标题
+    content: str = ""  # 按token预算截断后的正文
+    error: Optional[str] = None  # 获取失败时的错误信息
+
+
+class SearchReadResults(SearchResults):
+    """搜索并阅读结果数据模型，在搜索结果的基础上附带前k个网页的正文摘要"""
+    pages: List[SearchPageDigest] = Field(default_factory=list)  # 网页正文摘要
@@ -12,6 +12,7 @@ from typing import Optional, List, Dict
 
 from pydantic import BaseModel, Field
 
+from app.domain.models.checkpoint import FlowCheckpoint
 from app.domain.models.event import Event, PlanEvent
 from app.domain.models.file import File
 from app.domain.models.memory import Memory
@@ -38,6 +39,7 @@ class Session(BaseModel):
     files: List[File] = Field(default_factory=list) # 文件列表
     memories: Dict[str, Memory] = Field(default_factory=dict) # 记忆
     status: SessionStatus = SessionStatus.PENDING # 状态
+    checkpoint: Optional[FlowCheckpoint] = None # 流检查点
     updated_at: datetime = Field(default_factory=datetime.now) # 更新时间
     created_at: datetime = Field(default_factory=datetime.now) # 创建时间
 
@@ -8,6 +8,7 @@
 from datetime import datetime
 from typing import Protocol, List, Optional
 
+from app.domain.models.checkpoint import FlowCheckpoint
 from app.domain.models.event import BaseEvent
 from app.domain.models.file import File
 from app.domain.models.memory import Memory
@@ -79,4 +80,8 @@ class SessionRepository(Protocol):
 
     async def get_memory(self, session_id: str, agent_name: str) -> Memory:
         """根据传递的会话id+Agent名字获取记忆"""
-        ...
\ No newline at end of file
+        ...
+
+    async def save_checkpoint(self, session_id: str, checkpoint: Optional[FlowCheckpoint]) -> None:
+        """更新会话的流检查点，传递None时清除检查点"""
+        ...
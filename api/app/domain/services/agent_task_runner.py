@@ -9,7 +9,7 @@ import asyncio
 import io
 import logging
 import uuid
-from typing import List, AsyncGenerator, Callable, BinaryIO
+from typing import List, AsyncGenerator, Callable, BinaryIO, Optional, Set
 
 from fastapi import UploadFile
 from pydantic import TypeAdapter
@@ -21,20 +21,25 @@ from app.domain.external.llm import LLM
 from app.domain.external.sandbox import Sandbox
 from app.domain.external.search import SearchEngine
 from app.domain.external.task import TaskRunner, Task
+from app.domain.external.tokenizer import Tokenizer
+from app.domain.external.web_fetcher import WebFetcher
 from app.domain.models.app_config import AgentConfig, MCPConfig, A2AConfig
+from app.domain.models.checkpoint import FlowCheckpoint
 from app.domain.models.event import ErrorEvent, Event, MessageEvent, BaseEvent, ToolEvent, ToolEventStatus, \
     BrowserToolContent, SearchToolContent, ShellToolContent, FileToolContent, MCPToolContent, A2AToolContent, \
-    TitleEvent, WaitEvent, DoneEvent
+    TitleEvent, WaitEvent, DoneEvent, StepEvent, StepEventStatus
 from app.domain.models.file import File
 from app.domain.models.message import Message
 from app.domain.models.search import SearchResults
 from app.domain.models.session import SessionStatus
 from app.domain.models.tool_result import ToolResult
 from app.domain.repositories.uow import IUnitOfWork
+from app.domain.services.agents.llm_profiles import LLMProfileSelector
 from app.domain.services.flows.planner_react import PlannerReActFlow
 from app.domain.services.tools.a2a import A2ATool
 from app.domain.services.tools.mcp import MCPTool
 from core.config import get_settings
+from core.context import current_session_id
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +59,11 @@ class AgentTaskRunner(TaskRunner):
             browser: Browser, # 浏览器
             search_engine: SearchEngine, # 搜索引擎
             sandbox: Sandbox, # 沙箱
+            web_fetcher: Optional[WebFetcher] = None, # 轻量网页获取器
+            tokenizer: Optional[Tokenizer] = None, # 本地分词器
+            summary_llm: Optional[LLM] = None, # 记忆摘要模型
+            llm_profiles: Optional[LLMProfileSelector] = None, # 模型档位选择器
+            checkpoint: Optional[FlowCheckpoint] = None, # 需要恢复的流检查点
     ) -> None:
         """构造函数，完成Agent任务运行器的创建"""
         self._uow_factory = uow_factory
@@ -66,6 +76,8 @@ class AgentTaskRunner(TaskRunner):
         self._a2a_tool = A2ATool()
         self._file_storage = file_storage
         self._browser = browser
+        self._browser_steps: Set[str] = set()  # 使用过浏览器的步骤id，用于在步骤边界截图(并行执行时按步骤区分)
+        self._checkpoint = checkpoint
         self._flow = PlannerReActFlow(
             uow_factory=self._uow_factory,
             llm=llm,
@@ -75,6 +87,10 @@ class AgentTaskRunner(TaskRunner):
             browser=browser,
             sandbox=sandbox,
             search_engine=search_engine,
+            web_fetcher=web_fetcher,
+            tokenizer=tokenizer,
+            summary_llm=summary_llm,
+            llm_profiles=llm_profiles,
             mcp_tool=self._mcp_tool,
             a2a_tool=self._a2a_tool,
         )
@@ -248,9 +264,10 @@ class AgentTaskRunner(TaskRunner):
             if event.status == ToolEventStatus.CALLING:
                 # 2.工具为浏览器则补全工具浏览器工具内容
                 if event.tool_name == "browser":
-                    event.tool_content = BrowserToolContent(
-                        screenshot=await self._get_browser_screenshot(),
-                    )
+                    # 截图只在步骤结束时持久化，工具调用期间前端通过实时画面查看浏览器
+                    event.tool_content = BrowserToolContent()
+                    if event.step_id:
+                        self._browser_steps.add(event.step_id)
                 elif event.tool_name == "search":
                     # 3.工具为搜索则添加搜索工具内容
                     search_results: ToolResult[SearchResults] = event.function_result
@@ -312,6 +329,16 @@ class AgentTaskRunner(TaskRunner):
         except Exception as e:
             logger.exception(f"AgentTaskRunner生成工具内容失败：{str(e)}")
 
+    async def _handle_step_end_event(self, event: StepEvent) -> None:
+        """步骤结束时，如果该步骤中使用过浏览器则截图并上传到对象存储"""
+        if event.step.id not in self._browser_steps:
+            return
+        self._browser_steps.discard(event.step.id)
+        try:
+            event.screenshot = await self._get_browser_screenshot()
+        except Exception as e:
+            logger.warning(f"AgentTaskRunner步骤结束截图失败：{str(e)}")
+
     async def _run_flow(self, message: Message) -> AsyncGenerator[BaseEvent, None]:
         """根据消息对象运行PlannerReActFlow"""
         # 1.判断传递的消息是否为空
@@ -322,16 +349,59 @@ class AgentTaskRunner(TaskRunner):
 
         # 2.调用流并运行获取事件信息
         async for event in self._flow.invoke(message):
-            # 3.判断是否为工具事件，如果是则额外处理
-            if isinstance(event, ToolEvent):
-                await self._handle_tool_event(event)
-            elif isinstance(event, MessageEvent):
-                # 4.如果是消息事件则将AI消息事件中的附件同步到存储中
-                await self._sync_message_attachments_to_storage(event)
+            # 3.额外处理流事件后直接返回
+            await self._handle_flow_event(event)
+            yield event
 
-            # 5.将事件直接返回
+    async def _resume_flow(self, checkpoint: FlowCheckpoint) -> AsyncGenerator[BaseEvent, None]:
+        """从检查点恢复并运行PlannerReActFlow"""
+        async for event in self._flow.resume(checkpoint):
+            await self._handle_flow_event(event)
             yield event
 
+    async def _handle_flow_event(self, event: BaseEvent) -> None:
+        """额外处理流生成的事件"""
+        # 1.判断是否为工具事件，如果是则额外处理
+        if isinstance(event, ToolEvent):
+            await self._handle_tool_event(event)
+        elif isinstance(event, StepEvent) and event.status != StepEventStatus.STARTED:
+            # 2.步骤结束时如果使用过浏览器则持久化一张截图
+            await self._handle_step_end_event(event)
+        elif isinstance(event, MessageEvent):
+            # 3.如果是消息事件则将AI消息事件中的附件同步到存储中
+            await self._sync_message_attachments_to_storage(event)
+
+    async def _dispatch_flow_events(self, task: Task, events: AsyncGenerator[BaseEvent, None]) -> bool:
+        """将流生成的事件写入任务输出流并同步会话信息，返回流是否在等待用户输入"""
+        async for event in events:
+            # 1.将得到的事件添加到消息队列中
+            await self._put_and_add_event(task, event)
+
+            # 2.如果事件类型为标题事件则更新会话标题
+            if isinstance(event, TitleEvent):
+                async with self._uow:
+                    await self._uow.session.update_title(self._session_id, event.title)
+            elif isinstance(event, MessageEvent):
+                # 3.如果事件为消息事件，则更新最新消息并新增未读消息数
+                async with self._uow:
+                    await self._uow.session.update_latest_message(
+                        self._session_id,
+                        event.message,
+                        event.created_at,
+                    )
+                async with self._uow:
+                    await self._uow.session.increase_unread_message_count(self._session_id)
+            elif isinstance(event, WaitEvent):
+                # 4.如果事件为等待，则更新会话状态并终止程序
+                async with self._uow:
+                    await self._uow.session.update_status(self._session_id, SessionStatus.WAITING)
+                return True
+
+            # 5.判断如果输入消息队列不为空(用户传递了新消息)则中断当前流
+            if not await task.input_stream.is_empty():
+                break
+        return False
+
     async def _cleanup_tools(self) -> None:
         """清理MCP和A2A工具资源，确保在同一任务上文中释放
 
@@ -351,6 +421,8 @@ class AgentTaskRunner(TaskRunner):
 
     async def invoke(self, task: Task) -> None:
         """根据传递的任务传递agent消息队列并运行agent流"""
+        # 记录当前会话，LLM限流等基础设施按会话公平排队(任务在独立的asyncio Task中运行，无需重置)
+        current_session_id.set(self._session_id)
         try:
             # 1.确保沙箱、mcp、a2a均初始化完成
             logger.info(f"AgentTaskRunner任务处理开始")
@@ -359,71 +431,57 @@ class AgentTaskRunner(TaskRunner):
             await self._mcp_tool.initialize(self._mcp_config)
             await self._a2a_tool.initialize(self._a2a_config)
 
-            # 2.循环读取任务中的输入消息队列
+            # 2.从检查点恢复的任务先继续执行被中断的流
+            if self._checkpoint is not None:
+                checkpoint, self._checkpoint = self._checkpoint, None
+                if await self._dispatch_flow_events(task, self._resume_flow(checkpoint)):
+                    return
+
+            # 3.循环读取任务中的输入消息队列
             while not await task.input_stream.is_empty():
-                # 3.从输入流中获取数据
+                # 4.从输入流中获取数据
                 event = await self._pop_event(task)
                 message = ""
 
-                # 4.判断事件类型是否为消息事件，如果是则处理消息并将附件同步到沙箱中
+                # 5.判断事件类型是否为消息事件，如果是则处理消息并将附件同步到沙箱中
                 if isinstance(event, MessageEvent):
                     message = event.message or ""
                     await self._sync_message_attachments_to_sandbox(event)
                     logger.info(f"AgentTaskRunner接受到新消息：{message[:50]}...")
 
-                # 5.将消息事件转换成消息对象
+                # 6.将消息事件转换成消息对象
                 message_obj = Message(
                     message=message,
                     attachments=[attachment.filepath for attachment in event.attachments]
                 )
 
-                # 6.传递消息对象并运行PlannerReActFlow
-                async for event in self._run_flow(message_obj):
-                    # 7.将得到的事件添加到消息队列中
-                    await self._put_and_add_event(task, event)
+                # 7.传递消息对象并运行PlannerReActFlow，等待用户输入时终止程序
+                if await self._dispatch_flow_events(task, self._run_flow(message_obj)):
+                    return
 
-                    # 8.如果事件类型为标题事件则更新会话标题
-                    if isinstance(event, TitleEvent):
-                        async with self._uow:
-                            await self._uow.session.update_title(self._session_id, event.title)
-                    elif isinstance(event, MessageEvent):
-                        # 9.如果事件为消息事件，则更新最新消息并新增未读消息数
-                        async with self._uow:
-                            await self._uow.session.update_latest_message(
-                                self._session_id,
-                                event.message,
-                                event.created_at,
-                            )
-                        async with self._uow:
-                            await self._uow.session.increase_unread_message_count(self._session_id)
-                    elif isinstance(event, WaitEvent):
-                        # 10.如果事件为等待，则更新会话状态并终止程序
-                        async with self._uow:
-                            await self._uow.session.update_status(self._session_id, SessionStatus.WAITING)
-                        return
-
-                    # 11.判断如果输入消息队列为空则跳出循环
-                    if not await task.input_stream.is_empty():
-                        break
-
-            # 12.更新会话状态为已完成
+            # 8.更新会话状态为已完成
             async with self._uow:
                 await self._uow.session.update_status(self._session_id, SessionStatus.COMPLETED)
         except asyncio.CancelledError:
-            # 13.异步任务被取消，推送结束事件并更新状态
+            # 9.任务被挂起时保留会话运行状态与检查点，由其他进程恢复执行
+            if task.suspended:
+                logger.info("AgentTaskRunner任务运行挂起，等待其他进程从检查点恢复")
+                raise
+
+            # 10.异步任务被取消，推送结束事件并更新状态
             logger.info(f"AgentTaskRunner任务运行取消")
             await self._put_and_add_event(task, DoneEvent())
             async with self._uow:
                 await self._uow.session.update_status(self._session_id, SessionStatus.COMPLETED)
             raise
         except Exception as e:
-            # 14.记录日志并往任务队列/消息队列中写入异常事件并更新会话状态
+            # 11.记录日志并往任务队列/消息队列中写入异常事件并更新会话状态
             logger.exception(f"AgentTaskRunner运行出错：{str(e)}")
             await self._put_and_add_event(task, ErrorEvent(error=f"AgentTaskRunner出错：{str(e)}"))
             async with self._uow:
                 await self._uow.session.update_status(self._session_id, SessionStatus.COMPLETED)
         finally:
-            # 15.在同一个asyncio Task上下文中清理MCP/A2A工具资源
+            # 12.在同一个asyncio Task上下文中清理MCP/A2A工具资源
             # 这是关键：streamablehttp_client内部使用anyio.create_task_group(),
             # 要求在同一个Task中进入和退出cancel scope，
             # 所以必须在invoke()的finally块（即初始化MCP的同一个Task）中清理
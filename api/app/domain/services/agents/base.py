@@ -6,24 +6,41 @@
 @File    :base.py
 """
 import asyncio
+import copy
 import logging
+import random
 import uuid
 from abc import ABC
+from dataclasses import dataclass
 from typing import Optional, List, AsyncGenerator, Dict, Any, Callable
 
 from app.domain.external.json_parser import JSONParser
 from app.domain.external.llm import LLM
+from app.domain.external.tokenizer import Tokenizer
 from app.domain.models.app_config import AgentConfig
 from app.domain.models.event import ToolEvent, ToolEventStatus, ErrorEvent, MessageEvent, BaseEvent
 from app.domain.models.memory import Memory
 from app.domain.models.message import Message
 from app.domain.models.tool_result import ToolResult
 from app.domain.repositories.uow import IUnitOfWork
+from app.domain.services.agents.llm_profiles import LLMProfileSelector, LLMProfile, LLMPurpose, ProfiledLLM
+from app.domain.services.agents.memory_budget import MemoryBudgetManager
 from app.domain.services.tools.base import BaseTool
+from core.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ToolCall:
+    """解析后的工具调用"""
+    id: str  # 工具调用id
+    function_name: str  # 工具名字
+    function_args: Dict[str, Any]  # 工具参数
+    tool: BaseTool  # 工具所在的工具包
+    read_only: bool = False  # 是否可以与相邻的只读工具并发执行
+
+
 class BaseAgent(ABC):
     """基础Agent智能体"""
     name: str = ""  # 智能体名字
@@ -40,6 +57,9 @@ class BaseAgent(ABC):
             llm: LLM,  # 语言模型协议
             json_parser: JSONParser,  # JSON输出解释器
             tools: List[BaseTool],  # 工具列表
+            tokenizer: Optional[Tokenizer] = None,  # 本地分词器，用于估算提示词token数
+            summary_llm: Optional[LLM] = None,  # 记忆摘要使用的低成本模型
+            llm_profiles: Optional[LLMProfileSelector] = None,  # 按调用用途选择模型的档位选择器，为None时全部使用llm
     ) -> None:
         """构造函数，完成Agent的初始化"""
         self._uow_factory = uow_factory
@@ -47,9 +67,24 @@ class BaseAgent(ABC):
         self._session_id = session_id
         self._agent_config = agent_config
         self._llm = llm
+        self._llm_profiles = llm_profiles or LLMProfileSelector(default=LLMProfile(name="default", llm=llm))
+        if self._llm_profiles.has_route(self.name, LLMPurpose.MEMORY_SUMMARY):
+            summary_llm = self._llm_profiles.select(self.name, LLMPurpose.MEMORY_SUMMARY)
+        elif summary_llm is not None:
+            summary_llm = ProfiledLLM(LLMProfile(name="memory_summary", llm=summary_llm), LLMPurpose.MEMORY_SUMMARY)
         self._memory: Optional[Memory] = None
         self._json_parser = json_parser
         self._tools = tools
+        self._tool_index: Dict[str, BaseTool] = {}  # 工具名->工具包索引
+        self._available_tools: List[Dict[str, Any]] = []  # 合并后的工具声明列表
+        self._tool_index_versions: Optional[tuple] = None  # 构建索引时各工具包的版本号
+        self._memory_budget = MemoryBudgetManager(
+            tokenizer=tokenizer,
+            summary_llm=summary_llm,
+            max_prompt_tokens=agent_config.memory_max_prompt_tokens,
+            keep_recent_messages=agent_config.memory_keep_recent_messages,
+            tool_result_max_tokens=agent_config.memory_tool_result_max_tokens,
+        )
 
     async def _ensure_memory(self) -> None:
         """确保智能体记忆是存在的"""
@@ -57,39 +92,68 @@ class BaseAgent(ABC):
             async with self._uow:
                 self._memory = await self._uow.session.get_memory(self._session_id, self.name)
 
-    def _get_available_tools(self) -> List[Dict[str, Any]]:
-        """获取Agent所有可用的工具列表参数申明/Schema"""
+    def _refresh_tool_index(self) -> None:
+        """工具包的工具列表发生变化(例如MCP/A2A初始化)时重建工具名->工具包索引与合并后的工具声明列表"""
+        # 1.根据所有工具包的版本号判断索引是否失效
+        versions = tuple(tool.tools_version for tool in self._tools)
+        if versions == self._tool_index_versions:
+            return
+
+        # 2.重建索引与声明列表，同名工具以先注册的工具包为准
+        tool_index: Dict[str, BaseTool] = {}
         available_tools = []
         for tool in self._tools:
+            for schema in tool.get_tools():
+                tool_index.setdefault(schema["function"]["name"], tool)
             available_tools.extend(tool.get_tools())
-        return available_tools
+        self._tool_index = tool_index
+        self._available_tools = available_tools
+        self._tool_index_versions = versions
+
+    def _get_available_tools(self) -> List[Dict[str, Any]]:
+        """获取Agent所有可用的工具列表参数申明/Schema"""
+        self._refresh_tool_index()
+        return self._available_tools
 
     def _get_tool(self, tool_name: str) -> BaseTool:
         """获取对应工具所在的工具类/包"""
-        # 1.循环遍历所有工具包
+        # 1.从工具索引中查找工具包
+        self._refresh_tool_index()
+        tool = self._tool_index.get(tool_name)
+        if tool is not None:
+            return tool
+
+        # 2.索引中不存在时回退为逐个询问工具包(兼容未在声明中暴露的工具)
         for tool in self._tools:
-            # 2.判断工具包中是否存在该工具
             if tool.has_tool(tool_name):
                 return tool
 
         raise ValueError(f"未知工具：{tool_name}")
 
-    async def _invoke_llm(self, messages: List[Dict[str, Any]], format: Optional[str] = None) -> Dict[str, Any]:
-        """调用语言模型并处理记忆内容"""
+    async def _invoke_llm(
+            self,
+            messages: List[Dict[str, Any]],
+            format: Optional[str] = None,
+            purpose: Optional[LLMPurpose] = None,
+    ) -> Dict[str, Any]:
+        """调用语言模型并处理记忆内容，根据调用用途选择模型档位"""
         # 1.将消息添加到记忆中
         await self._add_to_memory(messages)
 
-        # 2.组装语言模型的响应格式
+        # 2.组装语言模型的响应格式与可用工具，并选择模型档位(并行执行者按所属Agent类型匹配)
         response_format = {"type": format} if format else None
+        available_tools = self._get_available_tools()
+        llm = self._llm_profiles.select(type(self).name, purpose)
 
         # 3.循环向LLM发起提问直到最大重试次数
         error = "调用语言模型发生错误"
-        for _ in range(self._agent_config.max_retries):
+        for attempt in range(self._agent_config.max_retries):
             try:
-                # 4.调用语言模型获取响应内容
-                message = await self._llm.invoke(
+                # 4.检查提示词是否超过token预算，超过时压缩记忆后调用语言模型获取响应内容
+                await self._fit_memory_budget(available_tools)
+                message = await llm.invoke(
                     messages=self._memory.get_messages(),
-                    tools=self._get_available_tools(),
+                    tools=available_tools,
                     response_format=response_format,
                     tool_choice=self._tool_choice,
                 )
@@ -110,8 +174,10 @@ class BaseAgent(ABC):
                     if message.get("reasoning_content"):
                         filtered_message["reasoning_content"] = message.get("reasoning_content")
                     if message.get("tool_calls"):
-                        # 7.取出工具调用的数据，限制LLM一次只能调用工具
-                        filtered_message["tool_calls"] = message.get("tool_calls")[:1]
+                        # 7.取出工具调用的数据，未开启并行工具调用时限制LLM一次只能调用一个工具
+                        tool_calls = message.get("tool_calls")
+                        filtered_message["tool_calls"] = \
+                            tool_calls if self._agent_config.parallel_tool_calls else tool_calls[:1]
                 else:
                     # 8.非AI消息则记录日志并存储message
                     logger.warning(f"LLM响应内容无法确认消息角色: {message.get('role')}")
@@ -121,10 +187,10 @@ class BaseAgent(ABC):
                 await self._add_to_memory([filtered_message])
                 return filtered_message
             except Exception as e:
-                # 10.记录日志并睡眠指定的时间
+                # 10.记录日志并按带随机抖动的指数退避等待，避免所有会话同时重试加剧供应商拥塞
                 logger.error(f"调用语言模型发生错误: {str(e)}")
                 error = str(e)
-                await asyncio.sleep(self._retry_interval)
+                await asyncio.sleep(self._retry_interval * (2 ** attempt) * random.uniform(0.5, 1.0))
                 continue
 
         # 11.所有重试均已耗尽仍未获得有效响应，抛出异常避免返回None
@@ -146,6 +212,53 @@ class BaseAgent(ABC):
         # 2.循环最大重试次数后没有结果则将错误作为工具的执行结果，让LLM自行处理
         return ToolResult(success=False, message=err)
 
+    async def _parse_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[ToolCall]:
+        """解析LLM返回的工具调用列表，取出调用id、名字、参数以及对应的工具包"""
+        parsed_tool_calls = []
+        for tool_call in tool_calls:
+            if not tool_call.get("function"):
+                continue
+            function_name = tool_call["function"]["name"]
+            parsed_tool_calls.append(ToolCall(
+                id=tool_call["id"] or str(uuid.uuid4()),
+                function_name=function_name,
+                function_args=await self._json_parser.invoke(
+                    tool_call["function"]["arguments"],
+                    source=f"tool:{function_name}",
+                ),
+                tool=self._get_tool(function_name),
+            ))
+        return parsed_tool_calls
+
+    def _build_tool_batches(self, tool_calls: List[ToolCall]) -> List[List[ToolCall]]:
+        """将工具调用划分为批次: 相邻的只读工具合并为一个并发批次，有副作用的工具单独成批串行执行"""
+        batches: List[List[ToolCall]] = []
+        for tool_call in tool_calls:
+            read_only = self._agent_config.parallel_tool_calls and tool_call.tool.is_read_only(tool_call.function_name)
+            if read_only and batches and batches[-1][-1].read_only:
+                batches[-1].append(tool_call)
+            else:
+                batches.append([tool_call])
+            tool_call.read_only = read_only
+        return batches
+
+    async def _invoke_tool_batch(self, batch: List[ToolCall]) -> List[ToolResult]:
+        """执行一个批次的工具调用，多个工具时在并发上限内并发执行，结果顺序与调用顺序一致"""
+        # 1.单个工具直接调用
+        if len(batch) == 1:
+            tool_call = batch[0]
+            return [await self._invoke_tool(tool_call.tool, tool_call.function_name, tool_call.function_args)]
+
+        # 2.多个只读工具在并发上限内并发调用
+        semaphore = asyncio.Semaphore(self._agent_config.max_parallel_tool_calls)
+
+        async def _invoke(tool_call: ToolCall) -> ToolResult:
+            async with semaphore:
+                return await self._invoke_tool(tool_call.tool, tool_call.function_name, tool_call.function_args)
+
+        get_metrics().observe("agent_parallel_tool_batch_size", len(batch))
+        return list(await asyncio.gather(*(_invoke(tool_call) for tool_call in batch)))
+
     async def _add_to_memory(self, messages: List[Dict[str, Any]]) -> None:
         """将对应的信息添加到记忆中"""
         # 1.先检查确保记忆是否是存在的
@@ -165,6 +278,23 @@ class BaseAgent(ABC):
         async with self._uow:
             await self._uow.session.save_memory(self._session_id, self.name, self._memory)
 
+    async def _fit_memory_budget(self, tools: List[Dict[str, Any]]) -> None:
+        """检查记忆是否超过token预算，超过时按层级压缩并持久化记忆"""
+        report = await self._memory_budget.fit(self._memory, tools)
+        if report.changed:
+            async with self._uow:
+                await self._uow.session.save_memory(self._session_id, self.name, self._memory)
+
+    async def fork_memory(self, source: "BaseAgent") -> None:
+        """当前Agent记忆为空时，复制源Agent的记忆作为初始记忆(用于并行执行者继承上下文)"""
+        await self._ensure_memory()
+        if not self._memory.empty:
+            return
+        await source._ensure_memory()
+        self._memory = Memory(messages=copy.deepcopy(source._memory.messages))
+        async with self._uow:
+            await self._uow.session.save_memory(self._session_id, self.name, self._memory)
+
     async def compact_memory(self) -> None:
         """压缩Agent的记忆"""
         await self._ensure_memory()
@@ -172,6 +302,28 @@ class BaseAgent(ABC):
         async with self._uow:
             await self._uow.session.save_memory(self._session_id, self.name, self._memory)
 
+    async def get_memory_cursor(self) -> int:
+        """获取记忆游标(当前消息数)，用于记录流检查点"""
+        await self._ensure_memory()
+        return len(self._memory.messages)
+
+    async def restore_memory(self, cursor: int) -> None:
+        """将记忆恢复到检查点游标处，丢弃检查点之后(执行到一半的步骤)产生的消息"""
+        # 1.游标之后没有新消息则无需恢复
+        await self._ensure_memory()
+        if len(self._memory.messages) <= cursor:
+            return
+
+        # 2.截断记忆，截断后最后一条消息为未响应的工具调用时一并删除
+        self._memory.truncate(cursor)
+        last_message = self._memory.get_last_message()
+        if last_message and last_message.get("tool_calls"):
+            self._memory.roll_back()
+
+        # 3.将记忆持久化
+        async with self._uow:
+            await self._uow.session.save_memory(self._session_id, self.name, self._memory)
+
     async def roll_back(self, message: Message) -> None:
         """Agent的状态回滚，该函数用于确保Agent的消息列表状态是正确，用于发送新消息、暂停/停止任务、通知用户"""
         # 1.取出记忆中的最后一条消息，检查释放是工具调用
@@ -184,21 +336,24 @@ class BaseAgent(ABC):
         ):
             return
 
-        # 2.取出消息中的工具调用参数
-        tool_call = last_message.get("tool_calls")[0]
-
-        # 3.提取工具名字、id
-        function_name = tool_call.get("function", {}).get("name")
-        tool_call_id = tool_call.get("id")
+        # 2.取出消息中的工具调用参数，判断其中是否有通知用户的工具(message_ask_user)
+        tool_calls = last_message.get("tool_calls")
+        function_names = [tool_call.get("function", {}).get("name") for tool_call in tool_calls]
 
-        # 4.判断下当前的工具是不是通知用户(message_ask_user)
-        if function_name == "message_ask_user":
-            self._memory.add_message({
-                "role": "tool",
-                "tool_call_id": tool_call_id,
-                "function_name": function_name,
-                "content": message.model_dump_json()
-            })
+        # 3.存在通知用户工具时需要为每一个工具调用补全响应(并行工具调用时同一轮可能包含多个工具)
+        if "message_ask_user" in function_names:
+            for tool_call, function_name in zip(tool_calls, function_names):
+                # 4.通知用户工具的结果为用户的新消息，其他工具视为被中断
+                if function_name == "message_ask_user":
+                    content = message.model_dump_json()
+                else:
+                    content = ToolResult(success=False, message="工具调用被中断，未返回结果").model_dump_json()
+                self._memory.add_message({
+                    "role": "tool",
+                    "tool_call_id": tool_call.get("id"),
+                    "function_name": function_name,
+                    "content": content,
+                })
         else:
             # 5.否则直接删除最后一条消息
             self._memory.roll_back()
@@ -207,8 +362,13 @@ class BaseAgent(ABC):
         async with self._uow:
             await self._uow.session.save_memory(self._session_id, self.name, self._memory)
 
-    async def invoke(self, query: str, format: Optional[str] = None) -> AsyncGenerator[BaseEvent, None]:
-        """传递消息+响应格式调用程序生成异步迭代内容"""
+    async def invoke(
+            self,
+            query: str,
+            format: Optional[str] = None,
+            purpose: Optional[LLMPurpose] = None,
+    ) -> AsyncGenerator[BaseEvent, None]:
+        """传递消息+响应格式+调用用途调用程序生成异步迭代内容"""
         # 1.需要判断下是否传递了format
         format = format if format else self._format
 
@@ -216,6 +376,7 @@ class BaseAgent(ABC):
         message = await self._invoke_llm(
             [{"role": "user", "content": query}],
             format,
+            purpose,
         )
 
         # 3.循环遍历直到最大迭代次数
@@ -224,57 +385,48 @@ class BaseAgent(ABC):
             if not message or not message.get("tool_calls"):
                 break
 
-            # 5.循环遍历工具参数并执行
+            # 5.解析所有工具调用，并按照是否可并行划分为多个批次
             tool_messages = []
-            for tool_call in message["tool_calls"]:
-                if not tool_call.get("function"):
-                    continue
-
-                # 6.取出调用工具id、名字、参数信息
-                tool_call_id = tool_call["id"] or str(uuid.uuid4())
-                function_name = tool_call["function"]["name"]
-                function_args = await self._json_parser.invoke(tool_call["function"]["arguments"])
-
-                # 7.取出Agent中对应的工具
-                tool = self._get_tool(function_name)
-
-                # 8.返回工具即将调用事件，其中tool_content比较特殊，需要在具体业务中进行实现，这里留空即可
-                yield ToolEvent(
-                    tool_call_id=tool_call_id,
-                    tool_name=tool.name,
-                    function_name=function_name,
-                    function_args=function_args,
-                    status=ToolEventStatus.CALLING,
-                )
-
-                # 9.调用工具并获取结果
-                result = await self._invoke_tool(tool, function_name, function_args)
-
-                # 10.返回工具调用结果，其中tool_content比较特殊，需要在业务中进行实现
-                yield ToolEvent(
-                    tool_call_id=tool_call_id,
-                    tool_name=tool.name,
-                    function_name=function_name,
-                    function_args=function_args,
-                    function_result=result,
-                    status=ToolEventStatus.CALLED,
-                )
-
-                # 11.组装工具响应
-                tool_messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call_id,
-                    "function_name": function_name,
-                    "content": result.model_dump_json(),
-                })
-
-            # 12.所有工具都执行完成后，调用LLM获取汇总消息二次提供
-            message = await self._invoke_llm(tool_messages)
+            for batch in self._build_tool_batches(await self._parse_tool_calls(message["tool_calls"])):
+                # 6.按调用顺序返回工具即将调用事件，其中tool_content比较特殊，需要在具体业务中进行实现，这里留空即可
+                for tool_call in batch:
+                    yield ToolEvent(
+                        tool_call_id=tool_call.id,
+                        tool_name=tool_call.tool.name,
+                        function_name=tool_call.function_name,
+                        function_args=tool_call.function_args,
+                        status=ToolEventStatus.CALLING,
+                    )
+
+                # 7.调用工具并获取结果，批次中有多个只读工具时并发执行
+                results = await self._invoke_tool_batch(batch)
+
+                # 8.按调用顺序返回工具调用结果，其中tool_content比较特殊，需要在业务中进行实现
+                for tool_call, result in zip(batch, results):
+                    yield ToolEvent(
+                        tool_call_id=tool_call.id,
+                        tool_name=tool_call.tool.name,
+                        function_name=tool_call.function_name,
+                        function_args=tool_call.function_args,
+                        function_result=result,
+                        status=ToolEventStatus.CALLED,
+                    )
+
+                    # 9.组装工具响应
+                    tool_messages.append({
+                        "role": "tool",
+                        "tool_call_id": tool_call.id,
+                        "function_name": tool_call.function_name,
+                        "content": result.model_dump_json(),
+                    })
+
+            # 10.所有工具都执行完成后，调用LLM获取汇总消息二次提供
+            message = await self._invoke_llm(tool_messages, purpose=purpose)
         else:
-            # 13.超过最大迭代次数后，则抛出错误
+            # 11.超过最大迭代次数后，则抛出错误
             yield ErrorEvent(error=f"Agent迭代超过最大迭代次数: {self._agent_config.max_iterations}, 任务处理失败")
 
-        # 14.在指定步骤内完成了迭代则返回消息事件
+        # 12.在指定步骤内完成了迭代则返回消息事件
         if message and message.get("content") is not None:
             yield MessageEvent(message=message["content"])
         else:
@@ -0,0 +1,133 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/20 01:50
+#Author  :Emcikem
+@File    :llm_profiles.py
+"""
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from app.domain.external.llm import LLM
+from core.metrics import get_metrics
+
+"""
+模型档位设计思路：
+1.原先规划Agent与执行Agent共用同一个语言模型，创建计划、更新计划、执行步骤、汇总结果、记忆摘要都使用同一个模型，
+    更新计划、记忆摘要这类低风险的调用也要付出大模型的耗时与成本；
+2.应用配置中声明多个模型档位(profile)，以及"agent.purpose"/"purpose"/"agent"到档位的路由规则，
+    Agent每次调用语言模型时传递调用用途(purpose)，由档位选择器按规则匹配档位，都未匹配时使用default档位(llm_config)；
+3.选择器返回的语言模型会按(档位, 用途)记录调用次数、耗时与token数，并根据档位配置的单价估算成本(llm_profile_*)，
+    用于调整各用途的模型组合；
+"""
+
+
+class LLMPurpose(str, Enum):
+    """语言模型调用用途类型枚举"""
+    PLAN_CREATE = "plan_create"  # 创建计划
+    PLAN_UPDATE = "plan_update"  # 更新计划
+    STEP_EXECUTE = "step_execute"  # 执行步骤
+    SUMMARIZE = "summarize"  # 汇总最终结果
+    MEMORY_SUMMARY = "memory_summary"  # 记忆摘要
+
+
+@dataclass
+class LLMProfile:
+    """模型档位，涵盖档位名字、语言模型与token单价"""
+    name: str  # 档位名字
+    llm: LLM  # 档位对应的语言模型
+    prompt_price: float = 0.0  # 每百万提示词token的价格
+    completion_price: float = 0.0  # 每百万生成token的价格
+
+
+class ProfiledLLM(LLM):
+    """记录档位调用指标的语言模型包装"""
+
+    def __init__(self, profile: LLMProfile, purpose: Optional[LLMPurpose] = None) -> None:
+        """构造函数，完成档位与调用用途的初始化"""
+        self._profile = profile
+        self._purpose = purpose.value if purpose else "default"
+
+    @property
+    def profile(self) -> LLMProfile:
+        return self._profile
+
+    @property
+    def model_name(self) -> str:
+        return self._profile.llm.model_name
+
+    @property
+    def temperature(self) -> float:
+        return self._profile.llm.temperature
+
+    @property
+    def max_tokens(self) -> int:
+        return self._profile.llm.max_tokens
+
+    async def invoke(
+            self,
+            messages: List[Dict[str, Any]],
+            tools: List[Dict[str, Any]] = None,
+            response_format: Dict[str, Any] = None,
+            tool_choice: str = None,
+    ) -> Dict[str, Any]:
+        """调用档位对应的语言模型，并按(档位, 用途)记录耗时、token数与成本"""
+        # 1.调用语言模型并记录耗时与结果
+        metrics = get_metrics()
+        labels = {"profile": self._profile.name, "purpose": self._purpose}
+        start_time = time.perf_counter()
+        try:
+            response = await self._profile.llm.invoke(messages, tools, response_format, tool_choice)
+        except Exception:
+            metrics.incr("llm_profile_requests", status="failure", **labels)
+            raise
+        metrics.incr("llm_profile_requests", status="success", **labels)
+        metrics.observe("llm_profile_latency_ms", (time.perf_counter() - start_time) * 1000, **labels)
+
+        # 2.取出语言模型返回的用量(缓存命中时没有，取出后避免写入记忆)，记录token数并估算成本
+        usage = response.pop("usage", None) or {}
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        if prompt_tokens or completion_tokens:
+            metrics.incr("llm_profile_prompt_tokens", prompt_tokens, **labels)
+            metrics.incr("llm_profile_completion_tokens", completion_tokens, **labels)
+            metrics.incr(
+                "llm_profile_cost",
+                (prompt_tokens * self._profile.prompt_price + completion_tokens * self._profile.completion_price) / 1e6,
+                **labels,
+            )
+        return response
+
+
+class LLMProfileSelector:
+    """模型档位选择器，根据Agent名字与调用用途选择档位"""
+
+    def __init__(
+            self,
+            default: LLMProfile,  # 默认档位
+            profiles: Optional[Dict[str, LLMProfile]] = None,  # 档位名字->档位
+            routes: Optional[Dict[str, str]] = None,  # "agent.purpose"/"purpose"/"agent"->档位名字
+    ) -> None:
+        """构造函数，完成档位选择器的初始化"""
+        self._default = default
+        self._profiles = profiles or {}
+        self._routes = routes or {}
+
+    def _match(self, agent_name: str, purpose: Optional[LLMPurpose]) -> Optional[str]:
+        """按"agent.purpose"、"purpose"、"agent"的顺序匹配路由规则，返回档位名字"""
+        keys = [f"{agent_name}.{purpose.value}", purpose.value] if purpose else []
+        for key in keys + [agent_name]:
+            if key in self._routes:
+                return self._routes[key]
+        return None
+
+    def has_route(self, agent_name: str, purpose: Optional[LLMPurpose] = None) -> bool:
+        """判断是否配置了匹配的路由规则"""
+        return self._match(agent_name, purpose) is not None
+
+    def select(self, agent_name: str, purpose: Optional[LLMPurpose] = None) -> ProfiledLLM:
+        """选择档位并返回记录档位指标的语言模型，未匹配时使用默认档位"""
+        name = self._match(agent_name, purpose)
+        return ProfiledLLM(self._profiles.get(name, self._default), purpose)
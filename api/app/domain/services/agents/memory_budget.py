@@ -0,0 +1,261 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 21:20
+#Author  :Emcikem
+@File    :memory_budget.py
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from app.domain.external.llm import LLM
+from app.domain.external.tokenizer import Tokenizer
+from app.domain.models.memory import Memory
+from core.metrics import get_metrics
+from core.tokens import estimate_tokens
+
+"""
+记忆token预算管理设计思路：
+1.Memory.compact只会清空browser_view/browser_navigate的结果并移除reasoning_content，
+    shell输出、文件内容、搜索结果、MCP/A2A返回值会无限累积，每次调用LLM都会重新发送完整的历史；
+2.每次调用LLM前使用本地分词器估算提示词(消息+工具声明)的token数，超过预算时按层级依次执行压缩策略，
+    每一层执行完都会重新计算，回到预算内即停止：
+    - truncate_tool_results: 截断最近窗口之外的工具结果，并移除其中的reasoning_content；
+    - summarize: 使用低成本模型将固定上下文与最近窗口之间的历史对话压缩为一条摘要消息；
+    - drop: 未配置摘要模型或者摘要失败时，直接丢弃最早的历史对话；
+3.固定上下文(系统提示词+第一条用户消息，包含任务与计划上下文)与最近窗口中的消息不会被压缩；
+4.最近窗口的起点不会落在tool消息上，保证assistant的tool_calls与对应的tool结果始终成对出现；
+5.每一层策略节省的token数都会记录到指标中；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 每条消息的格式开销(角色、分隔符等)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 摘要提示词
+SUMMARY_PROMPT = """你是一个Agent执行历史压缩助手。下面是Agent更早的执行历史(包含思考、工具调用与工具结果)，
+请将其压缩成一份简明的摘要，要求：
+1.保留已完成的操作与结论、关键数据(数字、URL、文件路径、命令)以及失败的尝试和原因；
+2.不要编造历史中不存在的信息；
+3.摘要不超过{max_tokens}个token，直接输出摘要内容。
+
+执行历史：
+{history}"""
+
+# 摘要消息前缀
+SUMMARY_PREFIX = "[更早的对话历史已压缩为以下摘要]\n"
+
+
+@dataclass
+class MemoryBudgetReport:
+    """记忆预算检查报告"""
+    tokens_before: int  # 压缩前的提示词token数
+    tokens_after: int  # 压缩后的提示词token数
+    strategies: List[str] = field(default_factory=list)  # 执行过的压缩策略
+
+    @property
+    def changed(self) -> bool:
+        """记忆是否被修改"""
+        return len(self.strategies) > 0
+
+
+class MemoryBudgetManager:
+    """Agent记忆token预算管理器"""
+
+    def __init__(
+            self,
+            tokenizer: Optional[Tokenizer] = None,  # 本地分词器，为None时使用启发式估算
+            summary_llm: Optional[LLM] = None,  # 摘要使用的低成本模型，为None时跳过摘要层
+            max_prompt_tokens: int = 64000,  # 提示词token预算
+            keep_recent_messages: int = 12,  # 最近窗口的消息数
+            tool_result_max_tokens: int = 300,  # 最近窗口之外单个工具结果保留的token数
+            summary_max_tokens: int = 800,  # 摘要的最大token数
+            summary_input_max_tokens: int = 12000,  # 送入摘要模型的历史最大token数
+    ) -> None:
+        """构造函数，完成记忆预算管理器的初始化"""
+        self._tokenizer = tokenizer
+        self._summary_llm = summary_llm
+        self._max_prompt_tokens = max_prompt_tokens
+        self._keep_recent_messages = keep_recent_messages
+        self._tool_result_max_tokens = tool_result_max_tokens
+        self._summary_max_tokens = summary_max_tokens
+        self._summary_input_max_tokens = summary_input_max_tokens
+
+    def count_text(self, text: str) -> int:
+        """计算文本的token数"""
+        if self._tokenizer is None:
+            return estimate_tokens(text)
+        return self._tokenizer.count(text)
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """计算单条消息的token数(内容+思考内容+工具调用参数+格式开销)"""
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count_text(message.get("content") or "")
+        if message.get("reasoning_content"):
+            tokens += self.count_text(message["reasoning_content"])
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function") or {}
+            tokens += self.count_text(function.get("name") or "") + self.count_text(function.get("arguments") or "")
+        return tokens
+
+    def count_prompt(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None) -> int:
+        """计算完整提示词(消息列表+工具声明)的token数"""
+        tokens = sum(self.count_message(message) for message in messages)
+        if tools:
+            tokens += self.count_text(json.dumps(tools, ensure_ascii=False))
+        return tokens
+
+    @classmethod
+    def _pinned_count(cls, messages: List[Dict[str, Any]]) -> int:
+        """固定上下文的消息数: 系统提示词+第一条用户消息"""
+        count = 0
+        if messages and messages[0].get("role") == "system":
+            count = 1
+        if len(messages) > count and messages[count].get("role") == "user":
+            count += 1
+        return count
+
+    def _recent_start(self, messages: List[Dict[str, Any]], pinned: int) -> int:
+        """最近窗口的起点，起点不会落在tool消息上，保证工具调用与结果成对"""
+        start = max(pinned, len(messages) - self._keep_recent_messages)
+        while start > pinned and messages[start].get("role") == "tool":
+            start -= 1
+        return start
+
+    def _truncate_tool_results(self, memory: Memory, start: int, end: int) -> None:
+        """截断[start, end)范围内的工具结果并移除思考内容，被修改的消息会标记到记忆的变更集中"""
+        for index in range(start, end):
+            message = memory.messages[index]
+            if message.get("role") == "tool":
+                content = message.get("content") or ""
+                tokens = self.count_text(content)
+                if tokens > self._tool_result_max_tokens:
+                    keep_chars = max(1, len(content) * self._tool_result_max_tokens // tokens)
+                    message["content"] = f"{content[:keep_chars]}...(已截断，原始约{tokens} tokens)"
+                    memory.mark_dirty(index)
+            if message.pop("reasoning_content", None) is not None:
+                memory.mark_dirty(index)
+
+    def _render_history(self, messages: List[Dict[str, Any]]) -> str:
+        """将待摘要的消息渲染成文本，单条消息过长时截断，整体不超过摘要输入上限"""
+        per_message_tokens = max(200, self._summary_input_max_tokens // max(len(messages), 1))
+        lines = []
+        for message in messages:
+            content = message.get("content") or ""
+            for tool_call in message.get("tool_calls") or []:
+                function = tool_call.get("function") or {}
+                content += f"\n调用工具: {function.get('name')}({function.get('arguments')})"
+            tokens = self.count_text(content)
+            if tokens > per_message_tokens:
+                content = content[:len(content) * per_message_tokens // tokens] + "..."
+            lines.append(f"[{message.get('role')}] {content}")
+        return "\n".join(lines)
+
+    async def _summarize(self, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """使用低成本模型生成历史对话摘要，失败时返回None"""
+        if self._summary_llm is None:
+            return None
+        try:
+            prompt = SUMMARY_PROMPT.format(max_tokens=self._summary_max_tokens, history=self._render_history(messages))
+            response = await self._summary_llm.invoke(messages=[{"role": "user", "content": prompt}])
+            summary = (response.get("content") or "").strip()
+            return summary or None
+        except Exception as e:
+            logger.warning(f"生成记忆摘要失败, 回退为丢弃最早的历史: {str(e)}")
+            return None
+
+    async def fit(self, memory: Memory, tools: Optional[List[Dict[str, Any]]] = None) -> MemoryBudgetReport:
+        """检查记忆是否超过token预算，超过时按层级压缩记忆(会直接修改记忆)"""
+        metrics = get_metrics()
+        tokens_before = self.count_prompt(memory.messages, tools)
+        report = MemoryBudgetReport(tokens_before=tokens_before, tokens_after=tokens_before)
+        metrics.observe("memory_prompt_tokens", tokens_before)
+        if tokens_before <= self._max_prompt_tokens:
+            return report
+
+        # 1.计算固定上下文与最近窗口的位置
+        pinned = self._pinned_count(memory.messages)
+        recent_start = self._recent_start(memory.messages, pinned)
+
+        # 2.第一层: 截断最近窗口之外的工具结果
+        self._truncate_tool_results(memory, pinned, recent_start)
+        self._record(report, "truncate_tool_results", self.count_prompt(memory.messages, tools))
+
+        # 3.第二层: 将固定上下文与最近窗口之间的历史压缩为摘要，摘要失败时直接丢弃
+        if report.tokens_after > self._max_prompt_tokens and recent_start > pinned:
+            summary = await self._summarize(memory.messages[pinned:recent_start])
+            if summary:
+                replacement = [{"role": "user", "content": SUMMARY_PREFIX + summary}]
+                strategy = "summarize"
+            else:
+                replacement = []
+                strategy = "drop"
+            memory.replace_messages(pinned, recent_start, replacement)
+            self._record(report, strategy, self.count_prompt(memory.messages, tools))
+
+        # 4.最近窗口本身超过预算时，截断窗口内除最后一条之外的工具结果
+        if report.tokens_after > self._max_prompt_tokens:
+            self._truncate_tool_results(memory, pinned, len(memory.messages) - 1)
+            self._record(report, "truncate_recent", self.count_prompt(memory.messages, tools))
+
+        logger.info(f"记忆超过token预算({self._max_prompt_tokens}), 压缩前: {tokens_before}, "
+                    f"压缩后: {report.tokens_after}, 执行策略: {report.strategies}")
+        return report
+
+    @classmethod
+    def _record(cls, report: MemoryBudgetReport, strategy: str, tokens: int) -> None:
+        """记录某一层策略执行后的token数与节省的token数"""
+        saved = report.tokens_after - tokens
+        if saved <= 0:
+            return
+        report.strategies.append(strategy)
+        report.tokens_after = tokens
+        get_metrics().incr("memory_tokens_saved", value=saved, strategy=strategy)
+
+
+if __name__ == "__main__":
+    # 基于录制的长会话(LLM_CACHE_MODE=record生成的JSONL)做记忆预算基准测试:
+    # python -m app.domain.services.agents.memory_budget recordings/llm_session.jsonl [token预算]
+    import asyncio
+    import copy
+    import sys
+    import time
+
+    from app.infrastructure.external.llm.cached_llm import LLMRecording
+    from app.infrastructure.external.tokenizer.local_tokenizer import get_tokenizer
+
+
+    class TruncatingSummaryLLM:
+        """离线基准测试使用的摘要模型: 直接截取历史开头作为摘要"""
+
+        async def invoke(self, messages, tools=None, response_format=None, tool_choice=None):
+            return {"role": "assistant", "content": messages[0]["content"][:2000]}
+
+
+    async def main():
+        entries = LLMRecording(sys.argv[1]).entries()
+        budget = int(sys.argv[2]) if len(sys.argv) > 2 else 16000
+        tokenizer = get_tokenizer()
+        manager = MemoryBudgetManager(tokenizer=tokenizer, summary_llm=TruncatingSummaryLLM(), max_prompt_tokens=budget)
+
+        # 1.对每一次录制的请求执行预算检查，统计压缩前后的token数与耗时
+        total_before, total_after, total_ms, compacted = 0, 0, 0.0, 0
+        for entry in entries:
+            memory = Memory(messages=copy.deepcopy(entry["request"]["messages"]))
+            start_time = time.perf_counter()
+            report = await manager.fit(memory, entry["request"].get("tools"))
+            total_ms += (time.perf_counter() - start_time) * 1000
+            total_before += report.tokens_before
+            total_after += report.tokens_after
+            compacted += int(report.changed)
+
+        # 2.输出统计结果
+        print(f"分词器: {tokenizer.name}, 请求数: {len(entries)}, 触发压缩: {compacted}, 预算: {budget}")
+        print(f"提示词总token: {total_before} -> {total_after}, "
+              f"节省: {(1 - total_after / max(total_before, 1)) * 100:.1f}%, 平均检查耗时: {total_ms / max(len(entries), 1):.2f}ms")
+        print(get_metrics().snapshot()["counters"])
+
+
+    asyncio.run(main())
@@ -5,13 +5,15 @@
 #Author  :Emcikem
 @File    :planner.py
 """
+import json
 import logging
-from typing import Optional, AsyncGenerator
+from typing import Optional, AsyncGenerator, List
 
 from app.domain.models.event import Event, MessageEvent, PlanEvent, PlanEventStatus
 from app.domain.models.message import Message
 from app.domain.models.plan import Plan, Step
 from app.domain.services.agents.base import BaseAgent
+from app.domain.services.agents.llm_profiles import LLMPurpose
 from app.domain.services.prompts.planner import PLANNER_SYSTEM_PROMPT, CREATE_PLANNER_PROMPT, UPDATE_PLANNER_PROMPT
 from app.domain.services.prompts.system import SYSTEM_PROMPT
 
@@ -54,12 +56,12 @@ class PlannerAgent(BaseAgent):
         )
 
         # 2.调用invoke函数返回迭代事件
-        async for event in self.invoke(query):
+        async for event in self.invoke(query, purpose=LLMPurpose.PLAN_CREATE):
             # 3.规划智能体因为使用json_object，正常情况下会返回MessageEvent
             if isinstance(event, MessageEvent):
                 # 4.记录日志并使用json解析器解析得到对应的数据
                 logger.info(f"PlannerAgent生成消息: {event.message}")
-                parsed_obj = await self._json_parser.invoke(event.message)
+                parsed_obj = await self._json_parser.invoke(event.message, source=LLMPurpose.PLAN_CREATE.value)
 
                 # 5.将解析对下转换成Plan计划
                 plan = Plan.model_validate(parsed_obj)
@@ -70,21 +72,22 @@ class PlannerAgent(BaseAgent):
                 # 返回不是消息事件的事件
                 yield event
 
-    async def update_plan(self, plan: Plan, step: Step) -> AsyncGenerator[Event, None]:
-        """根据传递的原始规划+子步骤更新事件"""
-        # 1.使用plan+step创建更新Plan提示词
+    async def update_plan(self, plan: Plan, steps: List[Step]) -> AsyncGenerator[Event, None]:
+        """根据传递的原始规划+本轮执行完成的子步骤(并行执行时有多个)更新事件"""
+        # 1.使用plan+steps创建更新Plan提示词，单个步骤时保持原有的提示词格式
         query = UPDATE_PLANNER_PROMPT.format(
             plan=plan.model_dump_json(),
-            step=step.model_dump_json(),
+            step=steps[0].model_dump_json() if len(steps) == 1 else
+            json.dumps([step.model_dump(mode="json") for step in steps], ensure_ascii=False),
         )
 
         # 2.调用invoke获取对应的事件
-        async for event in self.invoke(query):
+        async for event in self.invoke(query, purpose=LLMPurpose.PLAN_UPDATE):
             # 3.判断规划Agent生菜的事件是不是消息事件
             if isinstance(event, MessageEvent):
                 # 4.记录日志并解析json
                 logger.info(f"PlannerAgent生成消息: {event.message}")
-                parsed_obj = await self._json_parser.invoke(event.message)
+                parsed_obj = await self._json_parser.invoke(event.message, source=LLMPurpose.PLAN_UPDATE.value)
 
                 # 5.将解析对下转换成Plan
                 updated_plan = Plan.model_validate(parsed_obj)
@@ -101,9 +104,11 @@ class PlannerAgent(BaseAgent):
 
                 # 8.判断是否有未完成的步骤，如果要有则执行更新
                 if first_pending_index is not None:
-                    # 9.获取历史已完成的子步骤并更新
+                    # 9.获取历史已完成的子步骤并更新(并行执行时已完成的步骤有可能位于未完成步骤之后，需要一并保留)
                     updated_steps = plan.steps[:first_pending_index]
-                    updated_steps.extend(new_steps)
+                    updated_steps.extend(step for step in plan.steps[first_pending_index:] if step.done)
+                    done_ids = {step.id for step in updated_steps}
+                    updated_steps.extend(step for step in new_steps if step.id not in done_ids)
 
                     # 10.更新plan规划
                     plan.steps = updated_steps
@@ -5,8 +5,9 @@
 #Author  :Emcikem
 @File    :react.py
 """
+import json
 import logging
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List
 
 from app.domain.models.event import Event, StepEventStatus, StepEvent, ToolEvent, MessageEvent, ErrorEvent, \
     ToolEventStatus, WaitEvent, BaseEvent
@@ -14,7 +15,9 @@ from app.domain.models.file import File
 from app.domain.models.message import Message
 from app.domain.models.plan import Plan, Step, ExecutionStatus
 from app.domain.services.agents.base import BaseAgent
-from app.domain.services.prompts.react import REACT_SYSTEM_PROMPT, EXECUTION_PROMPT, SUMMARIZE_PROMPT
+from app.domain.services.agents.llm_profiles import LLMPurpose
+from app.domain.services.prompts.react import REACT_SYSTEM_PROMPT, EXECUTION_PROMPT, SUMMARIZE_PROMPT, \
+    PARALLEL_STEPS_RESULT_PROMPT
 from app.domain.services.prompts.system import SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
@@ -41,9 +44,10 @@ class ReActAgent(BaseAgent):
         yield StepEvent(step=step, status=StepEventStatus.STARTED)
 
         # 3.调用invoke获取agent返回的事件内容
-        async for event in self.invoke(query):
+        async for event in self.invoke(query, purpose=LLMPurpose.STEP_EXECUTE):
             # 4.判断事件类型执行不同操作
             if isinstance(event, ToolEvent):
+                event.step_id = step.id
                 # 5.工具事件需要判断工具的名称是否为message_ask_user
                 if event.function_name == "message_ask_user":
                     # 6.工具如果在调用中，我们需要返回一条消息告知用户需要让用户处理什么
@@ -62,7 +66,7 @@ class ReActAgent(BaseAgent):
                 step.status = ExecutionStatus.COMPLETED
 
                 # 9.message中输出的数据结构为json，需要提取并解析
-                parsed_obj = await self._json_parser.invoke(event.message)
+                parsed_obj = await self._json_parser.invoke(event.message, source=LLMPurpose.STEP_EXECUTE.value)
                 new_step = Step.model_validate(parsed_obj)
 
                 # 10.更新子步骤的数据
@@ -91,18 +95,29 @@ class ReActAgent(BaseAgent):
         # 16.循环迭代完成后代表子步骤已实现，需要更新状态
         step.status = ExecutionStatus.COMPLETED
 
+    async def merge_step_results(self, steps: List[Step]) -> None:
+        """将并行执行者完成的步骤结果合并到记忆中，作为后续步骤与汇总的上下文"""
+        results = [
+            step.model_dump(mode="json", include={"id", "description", "success", "result", "error", "attachments"})
+            for step in steps
+        ]
+        await self._add_to_memory([{
+            "role": "user",
+            "content": PARALLEL_STEPS_RESULT_PROMPT.format(steps=json.dumps(results, ensure_ascii=False)),
+        }])
+
     async def summarize(self) -> AsyncGenerator[Event, None]:
         """调用Agent汇总历史的消息并生成最终回复+附件"""
         # 1.构建请求query
         query = SUMMARIZE_PROMPT
 
         # 2.调用invoke方法获取Agent生成的事件
-        async for event in self.invoke(query):
+        async for event in self.invoke(query, purpose=LLMPurpose.SUMMARIZE):
             # 3.判断事件类型是否为消息事件，如果是则表示Agent结构化生成汇总内容
             if isinstance(event, MessageEvent):
                 # 4.记录日志并解析输出内容
                 logger.info(f"执行Agent生成汇总内容: {event.message}")
-                parsed_obj = await self._json_parser.invoke(event.message)
+                parsed_obj = await self._json_parser.invoke(event.message, source=LLMPurpose.SUMMARIZE.value)
 
                 # 5.将解析数据转换为Message对象
                 message = Message.model_validate(parsed_obj)
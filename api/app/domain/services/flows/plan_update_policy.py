@@ -0,0 +1,150 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 22:40
+#Author  :Emcikem
+@File    :plan_update_policy.py
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from app.domain.models.plan import Plan, Step, ExecutionStatus
+from core.metrics import get_metrics
+
+"""
+计划更新策略设计思路：
+1.原先每执行完一个步骤都会调用一次规划Agent更新计划，即使步骤成功且剩余计划显然仍然有效，每次都是一次完整的LLM往返；
+2.更新策略决定本轮执行完成后是否需要更新计划：
+    - always: 每一轮都更新(原有行为)；
+    - on_failure: 只有步骤失败时才更新；
+    - every_n: 步骤失败或者距离上次更新已经执行了N个步骤时更新；
+    - heuristic: 步骤失败、结果为空或者结果中出现受阻/失败的信号时更新；
+3.最后一轮(没有剩余步骤)且全部成功时，除always外的策略都会跳过更新，直接进入总结；
+4.开启并发更新时，规划Agent基于计划快照更新计划，同时按更新前的计划执行下一轮步骤，两者都完成后再合并：
+    已完成步骤的执行结果以实际执行为准，其余步骤以更新后的计划为准；
+5.统计每个会话调用/跳过的规划次数，以及通过跳过与并发更新节省的时间(按规划更新的平均耗时估算)；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 支持的更新策略
+PLAN_UPDATE_POLICIES = ("always", "on_failure", "every_n", "heuristic")
+
+# 步骤结果中代表受阻/失败的信号
+BLOCKED_SIGNAL_PATTERN = re.compile(
+    r"无法|未能|失败|出错|错误|找不到|不存在|没有找到|受阻|需要用户|"
+    r"unable|failed|failure|error|not found|cannot|can't|blocked",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class PlanUpdateStats:
+    """单个会话的计划更新统计"""
+    calls: int = 0  # 调用规划Agent更新计划的次数
+    skipped: int = 0  # 跳过的次数
+    concurrent: int = 0  # 与下一轮步骤并发执行的次数
+    update_seconds: float = 0.0  # 更新计划的累计耗时
+    saved_seconds: float = 0.0  # 估算节省的时间
+
+    @property
+    def average_update_seconds(self) -> float:
+        """单次更新计划的平均耗时"""
+        return self.update_seconds / self.calls if self.calls else 0.0
+
+
+class PlanUpdatePolicy:
+    """计划更新策略，决定每一轮步骤执行完成后是否需要调用规划Agent更新计划"""
+
+    def __init__(
+            self,
+            policy: str = "always",  # 更新策略
+            interval: int = 3,  # every_n策略的更新间隔(步骤数)
+            concurrent: bool = False,  # 是否与下一轮步骤并发更新计划
+            default_update_seconds: float = 5.0,  # 还没有更新过计划时估算节省时间使用的耗时
+    ) -> None:
+        """构造函数，完成计划更新策略的初始化"""
+        if policy not in PLAN_UPDATE_POLICIES:
+            logger.warning(f"未知的计划更新策略[{policy}]，回退为always")
+            policy = "always"
+        self.policy = policy
+        self._interval = max(1, interval)
+        self._concurrent = concurrent
+        self._default_update_seconds = default_update_seconds
+        self._steps_since_update = 0
+        self.stats = PlanUpdateStats()
+
+    @classmethod
+    def _is_failed(cls, step: Step) -> bool:
+        """判断步骤是否执行失败"""
+        return step.status == ExecutionStatus.FAILED or not step.success
+
+    @classmethod
+    def _needs_heuristic_update(cls, steps: List[Step]) -> Tuple[bool, str]:
+        """启发式判断: 步骤结果为空或者结果中出现受阻/失败信号时需要更新"""
+        for step in steps:
+            if not (step.result or "").strip():
+                return True, f"步骤[{step.id}]结果为空"
+            if BLOCKED_SIGNAL_PATTERN.search(step.result):
+                return True, f"步骤[{step.id}]结果中出现受阻信号"
+        return False, "步骤按预期完成"
+
+    def should_update(self, plan: Plan, steps: List[Step]) -> Tuple[bool, str]:
+        """判断本轮执行完成后是否需要更新计划，返回(是否更新, 原因)"""
+        self._steps_since_update += len(steps)
+
+        # 1.always策略始终更新
+        if self.policy == "always":
+            return True, "always"
+
+        # 2.任意步骤失败时均需要更新
+        if any(self._is_failed(step) for step in steps):
+            return True, "步骤执行失败"
+
+        # 3.没有剩余步骤时直接进入总结
+        if all(step.done for step in plan.steps):
+            return False, "没有剩余步骤"
+
+        # 4.根据策略判断
+        if self.policy == "every_n" and self._steps_since_update >= self._interval:
+            return True, f"距离上次更新已执行{self._steps_since_update}个步骤"
+        if self.policy == "heuristic":
+            return self._needs_heuristic_update(steps)
+        return False, "步骤按预期完成"
+
+    def should_overlap(self, plan: Plan, steps: List[Step]) -> bool:
+        """判断本轮的计划更新是否可以与下一轮步骤并发执行: 步骤失败时剩余计划大概率需要调整，必须先更新再执行"""
+        if not self._concurrent or any(self._is_failed(step) for step in steps):
+            return False
+        return any(not step.done for step in plan.steps)
+
+    def record_update(self, elapsed: float, saved: float = 0.0) -> None:
+        """记录一次计划更新，elapsed为更新耗时，saved为与步骤并发执行节省的时间"""
+        self._steps_since_update = 0
+        self.stats.calls += 1
+        self.stats.update_seconds += elapsed
+        self.stats.saved_seconds += saved
+        if saved > 0:
+            self.stats.concurrent += 1
+        get_metrics().incr("plan_update_decisions", decision="concurrent" if saved > 0 else "update",
+                           policy=self.policy)
+        get_metrics().observe("plan_update_latency_ms", elapsed * 1000)
+
+    def record_skip(self) -> None:
+        """记录一次跳过的计划更新，按平均更新耗时估算节省的时间"""
+        saved = self.stats.average_update_seconds or self._default_update_seconds
+        self.stats.skipped += 1
+        self.stats.saved_seconds += saved
+        get_metrics().incr("plan_update_decisions", decision="skip", policy=self.policy)
+
+    def report(self, session_id: str) -> None:
+        """输出会话的计划更新统计并重置"""
+        stats = self.stats
+        logger.info(f"会话[{session_id}]计划更新统计(策略: {self.policy}): 调用{stats.calls}次, 跳过{stats.skipped}次, "
+                    f"并发{stats.concurrent}次, 估算节省{stats.saved_seconds:.1f}秒")
+        get_metrics().observe("plan_update_skipped_per_session", stats.skipped)
+        get_metrics().observe("plan_update_saved_seconds_per_session", stats.saved_seconds)
+        self.stats = PlanUpdateStats()
+        self._steps_since_update = 0
@@ -5,25 +5,34 @@
 #Author  :Emcikem
 @File    :planner_react.py
 """
+import asyncio
 import logging
-from typing import AsyncGenerator, Optional, Callable
+import time
+from typing import AsyncGenerator, Optional, Callable, List, Tuple, Dict
 
 from app.domain.external.browser import Browser
 from app.domain.external.json_parser import JSONParser
 from app.domain.external.llm import LLM
 from app.domain.external.sandbox import Sandbox
 from app.domain.external.search import SearchEngine
+from app.domain.external.tokenizer import Tokenizer
+from app.domain.external.web_fetcher import WebFetcher
 from app.domain.models.app_config import AgentConfig
+from app.domain.models.checkpoint import FlowCheckpoint
 from app.domain.models.event import BaseEvent, DoneEvent, PlanEvent, PlanEventStatus, TitleEvent, MessageEvent
 from app.domain.models.message import Message
-from app.domain.models.plan import Plan, ExecutionStatus
+from app.domain.models.plan import Plan, ExecutionStatus, Step
 from app.domain.models.session import SessionStatus
 from app.domain.repositories.uow import IUnitOfWork
+from app.domain.services.agents.llm_profiles import LLMProfileSelector
 from app.domain.services.agents.planner import PlannerAgent
 from app.domain.services.agents.react import ReActAgent
 from app.domain.services.flows.base import BaseFlow, FlowStatus
+from app.domain.services.flows.plan_update_policy import PlanUpdatePolicy
 from app.domain.services.tools.a2a import A2ATool
+from app.domain.services.tools.base import BaseTool
 from app.domain.services.tools.browser import BrowserTool
+from app.domain.services.tools.exclusive import ExclusiveTool
 from app.domain.services.tools.file import FileTool
 from app.domain.services.tools.mcp import MCPTool
 from app.domain.services.tools.message import MessageTool
@@ -32,6 +41,34 @@ from app.domain.services.tools.shell import ShellTool
 
 logger = logging.getLogger(__name__)
 
+"""
+DAG并行执行设计思路：
+1.规划Agent可以为每个步骤声明dependencies，AgentConfig.max_parallel_steps大于1时开启并行执行，
+    每一轮取出依赖已满足的就绪步骤(最多max_parallel_steps个)并发执行，默认为1保持原有的逐个执行；
+2.并行模式下每个步骤由独立的执行者(名字为react_{步骤id}的ReActAgent)执行，拥有独立的记忆，
+    执行者首次创建时复制主执行Agent的记忆作为上下文；
+3.各执行者的事件写入各自的队列，按步骤顺序依次输出：先完整输出第一个步骤的事件，再输出下一个步骤已缓存的事件，
+    保证前端看到的每个步骤的事件都是连续的；
+4.所有就绪步骤执行完成后，将步骤结果合并到主执行Agent的记忆中，再一次性交给规划Agent更新计划；
+5.执行者共享同一个沙箱，浏览器工具包通过ExclusiveTool在步骤级别独占，避免多个步骤交替操作同一个页面；
+6.执行者等待用户输入(message_ask_user)时中断本轮并行执行，恢复时对应步骤仍未完成，会由同名执行者基于原有记忆继续执行；
+
+计划更新省略设计思路：
+1.每一轮步骤执行完成后由PlanUpdatePolicy决定是否需要调用规划Agent更新计划，不需要时直接执行下一轮步骤；
+2.开启并发更新时，规划Agent在后台基于计划快照更新计划，同时按当前计划执行下一轮步骤，
+    下一轮步骤执行完成后等待更新结果并合并：实际执行完成的步骤保留执行结果，其余步骤以更新后的计划为准；
+3.流被中断(等待用户输入)时未完成的后台更新会在下一次运行时取消；
+
+检查点与崩溃恢复设计思路：
+1.流的每一次状态流转都会将检查点写入会话：流状态、计划(步骤状态与结果)、正在处理的用户消息、
+    本轮完成的步骤以及各Agent的记忆游标(消息数)，流正常结束时清除检查点；
+2.进程退出后会话停留在运行中，任何一个进程都可以调用resume从检查点恢复：
+    各Agent的记忆截断到检查点游标处，丢弃执行到一半的步骤产生的消息，再从检查点的状态继续执行，
+    已完成步骤的LLM调用与工具调用不会重复执行；
+3.并行模式下未完成步骤的执行者同样记录记忆游标，从未执行过的执行者游标为0(恢复时清空记忆，重新继承主执行Agent的记忆)；
+"""
+
+
 class PlannerReActFlow(BaseFlow):
     """规划与执行流"""
 
@@ -47,6 +84,10 @@ class PlannerReActFlow(BaseFlow):
             search_engine: SearchEngine, # 搜索引擎
             mcp_tool: MCPTool, # mcp工具
             a2a_tool: A2ATool, # a2a远程agent
+            web_fetcher: Optional[WebFetcher] = None, # 轻量网页获取器
+            tokenizer: Optional[Tokenizer] = None, # 本地分词器
+            summary_llm: Optional[LLM] = None, # 记忆摘要模型
+            llm_profiles: Optional[LLMProfileSelector] = None, # 模型档位选择器
     ) -> None:
         """构造函数，完成规划与执行流的初始化"""
         # 1.流初始化数据配置
@@ -56,12 +97,29 @@ class PlannerReActFlow(BaseFlow):
         self.status = FlowStatus.IDLE
         self.plan: Optional[Plan] = None
 
-        # 2.初始化Agent预设工具列表
-        tools = [
+        # 2.初始化Agent预设工具列表，并保存创建并行执行者所需的依赖
+        self._llm = llm
+        self._agent_config = agent_config
+        self._json_parser = json_parser
+        self._tokenizer = tokenizer
+        self._summary_llm = summary_llm
+        self._llm_profiles = llm_profiles
+        self._max_parallel_steps = agent_config.max_parallel_steps
+        self._completed_steps: List[Step] = []  # 本轮执行完成、等待更新计划的步骤
+        self._browser_lock = asyncio.Lock()  # 并行执行时浏览器工具包的独占锁
+        self._plan_update_policy = PlanUpdatePolicy(
+            policy=agent_config.plan_update_policy,
+            interval=agent_config.plan_update_interval,
+            concurrent=agent_config.plan_update_concurrent,
+        )
+        self._pending_update: Optional[asyncio.Task] = None  # 与步骤并发执行的计划更新任务
+        self._pending_update_started: float = 0.0  # 并发更新开始的时间
+        self._worker_cursors: Dict[str, int] = {}  # 并行执行者的记忆游标
+        self._tools = tools = [
             FileTool(sandbox=sandbox),
             ShellTool(sandbox=sandbox),
             BrowserTool(browser=browser),
-            SearchTool(search_engine=search_engine),
+            SearchTool(search_engine=search_engine, web_fetcher=web_fetcher, agent_config=agent_config),
             MessageTool(),
             mcp_tool,
             a2a_tool,
@@ -75,6 +133,9 @@ class PlannerReActFlow(BaseFlow):
             llm=llm,
             json_parser=json_parser,
             tools=tools,
+            tokenizer=tokenizer,
+            summary_llm=summary_llm,
+            llm_profiles=llm_profiles,
         )
         logger.debug(f"创建规划Agent成功，会话id：{self._session_id}")
 
@@ -86,9 +147,130 @@ class PlannerReActFlow(BaseFlow):
             llm=llm,
             json_parser=json_parser,
             tools=tools,
+            tokenizer=tokenizer,
+            summary_llm=summary_llm,
+            llm_profiles=llm_profiles,
         )
         logger.debug(f"创建执行Agent成功，会话id：{self._session_id}")
 
+    def _create_step_worker(self, step: Step, tools: List[BaseTool]) -> ReActAgent:
+        """创建并行执行指定步骤的执行者，执行者的名字(记忆key)由步骤id决定"""
+        worker = ReActAgent(
+            uow_factory=self._uow_factory,
+            session_id=self._session_id,
+            agent_config=self._agent_config,
+            llm=self._llm,
+            json_parser=self._json_parser,
+            tools=tools,
+            tokenizer=self._tokenizer,
+            summary_llm=self._summary_llm,
+            llm_profiles=self._llm_profiles,
+        )
+        worker.name = self._worker_name(step)
+        return worker
+
+    @classmethod
+    def _worker_name(cls, step: Step) -> str:
+        """并行执行指定步骤的执行者名字"""
+        return f"{ReActAgent.name}_{step.id}"
+
+    async def _run_step_worker(self, step: Step, message: Message, queue: asyncio.Queue) -> None:
+        """由独立的执行者执行步骤，并将事件写入队列，队列以None结束"""
+        # 1.浏览器工具包替换为步骤级独占的代理
+        tools = [
+            ExclusiveTool(tool, self._browser_lock) if isinstance(tool, BrowserTool) else tool
+            for tool in self._tools
+        ]
+        worker = self._create_step_worker(step, tools)
+        try:
+            # 2.继承主执行Agent的记忆后执行步骤
+            await worker.fork_memory(self.react)
+            async for event in worker.execute_step(self.plan, step, message):
+                await queue.put(event)
+
+            # 3.压缩执行者记忆
+            await worker.compact_memory()
+        except Exception as e:
+            # 4.执行出错时将异常写入队列，由消费者重新抛出
+            await queue.put(e)
+        finally:
+            # 5.释放独占的工具包并写入结束标记
+            for tool in tools:
+                if isinstance(tool, ExclusiveTool):
+                    tool.release()
+            await queue.put(None)
+
+    async def _execute_steps_concurrently(self, steps: List[Step], message: Message) -> AsyncGenerator[BaseEvent, None]:
+        """并发执行多个就绪步骤，按步骤顺序输出事件，每个步骤结束后记录检查点"""
+        # 1.为每个步骤创建事件队列与执行任务
+        queues = [asyncio.Queue() for _ in steps]
+        tasks = [
+            asyncio.create_task(self._run_step_worker(step, message, queue))
+            for step, queue in zip(steps, queues)
+        ]
+
+        try:
+            # 2.按步骤顺序依次输出每个步骤的事件，后面步骤的事件在队列中缓存
+            for step, queue in zip(steps, queues):
+                while (event := await queue.get()) is not None:
+                    if isinstance(event, Exception):
+                        raise event
+                    yield event
+
+                # 3.步骤执行结束后记录检查点，恢复时本轮已完成的步骤不会重复执行
+                if step.done:
+                    self._completed_steps.append(step)
+                    await self._save_checkpoint(message)
+        finally:
+            # 4.中断(等待用户输入、取消、出错)时取消其余仍在执行的步骤
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _update_plan_snapshot(self, snapshot: Plan, steps: List[Step]) -> Tuple[Plan, List[BaseEvent]]:
+        """基于计划快照更新计划，缓存规划Agent生成的非计划事件，返回更新后的快照与缓存的事件"""
+        events = []
+        async for event in self.planner.update_plan(snapshot, steps):
+            if not isinstance(event, PlanEvent):
+                events.append(event)
+        return snapshot, events
+
+    def _start_plan_update(self, steps: List[Step]) -> None:
+        """在后台启动与下一轮步骤并发执行的计划更新"""
+        self._pending_update_started = time.perf_counter()
+        self._pending_update = asyncio.create_task(
+            self._update_plan_snapshot(self.plan.model_copy(deep=True), list(steps))
+        )
+
+    async def _finish_plan_update(self) -> AsyncGenerator[BaseEvent, None]:
+        """等待后台计划更新完成，并将更新后的计划与期间实际执行完成的步骤合并"""
+        # 1.等待后台更新完成并计算更新耗时与等待耗时
+        wait_started = time.perf_counter()
+        task, self._pending_update = self._pending_update, None
+        updated_plan, events = await task
+        finished = time.perf_counter()
+        elapsed = finished - self._pending_update_started
+        self._plan_update_policy.record_update(elapsed, saved=max(elapsed - (finished - wait_started), 0.0))
+
+        # 2.输出规划Agent生成的其他事件
+        for event in events:
+            yield event
+
+        # 3.以更新后的计划为准，快照之后实际执行完成的步骤保留执行结果
+        done_steps = {step.id: step for step in self.plan.steps if step.done}
+        merged_steps = [done_steps.pop(step.id, step) for step in updated_plan.steps]
+
+        # 4.规划Agent删除了的已完成步骤插入到第一个未完成的步骤之前
+        if done_steps:
+            first_pending_index = next(
+                (index for index, step in enumerate(merged_steps) if not step.done), len(merged_steps)
+            )
+            merged_steps[first_pending_index:first_pending_index] = list(done_steps.values())
+        self.plan.steps = merged_steps
+        logger.info(f"Planner&ReAct流合并并发更新的计划，耗时: {elapsed:.2f}s")
+        yield PlanEvent(status=PlanEventStatus.UPDATED, plan=self.plan)
+
     async def invoke(self, message: Message) -> AsyncGenerator[BaseEvent, None]:
         """传递消息，运行流，在流中调用planner&react智能体组合完成任务并返回对应事件"""
         # 1.调用会话仓库查询会话是否存在
@@ -102,6 +284,9 @@ class PlannerReActFlow(BaseFlow):
         #    - 任务未结束，还在运行、但是用户又传递了一条消息
         #    - Agent在等待人类输入，这时候人类输入了
         #    这时候均需要处理历史消息列表，避免AI（根据调用消息）后直接接上人类消息
+        if self._pending_update is not None:
+            self._pending_update.cancel()
+            self._pending_update = None
         if session.status != SessionStatus.PENDING:
             logger.debug(f"会话[{self._session_id}]未处于空闲状态，回滚数据确保消息列表格式正确")
             await self.planner.roll_back(message)
@@ -123,91 +308,213 @@ class PlannerReActFlow(BaseFlow):
 
         # 6.获取当前会话中最新事件
         self.plan = session.get_latest_plan()
+
+        # 7.并行模式下被中断的步骤由同名执行者继续执行，同样需要回滚其记忆
+        if session.status != SessionStatus.PENDING and self.plan and self._max_parallel_steps > 1:
+            for running_step in self.plan.steps:
+                if running_step.status == ExecutionStatus.RUNNING:
+                    worker = self._create_step_worker(running_step, self._tools)
+                    await worker.roll_back(message)
+                    self._worker_cursors[worker.name] = await worker.get_memory_cursor()
         logger.info(f"Planner&ReAct流接受到消息: {message.message[:50]}...")
 
-        # 7.定义当前正在执行的子步骤
+        # 8.运行流直到任务结束或者等待用户输入
+        async for event in self._run(message):
+            yield event
+
+    async def resume(self, checkpoint: FlowCheckpoint) -> AsyncGenerator[BaseEvent, None]:
+        """从检查点恢复被中断的流，从最后一次状态流转处继续执行"""
+        # 1.恢复流状态、计划以及本轮完成的步骤
+        self.status = FlowStatus(checkpoint.flow_status)
+        self.plan = checkpoint.plan
+        self._completed_steps = [
+            step for step in (self.plan.steps if self.plan else [])
+            if step.id in checkpoint.completed_step_ids
+        ]
+        logger.info(f"Planner&ReAct流从检查点恢复, 状态: {self.status}, 检查点时间: {checkpoint.created_at}")
+
+        # 2.将规划Agent与执行Agent的记忆恢复到检查点游标处
+        for agent in (self.planner, self.react):
+            if agent.name in checkpoint.memory_cursors:
+                await agent.restore_memory(checkpoint.memory_cursors[agent.name])
+
+        # 3.并行模式下恢复未完成步骤的执行者记忆，检查点中没有游标的执行者视为从未执行过
+        if self.plan and self._max_parallel_steps > 1:
+            for step in self.plan.steps:
+                if not step.done:
+                    worker = self._create_step_worker(step, self._tools)
+                    cursor = checkpoint.memory_cursors.get(worker.name, 0)
+                    await worker.restore_memory(cursor)
+                    self._worker_cursors[worker.name] = cursor
+
+        # 4.从检查点的状态继续运行流
+        async for event in self._run(checkpoint.message):
+            yield event
+
+    async def _save_checkpoint(self, message: Message) -> None:
+        """记录流检查点，检查点写入失败不影响流的运行"""
+        # 1.空闲与已完成状态无需记录检查点
+        if self.status in [FlowStatus.IDLE, FlowStatus.COMPLETED]:
+            return
+
+        try:
+            # 2.收集规划Agent、执行Agent以及未完成步骤执行者的记忆游标
+            memory_cursors = {
+                self.planner.name: await self.planner.get_memory_cursor(),
+                self.react.name: await self.react.get_memory_cursor(),
+            }
+            if self.plan and self._max_parallel_steps > 1:
+                for step in self.plan.steps:
+                    if not step.done:
+                        worker_name = self._worker_name(step)
+                        memory_cursors[worker_name] = self._worker_cursors.get(worker_name, 0)
+
+            # 3.将检查点写入会话
+            checkpoint = FlowCheckpoint(
+                flow_status=self.status.value,
+                plan=self.plan,
+                message=message,
+                completed_step_ids=[step.id for step in self._completed_steps],
+                memory_cursors=memory_cursors,
+            )
+            async with self._uow:
+                await self._uow.session.save_checkpoint(self._session_id, checkpoint)
+        except Exception as e:
+            logger.warning(f"会话[{self._session_id}]记录流检查点失败: {str(e)}")
+
+    async def _clear_checkpoint(self) -> None:
+        """流正常结束时清除检查点"""
+        try:
+            async with self._uow:
+                await self._uow.session.save_checkpoint(self._session_id, None)
+        except Exception as e:
+            logger.warning(f"会话[{self._session_id}]清除流检查点失败: {str(e)}")
+
+    async def _run(self, message: Message) -> AsyncGenerator[BaseEvent, None]:
+        """根据流的状态循环执行规划、执行、更新与总结"""
+        # 1.定义当前正在执行的子步骤
         step = None
 
-        # 8.创建死循环执行任务，根据流的不同状态执行不同的操作
+        # 2.创建死循环执行任务，根据流的不同状态执行不同的操作
         while True:
-            # 9.如果流的状态为空闲，则只需要将状态修改为规划中
+            # 3.记录流检查点，进程退出后可以从最后一次状态流转处恢复
+            await self._save_checkpoint(message)
+
+            # 4.如果流的状态为空闲，则只需要将状态修改为规划中
             if self.status == FlowStatus.IDLE:
                 logger.info(f"Planner&ReAct流状态从{FlowStatus.IDLE}变成{FlowStatus.PLANNING}")
                 self.status = FlowStatus.PLANNING
             elif self.status == FlowStatus.PLANNING:
-                # 10.流状态为规划中，则调用规划Agent
+                # 5.流状态为规划中，则调用规划Agent
                 logger.info(f"Planner&ReAct流开始创建计划/Plan")
                 async for event in self.planner.create_plan(message):
-                    # 11.判断规划Agent是否返回规划事件
+                    # 6.判断规划Agent是否返回规划事件
                     if isinstance(event, PlanEvent) and event.status == PlanEventStatus.CREATED:
-                        # 12.创建计划成功时需要更新计划
+                        # 7.创建计划成功时需要更新计划
                         self.plan = event.plan
                         logger.info(f"Planner&ReAct流成功创建计划，共计：{len(event.plan.steps)} 步")
 
-                        # 13.在计划中同步生成了会话标题+初始AI消息
+                        # 8.在计划中同步生成了会话标题+初始AI消息
                         yield TitleEvent(title=event.plan.title)
                         yield MessageEvent(role="assistant", message=event.plan.message)
 
-                    # 14.将生成的事件直接输出（一般来说是PlanEvent）
+                    # 9.将生成的事件直接输出（一般来说是PlanEvent）
                     yield event
 
-                # 15.计划创建完成，更新流状态为执行中
+                # 10.计划创建完成，更新流状态为执行中
                 logger.info(f"Planner&ReAct流状态从{FlowStatus.PLANNING}变成{FlowStatus.EXECUTING}")
+                self._completed_steps = []
                 self.status = FlowStatus.EXECUTING
 
-                # 16.判断计划是否生成，步骤是否正常
+                # 11.判断计划是否生成，步骤是否正常
                 if not self.plan or len(self.plan.steps) == 0:
                     logger.info(f"Planner&ReAct流创建计划失败或无子步骤")
                     self.status = FlowStatus.COMPLETED
             elif self.status == FlowStatus.EXECUTING:
-                # 17.流的状态为执行中，先将计划状态挑战为运行中，同时调用执行Agent完成每个子步骤
+                # 12.流的状态为执行中，先将计划状态挑战为运行中，同时调用执行Agent完成每个子步骤
                 self.plan.status = ExecutionStatus.RUNNING
 
-                # 18.获取当前计划的下一个需要执行的子步骤
-                step = self.plan.get_next_step()
+                # 13.获取当前计划的下一个需要执行的子步骤，并行模式下获取所有依赖已满足的就绪步骤
+                if self._max_parallel_steps > 1:
+                    steps = self.plan.get_ready_steps(self._max_parallel_steps)
+                else:
+                    step = self.plan.get_next_step()
+                    steps = [step] if step else []
 
-                # 19.如果不存在下一个需要执行的子计划，则更新流程状态并执行后续步骤
-                if not step:
+                # 14.如果不存在下一个需要执行的子计划，则更新流程状态并执行后续步骤(存在并发更新时先合并再重新获取)
+                if not steps and self._pending_update is not None:
+                    async for event in self._finish_plan_update():
+                        yield event
+                    continue
+                if not steps:
                     logger.info(f"Planner&ReAct流状态从{FlowStatus.EXECUTING}变成{FlowStatus.SUMMARIZING}")
                     self.status = FlowStatus.SUMMARIZING
                     continue
 
-                # 20.调用执行Agent执行对应的步骤
-                logger.info(f"Planner&ReAct流开始执行步骤 {step.id}: {step.description[:50]}...")
-                async for event in self.react.execute_step(self.plan, step, message):
-                    yield event
+                if self._max_parallel_steps > 1:
+                    # 15.并行模式下由独立的执行者并发执行就绪步骤，并将本轮完成的步骤结果合并到主执行Agent的记忆中
+                    logger.info(f"Planner&ReAct流开始并行执行步骤: {[step.id for step in steps]}")
+                    async for event in self._execute_steps_concurrently(steps, message):
+                        yield event
+                    await self.react.merge_step_results(self._completed_steps)
+                else:
+                    # 16.调用执行Agent执行对应的步骤
+                    logger.info(f"Planner&ReAct流开始执行步骤 {step.id}: {step.description[:50]}...")
+                    async for event in self.react.execute_step(self.plan, step, message):
+                        yield event
 
-                # 21.压缩执行Agent记忆，避免上下文腐化+消耗大量token
-                logger.info(f"压缩{self.react.name} Agent记忆/上下文")
-                await self.react.compact_memory()
+                    # 17.压缩执行Agent记忆，避免上下文腐化+消耗大量token
+                    logger.info(f"压缩{self.react.name} Agent记忆/上下文")
+                    await self.react.compact_memory()
+                    self._completed_steps.append(step)
 
-                # 22.将状态更新为updating
+                # 18.等待并合并与本轮步骤并发执行的计划更新
+                if self._pending_update is not None:
+                    async for event in self._finish_plan_update():
+                        yield event
+
+                # 19.将状态更新为updating
                 self.status = FlowStatus.UPDATING
             elif self.status == FlowStatus.UPDATING:
-                # 23.流状态为更新表示需要更新计划
-                logger.info(f"Planner&ReAct流开始更新计划")
-                async for event in self.planner.update_plan(self.plan, step):
-                    yield event
+                # 20.根据更新策略判断是否需要更新计划
+                should_update, reason = self._plan_update_policy.should_update(self.plan, self._completed_steps)
+                if not should_update:
+                    logger.info(f"Planner&ReAct流跳过更新计划: {reason}")
+                    self._plan_update_policy.record_skip()
+                elif self._plan_update_policy.should_overlap(self.plan, self._completed_steps):
+                    # 21.在后台更新计划，同时按当前计划执行下一轮步骤
+                    logger.info(f"Planner&ReAct流开始并发更新计划: {reason}")
+                    self._start_plan_update(self._completed_steps)
+                else:
+                    # 22.调用规划Agent更新计划
+                    logger.info(f"Planner&ReAct流开始更新计划: {reason}")
+                    start_time = time.perf_counter()
+                    async for event in self.planner.update_plan(self.plan, self._completed_steps):
+                        yield event
+                    self._plan_update_policy.record_update(time.perf_counter() - start_time)
 
-                # 24.计划更新完成，需要执行相应的子步骤
+                # 23.计划更新完成，需要执行相应的子步骤
                 logger.info(f"Planner&ReAct流状态从{FlowStatus.UPDATING}变成{FlowStatus.EXECUTING}")
+                self._completed_steps = []
                 self.status = FlowStatus.EXECUTING
             elif self.status == FlowStatus.SUMMARIZING:
-                # 25.流状态为总结中，则意味着所有子步骤都执行完成
+                # 24.流状态为总结中，则意味着所有子步骤都执行完成
                 logger.info(f"Planner&ReAct流开始总结")
                 async for event in self.react.summarize():
                     yield event
 
-                # 26.总结完成，意味着流即将结束
+                # 25.总结完成，意味着流即将结束
                 logger.info(f"Planner&ReAct流状态从{FlowStatus.SUMMARIZING}变成{FlowStatus.COMPLETED}")
                 self.status = FlowStatus.COMPLETED
             elif self.status == FlowStatus.COMPLETED:
-                # 27.计划状态已完成则更新plan状态，并发送计划事件通知API已完成
+                # 26.计划状态已完成则更新plan状态，并发送计划事件通知API已完成
                 self.plan.status = ExecutionStatus.COMPLETED
                 self.status = FlowStatus.IDLE
+                self._plan_update_policy.report(self._session_id)
+                await self._clear_checkpoint()
                 yield PlanEvent(status=PlanEventStatus.COMPLETED, plan=self.plan)
                 break
-        # 28.任务以及结束则返回结束事件
+        # 27.任务以及结束则返回结束事件
         yield DoneEvent()
         logger.info(f"Planner&ReAct流处理任务消息已完毕")
 
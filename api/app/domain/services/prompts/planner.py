@@ -24,6 +24,7 @@ CREATE_PLANNER_PROMPT = """
 - 你的计划必须简洁明了，不要添加任何不必要的细节
 - 你的步骤必须是原子性且独立的，以便下一个执行者可以使用工具逐一执行它们
 - 你需要判断任务是否可以拆分为多个步骤，如果可以，返回多个步骤；否则，返回单个个步骤
+- 使用dependencies声明每个步骤依赖的步骤id，相互独立的步骤(例如分别调研A和B)不要相互依赖，它们可以被并行执行
 
 返回格式要求:
 - 必须返回符合以下 TypeScript 接口定义的 JSON 格式
@@ -43,6 +44,8 @@ interface CreatePlanResponse {{
         id: string;
         /** 步骤描述 **/
         description: string;
+        /** 依赖的步骤id数组，依赖的步骤全部完成后才会执行该步骤，不依赖任何步骤时为空数组 **/
+        dependencies: string[];
     }}>;
     /** 根据上下文生成的计划目标 **/
     goal: string;
@@ -60,7 +63,8 @@ JSON 输出示例:
     "steps": [
         {{
             "id": "1",
-            "description": "步骤1描述"
+            "description": "步骤1描述",
+            "dependencies": []
         }}
     ]
 }}
@@ -82,7 +86,7 @@ JSON 输出示例:
 
 # 更新Plan规划提示词模板，内部有plan和step占位符
 UPDATE_PLANNER_PROMPT = """
-你正在更新计划，你需要根据步骤的执行结果来更新计划:
+你正在更新计划，你需要根据步骤(可能有多个并行执行的步骤)的执行结果来更新计划:
 {step}
 
 注意:
@@ -93,6 +97,7 @@ UPDATE_PLANNER_PROMPT = """
 - 如果步骤已完成或者不在必要，请将其删除
 - 仔细阅读步骤结果以确定是否成功，如果不成功，请更改后续步骤
 - 根据步骤结果，你续页相应更新计划步骤
+- 保留或更新步骤的dependencies，已完成步骤的id可以继续被依赖
 
 返回格式要求:
 - 必须返回符合以下 TypeScript 接口定义的 JSON 格式
@@ -107,6 +112,8 @@ interface UpdatePlanResponse {{
         id: string;
         /** 步骤描述 **/
         description: string;
+        /** 依赖的步骤id数组，依赖的步骤全部完成后才会执行该步骤，不依赖任何步骤时为空数组 **/
+        dependencies: string[];
     }}>;
 }}
 ```
@@ -116,8 +123,9 @@ JSON输出示例:
 {{
     "steps": [
         {{
-            "id": 1,
-            "description": "步骤1描述"
+            "id": "1",
+            "description": "步骤1描述",
+            "dependencies": []
         }}
     ]
 }}
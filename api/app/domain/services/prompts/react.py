@@ -112,3 +112,9 @@ JSON 输出示例：
     ]
 }}
 """
+
+# 并行步骤结果合并提示词模板，包含steps(并行执行的步骤及结果)
+PARALLEL_STEPS_RESULT_PROMPT = """
+以下步骤已由其他执行者并行执行完成，请将它们的执行结果作为后续步骤的上下文：
+{steps}
+"""
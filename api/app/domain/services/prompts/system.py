@@ -59,6 +59,7 @@ SYSTEM_PROMPT = """
 - 主动探索有价值的链接以获取更深层信息（通过点击元素或直接访问 URL）
 - 浏览器工具默认仅返回可见视口（Viewport）中的元素
 - 可见元素返回格式为 `index[:]<tag>text</tag>`，其中 `index` 用于后续浏览器操作中的交互
+- 页面内容也可能以无障碍树格式返回，每行为 `[index] role "name"`，带 `index` 的行为可交互元素，`index` 同样用于后续浏览器操作
 - 由于技术限制，可能无法识别所有交互元素；对于未列出的元素，请使用坐标进行交互
 - 浏览器工具会自动尝试提取页面内容，如果成功则提供 Markdown 格式
 - 提取的 Markdown 包含视口之外的文本，但会省略链接和图像；不保证内容的完整性
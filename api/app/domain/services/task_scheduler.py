@@ -0,0 +1,215 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/20 00:10
+#Author  :Emcikem
+@File    :task_scheduler.py
+"""
+import asyncio
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from app.domain.external.task import Task
+from core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+"""
+任务调度与准入控制设计思路：
+1.原先每次对话都会直接启动AgentTaskRunner，突发的大量会话会同时发起LLM、沙箱、浏览器调用，拖慢所有会话；
+2.启动任务前先向调度器申请票据，调度器限制全局并发数与单个用户的并发数，超过并发的票据进入等待队列；
+3.等待队列使用加权公平排队(按开始时间的公平排队)：每个(用户, 优先级)是一条流，票据的完成标签 =
+    max(虚拟时间, 该流上一个票据的完成标签) + 1/权重，每次放行完成标签最小且用户未超过并发上限的票据，
+    交互式(interactive)任务的权重高于批处理(batch)任务，同一用户连续提交的任务不会挤占其他用户；
+4.等待期间每当排队位置变化时返回新的位置，由Agent服务推送排队事件给前端；
+5.等待队列长度达到上限时直接拒绝，并根据平均任务耗时估算重试时间(retry-after)，避免请求长时间挂起；
+6.放行后票据绑定到任务，任务结束(done)时自动释放并发名额，无需任务运行器显式回调；
+"""
+
+
+class TaskPriority(str, Enum):
+    """任务优先级类型枚举"""
+    INTERACTIVE = "interactive"  # 交互式任务
+    BATCH = "batch"  # 批处理任务
+
+
+class SchedulerOverloadedError(RuntimeError):
+    """调度器等待队列已满"""
+
+    def __init__(self, retry_after: int) -> None:
+        """构造函数，传递建议的重试秒数"""
+        self.retry_after = retry_after
+        super().__init__(f"当前排队的任务过多，请{retry_after}秒后重试")
+
+
+@dataclass
+class SchedulerTicket:
+    """调度票据，记录一次任务启动申请的排队与运行状态"""
+    user_id: str
+    priority: TaskPriority
+    start_tag: float = 0.0  # 公平排队的开始标签
+    finish_tag: float = 0.0  # 公平排队的完成标签
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    granted: bool = False  # 是否已经放行
+    task: Optional[Task] = None  # 放行后绑定的任务
+
+    @property
+    def sort_key(self) -> Tuple[float, float]:
+        return self.finish_tag, self.enqueued_at
+
+
+class TaskScheduler:
+    """任务调度器，负责任务启动前的准入控制、并发限制与加权公平排队"""
+
+    def __init__(
+            self,
+            max_concurrent_tasks: int = 32,
+            max_concurrent_tasks_per_user: int = 4,
+            max_queued_tasks: int = 100,
+            weights: Optional[Dict[TaskPriority, int]] = None,
+            default_task_seconds: float = 60.0,
+            poll_interval: float = 0.5,
+    ) -> None:
+        """构造函数，完成调度器初始化，涵盖全局/用户并发上限、等待队列上限、优先级权重"""
+        self._max_concurrent_tasks = max(1, max_concurrent_tasks)
+        self._max_concurrent_tasks_per_user = max(1, max_concurrent_tasks_per_user)
+        self._max_queued_tasks = max_queued_tasks
+        self._weights = weights or {TaskPriority.INTERACTIVE: 4, TaskPriority.BATCH: 1}
+        self._avg_task_seconds = default_task_seconds  # 任务平均运行时长(指数加权平均)，用于估算重试时间
+        self._poll_interval = poll_interval
+        self._waiting: List[SchedulerTicket] = []
+        self._running: List[SchedulerTicket] = []
+        self._flow_tags: Dict[Tuple[str, TaskPriority], float] = {}  # 每条流上一个票据的完成标签
+        self._virtual_time = 0.0
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        """唤醒所有等待中的票据重新计算排队位置"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _user_running(self, user_id: str) -> int:
+        return sum(1 for ticket in self._running if ticket.user_id == user_id)
+
+    def _prune(self) -> bool:
+        """释放已经结束的任务占用的并发名额，返回是否有名额被释放"""
+        finished = [ticket for ticket in self._running if ticket.task is not None and ticket.task.done]
+        for ticket in finished:
+            self._running.remove(ticket)
+            self._avg_task_seconds = 0.8 * self._avg_task_seconds + 0.2 * (time.monotonic() - ticket.started_at)
+        return bool(finished)
+
+    def _dispatch(self) -> None:
+        """按公平排队的顺序放行票据，直到全局并发已满或没有可以放行的票据"""
+        # 1.释放已经结束的任务
+        changed = self._prune()
+
+        # 2.循环放行完成标签最小、且用户未达到并发上限的票据
+        while self._waiting and len(self._running) < self._max_concurrent_tasks:
+            eligible = [
+                ticket for ticket in self._waiting
+                if self._user_running(ticket.user_id) < self._max_concurrent_tasks_per_user
+            ]
+            if not eligible:
+                break
+            ticket = min(eligible, key=lambda t: t.sort_key)
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            ticket.started_at = time.monotonic()
+            self._running.append(ticket)
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            get_metrics().observe(
+                "task_scheduler_wait_ms",
+                (ticket.started_at - ticket.enqueued_at) * 1000,
+                priority=ticket.priority.value,
+            )
+            changed = True
+
+        # 3.更新监控指标并唤醒等待中的票据
+        if changed:
+            get_metrics().set_gauge("task_scheduler_running", len(self._running))
+            get_metrics().set_gauge("task_scheduler_waiting", len(self._waiting))
+            self._notify()
+
+    def _retry_after(self) -> int:
+        """根据平均任务耗时与排队长度估算重试秒数"""
+        seconds = self._avg_task_seconds * (len(self._waiting) + 1) / self._max_concurrent_tasks
+        return min(600, max(1, math.ceil(seconds)))
+
+    def submit(self, user_id: str, priority: TaskPriority = TaskPriority.INTERACTIVE) -> SchedulerTicket:
+        """申请调度票据，有空闲名额时立即放行，等待队列已满时抛出SchedulerOverloadedError"""
+        # 1.计算票据在所属流中的开始/完成标签
+        flow = (user_id, priority)
+        previous_tag = self._flow_tags.get(flow)
+        start_tag = max(self._virtual_time, previous_tag or 0.0)
+        ticket = SchedulerTicket(
+            user_id=user_id,
+            priority=priority,
+            start_tag=start_tag,
+            finish_tag=start_tag + 1.0 / self._weights.get(priority, 1),
+        )
+        self._flow_tags[flow] = ticket.finish_tag
+
+        # 2.加入等待队列并尝试放行
+        self._waiting.append(ticket)
+        self._dispatch()
+
+        # 3.未被放行且等待队列超过上限时撤销票据并拒绝
+        if not ticket.granted and len(self._waiting) > self._max_queued_tasks:
+            self._waiting.remove(ticket)
+            if previous_tag is None:
+                del self._flow_tags[flow]
+            else:
+                self._flow_tags[flow] = previous_tag
+            get_metrics().incr("task_scheduler_rejected", priority=priority.value)
+            raise SchedulerOverloadedError(self._retry_after())
+        return ticket
+
+    def position(self, ticket: SchedulerTicket) -> int:
+        """获取票据在等待队列中的位置(从1开始)，已放行时返回0"""
+        if ticket.granted:
+            return 0
+        return 1 + sum(1 for other in self._waiting if other.sort_key < ticket.sort_key)
+
+    async def wait(self, ticket: SchedulerTicket) -> AsyncGenerator[int, None]:
+        """等待票据被放行，排队位置变化时返回新的位置，放行后结束迭代"""
+        last_position = None
+        while True:
+            # 1.尝试放行(任务结束不会主动通知，需要在等待期间检查)
+            self._dispatch()
+            if ticket.granted:
+                return
+
+            # 2.排队位置变化时返回
+            position = self.position(ticket)
+            if position != last_position:
+                last_position = position
+                yield position
+
+            # 3.等待其他票据放行/释放或到达轮询间隔
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self._poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def bind(self, ticket: SchedulerTicket, task: Task) -> None:
+        """将已放行的票据绑定到任务，任务结束时自动释放名额"""
+        ticket.task = task
+
+    def release(self, ticket: SchedulerTicket) -> None:
+        """撤销等待中的票据，或释放没有绑定任务的已放行票据"""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+        elif ticket in self._running and ticket.task is None:
+            self._running.remove(ticket)
+        else:
+            return
+        self._dispatch()
+        self._notify()
@@ -171,7 +171,8 @@ class A2ATool(BaseTool):
         name="get_remote_agent_cards",
         description="获取可远程调用的Agent卡片信息，包含Agent id、名称、描述、技能、请求端点等。",
         parameters={},
-        required=[]
+        required=[],
+        read_only=True,
     )
     async def get_remote_agent_cards(self) -> ToolResult:
         """获取远程Agent卡片信息列表"""
@@ -6,7 +6,8 @@
 @File    :base.py
 """
 import inspect
-from typing import Dict, Any, List, Callable
+from dataclasses import dataclass
+from typing import Dict, Any, List, Callable, FrozenSet, Optional
 
 from app.domain.models.tool_result import ToolResult
 
@@ -16,6 +17,10 @@ LlmManus工具工具设计思路
 2.定义一个装饰器，被该装饰器装饰的方法会填充_tool_name、_tool_description、_tool_schema属性;
 3.工具类可以提供get_tools快速获取基于缓存的scheme参数信息，折腰LLM就可以便捷调用;
 4.LLM生成的内容有可能会有幻觉，在调用工具前需要筛选出LLM生成参数中符合工具的相关数据
+5.每个工具类第一次使用时扫描一次类属性构建工具注册表(工具名->方法名、声明、可接收的参数集合)，
+    之后has_tool/invoke/get_tools均为字典查找，不再在每次调用时执行inspect.getmembers/inspect.signature；
+6.工具集会变化的工具包(例如MCP)在工具列表变化时递增tools_version，Agent据此判断是否需要重建工具索引与声明列表；
+7.装饰器通过read_only标记只读/幂等工具(读文件、搜索等)，Agent开启并行工具调用时这类工具可以并发执行；
 """
 
 
@@ -24,6 +29,7 @@ def tool(
         description: str,
         parameters: Dict[str, Dict[str, Any]],
         required: List[str],
+        read_only: bool = False,
 ) -> Callable:
     """定义OpenAI工具装饰器，用于将一个函数/方法添加上对应的工具声明"""
 
@@ -48,33 +54,64 @@ def tool(
         func._tool_name = name
         func._tool_description = description
         func._tool_schema = tool_schema
+        func._tool_read_only = read_only
 
         return func
 
     return decorator
 
 
+@dataclass(frozen=True)
+class ToolSpec:
+    """工具注册信息"""
+    method_name: str  # 工具对应的方法名
+    schema: Dict[str, Any]  # 工具声明
+    parameters: FrozenSet[str]  # 方法可接收的参数名
+    read_only: bool  # 是否为只读/幂等工具，只读工具可以并行调用
+
+
 class BaseTool:
     """基础工具类，用于定义一个工具类，管理统一的工具集"""
     name: str = ""  # 工具集的名字
 
     def __init__(self) -> None:
         """构造函数，完成缓存初始化"""
-        self._tools_cache = None
+        self._tools_cache: Optional[List[Dict[str, Any]]] = None
+        self._tools_version: int = 0
 
     @classmethod
-    def _filter_parameters(cls, method: Callable, kwargs: Dict[str, Any]) -> Dict[str, Any]:
-        """传递method+kwargs并过滤参数，使其符合method参数的要求，因为LLM输出的内容有可能有幻觉"""
-        # 1.定义一个变量用于存储过滤后的字典信息
-        filtered_kwargs = {}
-        sign = inspect.signature(method)
+    def _get_registry(cls) -> Dict[str, ToolSpec]:
+        """获取当前工具类的工具注册表(每个类只构建一次，子类不会复用父类的注册表)"""
+        # 1.判断当前类是否已经构建过注册表
+        registry = cls.__dict__.get("_tool_registry")
+        if registry is not None:
+            return registry
+
+        # 2.扫描类下所有被tool装饰器装饰的函数，预先计算参数集合
+        registry = {}
+        for method_name, func in inspect.getmembers(cls, inspect.isfunction):
+            if not hasattr(func, "_tool_name"):
+                continue
+            registry[func._tool_name] = ToolSpec(
+                method_name=method_name,
+                schema=func._tool_schema,
+                parameters=frozenset(name for name in inspect.signature(func).parameters if name != "self"),
+                read_only=getattr(func, "_tool_read_only", False),
+            )
+
+        # 3.缓存到当前类上并返回
+        cls._tool_registry = registry
+        return registry
 
-        # 2.循环遍历kwargs的所有数据
-        for key, value in kwargs.items():
-            if key in sign.parameters:
-                filtered_kwargs[key] = value
+    @classmethod
+    def _filter_parameters(cls, spec: ToolSpec, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """传递工具注册信息+kwargs并过滤参数，使其符合方法参数的要求，因为LLM输出的内容有可能有幻觉"""
+        return {key: value for key, value in kwargs.items() if key in spec.parameters}
 
-        return filtered_kwargs
+    @property
+    def tools_version(self) -> int:
+        """工具列表版本号，工具列表发生变化时递增"""
+        return self._tools_version
 
     def get_tools(self) -> List[Dict[str, Any]]:
         """获取所有已注册的工具列表信息，用于LLM绑定工具"""
@@ -82,36 +119,76 @@ class BaseTool:
         if self._tools_cache is not None:
             return self._tools_cache
 
-        # 2.定义工具列表用于存储对应的数据
-        tools = []
-
-        # 3.循环遍历类下的所有方法
-        for _, method in inspect.getmembers(self, predicate=inspect.ismethod):
-            if hasattr(method, "_tool_schema"):
-                tools.append(getattr(method, "_tool_schema"))
-
-        # 4.创建缓存后返回
-        self._tools_cache = tools
-        return tools
+        # 2.从注册表中取出工具声明并创建缓存后返回
+        self._tools_cache = [spec.schema for spec in self._get_registry().values()]
+        return self._tools_cache
 
     def has_tool(self, tool_name: str) -> bool:
         """传递工具名字，判断该工具集下是否存在该工具"""
-        for _, method in inspect.getmembers(self, inspect.ismethod):
-            if hasattr(method, "_tool_name") and getattr(method, "_tool_name") == tool_name:
-                return True
-        return False
+        return tool_name in self._get_registry()
+
+    def is_read_only(self, tool_name: str) -> bool:
+        """判断工具是否为只读/幂等工具(不存在的工具视为有副作用)"""
+        spec = self._get_registry().get(tool_name)
+        return spec is not None and spec.read_only
 
     async def invoke(self, tool_name: str, **kwargs) -> ToolResult:
         """工具传递的工具名+kwargs调用制定工具并获取结果"""
-        # 1.循环遍历工具集的所有方法
-        for _, method in inspect.getmembers(self, inspect.ismethod):
-            # 2.判断对应的方法是否存在_tool_name
-            if hasattr(method, "_tool_name") and getattr(method, "_tool_name") == tool_name:
-                # 3.筛选传递的kwargs参数保留method对应的参数，多余的剔除
-                filtered_kwargs = self._filter_parameters(method, kwargs)
+        # 1.从注册表中查找工具，不存在则抛出错误
+        spec = self._get_registry().get(tool_name)
+        if spec is None:
+            raise ValueError(f"工具[{tool_name}]未找到")
+
+        # 2.筛选传递的kwargs参数保留method对应的参数，多余的剔除
+        filtered_kwargs = self._filter_parameters(spec, kwargs)
+
+        # 3.调用方法获取工具结果
+        return await getattr(self, spec.method_name)(**filtered_kwargs)
+
+
+if __name__ == "__main__":
+    # 工具分发开销基准测试: python -m app.domain.services.tools.base
+    import asyncio
+    import timeit
 
-                # 4.调用方法获取工具结果
-                return await method(**filtered_kwargs)
 
-        # 5.如果循环结束还没有找到工具并调用抛出错误
+    def make_tool(index: int) -> Callable:
+        """创建一个基准测试使用的工具方法"""
+
+        @tool(name=f"tool_{index}", description="", parameters={}, required=[])
+        async def method(self, a=None, b=None) -> ToolResult:
+            return ToolResult(success=True)
+
+        return method
+
+
+    # 模拟一个包含15个工具的真实工具包
+    BenchmarkTool = type("BenchmarkTool", (BaseTool,), {f"tool_{index}": make_tool(index) for index in range(15)})
+
+
+    async def legacy_invoke(toolkit: BaseTool, tool_name: str, **kwargs) -> ToolResult:
+        """旧版本的分发方式: 每次调用都执行inspect.getmembers+inspect.signature"""
+        for _, method in inspect.getmembers(toolkit, inspect.ismethod):
+            if hasattr(method, "_tool_name") and getattr(method, "_tool_name") == tool_name:
+                sign = inspect.signature(method)
+                return await method(**{key: value for key, value in kwargs.items() if key in sign.parameters})
         raise ValueError(f"工具[{tool_name}]未找到")
+
+
+    async def main():
+        toolkit, number = BenchmarkTool(), 20000
+        loop = asyncio.get_running_loop()
+        for label, dispatch in [("inspect扫描", legacy_invoke), ("注册表", BaseTool.invoke)]:
+            start_time = loop.time()
+            for _ in range(number):
+                await dispatch(toolkit, "tool_14", a=1, c=2)
+            print(f"{label} invoke: {(loop.time() - start_time) / number * 1e6:.2f}us/次")
+
+        legacy_has_tool = lambda: any(
+            getattr(method, "_tool_name", None) == "tool_14" for _, method in inspect.getmembers(toolkit, inspect.ismethod)
+        )
+        for label, has_tool in [("inspect扫描", legacy_has_tool), ("注册表", lambda: toolkit.has_tool("tool_14"))]:
+            print(f"{label} has_tool: {timeit.timeit(has_tool, number=number) / number * 1e6:.2f}us/次")
+
+
+    asyncio.run(main())
@@ -25,7 +25,8 @@ class BrowserTool(BaseTool):
         name='browser_view',
         description="查看当前浏览器页面内容，用于确定已打开页面的最新状态。",
         parameters={},
-        required=[]
+        required=[],
+        read_only=True,
     )
     async def browser_view(self) -> ToolResult:
         """获取浏览器当前网页内容并返回"""
@@ -235,6 +236,7 @@ class BrowserTool(BaseTool):
             },
         },
         required=[],
+        read_only=True,
     )
     async def browser_console_view(self, max_lines: int) -> ToolResult:
         """传递浏览的最大行数查看控制台输出"""
@@ -0,0 +1,64 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 22:10
+#Author  :Emcikem
+@File    :exclusive.py
+"""
+import asyncio
+from typing import Dict, Any, List
+
+from app.domain.models.tool_result import ToolResult
+from app.domain.services.tools.base import BaseTool
+
+"""
+独占工具包设计思路：
+1.并行执行多个步骤时，各执行者共享同一个沙箱浏览器，如果两个步骤交替导航/点击，会互相破坏对方的页面状态；
+2.ExclusiveTool代理一个共享工具包，执行者第一次调用该工具包时获取共享锁，并一直持有到步骤结束时调用release，
+    保证同一时间只有一个步骤在使用该工具包，其他步骤在第一次使用时排队等待；
+3.同一个执行者并发调用(并行只读工具)时只会获取一次共享锁；
+"""
+
+
+class ExclusiveTool(BaseTool):
+    """独占工具包代理，第一次调用时获取共享锁并持有到release"""
+
+    def __init__(self, tool: BaseTool, lock: asyncio.Lock) -> None:
+        """构造函数，完成独占工具包代理的初始化"""
+        super().__init__()
+        self.name = tool.name
+        self._tool = tool
+        self._lock = lock
+        self._acquire_lock = asyncio.Lock()  # 保证同一个执行者只获取一次共享锁
+        self._held = False
+
+    @property
+    def tools_version(self) -> int:
+        """工具列表版本号，与被代理的工具包保持一致"""
+        return self._tool.tools_version
+
+    def get_tools(self) -> List[Dict[str, Any]]:
+        """获取被代理工具包的工具列表"""
+        return self._tool.get_tools()
+
+    def has_tool(self, tool_name: str) -> bool:
+        """判断被代理工具包中是否存在该工具"""
+        return self._tool.has_tool(tool_name)
+
+    def is_read_only(self, tool_name: str) -> bool:
+        """判断被代理工具包中的工具是否为只读工具"""
+        return self._tool.is_read_only(tool_name)
+
+    async def invoke(self, tool_name: str, **kwargs) -> ToolResult:
+        """获取共享锁后调用被代理工具包中的工具"""
+        async with self._acquire_lock:
+            if not self._held:
+                await self._lock.acquire()
+                self._held = True
+        return await self._tool.invoke(tool_name, **kwargs)
+
+    def release(self) -> None:
+        """释放持有的共享锁"""
+        if self._held:
+            self._held = False
+            self._lock.release()
@@ -47,6 +47,7 @@ class FileTool(BaseTool):
             }
         },
         required=["filepath"],
+        read_only=True,
     )
     async def read_file(
             self,
@@ -169,6 +170,7 @@ class FileTool(BaseTool):
             },
         },
         required=["filepath", "regex"],
+        read_only=True,
     )
     async def search_in_file(
             self,
@@ -196,6 +198,7 @@ class FileTool(BaseTool):
             }
         },
         required=["dir_path", "glob_pattern"],
+        read_only=True,
     )
     async def find_files(
             self, dir_path:
@@ -216,6 +219,7 @@ class FileTool(BaseTool):
             },
         },
         required=["dir_path"],
+        read_only=True,
     )
     async def list_files(self, dir_path: str) -> ToolResult:
         return await self.sandbox.list_files(dir_path=dir_path)
\ No newline at end of file
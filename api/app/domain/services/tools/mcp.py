@@ -8,7 +8,7 @@
 import logging
 import os
 from contextlib import AsyncExitStack
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Set
 
 from mcp import ClientSession, Tool, StdioServerParameters, stdio_client
 from mcp.client.sse import sse_client
@@ -245,17 +245,11 @@ class MCPClientManager:
         for server_name, tools in self._tools.items():
             # 3.循环取出每个MCP服务的工具列表
             for tool in tools:
-                # 4.修改工具名字加上mcp_前缀+服务名字
-                if server_name.startswith("mcp_"):
-                    tool_name = f"{server_name}_{tool.name}"
-                else:
-                    tool_name = f"mcp_{server_name}_{tool.name}"
-
-                # 5.生成OpenAI工具描述
+                # 4.修改工具名字加上mcp_前缀+服务名字，并生成OpenAI工具描述
                 tool_schema = {
                     "type": "function",
                     "function": {
-                        "name": tool_name,
+                        "name": self._build_tool_name(server_name, tool.name),
                         "description": f"[{server_name}] {tool.description or tool.name}",
                         "parameters": tool.inputSchema,
                     }
@@ -264,6 +258,22 @@ class MCPClientManager:
 
         return all_tools
 
+    @classmethod
+    def _build_tool_name(cls, server_name: str, tool_name: str) -> str:
+        """生成暴露给LLM的工具名字: mcp_前缀+服务名字+工具名字"""
+        if server_name.startswith("mcp_"):
+            return f"{server_name}_{tool_name}"
+        return f"mcp_{server_name}_{tool_name}"
+
+    def get_read_only_tool_names(self) -> Set[str]:
+        """获取MCP服务通过annotations.readOnlyHint声明为只读的工具名字"""
+        return {
+            self._build_tool_name(server_name, tool.name)
+            for server_name, tools in self._tools.items()
+            for tool in tools
+            if tool.annotations is not None and tool.annotations.readOnlyHint
+        }
+
     async def invoke(self, tool_name: str, arguments: Dict[str, Any]) -> ToolResult:
         """根据传递的工具名字+参数调用MCP工具"""
         try:
@@ -359,6 +369,8 @@ class MCPTool(BaseTool):
         super().__init__()
         self._initialized: bool = False
         self._tools = []
+        self._tool_names: Set[str] = set()  # 工具名集合，用于O(1)判断工具是否存在
+        self._read_only_tool_names: Set[str] = set()  # 只读工具名集合
         self._manager: MCPClientManager = None
 
     async def initialize(self, mcp_config: Optional[MCPConfig] = None) -> None:
@@ -369,23 +381,28 @@ class MCPTool(BaseTool):
             self._manager = MCPClientManager(mcp_config=mcp_config)
             await self._manager.initialize()
 
-            # 3.获取mcpServers工具列表
-            self._tools = await self._manager.get_all_tools()
+            # 3.获取mcpServers工具列表并递增工具列表版本号
+            self._set_tools(await self._manager.get_all_tools())
+            self._read_only_tool_names = self._manager.get_read_only_tool_names()
             self._initialized = True
 
+    def _set_tools(self, tools: List[Dict[str, Any]]) -> None:
+        """更新工具列表与工具名集合，并递增工具列表版本号"""
+        self._tools = tools
+        self._tool_names = {tool["function"]["name"] for tool in tools}
+        self._tools_version += 1
+
     def get_tools(self) -> List[Dict[str, Any]]:
         """同步获取工具包下的所有工具列表"""
         return self._tools
 
     def has_tool(self, tool_name: str) -> bool:
         """传递工具名字判断工具是否存在"""
-        # 1.循环遍历所有的工具
-        for tool in self._tools:
-            # 2.判断工具的名字是否存在，如果是则返回True，否则返回False
-            if tool["function"]["name"] == tool_name:
-                return True
+        return tool_name in self._tool_names
 
-        return False
+    def is_read_only(self, tool_name: str) -> bool:
+        """判断MCP工具是否为只读工具"""
+        return tool_name in self._read_only_tool_names
 
     async def invoke(self, tool_name: str, **kwargs) -> ToolResult:
         """传递工具名字+参数调用MCP工具并获取结果"""
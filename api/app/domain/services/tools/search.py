@@ -5,22 +5,44 @@
 #Author  :Emcikem
 @File    :search.py
 """
-from typing import Optional
+import asyncio
+import json
+from typing import Optional, List
 
 from app.domain.external.search import SearchEngine
-from app.domain.models.search import SearchResults
+from app.domain.external.web_fetcher import WebFetcher
+from app.domain.models.app_config import AgentConfig
+from app.domain.models.search import SearchResults, SearchReadResults, SearchPageDigest, SearchResultItem
 from app.domain.models.tool_result import ToolResult
 from app.domain.services.tools.base import BaseTool, tool
+from core.tokens import estimate_tokens, truncate_to_tokens
+
+"""
+搜索并阅读(search_and_read)设计思路：
+1.之前Agent的典型用法是先search_web，再对每个结果依次browser_navigate+browser_view，每一步都是一次完整的LLM往返，
+    读取k个结果需要2k+1轮LLM调用；
+2.search_and_read在一次工具调用中完成搜索，并通过轻量网页获取器并发读取前k个结果页的正文(不经过沙箱浏览器)；
+3.正文按token预算分配：先扣除搜索结果列表本身的开销，剩余预算按"注水"方式分配，
+    正文较短的网页用不完的预算会分给其余网页，每个网页的正文都带有与搜索结果对应的引用编号；
+4.读取数量、并发数、单页字节上限、总token预算均可在Agent配置中调整；
+"""
 
 
 class SearchTool(BaseTool):
     """搜索工具包，提供与搜索引擎交互的能力"""
     name: str = "search"
 
-    def __init__(self, search_engine: SearchEngine) -> None:
+    def __init__(
+            self,
+            search_engine: SearchEngine,
+            web_fetcher: Optional[WebFetcher] = None,
+            agent_config: Optional[AgentConfig] = None,
+    ) -> None:
         """构造函数，完成搜索工具的初始化"""
         super().__init__()
         self.search_engine = search_engine
+        self.web_fetcher = web_fetcher
+        self.agent_config = agent_config or AgentConfig()
 
     @tool(
         name="search_web",
@@ -37,7 +59,102 @@ class SearchTool(BaseTool):
             },
         },
         required=["query"],
+        read_only=True,
     )
     async def search_web(self, query: str, date_range: Optional[str] = None) -> ToolResult[SearchResults]:
         """调用搜索引擎获取搜索结果后返回"""
         return await self.search_engine.invoke(query, date_range=date_range)
+
+    async def _read_page(
+            self,
+            index: int,
+            item: SearchResultItem,
+            semaphore: asyncio.Semaphore,
+    ) -> SearchPageDigest:
+        """在并发限制下读取单个搜索结果页的正文"""
+        async with semaphore:
+            result = await self.web_fetcher.fetch(item.url, self.agent_config.search_read_max_page_bytes)
+        if not result.success or not result.data:
+            return SearchPageDigest(index=index, url=item.url, title=item.title, error=result.message)
+        return SearchPageDigest(
+            index=index,
+            url=item.url,
+            title=result.data.title or item.title,
+            content=result.data.content,
+        )
+
+    @classmethod
+    def _allocate_budget(cls, pages: List[SearchPageDigest], budget: int) -> None:
+        """按注水方式将token预算分配给各个网页正文并截断，正文较短的网页剩余的预算会分给其余网页"""
+        # 1.按正文token数从小到大依次分配，每个网页最多分到剩余预算的平均值
+        readable = sorted((page for page in pages if page.content), key=lambda page: estimate_tokens(page.content))
+        remaining = budget
+        for position, page in enumerate(readable):
+            share = remaining // (len(readable) - position)
+            page.content = truncate_to_tokens(page.content, share)
+            remaining -= estimate_tokens(page.content)
+
+    @tool(
+        name="search_and_read",
+        description="搜索并阅读工具。调用搜索引擎后并发读取排名靠前的k个网页正文，一次性返回搜索结果列表+网页正文摘要。"
+                    "当需要阅读网页具体内容(而不仅是摘要)来回答问题时优先使用该工具，替代search_web后逐个打开网页的做法。"
+                    "正文中的[n]编号与搜索结果的位置对应，引用信息时请标注来源编号和URL。",
+        parameters={
+            "query": {
+                "type": "string",
+                "description": "针对搜索引擎优化的查询字符串。请提取问题中的核心实体和关键词（3-5个），避免使用完整的自然语言问句。"
+            },
+            "date_range": {
+                "type": "string",
+                "enum": ["all", "past_hour", "past_day", "past_week", "past_month", "past_year"],
+                "description": "（可选）搜索结果的事件范围过滤。默认为'all'。"
+            },
+            "top_k": {
+                "type": "integer",
+                "description": "（可选）读取正文的网页数量，默认为3，最大为10。"
+            },
+        },
+        required=["query"],
+        read_only=True,
+    )
+    async def search_and_read(
+            self,
+            query: str,
+            date_range: Optional[str] = None,
+            top_k: Optional[int] = None,
+    ) -> ToolResult[SearchReadResults]:
+        """搜索并并发读取前top_k个结果页的正文，返回在token预算内的摘要"""
+        # 1.调用搜索引擎获取搜索结果
+        search_result = await self.search_engine.invoke(query, date_range=date_range)
+        search_data = search_result.data or SearchResults(query=query, date_range=date_range)
+        results = search_data.results[:self.agent_config.max_search_result]
+        read_results = SearchReadResults(
+            query=query,
+            date_range=date_range,
+            total_results=search_data.total_results,
+            results=results,
+        )
+        if not search_result.success or not results or self.web_fetcher is None:
+            return ToolResult(success=search_result.success, message=search_result.message, data=read_results)
+
+        # 2.选取前top_k个不重复的http(s)链接，引用编号与搜索结果位置对应
+        top_k = min(max(top_k or self.agent_config.search_read_top_k, 1), 10)
+        candidates, seen_urls = [], set()
+        for index, item in enumerate(results, start=1):
+            if len(candidates) >= top_k:
+                break
+            if item.url.startswith(("http://", "https://")) and item.url not in seen_urls:
+                seen_urls.add(item.url)
+                candidates.append((index, item))
+
+        # 3.在并发限制下读取所有网页正文
+        semaphore = asyncio.Semaphore(self.agent_config.search_read_concurrency)
+        pages = await asyncio.gather(*[self._read_page(index, item, semaphore) for index, item in candidates])
+
+        # 4.扣除搜索结果列表的开销后，将剩余预算分配给网页正文
+        results_tokens = estimate_tokens(json.dumps([item.model_dump() for item in results], ensure_ascii=False))
+        budget = self.agent_config.search_read_token_budget
+        self._allocate_budget(list(pages), max(budget - results_tokens, budget // 2))
+        read_results.pages = list(pages)
+
+        return ToolResult(success=True, data=read_results)
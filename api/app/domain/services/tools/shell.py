@@ -59,6 +59,7 @@ class ShellTool(BaseTool):
             },
         },
         required=["session_id"],
+        read_only=True,
     )
     async def shell_read_output(self, session_id: str) -> ToolResult:
         """根据会话id查看Shell执行结果"""
@@ -0,0 +1,221 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 10:35
+#Author  :Emcikem
+@File    :accessibility_tree.py
+"""
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+
+from core.tokens import estimate_tokens
+
+"""
+无障碍树(Accessibility Tree)页面编码设计思路：
+1.原始的browser_view会返回可见内容的Markdown+可交互元素列表，大页面动辄几万token，
+    而且还会写入记忆和数据库，这里基于CDP的Accessibility.getFullAXTree构建一份紧凑的页面表示；
+2.每个节点仅保留角色(role)+名字(name)，可交互元素会带上和GET_INTERACTIVE_ELEMENTS_FUNC一致的索引，
+    索引通过DOMSnapshot中的data-manus-id属性映射，所以click/input等工具可以直接复用；
+3.无意义的结构节点(generic/none等)会被跳过，与父节点名字相同的文本、连续重复的兄弟节点会被折叠；
+4.根据DOMSnapshot中的布局信息判断节点是否在视口内，视口内节点优先占用token预算，剩余预算再分配给视口外节点；
+"""
+
+# 没有名字时可以直接跳过的结构性角色
+SKIPPED_ROLES = {"generic", "none", "presentation", "InlineTextBox", "LineBreak", "RootWebArea", "WebArea"}
+
+# 文本类角色，输出时只保留文本本身
+TEXT_ROLES = {"StaticText", "text"}
+
+
+@dataclass
+class AXLine:
+    """编码后的单行节点信息"""
+    depth: int  # 缩进层级
+    text: str  # 行内容
+    in_viewport: bool  # 是否在视口内
+    interactive: bool  # 是否为可交互元素
+    repeat: int = 1  # 连续重复次数
+
+
+class AccessibilityTreeEncoder:
+    """基于CDP无障碍树的紧凑页面编码器"""
+
+    def __init__(self, token_budget: int = 4000, max_name_length: int = 100, max_depth: int = 12) -> None:
+        """构造函数，完成编码器的初始化"""
+        self._token_budget = token_budget
+        self._max_name_length = max_name_length
+        self._max_depth = max_depth
+
+    @classmethod
+    def _parse_snapshot(
+            cls,
+            snapshot: Dict[str, Any],
+    ) -> Tuple[Dict[int, int], Dict[int, List[float]], float, float]:
+        """解析DOMSnapshot，返回backendNodeId->元素索引、backendNodeId->布局边界以及页面滚动偏移"""
+        # 1.定义变量存储映射关系
+        index_map: Dict[int, int] = {}
+        bounds_map: Dict[int, List[float]] = {}
+        documents = snapshot.get("documents") or []
+        if not documents:
+            return index_map, bounds_map, 0.0, 0.0
+
+        # 2.只处理主文档，iframe中的元素无法通过data-manus-id选择器定位
+        strings = snapshot.get("strings") or []
+        document = documents[0]
+        nodes = document.get("nodes", {})
+        backend_ids = nodes.get("backendNodeId", [])
+
+        # 3.从属性中提取data-manus-id，属性以[名字索引, 值索引, ...]的形式存储在字符串表中
+        for node_index, attributes in enumerate(nodes.get("attributes", [])):
+            for i in range(0, len(attributes) - 1, 2):
+                if strings[attributes[i]] != "data-manus-id":
+                    continue
+                value = strings[attributes[i + 1]]
+                try:
+                    index_map[backend_ids[node_index]] = int(value.rsplit("-", 1)[-1])
+                except (ValueError, IndexError):
+                    pass
+                break
+
+        # 4.提取布局边界信息，边界为相对文档的[x, y, width, height]
+        layout = document.get("layout", {})
+        for node_index, bounds in zip(layout.get("nodeIndex", []), layout.get("bounds", [])):
+            if node_index < len(backend_ids):
+                bounds_map[backend_ids[node_index]] = bounds
+
+        return index_map, bounds_map, document.get("scrollOffsetX", 0.0), document.get("scrollOffsetY", 0.0)
+
+    def _truncate(self, name: str) -> str:
+        """压缩空白字符并截断过长的名字"""
+        name = " ".join(name.split())
+        if len(name) > self._max_name_length:
+            name = name[:self._max_name_length - 3] + "..."
+        return name
+
+    def _build_lines(
+            self,
+            ax_nodes: List[Dict[str, Any]],
+            index_map: Dict[int, int],
+            bounds_map: Dict[int, List[float]],
+            viewport: Tuple[float, float, float, float],
+    ) -> List[AXLine]:
+        """深度优先遍历无障碍树并生成编码行"""
+        # 1.构建节点映射并查找根节点
+        node_map = {node["nodeId"]: node for node in ax_nodes if "nodeId" in node}
+        roots = [node for node in ax_nodes if not node.get("parentId")]
+        if not roots:
+            return []
+
+        left, top, right, bottom = viewport
+        lines: List[AXLine] = []
+
+        # 2.使用显式栈遍历，避免超深页面触发递归上限，栈元素为(节点, 深度, 父节点名字, 父节点是否在视口内)
+        stack: List[Tuple[Dict[str, Any], int, str, bool]] = [(root, 0, "", True) for root in reversed(roots)]
+        while stack:
+            node, depth, parent_name, parent_in_viewport = stack.pop()
+            role = (node.get("role") or {}).get("value", "")
+            name = self._truncate(str((node.get("name") or {}).get("value", "") or ""))
+            backend_id = node.get("backendDOMNodeId")
+
+            # 3.判断节点是否在视口内，没有布局信息的节点(例如文本节点)继承父节点
+            in_viewport = parent_in_viewport
+            bounds = bounds_map.get(backend_id)
+            if bounds and len(bounds) == 4:
+                x, y, width, height = bounds
+                in_viewport = x + width > left and x < right and y + height > top and y < bottom
+
+            # 4.判断是否需要输出该节点
+            element_index = index_map.get(backend_id)
+            emit = not node.get("ignored", False)
+            if emit and element_index is None:
+                if role in SKIPPED_ROLES and not name:
+                    emit = False
+                elif role in TEXT_ROLES and (not name or name == parent_name):
+                    emit = False
+                elif not name and not node.get("childIds"):
+                    emit = False
+
+            # 5.生成行内容，可交互元素携带索引
+            child_depth = depth
+            if emit:
+                if role in TEXT_ROLES:
+                    text = f'"{name}"'
+                else:
+                    text = f'{role} "{name}"' if name else role
+                if element_index is not None:
+                    text = f"[{element_index}] {text}"
+                line = AXLine(
+                    depth=min(depth, self._max_depth),
+                    text=text,
+                    in_viewport=in_viewport,
+                    interactive=element_index is not None,
+                )
+
+                # 6.折叠连续重复的非交互兄弟节点
+                previous = lines[-1] if lines else None
+                if (
+                        previous and not line.interactive and not previous.interactive and
+                        previous.depth == line.depth and previous.text == line.text
+                ):
+                    previous.repeat += 1
+                else:
+                    lines.append(line)
+                child_depth = depth + 1
+
+            # 7.子节点逆序入栈，保证出栈顺序与文档顺序一致
+            for child_id in reversed(node.get("childIds", [])):
+                child = node_map.get(child_id)
+                if child:
+                    stack.append((child, child_depth, name or parent_name, in_viewport))
+
+        return lines
+
+    @classmethod
+    def _render(cls, line: AXLine) -> str:
+        """将单行节点渲染成字符串"""
+        text = " " * line.depth + line.text
+        return f"{text} ×{line.repeat}" if line.repeat > 1 else text
+
+    def encode(
+            self,
+            ax_nodes: List[Dict[str, Any]],
+            snapshot: Optional[Dict[str, Any]] = None,
+            viewport_size: Optional[Dict[str, float]] = None,
+    ) -> str:
+        """传递无障碍树节点+DOM快照+视口尺寸，生成在token预算内的紧凑页面表示"""
+        # 1.解析快照并计算视口区域
+        index_map, bounds_map, scroll_x, scroll_y = self._parse_snapshot(snapshot or {})
+        viewport_size = viewport_size or {}
+        width = viewport_size.get("width") or 1280
+        height = viewport_size.get("height") or 1080
+        viewport = (scroll_x, scroll_y, scroll_x + width, scroll_y + height)
+
+        # 2.生成所有编码行
+        lines = self._build_lines(ax_nodes, index_map, bounds_map, viewport)
+
+        # 3.视口内的节点优先占用token预算，剩余预算按文档顺序分配给视口外节点
+        remaining = self._token_budget
+        selected = set()
+        for in_viewport in (True, False):
+            for i, line in enumerate(lines):
+                if line.in_viewport != in_viewport:
+                    continue
+                tokens = estimate_tokens(self._render(line)) + 1
+                if tokens > remaining:
+                    continue
+                selected.add(i)
+                remaining -= tokens
+
+        # 4.按视口内/视口外分段输出
+        viewport_lines = [self._render(line) for i, line in enumerate(lines) if i in selected and line.in_viewport]
+        outside_lines = [self._render(line) for i, line in enumerate(lines) if i in selected and not line.in_viewport]
+        output = viewport_lines
+        if outside_lines:
+            output = output + ["--- 视口外 ---"] + outside_lines
+
+        # 5.记录被预算截断的节点数
+        omitted = len(lines) - len(selected)
+        if omitted > 0:
+            output.append(f"...(超出token预算，省略{omitted}个节点，可滚动页面后重新查看)")
+
+        return "\n".join(output)
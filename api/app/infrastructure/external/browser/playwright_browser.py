@@ -6,20 +6,32 @@
 @File    :playwright_browser.py
 """
 import asyncio
+import json
 import logging
-from typing import Optional, List, Any
+import random
+import time
+from typing import Optional, List, Any, Dict, Callable, Awaitable
 
 from markdownify import markdownify
-from playwright.async_api import Playwright, Browser, Page, async_playwright
+from playwright.async_api import Browser, Page
 
 from app.domain.external.browser import Browser as BrowserProtocol
 from app.domain.external.llm import LLM
 from app.domain.models.tool_result import ToolResult
+from app.infrastructure.external.browser.accessibility_tree import AccessibilityTreeEncoder
 from app.infrastructure.external.browser.playwright_browser_fun import GET_VISIBLE_CONTENT_FUNC, \
-    GET_INTERACTIVE_ELEMENTS_FUNC, INJECT_CONSOLE_LOGS_FUNC
+    GET_INTERACTIVE_ELEMENTS_FUNC, INJECT_CONSOLE_LOGS_FUNC, GET_VIEWPORT_SIZE_FUNC
+from app.infrastructure.external.browser.playwright_manager import get_playwright_manager
+from core.metrics import get_metrics
+from core.tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+# browser_view页面编码方式
+PAGE_ENCODING_MARKDOWN = "markdown"  # 可见内容Markdown+可交互元素列表
+PAGE_ENCODING_AX_TREE = "ax_tree"  # 基于无障碍树的紧凑编码
+PAGE_ENCODING_AB = "ab"  # A/B对比，每个浏览器实例随机选择一种编码
+
 
 class PlaywrightBrowser(BrowserProtocol):
     """基于Playwright管理的浏览器扩展"""
@@ -28,26 +40,62 @@ class PlaywrightBrowser(BrowserProtocol):
             self,
             cdp_url: str,  # CDP的连接地址
             llm: Optional[LLM] = None,  # 可选参数，传递LLM，如果传递了则会使用LLM对页面内容进行整理变成Markdown格式
+            page_encoding: str = PAGE_ENCODING_MARKDOWN,  # 页面编码方式，支持markdown/ax_tree/ab
+            token_budget: int = 4000,  # ax_tree编码的token预算
+            maintain_hook: Optional[Callable[[], Awaitable[bool]]] = None,  # 浏览器卫生检查钩子，返回浏览器是否被重启
+            maintain_interval: float = 15.0,  # 两次卫生检查的最小间隔(秒)
     ) -> None:
         """构造函数，完成playwright浏览器的初始化"""
         # LLM相关
         self.llm: Optional[LLM] = llm
 
+        # 页面编码相关，ab模式下每个浏览器实例随机固定一种编码，方便按会话对比token与耗时
+        if page_encoding == PAGE_ENCODING_AB:
+            page_encoding = random.choice([PAGE_ENCODING_MARKDOWN, PAGE_ENCODING_AX_TREE])
+        self.page_encoding: str = page_encoding
+        self._ax_tree_encoder = AccessibilityTreeEncoder(token_budget=token_budget)
+
+        # 浏览器卫生检查相关
+        self._maintain_hook = maintain_hook
+        self._maintain_interval = maintain_interval
+        self._last_maintained: float = 0.0
+
         # 浏览器相关
         self.cdp_url: str = cdp_url
-        self.playwright: Optional[Playwright] = None
         self.browser: Optional[Browser] = None
         self.page: Optional[Page] = None
 
     async def _ensure_browser(self) -> None:
-        """确保浏览器存在，如果不存在则初始化"""
-        if not self.browser or not self.page:
+        """确保浏览器存在，如果不存在或连接已断开则初始化"""
+        if not self.browser or not self.page or not self.browser.is_connected() or self.page.is_closed():
             if not await self.initialize():
                 raise Exception("初始化Playwright浏览器失败")
 
+    async def _maintain(self) -> None:
+        """在工具调用间隙触发沙箱浏览器卫生检查，浏览器被重启后丢弃旧连接"""
+        # 1.未配置钩子或未到检查间隔则跳过
+        if not self._maintain_hook or time.monotonic() - self._last_maintained < self._maintain_interval:
+            return
+        self._last_maintained = time.monotonic()
+
+        # 2.执行检查，检查失败不影响工具调用
+        try:
+            restarted = await self._maintain_hook()
+        except Exception as e:
+            logger.warning(f"浏览器卫生检查失败: {str(e)}")
+            return
+
+        # 3.浏览器已重启则断开旧连接，后续会重新初始化并连接到恢复后的页面
+        if restarted:
+            logger.info("沙箱浏览器因内存超限已重启, 重新建立连接")
+            self.page = None
+            self.browser = None
+            await get_playwright_manager().disconnect(self.cdp_url)
+
     async def _ensure_page(self) -> None:
         """确保浏览器存在，如果不存在则新建"""
-        # 1.先保证浏览器存在
+        # 1.先执行卫生检查并保证浏览器存在
+        await self._maintain()
         await self._ensure_browser()
 
         # 2.如果页面不存在则创建新上下文+页面
@@ -98,6 +146,31 @@ class PlaywrightBrowser(BrowserProtocol):
         else:
             return markdown_content[:max_content_length]
 
+    async def _extract_accessibility_tree(self) -> str:
+        """基于CDP无障碍树提取当前页面的紧凑表示，需要在_extract_interactive_elements之后调用以复用元素索引"""
+        # 1.创建当前页面的CDP会话
+        cdp_session = await self.page.context.new_cdp_session(self.page)
+
+        try:
+            # 2.获取完整无障碍树以及带布局信息的DOM快照
+            ax_tree = await cdp_session.send("Accessibility.getFullAXTree")
+            snapshot = await cdp_session.send("DOMSnapshot.captureSnapshot", {"computedStyles": []})
+        finally:
+            await cdp_session.detach()
+
+        # 3.获取视口尺寸并编码
+        viewport_size = await self.page.evaluate(GET_VIEWPORT_SIZE_FUNC)
+        return self._ax_tree_encoder.encode(ax_tree.get("nodes", []), snapshot, viewport_size)
+
+    def _record_view_metrics(self, data: Dict[str, Any], start_time: float) -> None:
+        """记录browser_view的耗时与token数，用于对比不同页面编码方式"""
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        tokens = estimate_tokens(json.dumps(data, ensure_ascii=False))
+        metrics = get_metrics()
+        metrics.observe("browser_view_latency_ms", latency_ms, encoding=self.page_encoding)
+        metrics.observe("browser_view_tokens", tokens, encoding=self.page_encoding)
+        logger.info(f"browser_view完成, 编码方式: {self.page_encoding}, 耗时: {latency_ms:.0f}ms, 预估token: {tokens}")
+
     async def _extract_interactive_elements(self) -> List[str]:
         """提取当前页面上的可交互元素"""
         # 1.确保页面存在
@@ -193,9 +266,8 @@ class PlaywrightBrowser(BrowserProtocol):
         # 2.循环开始资源构建
         for attempt in range(max_retries):
             try:
-                # 3.创建playwright上下文并连接到cdp浏览器
-                self.playwright = await async_playwright().start()
-                self.browser = await self.playwright.chromium.connect_over_cdp(self.cdp_url)
+                # 3.从进程级驱动管理器获取复用的cdp浏览器连接(共享playwright驱动，连接不可用时会自动重连)
+                self.browser = await get_playwright_manager().get_browser(self.cdp_url)
 
                 # 4.获取浏览器的所有上下文
                 contexts = self.browser.contexts
@@ -223,8 +295,9 @@ class PlaywrightBrowser(BrowserProtocol):
 
                 return True
             except Exception as e:
-                # 10.清除所有资源
+                # 10.清除页面资源并断开该沙箱的连接，下一次重试会重新建立连接
                 await self.cleanup()
+                await get_playwright_manager().disconnect(self.cdp_url)
 
                 # 11.判断重试次数是否等于最大重试次数
                 if attempt == max_retries - 1:
@@ -238,10 +311,10 @@ class PlaywrightBrowser(BrowserProtocol):
         return False
 
     async def cleanup(self) -> None:
-        """清除playwright资源，包含浏览器+页面+playwright"""
+        """清除playwright资源，包含浏览器页面，浏览器连接与playwright驱动由驱动管理器统一复用与释放"""
         try:
             # 1.检测浏览器是否存在，如果存在则删除该浏览器下的所有tabs页面
-            if self.browser:
+            if self.browser and self.browser.is_connected():
                 # 2.获取该浏览器的所有上下文
                 contexts = self.browser.contexts
                 if contexts:
@@ -257,22 +330,13 @@ class PlaywrightBrowser(BrowserProtocol):
             # 6.判定self.page是否关闭
             if self.page and not self.page.is_closed():
                 await self.page.close()
-
-            # 7.关闭浏览器
-            if self.browser:
-                await self.browser.close()
-
-            # 8.停止playwright
-            if self.playwright:
-                await self.playwright.stop()
         except Exception as e:
-            # 9.记录错误日志
+            # 7.记录错误日志
             logger.error(f"清理Playwright浏览器资源出错：{str(e)}")
         finally:
-            # 10.重置所有资源
+            # 8.重置所有资源
             self.page = None
             self.browser = None
-            self.playwright = None
 
     async def wait_for_page_load(self, timeout: int = 15) -> bool:
         """传递超时时间，等待当前页面是否加载完毕"""
@@ -320,19 +384,24 @@ class PlaywrightBrowser(BrowserProtocol):
         await self._ensure_page()
 
         # 2.等待页面加载完成
+        start_time = time.perf_counter()
         await self.wait_for_page_load()
 
-        # 3.更新页面的可交互元素
+        # 3.更新页面的可交互元素(同时为元素打上data-manus-id索引)
         interactive_elements = await self._extract_interactive_elements()
 
-        # 4.返回工具结果
-        return ToolResult(
-            success=True,
-            data={
+        # 4.根据编码方式生成页面内容，ax_tree编码中已经内嵌了可交互元素的索引
+        if self.page_encoding == PAGE_ENCODING_AX_TREE:
+            data = {"content": await self._extract_accessibility_tree()}
+        else:
+            data = {
                 "content": await self._extract_content(),
                 "interactive_elements": interactive_elements,
             }
-        )
+
+        # 5.记录指标并返回工具结果
+        self._record_view_metrics(data, start_time)
+        return ToolResult(success=True, data=data)
 
     async def input(
             self,
@@ -406,7 +475,9 @@ class PlaywrightBrowser(BrowserProtocol):
 
     async def restart(self, url: str) -> ToolResult:
         """重启并跳转到指定URL"""
+        # 1.清除页面并断开当前连接，navigate时会重新建立连接
         await self.cleanup()
+        await get_playwright_manager().disconnect(self.cdp_url)
         return await self.navigate(url)
 
     async def scroll_up(self, to_top: Optional[bool] = None) -> ToolResult:
@@ -214,3 +214,8 @@ INJECT_CONSOLE_LOGS_FUNC = """() => {
         originalLog.apply(console, args);
     };
 }"""
+
+# 获取当前视口尺寸js代码
+GET_VIEWPORT_SIZE_FUNC = """() => {
+    return {width: window.innerWidth, height: window.innerHeight};
+}"""
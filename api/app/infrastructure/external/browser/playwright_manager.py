@@ -0,0 +1,235 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 14:20
+#Author  :Emcikem
+@File    :playwright_manager.py
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, Set, AsyncIterator
+
+from playwright.async_api import Playwright, Browser, async_playwright
+
+from core.metrics import get_metrics
+
+"""
+Playwright驱动管理器设计思路：
+1.async_playwright().start()会拉起一个node驱动进程，之前每个PlaywrightBrowser每次初始化都会启动一个新驱动，
+    新任务需要付出驱动启动+CDP握手的耗时，并且初始化重试失败时还会泄露驱动实例；
+2.驱动管理器在整个进程内只启动一个Playwright驱动，所有浏览器实例共享该驱动；
+3.按cdp_url(每个沙箱一个)缓存connect_over_cdp得到的Browser连接，跨任务复用，避免重复握手；
+4.获取连接时会检查连接状态，超过健康检查间隔后会通过CDP发送Browser.getVersion做一次主动探测，
+    连接断开或探测失败时透明地重新连接；
+5.通过指标收集器记录当前连接数、重连次数、连接耗时，方便观察复用效果；
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class PlaywrightManager:
+    """进程级Playwright驱动与CDP连接管理器"""
+
+    def __init__(self, health_check_interval: float = 30.0, health_check_timeout: float = 5.0) -> None:
+        """构造函数，完成驱动管理器的初始化"""
+        self._health_check_interval = health_check_interval  # 主动健康检查间隔(秒)
+        self._health_check_timeout = health_check_timeout  # 健康检查超时时间(秒)
+        self._playwright: Optional[Playwright] = None  # 共享的playwright驱动
+        self._driver_lock: Optional[asyncio.Lock] = None  # 驱动启动锁
+        self._browsers: Dict[str, Browser] = {}  # cdp_url->浏览器连接
+        self._last_checked: Dict[str, float] = {}  # cdp_url->上一次健康检查时间
+        self._connect_locks: Dict[str, asyncio.Lock] = {}  # cdp_url->连接锁，避免并发重复连接
+        self._lock_users: Dict[str, int] = {}  # cdp_url->持有或等待连接锁的协程数
+        self._connected_urls: Set[str] = set()  # 曾经连接过的cdp_url，再次连接时记为重连
+        self._reconnect_count: int = 0  # 重连次数
+
+    def _get_driver_lock(self) -> asyncio.Lock:
+        """懒加载驱动锁，确保锁在事件循环内创建"""
+        if self._driver_lock is None:
+            self._driver_lock = asyncio.Lock()
+        return self._driver_lock
+
+    @asynccontextmanager
+    async def _url_lock(self, cdp_url: str) -> AsyncIterator[None]:
+        """持有cdp_url对应的连接锁，没有协程持有或等待且连接已断开时才移除锁，避免并发时出现两把锁"""
+        lock = self._connect_locks.setdefault(cdp_url, asyncio.Lock())
+        self._lock_users[cdp_url] = self._lock_users.get(cdp_url, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[cdp_url] -= 1
+            if self._lock_users[cdp_url] == 0:
+                del self._lock_users[cdp_url]
+                if cdp_url not in self._browsers:
+                    self._connect_locks.pop(cdp_url, None)
+
+    def _update_connection_gauge(self) -> None:
+        """更新当前CDP连接数指标"""
+        get_metrics().set_gauge("playwright_cdp_connections", len(self._browsers))
+
+    async def get_playwright(self) -> Playwright:
+        """获取共享的playwright驱动，不存在时启动"""
+        async with self._get_driver_lock():
+            if self._playwright is None:
+                start_time = time.perf_counter()
+                self._playwright = await async_playwright().start()
+                logger.info(f"Playwright驱动启动成功, 耗时: {(time.perf_counter() - start_time) * 1000:.0f}ms")
+                get_metrics().set_gauge("playwright_driver_running", 1)
+        return self._playwright
+
+    async def _is_healthy(self, cdp_url: str, browser: Browser) -> bool:
+        """检查浏览器连接是否健康"""
+        # 1.连接已断开则直接返回
+        if not browser.is_connected():
+            return False
+
+        # 2.未到主动检查时间则认为连接健康
+        if time.monotonic() - self._last_checked.get(cdp_url, 0) < self._health_check_interval:
+            return True
+
+        # 3.通过CDP会话发送Browser.getVersion做主动探测
+        try:
+            cdp_session = await asyncio.wait_for(browser.new_browser_cdp_session(), self._health_check_timeout)
+            try:
+                await asyncio.wait_for(cdp_session.send("Browser.getVersion"), self._health_check_timeout)
+            finally:
+                await cdp_session.detach()
+            self._last_checked[cdp_url] = time.monotonic()
+            return True
+        except Exception as e:
+            logger.warning(f"CDP连接[{cdp_url}]健康检查失败: {str(e)}")
+            return False
+
+    def _on_disconnected(self, cdp_url: str, browser: Browser) -> None:
+        """浏览器连接断开时的回调，移除缓存的连接"""
+        if self._browsers.get(cdp_url) is browser:
+            self._browsers.pop(cdp_url, None)
+            self._last_checked.pop(cdp_url, None)
+            self._update_connection_gauge()
+            logger.info(f"CDP连接[{cdp_url}]已断开")
+
+    async def get_browser(self, cdp_url: str) -> Browser:
+        """根据cdp_url获取复用的浏览器连接，连接不可用时透明重连"""
+        # 1.持有该cdp_url对应的连接锁
+        async with self._url_lock(cdp_url):
+            # 2.检查缓存的连接是否健康
+            browser = self._browsers.get(cdp_url)
+            if browser and await self._is_healthy(cdp_url, browser):
+                get_metrics().incr("playwright_cdp_reuse")
+                return browser
+
+            # 3.连接存在但不健康则先关闭旧连接
+            reconnect = cdp_url in self._connected_urls
+            if browser:
+                await self._close_browser(cdp_url, browser)
+
+            # 4.使用共享驱动连接到CDP浏览器
+            playwright = await self.get_playwright()
+            start_time = time.perf_counter()
+            browser = await playwright.chromium.connect_over_cdp(cdp_url)
+            latency_ms = (time.perf_counter() - start_time) * 1000
+
+            # 5.缓存连接并注册断开回调
+            browser.on("disconnected", lambda b: self._on_disconnected(cdp_url, b))
+            self._browsers[cdp_url] = browser
+            self._last_checked[cdp_url] = time.monotonic()
+            self._connected_urls.add(cdp_url)
+
+            # 6.记录指标
+            metrics = get_metrics()
+            metrics.observe("playwright_cdp_connect_latency_ms", latency_ms)
+            if reconnect:
+                self._reconnect_count += 1
+                metrics.incr("playwright_cdp_reconnects")
+                metrics.observe("playwright_cdp_reconnect_latency_ms", latency_ms)
+            self._update_connection_gauge()
+            logger.info(f"连接CDP浏览器[{cdp_url}]成功, 耗时: {latency_ms:.0f}ms, 是否重连: {reconnect}")
+
+            return browser
+
+    async def _close_browser(self, cdp_url: str, browser: Browser) -> None:
+        """关闭指定的浏览器连接(对于CDP连接只会断开连接，不会关闭沙箱中的浏览器)"""
+        self._browsers.pop(cdp_url, None)
+        self._last_checked.pop(cdp_url, None)
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.warning(f"关闭CDP连接[{cdp_url}]出错: {str(e)}")
+        self._update_connection_gauge()
+
+    async def disconnect(self, cdp_url: str) -> None:
+        """断开指定cdp_url的连接，下次获取时会重新连接(持有连接锁，避免与并发的连接交错)"""
+        async with self._url_lock(cdp_url):
+            browser = self._browsers.get(cdp_url)
+            if browser:
+                await self._close_browser(cdp_url, browser)
+            self._connected_urls.discard(cdp_url)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回驱动管理器的统计信息"""
+        return {
+            "driver_running": self._playwright is not None,
+            "connections": len(self._browsers),
+            "reconnects": self._reconnect_count,
+            "cdp_urls": list(self._browsers.keys()),
+        }
+
+    async def shutdown(self) -> None:
+        """关闭所有CDP连接并停止共享驱动"""
+        # 1.断开所有连接
+        for cdp_url, browser in list(self._browsers.items()):
+            await self._close_browser(cdp_url, browser)
+        self._connected_urls.clear()
+
+        # 2.停止playwright驱动
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+                logger.info("Playwright驱动已停止")
+            except Exception as e:
+                logger.error(f"停止Playwright驱动出错: {str(e)}")
+            finally:
+                self._playwright = None
+                get_metrics().set_gauge("playwright_driver_running", 0)
+
+
+@lru_cache()
+def get_playwright_manager() -> PlaywrightManager:
+    """使用lru_cache实现单例模式，获取进程级Playwright驱动管理器"""
+    return PlaywrightManager()
+
+
+if __name__ == "__main__":
+    # 使用本地无头Chromium验证驱动共享与连接复用:
+    # chromium --headless=new --remote-debugging-port=9333 &
+    # python -m app.infrastructure.external.browser.playwright_manager
+    async def main():
+        manager = get_playwright_manager()
+        cdp_url = "http://127.0.0.1:9333"
+
+        # 1.首次连接会启动驱动并完成CDP握手
+        start_time = time.perf_counter()
+        browser = await manager.get_browser(cdp_url)
+        print(f"首次连接耗时: {(time.perf_counter() - start_time) * 1000:.0f}ms")
+
+        # 2.再次获取会直接复用连接
+        start_time = time.perf_counter()
+        reused = await manager.get_browser(cdp_url)
+        print(f"复用连接耗时: {(time.perf_counter() - start_time) * 1000:.2f}ms, 是否同一连接: {reused is browser}")
+
+        # 3.断开后再次获取会透明重连
+        await browser.close()
+        start_time = time.perf_counter()
+        await manager.get_browser(cdp_url)
+        print(f"重连耗时: {(time.perf_counter() - start_time) * 1000:.0f}ms")
+
+        print(manager.stats())
+        print(get_metrics().snapshot())
+        await manager.shutdown()
+
+
+    asyncio.run(main())
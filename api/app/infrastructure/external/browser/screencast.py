@@ -0,0 +1,149 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 17:05
+#Author  :Emcikem
+@File    :screencast.py
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import time
+from typing import AsyncGenerator, Optional, Dict, Any
+
+from playwright.async_api import Page, CDPSession
+
+from app.infrastructure.external.browser.playwright_manager import get_playwright_manager
+from core.metrics import get_metrics
+
+"""
+浏览器实时画面设计思路：
+1.之前前端只能通过每次浏览器工具调用时上传到COS的截图或者很重的VNC代理查看浏览器，
+    截图上传会给每一次浏览器工具事件增加一次截图+上传的耗时；
+2.这里通过CDP Page.startScreencast让沙箱浏览器在画面变化时主动推送JPEG帧，再由API的websocket端点转发给前端；
+3.帧回调中立即ack，只保留最新的一帧(队列长度为1)，发送端按最大帧率限流，限流期间产生的中间帧直接丢弃；
+4.对帧数据做摘要，与上一次发送的帧完全相同时不再发送(增量抑制)；
+5.Agent切换到新标签页时(与PlaywrightBrowser一致，跟随最新的标签页)自动切换录屏目标；
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserScreencast:
+    """基于CDP Page.startScreencast的浏览器实时画面"""
+
+    def __init__(
+            self,
+            cdp_url: str,
+            max_fps: float = 5.0,  # 最大帧率
+            quality: int = 60,  # JPEG质量
+            max_width: int = 1280,  # 最大宽度
+            max_height: int = 1080,  # 最大高度
+            page_check_interval: float = 1.0,  # 检查标签页切换的间隔(秒)
+    ) -> None:
+        """构造函数，完成实时画面的初始化"""
+        self._cdp_url = cdp_url
+        self._min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._screencast_params = {
+            "format": "jpeg",
+            "quality": quality,
+            "maxWidth": max_width,
+            "maxHeight": max_height,
+        }
+        self._page_check_interval = page_check_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._page: Optional[Page] = None
+        self._cdp_session: Optional[CDPSession] = None
+
+    def _on_frame(self, params: Dict[str, Any]) -> None:
+        """录屏帧回调，立即ack并只保留最新的一帧"""
+        # 1.ack之后浏览器才会推送下一帧
+        if self._cdp_session:
+            asyncio.create_task(self._ack(self._cdp_session, params["sessionId"]))
+
+        # 2.队列中已有未发送的帧则丢弃旧帧
+        if self._queue.full():
+            self._queue.get_nowait()
+            get_metrics().incr("browser_screencast_frames", status="dropped")
+        self._queue.put_nowait(params["data"])
+
+    @classmethod
+    async def _ack(cls, cdp_session: CDPSession, session_id: int) -> None:
+        """确认录屏帧"""
+        try:
+            await cdp_session.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception as e:
+            logger.debug(f"确认录屏帧失败: {str(e)}")
+
+    async def _get_latest_page(self) -> Optional[Page]:
+        """获取浏览器最新的标签页"""
+        browser = await get_playwright_manager().get_browser(self._cdp_url)
+        contexts = browser.contexts
+        if not contexts or not contexts[0].pages:
+            return None
+        return contexts[0].pages[-1]
+
+    async def _start(self, page: Page) -> None:
+        """在指定页面上开启录屏"""
+        await self._stop()
+        self._page = page
+        self._cdp_session = await page.context.new_cdp_session(page)
+        self._cdp_session.on("Page.screencastFrame", self._on_frame)
+        await self._cdp_session.send("Page.startScreencast", self._screencast_params)
+
+    async def _stop(self) -> None:
+        """停止录屏并释放CDP会话"""
+        if self._cdp_session:
+            try:
+                await self._cdp_session.send("Page.stopScreencast")
+                await self._cdp_session.detach()
+            except Exception as e:
+                logger.debug(f"停止录屏失败: {str(e)}")
+        self._cdp_session = None
+        self._page = None
+
+    async def frames(self) -> AsyncGenerator[bytes, None]:
+        """持续生成JPEG帧，调用方停止迭代时自动关闭录屏"""
+        metrics = get_metrics()
+        last_digest: Optional[bytes] = None
+        last_sent = 0.0
+
+        try:
+            while True:
+                # 1.最新标签页发生变化(或页面已关闭)时切换录屏目标
+                page = await self._get_latest_page()
+                if page is None:
+                    await asyncio.sleep(self._page_check_interval)
+                    continue
+                if page is not self._page or page.is_closed():
+                    await self._start(page)
+                    last_digest = None
+
+                # 2.等待新的帧，超时则回到第1步检查标签页
+                try:
+                    data = await asyncio.wait_for(self._queue.get(), self._page_check_interval)
+                except asyncio.TimeoutError:
+                    continue
+
+                # 3.与上一次发送的帧完全相同则抑制
+                digest = hashlib.md5(data.encode("ascii")).digest()
+                if digest == last_digest:
+                    metrics.incr("browser_screencast_frames", status="suppressed")
+                    continue
+
+                # 4.按最大帧率限流，等待期间到达的新帧会替换队列中的旧帧
+                wait = self._min_interval - (time.monotonic() - last_sent)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    if not self._queue.empty():
+                        data = self._queue.get_nowait()
+                        digest = hashlib.md5(data.encode("ascii")).digest()
+                        metrics.incr("browser_screencast_frames", status="dropped")
+
+                # 5.发送帧
+                last_digest, last_sent = digest, time.monotonic()
+                metrics.incr("browser_screencast_frames", status="sent")
+                yield base64.b64decode(data)
+        finally:
+            await self._stop()
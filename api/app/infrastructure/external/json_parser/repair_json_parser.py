@@ -5,27 +5,141 @@
 #Author  :Emcikem
 @File    :repair_json_parser.py
 """
+import json
 import logging
 from typing import Union, Dict, List, Any, Optional
 
 import json_repair
 
 from app.domain.external.json_parser import JSONParser
+from core.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
+"""
+json解析设计思路：
+1.原先每次解析都会执行json_repair.repair_json，并在INFO级别打印完整文本，而大部分工具调用参数与步骤结果本身就是合法的json，
+    修复库逐字符扫描的开销与大段日志都是浪费；
+2.先使用严格解析器(安装了orjson时使用orjson，否则使用标准库json)解析，失败后再回退到json_repair修复，
+    json_repair内部同样会先尝试json.loads，回退时跳过这一步避免重复解析；
+3.按文本来源(source)统计快速解析/修复的次数(json_parse_requests)，修复率较高的来源说明对应的提示词容易产生不合法的json；
+4.文本只在DEBUG级别打印，并截断到LOG_MAX_CHARS个字符；
+"""
+
+try:
+    import orjson
+
+    _strict_loads = orjson.loads
+except ImportError:
+    _strict_loads = json.loads
+
+# 日志中最多打印的文本字符数
+LOG_MAX_CHARS = 500
+
 
 class RepairJSONParser(JSONParser):
-    """基于修复逻辑的json解析器"""
+    """基于修复逻辑的json解析器，合法的json走严格解析的快速路径"""
 
-    async def invoke(self, text: str, default_value: Optional[Any] = None) -> Union[Dict, List, Any]:
-        """传递文本，并使用json修复库进行修复"""
+    def _parse(self, text: str, source: str = "default") -> Union[Dict, List, Any]:
+        """先严格解析，失败后使用json修复库修复并解析"""
+        # 1.严格解析合法的json(orjson/json解析失败时抛出的错误均为ValueError的子类)
+        metrics = get_metrics()
+        try:
+            result = _strict_loads(text)
+            metrics.incr("json_parse_requests", source=source, result="fast")
+            return result
+        except ValueError:
+            pass
+
+        # 2.不合法的json使用json_repair修复并解析
+        logger.info(f"json文本不合法，使用json_repair修复，来源: {source}，长度: {len(text)}")
+        metrics.incr("json_parse_requests", source=source, result="repaired")
+        return json_repair.repair_json(text, ensure_ascii=False, return_objects=True, skip_json_loads=True)
+
+    async def invoke(
+            self,
+            text: str,
+            default_value: Optional[Any] = None,
+            source: str = "default",
+    ) -> Union[Dict, List, Any]:
+        """传递文本，合法的json直接解析，否则使用json修复库进行修复"""
         # 1.记录日志并判断text是否传递
-        logger.info(f"解析json文本: {text}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"解析json文本(来源: {source}): {text[:LOG_MAX_CHARS] if text else text}")
         if not text or not text.strip():
             if default_value is not None:
                 return default_value
             raise ValueError("json文本为空，且无默认值")
 
-        # 2.存在数值则使用json_repair库修复并解析
-        return json_repair.repair_json(text, ensure_ascii=False, return_objects=True)
+        # 2.存在数值则解析(必要时修复)
+        return self._parse(text, source)
+
+
+if __name__ == "__main__":
+    # 基于录制的会话(LLM_CACHE_MODE=record生成的JSONL)对比快速路径与始终修复的解析耗时:
+    # python -m app.infrastructure.external.json_parser.repair_json_parser recordings/llm_session.jsonl [轮数]
+    import sys
+    import time
+
+    from app.infrastructure.external.llm.cached_llm import LLMRecording
+
+
+    def collect_arguments(entries: List[Dict[str, Any]]) -> List[str]:
+        """收集录制中的工具调用参数(请求历史+响应)，按内容去重"""
+        arguments = {}
+        for entry in entries:
+            messages = entry["request"]["messages"] + [entry["response"]]
+            for message in messages:
+                for tool_call in message.get("tool_calls") or []:
+                    text = (tool_call.get("function") or {}).get("arguments")
+                    if text:
+                        arguments[text] = None
+        return list(arguments)
+
+
+    def benchmark(samples: List[str], rounds: int) -> None:
+        """对比原实现(始终调用json_repair)与快速路径的平均耗时"""
+        parser = RepairJSONParser()
+        total = len(samples) * rounds
+
+        # 1.原实现: 始终使用json_repair修复并解析
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            for text in samples:
+                json_repair.repair_json(text, ensure_ascii=False, return_objects=True)
+        repair_us = (time.perf_counter() - start_time) * 1e6 / total
+
+        # 2.快速路径: 先严格解析，失败后再修复
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            for text in samples:
+                parser._parse(text, source="benchmark")
+        fast_us = (time.perf_counter() - start_time) * 1e6 / total
+        print(f"  始终修复: {repair_us:.1f}us/次, 快速路径: {fast_us:.1f}us/次, 加速: {repair_us / max(fast_us, 1e-6):.2f}x")
+
+    def main():
+        samples = collect_arguments(LLMRecording(sys.argv[1]).entries())
+        rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        if not samples:
+            print("录制中没有工具调用参数")
+            return
+
+        # 1.按是否为合法json拆分样本，分别统计(不合法的参数修复耗时远高于解析，合并统计会掩盖快速路径的收益)
+        valid, broken = [], []
+        for text in samples:
+            try:
+                json.loads(text)
+                valid.append(text)
+            except ValueError:
+                broken.append(text)
+        print(f"严格解析器: {_strict_loads.__module__}, 参数数: {len(samples)}(合法: {len(valid)}, 需要修复: {len(broken)}), "
+              f"平均长度: {sum(len(text) for text in samples) / len(samples):.0f}字符, 轮数: {rounds}")
+
+        # 2.分别对合法参数、需要修复的参数与全部参数做基准测试
+        for name, group in (("合法参数", valid), ("需要修复的参数", broken), ("全部参数", samples)):
+            if group:
+                print(f"{name}:")
+                benchmark(group, rounds)
+
+
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 20:30
+#Author  :Emcikem
+@File    :cached_llm.py
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict, deque
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Deque
+
+from app.application.errors.exception import ServerRequestsError
+from app.domain.external.llm import LLM
+from app.infrastructure.storage.redis import RedisClient, get_redis
+from core.config import get_settings
+from core.metrics import get_metrics
+
+"""
+LLM响应缓存与录制回放设计思路：
+1.重试、重复的测试运行以及相同的规划提示词都会再次请求LLM，这里提供一个包装LLM协议的缓存层，
+    缓存键为(model, messages, tools, response_format, tool_choice, temperature)的哈希；
+2.缓存只在结果确定时生效：temperature为0时才会缓存，回放模式下则不受温度限制；
+3.缓存后端可插拔，均使用LRU淘汰：
+    - disk: 每个键一个JSON文件，通过文件修改时间维护LRU顺序，适合本地开发与测试；
+    - redis: 值存储在字符串中，有序集合记录最近访问时间，适合多实例共享；
+4.四种模式：
+    - off: 不做任何处理；
+    - cache: temperature为0时读写缓存；
+    - record: 始终请求LLM，并将每一次请求与响应按顺序追加到录制文件(JSONL)中，完整捕获一次会话；
+    - replay: 只从录制文件中读取响应，不请求LLM，可以离线全速重跑Agent循环做性能回归测试，
+        相同的请求按录制顺序依次返回响应，录制中缺失的请求默认报错；
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def build_cache_key(
+        model_name: str,
+        temperature: float,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        response_format: Optional[Dict[str, Any]],
+        tool_choice: Optional[str],
+) -> str:
+    """根据请求参数构建缓存键"""
+    payload = {
+        "model": model_name,
+        "messages": messages,
+        "tools": tools or [],
+        "response_format": response_format,
+        "tool_choice": tool_choice,
+        "temperature": temperature,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCacheBackend(ABC):
+    """LLM响应缓存后端基类"""
+    name: str = ""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """根据缓存键获取响应"""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """写入响应，超过容量时淘汰最久未使用的条目"""
+        raise NotImplementedError
+
+
+class DiskLLMCache(LLMCacheBackend):
+    """基于本地磁盘的LLM响应缓存"""
+    name: str = "disk"
+
+    def __init__(self, directory: str, max_entries: int = 10000) -> None:
+        """构造函数，完成磁盘缓存的初始化"""
+        self._directory = Path(directory)
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index: Optional[OrderedDict] = None  # 缓存键->None，按最近访问时间从旧到新排列
+
+    def _path(self, key: str) -> Path:
+        """缓存键对应的文件路径，使用前两位做子目录避免单目录文件过多"""
+        return self._directory / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> OrderedDict:
+        """懒加载LRU索引，按文件修改时间排序"""
+        if self._index is None:
+            paths = sorted(self._directory.glob("*/*.json"), key=lambda path: path.stat().st_mtime) \
+                if self._directory.exists() else []
+            self._index = OrderedDict((path.stem, None) for path in paths)
+        return self._index
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            if key not in index or not path.exists():
+                index.pop(key, None)
+                return None
+            index.move_to_end(key)
+            os.utime(path)
+            return json.loads(path.read_text(encoding="utf-8"))
+
+    def _set(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            # 1.写入临时文件后原子替换，避免并发读取到不完整的文件
+            index = self._load_index()
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+            tmp_path.replace(path)
+            index[key] = None
+            index.move_to_end(key)
+
+            # 2.超过容量时淘汰最久未使用的条目
+            while len(index) > self._max_entries:
+                old_key, _ = index.popitem(last=False)
+                self._path(old_key).unlink(missing_ok=True)
+                get_metrics().incr("llm_cache_evictions", backend=self.name)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._set, key, value)
+
+
+class RedisLLMCache(LLMCacheBackend):
+    """基于Redis的LLM响应缓存"""
+    name: str = "redis"
+
+    def __init__(self, redis_client: RedisClient, max_entries: int = 10000, key_prefix: str = "llm:cache") -> None:
+        """构造函数，完成Redis缓存的初始化"""
+        self._redis_client = redis_client
+        self._max_entries = max_entries
+        self._key_prefix = key_prefix
+        self._lru_key = f"{key_prefix}:lru"  # 有序集合，成员为缓存键，分数为最近访问时间
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        client = self._redis_client.client
+        value = await client.get(f"{self._key_prefix}:{key}")
+        if value is None:
+            return None
+        await client.zadd(self._lru_key, {key: time.time()})
+        return json.loads(value)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        # 1.写入值并更新访问时间
+        client = self._redis_client.client
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.set(f"{self._key_prefix}:{key}", json.dumps(value, ensure_ascii=False))
+            pipe.zadd(self._lru_key, {key: time.time()})
+            pipe.zcard(self._lru_key)
+            _, _, size = await pipe.execute()
+
+        # 2.超过容量时淘汰最久未使用的条目
+        overflow = size - self._max_entries
+        if overflow > 0:
+            old_keys = await client.zpopmin(self._lru_key, overflow)
+            if old_keys:
+                await client.delete(*[f"{self._key_prefix}:{old_key}" for old_key, _ in old_keys])
+                get_metrics().incr("llm_cache_evictions", value=len(old_keys), backend=self.name)
+
+
+class LLMRecording:
+    """LLM会话录制文件(JSONL)，每行记录一次请求的缓存键、请求参数与响应"""
+
+    def __init__(self, path: str) -> None:
+        """构造函数，完成录制文件的初始化"""
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._responses: Optional[Dict[str, Deque[Dict[str, Any]]]] = None  # 缓存键->按录制顺序排列的响应
+        self._last: Dict[str, Dict[str, Any]] = {}  # 缓存键->最后一次返回的响应
+
+    def append(self, key: str, request: Dict[str, Any], response: Dict[str, Any], latency_ms: float) -> None:
+        """追加一条录制记录"""
+        line = json.dumps(
+            {"key": key, "request": request, "response": response, "latency_ms": latency_ms, "time": time.time()},
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """读取所有录制记录"""
+        if not self.path.exists():
+            return []
+        with self.path.open(encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def next_response(self, key: str) -> Optional[Dict[str, Any]]:
+        """按录制顺序返回缓存键对应的下一条响应，录制的响应用完后重复返回最后一条"""
+        with self._lock:
+            if self._responses is None:
+                self._responses = defaultdict(deque)
+                for entry in self.entries():
+                    self._responses[entry["key"]].append(entry["response"])
+            responses = self._responses.get(key)
+            if responses:
+                self._last[key] = responses.popleft()
+            return self._last.get(key)
+
+
+class CachedLLM(LLM):
+    """带有响应缓存与录制回放能力的LLM包装器"""
+
+    def __init__(
+            self,
+            llm: LLM,
+            mode: str = "cache",  # off/cache/record/replay
+            backend: Optional[LLMCacheBackend] = None,  # 缓存后端，为None时不使用缓存
+            recording: Optional[LLMRecording] = None,  # 录制文件，record/replay模式下必须传递
+            replay_strict: bool = True,  # 回放时请求不在录制中是否报错，为False时回退为请求LLM
+    ) -> None:
+        """构造函数，完成LLM缓存包装器的初始化"""
+        if mode in ("record", "replay") and recording is None:
+            raise ValueError(f"LLM缓存[{mode}]模式需要传递录制文件")
+        self._llm = llm
+        self._mode = mode
+        self._backend = backend
+        self._recording = recording
+        self._replay_strict = replay_strict
+
+    @property
+    def model_name(self) -> str:
+        return self._llm.model_name
+
+    @property
+    def temperature(self) -> float:
+        return self._llm.temperature
+
+    @property
+    def max_tokens(self) -> int:
+        return self._llm.max_tokens
+
+    async def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，缓存后端异常时视为未命中"""
+        try:
+            return await self._backend.get(key)
+        except Exception as e:
+            logger.warning(f"读取LLM缓存失败: {str(e)}")
+            return None
+
+    async def _cache_set(self, key: str, value: Dict[str, Any]) -> None:
+        """写入缓存，缓存后端异常时忽略"""
+        try:
+            await self._backend.set(key, value)
+        except Exception as e:
+            logger.warning(f"写入LLM缓存失败: {str(e)}")
+
+    @classmethod
+    def _without_usage(cls, response: Dict[str, Any]) -> Dict[str, Any]:
+        """返回不含用量的响应副本(回放/命中缓存没有消耗token，且不能修改回放索引与缓存后端持有的响应)"""
+        return {name: value for name, value in response.items() if name != "usage"}
+
+    async def invoke(
+            self,
+            messages: List[Dict[str, Any]],
+            tools: List[Dict[str, Any]] = None,
+            response_format: Dict[str, Any] = None,
+            tool_choice: str = None,
+    ) -> Dict[str, Any]:
+        """按模式读取缓存/回放录制，未命中时请求LLM"""
+        if self._mode == "off":
+            return await self._llm.invoke(messages, tools, response_format, tool_choice)
+
+        # 1.构建缓存键
+        metrics = get_metrics()
+        key = build_cache_key(self.model_name, self.temperature, messages, tools, response_format, tool_choice)
+
+        # 2.回放模式直接从录制中读取响应
+        if self._mode == "replay":
+            response = self._recording.next_response(key)
+            if response is not None:
+                metrics.incr("llm_cache_requests", result="replay")
+                return self._without_usage(response)
+            metrics.incr("llm_cache_requests", result="replay_miss")
+            if self._replay_strict:
+                raise ServerRequestsError(f"LLM回放录制[{self._recording.path}]中不存在该请求: {key}")
+
+        # 3.temperature为0时读取缓存
+        cacheable = self._backend is not None and self.temperature == 0
+        if cacheable and self._mode == "cache":
+            response = await self._cache_get(key)
+            if response is not None:
+                metrics.incr("llm_cache_requests", result="hit")
+                return self._without_usage(response)
+            metrics.incr("llm_cache_requests", result="miss")
+
+        # 4.请求LLM并写入缓存/录制
+        start_time = time.perf_counter()
+        response = await self._llm.invoke(messages, tools, response_format, tool_choice)
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        metrics.observe("llm_invoke_latency_ms", latency_ms)
+        if cacheable:
+            await self._cache_set(key, response)
+        if self._mode == "record":
+            request = {"model": self.model_name, "temperature": self.temperature, "messages": messages,
+                       "tools": tools, "response_format": response_format, "tool_choice": tool_choice}
+            await asyncio.to_thread(self._recording.append, key, request, response, latency_ms)
+            metrics.incr("llm_cache_requests", result="recorded")
+
+        return response
+
+
+@lru_cache()
+def get_llm_cache_backend() -> LLMCacheBackend:
+    """使用lru_cache实现单例模式，根据配置获取LLM缓存后端"""
+    settings = get_settings()
+    if settings.llm_cache_backend == "disk":
+        return DiskLLMCache(settings.llm_cache_dir, max_entries=settings.llm_cache_max_entries)
+    return RedisLLMCache(get_redis(), max_entries=settings.llm_cache_max_entries)
+
+
+@lru_cache()
+def get_llm_recording() -> LLMRecording:
+    """使用lru_cache实现单例模式，获取LLM会话录制文件(回放索引在进程内共享)"""
+    return LLMRecording(get_settings().llm_record_path)
+
+
+if __name__ == "__main__":
+    # 离线回放录制文件并统计回放耗时，用于性能回归测试:
+    # python -m app.infrastructure.external.llm.cached_llm recordings/llm_session.jsonl
+    import sys
+
+
+    class RecordedLLM:
+        """只提供录制时模型名与温度的LLM，回放模式下不应该被调用"""
+
+        def __init__(self, model_name: str, temperature: float) -> None:
+            self.model_name, self.temperature, self.max_tokens = model_name, temperature, 0
+
+        async def invoke(self, *args, **kwargs):
+            raise RuntimeError("回放模式不应请求LLM")
+
+
+    async def main():
+        recording = LLMRecording(sys.argv[1])
+        entries = recording.entries()
+        if not entries:
+            print("录制文件为空")
+            return
+        recorded_ms = sum(entry.get("latency_ms", 0.0) for entry in entries)
+
+        # 1.按录制顺序回放所有请求并校验响应
+        first_request = entries[0]["request"]
+        llm = CachedLLM(
+            llm=RecordedLLM(first_request["model"], first_request["temperature"]),
+            mode="replay",
+            recording=recording,
+        )
+        start_time = time.perf_counter()
+        for entry in entries:
+            request = entry["request"]
+            llm._llm = RecordedLLM(request["model"], request["temperature"])
+            response = await llm.invoke(
+                request["messages"], request["tools"], request["response_format"], request["tool_choice"],
+            )
+            expected = CachedLLM._without_usage(entry["response"])
+            assert response == expected, f"回放结果不一致: {entry['key']}"
+        replay_ms = (time.perf_counter() - start_time) * 1000
+
+        # 2.输出耗时对比
+        print(f"录制请求数: {len(entries)}, 录制时LLM总耗时: {recorded_ms:.0f}ms, 回放耗时: {replay_ms:.1f}ms")
+
+
+    asyncio.run(main())
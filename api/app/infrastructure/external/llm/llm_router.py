@@ -0,0 +1,290 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/20 01:20
+#Author  :Emcikem
+@File    :llm_router.py
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import urlparse
+
+from openai import APIConnectionError, APIStatusError
+
+from app.application.errors.exception import ServerRequestsError
+from app.domain.external.llm import LLM
+from app.domain.models.app_config import LLMRouterConfig, LLMConfig
+from app.infrastructure.external.search.multi_search import CircuitBreaker
+from core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+"""
+多供应商LLM路由设计思路：
+1.原先OpenAILLM只对接一个base_url，供应商变慢或者返回5xx时Agent只能对同一个端点固定间隔重试，
+    这里提供一个路由LLM，对接llm_config以及llm_router_config.providers中配置的多个供应商/模型，本身同样实现LLM协议；
+2.每个路由在进程内维护滚动的耗时(p50/p95)、错误率与熔断器(复用多后端搜索的熔断器)，由于Agent服务按请求创建，
+    统计信息按路由名称做进程内单例，跨请求累计；
+3.每次调用按(错误率是否超过阈值, p50耗时, 配置顺序)排序可用路由，先请求第一个路由，
+    超过该路由历史耗时的分位数(默认p95)仍未返回时向下一个路由发送对冲请求，任意一个路由成功即取消其余请求；
+4.路由返回超时、连接错误、429或5xx时立即故障转移到下一个路由，其余4xx(请求本身有问题)直接抛出；
+    所有路由都失败时按带随机抖动的指数退避重试，直到最大轮数；
+5.整个调用(含对冲、故障转移与退避)有统一的截止时间，超时后取消所有飞行中的请求；
+6.路由顺序、对冲、故障转移均记录日志与监控指标(llm_route_*)；
+"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """判断错误是否可以故障转移：超时、连接错误、429与5xx可以，其余4xx不可以，未知错误按可以处理"""
+    current: Optional[BaseException] = error
+    while current is not None:
+        if isinstance(current, (asyncio.TimeoutError, APIConnectionError)):
+            return True
+        if isinstance(current, APIStatusError):
+            return current.status_code == 429 or current.status_code >= 500
+        current = current.__cause__ or current.__context__
+    return True
+
+
+class LLMRouteStats:
+    """单个路由的滚动统计信息，涵盖耗时、错误率与熔断器"""
+
+    def __init__(self, name: str) -> None:
+        """构造函数，完成路由统计信息的初始化"""
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.latencies: Deque[float] = deque(maxlen=100)  # 最近成功请求的耗时(秒)
+        self.outcomes: Deque[bool] = deque(maxlen=100)  # 最近请求是否成功
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """计算历史耗时的分位数，样本不足时返回None"""
+        if len(self.latencies) < 5:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(percentile * (len(values) - 1)))]
+
+    @property
+    def error_rate(self) -> float:
+        """最近请求的错误率"""
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def record(self, success: bool, latency: Optional[float] = None) -> None:
+        """记录一次请求结果并更新监控指标"""
+        self.outcomes.append(success)
+        if success:
+            self.breaker.record_success()
+            self.latencies.append(latency)
+        else:
+            self.breaker.record_failure()
+
+        metrics = get_metrics()
+        metrics.set_gauge("llm_route_error_rate", round(self.error_rate, 4), route=self.name)
+        metrics.set_gauge("llm_route_circuit_open", int(self.breaker.state != "closed"), route=self.name)
+        p95 = self.latency_percentile(0.95)
+        if p95 is not None:
+            metrics.set_gauge("llm_route_p95_ms", round(p95 * 1000, 1), route=self.name)
+
+
+@lru_cache(maxsize=None)
+def get_llm_route_stats(name: str) -> LLMRouteStats:
+    """使用lru_cache实现按路由名称的单例，跨请求累计路由统计信息"""
+    return LLMRouteStats(name)
+
+
+class LLMRoute:
+    """LLM路由中的单个供应商/模型"""
+
+    def __init__(self, name: str, llm: LLM) -> None:
+        """构造函数，完成路由的初始化"""
+        self.name = name
+        self.llm = llm
+        self.stats = get_llm_route_stats(name)
+
+    @classmethod
+    def route_name(cls, llm_config: LLMConfig) -> str:
+        """根据语言模型配置生成路由名称(供应商域名/模型名)"""
+        return f"{urlparse(str(llm_config.base_url)).netloc or llm_config.base_url}/{llm_config.model_name}"
+
+
+class LLMRouter(LLM):
+    """多供应商LLM路由，支持基于耗时的路由选择、对冲请求、故障转移与截止时间"""
+
+    def __init__(self, routes: List[LLMRoute], router_config: LLMRouterConfig) -> None:
+        """构造函数，完成LLM路由的初始化，第一个路由作为主路由提供模型名等属性"""
+        if not routes:
+            raise ValueError("LLM路由至少需要配置一个路由")
+        self._routes = routes
+        self._config = router_config
+
+    @property
+    def model_name(self) -> str:
+        return self._routes[0].llm.model_name
+
+    @property
+    def temperature(self) -> float:
+        return self._routes[0].llm.temperature
+
+    @property
+    def max_tokens(self) -> int:
+        return self._routes[0].llm.max_tokens
+
+    def _ordered_routes(self) -> List[LLMRoute]:
+        """过滤熔断中的路由，并按(错误率是否超过阈值, p50耗时, 配置顺序)排序"""
+        routes = [(index, route) for index, route in enumerate(self._routes) if route.stats.breaker.allow()]
+        routes.sort(key=lambda item: (
+            item[1].stats.error_rate > self._config.error_rate_threshold,
+            item[1].stats.latency_percentile(0.5) or 0.0,
+            item[0],
+        ))
+        return [route for _, route in routes]
+
+    def _hedge_delay(self, route: LLMRoute) -> float:
+        """计算向下一个路由发送对冲请求前的等待时间"""
+        delay = route.stats.latency_percentile(self._config.hedge_percentile)
+        return delay if delay is not None else self._config.default_hedge_seconds
+
+    def _backoff(self, attempt: int) -> float:
+        """带随机抖动的指数退避时长"""
+        delay = min(self._config.backoff_max_seconds, self._config.backoff_base_seconds * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _call_route(self, route: LLMRoute, request: Dict[str, Any]) -> Dict[str, Any]:
+        """请求单个路由并记录耗时与结果，被取消(对冲落败)时不计入成功或失败"""
+        metrics = get_metrics()
+        start_time = time.perf_counter()
+        try:
+            response = await route.llm.invoke(**request)
+        except asyncio.CancelledError:
+            # 对冲落败的耗时作为耗时下限样本，避免慢路由因为始终被取消而一直排在前面
+            route.stats.latencies.append(time.perf_counter() - start_time)
+            route.stats.breaker.release()
+            metrics.incr("llm_route_requests", route=route.name, status="cancelled")
+            raise
+        except Exception:
+            route.stats.record(success=False)
+            metrics.incr("llm_route_requests", route=route.name, status="failure")
+            raise
+
+        latency = time.perf_counter() - start_time
+        route.stats.record(success=True, latency=latency)
+        metrics.observe("llm_route_latency_ms", latency * 1000, route=route.name)
+        metrics.incr("llm_route_requests", route=route.name, status="success")
+        return response
+
+    async def _invoke_hedged(self, routes: List[LLMRoute], request: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        """按顺序请求路由，超过耗时分位数后发送对冲请求，失败时故障转移，全部失败时抛出最后一个错误"""
+        metrics = get_metrics()
+        remaining = list(routes)
+        pending: Dict[asyncio.Task, LLMRoute] = {}
+        last_error: Optional[BaseException] = None
+        next_hedge_at = 0.0
+
+        def launch(reason: str) -> None:
+            nonlocal next_hedge_at
+            route = remaining.pop(0)
+            pending[asyncio.create_task(self._call_route(route, request))] = route
+            next_hedge_at = time.monotonic() + self._hedge_delay(route)
+            if reason != "primary":
+                metrics.incr(f"llm_route_{reason}s", route=route.name)
+                logger.info(f"LLM路由{'对冲' if reason == 'hedge' else '故障转移'}到[{route.name}]")
+
+        try:
+            # 1.请求第一个路由
+            launch("primary")
+            while pending or remaining:
+                # 2.超过截止时间则取消所有飞行中的请求并记为失败
+                now = time.monotonic()
+                if now >= deadline:
+                    for route in pending.values():
+                        route.stats.record(success=False)
+                        metrics.incr("llm_route_timeouts", route=route.name)
+                    raise asyncio.TimeoutError()
+
+                # 3.没有飞行中的请求(前面的路由都失败了)时立即故障转移到下一个路由
+                if not pending:
+                    launch("failover")
+                    continue
+
+                # 4.等待请求完成，或者到达对冲时间
+                timeout = deadline - now
+                if remaining and self._config.hedge_enabled:
+                    timeout = min(timeout, max(0.0, next_hedge_at - now))
+                done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                # 5.超过对冲时间仍未返回则向下一个路由发送对冲请求
+                if not done:
+                    if remaining and self._config.hedge_enabled and time.monotonic() >= next_hedge_at:
+                        launch("hedge")
+                    continue
+
+                # 6.任意路由成功则返回，不可故障转移的错误直接抛出
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        logger.info(f"LLM路由[{route.name}]返回结果")
+                        return task.result()
+                    last_error = task.exception()
+                    logger.warning(f"LLM路由[{route.name}]请求失败: {getattr(last_error, 'msg', None) or repr(last_error)}")
+                    if not is_retryable_error(last_error):
+                        raise last_error
+
+            raise last_error
+        finally:
+            # 7.取消飞行中的请求，未被请求的路由释放半开状态下占用的探测名额
+            for task in pending:
+                task.cancel()
+            for route in remaining:
+                route.stats.breaker.release()
+
+    async def invoke(
+            self,
+            messages: List[Dict[str, Any]],
+            tools: List[Dict[str, Any]] = None,
+            response_format: Dict[str, Any] = None,
+            tool_choice: str = None,
+    ) -> Dict[str, Any]:
+        """在截止时间内按路由顺序请求，所有路由都失败时按指数退避重试"""
+        metrics = get_metrics()
+        request = {"messages": messages, "tools": tools, "response_format": response_format, "tool_choice": tool_choice}
+        deadline = time.monotonic() + self._config.deadline_seconds
+        last_error: Optional[BaseException] = None
+
+        for attempt in range(self._config.max_attempts):
+            # 1.选择可用路由并记录路由顺序
+            routes = self._ordered_routes()
+            if routes:
+                logger.info(f"LLM路由顺序(第{attempt + 1}轮): {[route.name for route in routes]}")
+                try:
+                    return await self._invoke_hedged(routes, request, deadline)
+                except asyncio.TimeoutError:
+                    metrics.incr("llm_router_requests", status="deadline")
+                    raise ServerRequestsError(f"调用语言模型超过截止时间({self._config.deadline_seconds}秒)")
+                except Exception as e:
+                    last_error = e
+                    if not is_retryable_error(e):
+                        metrics.incr("llm_router_requests", status="failure")
+                        raise
+            else:
+                logger.warning("所有LLM路由均处于熔断状态")
+
+            # 2.所有路由都失败时按指数退避等待下一轮
+            remaining_seconds = deadline - time.monotonic()
+            if attempt == self._config.max_attempts - 1 or remaining_seconds <= 0:
+                break
+            delay = min(self._backoff(attempt), remaining_seconds)
+            metrics.incr("llm_router_backoffs")
+            logger.warning(f"所有LLM路由请求失败，{delay:.2f}秒后重试")
+            await asyncio.sleep(delay)
+
+        # 3.重试耗尽
+        metrics.incr("llm_router_requests", status="failure")
+        if last_error is not None:
+            raise last_error
+        raise ServerRequestsError("所有LLM路由均处于熔断状态，请稍后重试")
@@ -5,16 +5,20 @@
 #Author  :Emcikem
 @File    :openai_llm.py
 """
+import json
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from urllib.parse import urlparse
 
-from openai import AsyncOpenAI
+from openai import AsyncOpenAI, RateLimitError
 
 from app.application.errors.exception import ServerRequestsError
 from app.domain.external.llm import LLM
 from app.domain.external.search import SearchEngine
 from app.domain.models.app_config import LLMConfig
 from app.domain.services.tools.search import SearchTool
+from app.infrastructure.external.llm.rate_limiter import LLMRateLimiter
+from core.tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +26,14 @@ logger = logging.getLogger(__name__)
 class OpenAILLM(LLM):
     """基于OpenAI SDK/兼容OpenAI格式的LLM调用类"""
 
-    def __init__(self, llm_config: LLMConfig, **kwargs) -> None:
-        """构造函数，完成异步OpenAI客户端的创建和参数初始化"""
+    def __init__(
+            self,
+            llm_config: LLMConfig,
+            parallel_tool_calls: bool = False,
+            rate_limiter: Optional[LLMRateLimiter] = None,
+            **kwargs,
+    ) -> None:
+        """构造函数，完成异步OpenAI客户端的创建和参数初始化，传递限流器时请求前先获取集群配额"""
         # 1.初始化异步客户端
         self._client = AsyncOpenAI(
             base_url=str(llm_config.base_url),
@@ -35,7 +45,11 @@ class OpenAILLM(LLM):
         self._model_name = llm_config.model_name
         self._temperature = llm_config.temperature
         self._max_tokens = llm_config.max_tokens
+        self._parallel_tool_calls = parallel_tool_calls
         self._timeout = 3000
+        self._rate_limiter = rate_limiter
+        self._provider = urlparse(str(llm_config.base_url)).netloc or "default"  # 限流按供应商+模型划分
+        self._max_rate_limited_retries = 3  # 触发供应商限流(429)后重新排队的最大次数
 
     @property
     def model_name(self) -> str:
@@ -49,6 +63,39 @@ class OpenAILLM(LLM):
     def max_tokens(self) -> int:
         return self._max_tokens
 
+    async def _create(self, **kwargs) -> Any:
+        """发起对话补全请求，开启限流时排队获取配额，并将响应头/实际用量反馈给限流器"""
+        # 1.未开启限流时直接请求
+        if self._rate_limiter is None:
+            return await self._client.chat.completions.create(**kwargs)
+
+        # 2.估算本次请求消耗的token(提示词+最大生成token)
+        estimated_tokens = estimate_tokens(json.dumps(kwargs["messages"], ensure_ascii=False)) + (self._max_tokens or 0)
+        for attempt in range(self._max_rate_limited_retries + 1):
+            # 3.排队获取配额后请求，读取原始响应以获取限流响应头
+            await self._rate_limiter.acquire(self._provider, self._model_name, estimated_tokens)
+            try:
+                raw_response = await self._client.chat.completions.with_raw_response.create(**kwargs)
+            except RateLimitError as e:
+                # 4.触发供应商限流时冻结令牌桶并重新排队，而不是直接失败
+                await self._rate_limiter.feedback(
+                    self._provider, self._model_name, e.response.headers, rate_limited=True,
+                )
+                if attempt == self._max_rate_limited_retries:
+                    raise
+                continue
+
+            # 5.按响应头与实际用量修正令牌桶
+            response = raw_response.parse()
+            await self._rate_limiter.feedback(
+                self._provider,
+                self._model_name,
+                raw_response.headers,
+                estimated_tokens=estimated_tokens,
+                actual_tokens=response.usage.total_tokens if response.usage else None,
+            )
+            return response
+
     async def invoke(
             self,
             messages: List[Dict[str, Any]],
@@ -61,7 +108,7 @@ class OpenAILLM(LLM):
             # 1.检测是否传递了工具列表
             if tools:
                 logger.info(f"调用OpenAI客户端向LLM发起请求并携带工具信息：{self._model_name}")
-                response = await self._client.chat.completions.create(
+                response = await self._create(
                     model=self._model_name,
                     temperature=self._temperature,
                     max_tokens=self._max_tokens,
@@ -70,13 +117,13 @@ class OpenAILLM(LLM):
                     # response_format=response_format,
                     tools=tools,
                     tool_choice=tool_choice,
-                    parallel_tool_calls=False,  # 关闭并行工具调用(deepseek没有这个参数的)
+                    parallel_tool_calls=self._parallel_tool_calls,  # 默认关闭并行工具调用(deepseek没有这个参数的)
                     timeout=self._timeout,
                 )
             else:
                 # 2.未传递工具则删除Tools/tool_choice等参数
                 logger.info(f"调用OpenAI客户端向LLM发起请求未携带工具：{self._model_name}")
-                response = await self._client.chat.completions.create(
+                response = await self._create(
                     model=self._model_name,
                     temperature=self._temperature,
                     max_tokens=self._max_tokens,
@@ -85,9 +132,15 @@ class OpenAILLM(LLM):
                     timeout=self._timeout,
                 )
 
-            # 3.处理响应数据并返回
+            # 3.处理响应数据并附带token用量返回(用于按模型档位统计成本)
             logger.info(f"OpenAI客户端返回内容：{response.model_dump()}")
-            return response.choices[0].message.model_dump()
+            message = response.choices[0].message.model_dump()
+            if response.usage:
+                message["usage"] = {
+                    "prompt_tokens": response.usage.prompt_tokens,
+                    "completion_tokens": response.usage.completion_tokens,
+                }
+            return message
         except Exception as e:
             logger.error(f"调用OpenAI客户端发起错误：{str(e)}")
             raise ServerRequestsError("调用OpenAI客户端向LLM发起请求出错")
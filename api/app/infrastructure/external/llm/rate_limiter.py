@@ -0,0 +1,337 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/20 00:45
+#Author  :Emcikem
+@File    :rate_limiter.py
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, Deque, Dict, Mapping, Optional
+
+from app.infrastructure.storage.redis import RedisClient, get_redis
+from core.config import get_settings
+from core.context import current_session_id
+from core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+"""
+LLM集群限流设计思路：
+1.原先每个OpenAILLM实例独立请求供应商，高负载时触发供应商的RPM/TPM限制，Agent重试又进一步加剧拥塞；
+2.每个(供应商, 模型)在Redis中维护一个令牌桶哈希，同时记录请求数与token数两个桶，
+    容量为每分钟限额，按时间线性补充，通过Lua脚本原子地补充+扣减，所有副本/worker共享同一个桶；
+3.请求前按提示词估算token+最大生成token扣减，响应后按实际用量(usage)修正差值；
+4.供应商响应头x-ratelimit-limit-*会覆盖配置的限额，x-ratelimit-remaining-*会将桶内余量下调到供应商的真实余量，
+    收到429时按retry-after(或x-ratelimit-reset-*)冻结整个桶，期间所有请求排队等待而不是直接失败；
+5.同一进程内每个桶只有一个请求去Redis争抢配额，其余请求按会话轮询排队(同一会话内先进先出)，
+    避免并行步骤多的会话占满配额；
+6.排队中的会话及其已等待时长写入Redis哈希llm:ratelimit:waits，可以通过状态接口按会话查询；
+"""
+
+# 令牌桶获取脚本: 补充两个桶并尝试扣减，返回需要等待的毫秒数(0表示获取成功)
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local fields = redis.call("HMGET", KEYS[1], "requests", "tokens", "ts", "blocked_until", "rpm", "tpm")
+local rpm = tonumber(fields[5]) or tonumber(ARGV[2])
+local tpm = tonumber(fields[6]) or tonumber(ARGV[3])
+local need = math.min(tonumber(ARGV[4]), tpm)
+local requests = tonumber(fields[1]) or rpm
+local tokens = tonumber(fields[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(fields[3]) or now))
+requests = math.min(rpm, requests + elapsed * rpm / 60000)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60000)
+
+local wait = 0
+local blocked_until = tonumber(fields[4]) or 0
+if blocked_until > now then
+    wait = blocked_until - now
+end
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60000 / rpm)
+end
+if tokens < need then
+    wait = math.max(wait, (need - tokens) * 60000 / tpm)
+end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - need
+end
+
+redis.call("HSET", KEYS[1], "requests", requests, "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], ARGV[5])
+return math.ceil(wait)
+"""
+
+# 反馈脚本: 按响应头与实际用量修正令牌桶
+FEEDBACK_SCRIPT = """
+local limit_requests = tonumber(ARGV[1])
+local limit_tokens = tonumber(ARGV[2])
+local remaining_requests = tonumber(ARGV[3])
+local remaining_tokens = tonumber(ARGV[4])
+local token_delta = tonumber(ARGV[5])
+local blocked_until = tonumber(ARGV[6])
+
+if limit_requests > 0 then
+    redis.call("HSET", KEYS[1], "rpm", limit_requests)
+end
+if limit_tokens > 0 then
+    redis.call("HSET", KEYS[1], "tpm", limit_tokens)
+end
+
+local fields = redis.call("HMGET", KEYS[1], "requests", "tokens", "blocked_until")
+if fields[1] and remaining_requests >= 0 then
+    redis.call("HSET", KEYS[1], "requests", math.min(tonumber(fields[1]), remaining_requests))
+end
+if fields[2] then
+    local tokens = tonumber(fields[2]) - token_delta
+    if remaining_tokens >= 0 then
+        tokens = math.min(tokens, remaining_tokens)
+    end
+    redis.call("HSET", KEYS[1], "tokens", tokens)
+end
+if blocked_until > (tonumber(fields[3]) or 0) then
+    redis.call("HSET", KEYS[1], "blocked_until", blocked_until)
+end
+redis.call("PEXPIRE", KEYS[1], ARGV[7])
+return 1
+"""
+
+# 供应商重置时间格式，例如: 1s、6m0s、20ms、1h2m3.5s
+DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000}
+
+
+def parse_duration_ms(value: Optional[str]) -> Optional[float]:
+    """解析供应商响应头中的时长(纯数字按秒处理)，无法解析时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value) * 1000
+    except ValueError:
+        pass
+    matches = DURATION_PATTERN.findall(value)
+    if not matches:
+        return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in matches)
+
+
+def _header_int(headers: Mapping[str, str], name: str) -> int:
+    """读取整数响应头，不存在或无法解析时返回-1"""
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return -1
+
+
+class _FairTurns:
+    """进程内按会话轮询的排队器，同一时刻只有一个请求持有令牌桶的争抢权"""
+
+    def __init__(self) -> None:
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._holder: Optional[asyncio.Future] = None
+
+    def _grant_next(self) -> None:
+        """将争抢权交给下一个会话队首的请求"""
+        while self._queues:
+            session_key, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            # 轮询: 当前会话移到末尾，队列为空时移除
+            del self._queues[session_key]
+            if queue:
+                self._queues[session_key] = queue
+            if not future.done():
+                self._holder = future
+                future.set_result(None)
+                return
+        self._holder = None
+
+    async def acquire(self, session_key: str) -> asyncio.Future:
+        """排队获取争抢权"""
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(session_key, deque()).append(future)
+        if self._holder is None:
+            self._grant_next()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 等待期间被取消，已经获得争抢权时交给下一个请求
+            if self._holder is future:
+                self._grant_next()
+            raise
+        return future
+
+    @property
+    def busy(self) -> bool:
+        """是否有请求正在争抢配额"""
+        return self._holder is not None
+
+    def release(self, future: asyncio.Future) -> None:
+        """释放争抢权"""
+        if self._holder is future:
+            self._grant_next()
+
+
+class LLMRateLimiter:
+    """基于Redis令牌桶的LLM集群限流器"""
+
+    def __init__(
+            self,
+            redis_client: RedisClient,
+            requests_per_minute: int = 500,
+            tokens_per_minute: int = 200_000,
+            max_wait_seconds: float = 120.0,
+    ) -> None:
+        """构造函数，完成限流器初始化，涵盖默认的每分钟请求数/token数、单次请求最长排队时间"""
+        self._redis = redis_client
+        self._requests_per_minute = requests_per_minute
+        self._tokens_per_minute = tokens_per_minute
+        self._max_wait_seconds = max_wait_seconds
+        self._turns: Dict[str, _FairTurns] = {}
+        self._waits_key = "llm:ratelimit:waits"
+
+    @classmethod
+    def _bucket_key(cls, provider: str, model_name: str) -> str:
+        return f"llm:ratelimit:{provider}:{model_name}"
+
+    async def _take(self, bucket_key: str, tokens: int) -> int:
+        """尝试从令牌桶中获取配额，返回需要等待的毫秒数"""
+        script = self._redis.client.register_script(ACQUIRE_SCRIPT)
+        return int(await script(
+            keys=[bucket_key],
+            args=[int(time.time() * 1000), self._requests_per_minute, self._tokens_per_minute, tokens, 120_000],
+        ))
+
+    async def _publish_wait(self, session_id: str, model_name: str, since: float) -> None:
+        """记录会话当前的排队状态，写入失败时忽略"""
+        try:
+            await self._redis.client.hset(self._waits_key, session_id, json.dumps({
+                "model": model_name,
+                "wait_ms": int((time.time() - since) * 1000),
+                "since": since,
+            }))
+        except Exception as e:
+            logger.debug(f"记录会话[{session_id}]LLM排队状态失败: {str(e)}")
+
+    async def _clear_wait(self, session_id: str) -> None:
+        try:
+            await self._redis.client.hdel(self._waits_key, session_id)
+        except Exception as e:
+            logger.debug(f"清除会话[{session_id}]LLM排队状态失败: {str(e)}")
+
+    async def acquire(self, provider: str, model_name: str, tokens: int) -> float:
+        """按会话公平排队获取一次请求的配额，返回排队耗时(秒)，超过最长排队时间或Redis异常时直接放行"""
+        # 1.进程内按会话轮询排队，同一时刻每个桶只有一个请求争抢配额
+        bucket_key = self._bucket_key(provider, model_name)
+        session_id = current_session_id.get() or "anonymous"
+        turns = self._turns.setdefault(bucket_key, _FairTurns())
+        start_time = time.time()
+        waited = turns.busy
+        if waited:
+            await self._publish_wait(session_id, model_name, start_time)
+        try:
+            turn = await turns.acquire(session_id)
+        except asyncio.CancelledError:
+            if waited:
+                await self._clear_wait(session_id)
+            raise
+
+        # 2.循环获取配额，配额不足时按令牌桶返回的时长等待
+        try:
+            while True:
+                try:
+                    wait_ms = await self._take(bucket_key, tokens)
+                except Exception as e:
+                    logger.warning(f"LLM限流器访问Redis失败，直接放行: {str(e)}")
+                    break
+                if wait_ms <= 0:
+                    break
+
+                elapsed = time.time() - start_time
+                if elapsed >= self._max_wait_seconds:
+                    logger.warning(f"会话[{session_id}]等待LLM[{model_name}]配额超过{self._max_wait_seconds}秒，直接放行")
+                    break
+                waited = True
+                await self._publish_wait(session_id, model_name, start_time)
+                await asyncio.sleep(min(wait_ms / 1000, self._max_wait_seconds - elapsed))
+        finally:
+            turns.release(turn)
+            if waited:
+                await self._clear_wait(session_id)
+
+        # 3.记录排队耗时
+        elapsed = time.time() - start_time
+        get_metrics().observe("llm_rate_limit_wait_ms", elapsed * 1000, model=model_name)
+        return elapsed
+
+    async def feedback(
+            self,
+            provider: str,
+            model_name: str,
+            headers: Mapping[str, str],
+            estimated_tokens: int = 0,
+            actual_tokens: Optional[int] = None,
+            rate_limited: bool = False,
+    ) -> None:
+        """根据响应头与实际用量修正令牌桶，rate_limited为True时按重试时间冻结令牌桶"""
+        # 1.计算被限流时的冻结截止时间
+        blocked_until = 0
+        if rate_limited:
+            retry_ms = parse_duration_ms(f"{headers['retry-after-ms']}ms") if headers.get("retry-after-ms") else None
+            retry_ms = retry_ms or parse_duration_ms(headers.get("retry-after")) or max(
+                parse_duration_ms(headers.get("x-ratelimit-reset-requests")) or 0,
+                parse_duration_ms(headers.get("x-ratelimit-reset-tokens")) or 0,
+            ) or 1000
+            blocked_until = int(time.time() * 1000 + retry_ms)
+            get_metrics().incr("llm_rate_limited", model=model_name)
+            logger.warning(f"LLM[{model_name}]触发供应商限流，冻结配额{retry_ms:.0f}ms")
+
+        # 2.按响应头与实际用量修正令牌桶
+        try:
+            script = self._redis.client.register_script(FEEDBACK_SCRIPT)
+            await script(keys=[self._bucket_key(provider, model_name)], args=[
+                _header_int(headers, "x-ratelimit-limit-requests"),
+                _header_int(headers, "x-ratelimit-limit-tokens"),
+                _header_int(headers, "x-ratelimit-remaining-requests"),
+                _header_int(headers, "x-ratelimit-remaining-tokens"),
+                (actual_tokens - estimated_tokens) if actual_tokens is not None else 0,
+                blocked_until,
+                120_000,
+            ])
+        except Exception as e:
+            logger.warning(f"LLM限流器更新令牌桶失败: {str(e)}")
+
+    async def waits(self, session_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """获取正在排队的会话及其已等待时长，传递session_id时只返回该会话"""
+        if session_id:
+            value = await self._redis.client.hget(self._waits_key, session_id)
+            raw = {session_id: value} if value else {}
+        else:
+            raw = await self._redis.client.hgetall(self._waits_key)
+
+        # 进程异常退出时遗留的排队记录不会被清除，超过最长排队时间的记录直接忽略
+        result = {}
+        for key, value in raw.items():
+            wait = json.loads(value)
+            wait["wait_ms"] = int((time.time() - wait["since"]) * 1000)
+            if wait["wait_ms"] <= (self._max_wait_seconds + 60) * 1000:
+                result[key] = wait
+        return result
+
+
+@lru_cache()
+def get_llm_rate_limiter() -> LLMRateLimiter:
+    """使用lru_cache实现单例模式，获取LLM集群限流器"""
+    settings = get_settings()
+    return LLMRateLimiter(
+        redis_client=get_redis(),
+        requests_per_minute=settings.llm_rate_limit_rpm,
+        tokens_per_minute=settings.llm_rate_limit_tpm,
+        max_wait_seconds=settings.llm_rate_limit_max_wait_seconds,
+    )
@@ -10,7 +10,7 @@ import logging
 import socket
 import uuid
 from tkinter.font import names
-from typing import Optional, Self, BinaryIO, io
+from typing import Optional, Self, BinaryIO, io, AsyncGenerator
 
 import docker
 from async_lru import alru_cache
@@ -23,10 +23,15 @@ from app.domain.external.browser import Browser
 from app.domain.external.sandbox import Sandbox
 from app.domain.models.tool_result import ToolResult
 from app.infrastructure.external.browser.playwright_browser import PlaywrightBrowser
+from app.infrastructure.external.browser.screencast import BrowserScreencast
 from core.config import get_settings
+from core.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 
+# 沙箱中按需启动的进程(与sanbox/supervisord.conf中autostart=false的程序保持一致)，未使用浏览器/VNC时处于STOPPED状态属于正常情况
+LAZY_SERVICES = {"xvfb", "chrome", "chrome_headless", "socat", "x11vnc", "websockify"}
+
 class DockerSandbox(Sandbox):
     """基于Docker的沙箱服务"""
 
@@ -219,9 +224,75 @@ class DockerSandbox(Sandbox):
             logger.error(f"获取沙箱发生位置错误：{str(e)}")
             return None
 
+    async def ensure_browser(self, vnc: bool = False) -> None:
+        """调用沙箱接口按需启动浏览器(以及VNC)相关进程，并等待浏览器就绪，vnc=True时沙箱浏览器会由无头模式切换为有头模式"""
+        response = await self.client.post(f"{self._base_url}/api/browser/start", json={"vnc": vnc}, timeout=120)
+        tool_result = ToolResult.from_sandbox(**response.json())
+        if not tool_result.success:
+            raise RuntimeError(f"启动沙箱浏览器失败: {tool_result.message}")
+
+        # 记录按需启动耗时
+        data = tool_result.data or {}
+        if data.get("started"):
+            get_metrics().observe("sandbox_browser_lazy_start_ms", data.get("elapsed_ms", 0), vnc=vnc)
+            logger.info(f"沙箱[{self.id}]按需启动进程: {data['started']}, 耗时: {data.get('elapsed_ms')}ms")
+
+    async def _keep_browser_alive(self, interval: int) -> None:
+        """定时刷新沙箱浏览器的最近使用时间，避免沙箱的空闲维护在有人观看实时画面时停止浏览器"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.ensure_browser()
+            except Exception as e:
+                logger.warning(f"沙箱[{self.id}]刷新浏览器使用时间失败: {str(e)}")
+
+    async def live_view(self) -> AsyncGenerator[bytes, None]:
+        """通过CDP录屏获取沙箱浏览器的实时画面，观看期间视为浏览器在使用中(页面静止时不会产生新帧)"""
+        await self.ensure_browser()
+        settings = get_settings()
+        screencast = BrowserScreencast(
+            self.cdp_url,
+            max_fps=settings.browser_live_view_max_fps,
+            quality=settings.browser_live_view_quality,
+        )
+        keepalive = asyncio.create_task(self._keep_browser_alive(settings.browser_live_view_keepalive_seconds))
+        try:
+            async for frame in screencast.frames():
+                yield frame
+        finally:
+            keepalive.cancel()
+
     async def get_browser(self) -> Browser:
-        """获取沙箱中的浏览器实例"""
-        return PlaywrightBrowser(self.cdp_url)
+        """获取沙箱中的浏览器实例，浏览器按需启动，返回前会等待其就绪"""
+        await self.ensure_browser()
+        settings = get_settings()
+        return PlaywrightBrowser(
+            self.cdp_url,
+            page_encoding=settings.browser_page_encoding,
+            token_budget=settings.browser_page_token_budget,
+            maintain_hook=self.maintain_browser,
+        )
+
+    async def maintain_browser(self) -> bool:
+        """在工具调用间隙执行沙箱浏览器卫生检查(清理过期标签页/内存超限回收)，返回浏览器是否被重启"""
+        # 1.调用沙箱接口执行检查
+        response = await self.client.post(f"{self._base_url}/api/browser/maintain", timeout=120)
+        tool_result = ToolResult.from_sandbox(**response.json())
+        if not tool_result.success:
+            logger.warning(f"沙箱浏览器卫生检查失败: {tool_result.message}")
+            return False
+
+        # 2.记录内存与回收指标，方便评估沙箱规格
+        data = tool_result.data or {}
+        metrics = get_metrics()
+        metrics.observe("sandbox_browser_rss_mb", data.get("rss_mb", 0))
+        metrics.observe("sandbox_browser_tabs", len(data.get("tabs", [])))
+        if data.get("closed_tabs"):
+            metrics.incr("sandbox_browser_closed_tabs", len(data["closed_tabs"]))
+        if data.get("restarted"):
+            metrics.incr("sandbox_browser_recycles")
+
+        return bool(data.get("restarted"))
 
     async def ensure_sandbox(self) -> None:
         """确保沙箱一定存在/服务全部都开启了裁执行后续步骤"""
@@ -259,7 +330,9 @@ class DockerSandbox(Sandbox):
                     service_name = service.get("name", "unknown")
                     state_name = service.get("statename", "")
 
-                    # 8.判断state_name是不是RUNNING
+                    # 8.判断state_name是不是RUNNING(按需启动的进程未启动时为STOPPED)
+                    if state_name == "STOPPED" and service_name in LAZY_SERVICES:
+                        continue
                     if state_name != "RUNNING":
                         all_running = False
                         non_running_services.append(f"{service_name}({state_name})")
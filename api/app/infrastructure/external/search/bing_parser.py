@@ -0,0 +1,289 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 17:40
+#Author  :Emcikem
+@File    :bing_parser.py
+"""
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import List, Tuple, Optional
+
+from bs4 import BeautifulSoup, Tag
+
+from app.domain.models.search import SearchResultItem
+
+"""
+Bing搜索结果解析器设计思路：
+1.之前使用BeautifulSoup纯Python实现的html.parser构建整棵树，并且每个结果条目都会执行多次find_all+正则扫描，
+    解析耗时在高并发搜索时会阻塞事件循环；
+2.将解析逻辑抽象为可插拔的解析器后端：
+    - lxml: 直接使用lxml(C实现)构建树并遍历，速度最快；
+    - soup: 使用BeautifulSoup，树构建器可选lxml/html.parser，兼容原始实现；
+3.每个结果条目只遍历一次子孙节点，在一次遍历中同时收集标题、兜底标题、摘要候选，不再重复find_all；
+4.lxml为可选依赖，未安装时自动回退到BeautifulSoup+html.parser；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 摘要元素的类名前缀(例如b_lineclamp2/b_lineclamp3)
+SNIPPET_CLASSES = ("b_lineclamp", "b_descript", "b_caption")
+
+# 结果总数元素的类名前缀
+COUNT_CLASSES = ("sb_count", "b_focusTextMedium")
+
+# 结果总数正则
+TOTAL_RESULTS_PATTERN = re.compile(r"([\d,]+)\s*results")
+
+# 句子分割正则
+SENTENCE_PATTERN = re.compile(r"[.!?\n。！]")
+
+try:
+    from lxml import html as lxml_html
+
+    LXML_AVAILABLE = True
+except ImportError:
+    lxml_html = None
+    LXML_AVAILABLE = False
+
+
+def normalize_url(url: str) -> str:
+    """补全相对路径的url链接或者是缺失的协议"""
+    if url and not url.startswith("http"):
+        if url.startswith("//"):
+            return "https:" + url
+        if url.startswith("/"):
+            return "https://www.bing.com" + url
+    return url
+
+
+def parse_total_results(text: str) -> int:
+    """从文本中提取结果总数"""
+    match = TOTAL_RESULTS_PATTERN.search(text)
+    if match:
+        try:
+            return int(match.group(1).replace(",", ""))
+        except ValueError:
+            return 0
+    return 0
+
+
+def has_class(classes: List[str], prefixes: Tuple[str, ...]) -> bool:
+    """判断类名列表中是否存在以指定前缀开头的类名"""
+    return any(class_name.startswith(prefixes) for class_name in classes)
+
+
+def pick_sentence(all_text: str, title: str) -> str:
+    """摘要兜底逻辑: 将条目的所有文本按句子拆分，取第一个足够长且不等于标题的句子"""
+    for sentence in SENTENCE_PATTERN.split(all_text):
+        clean_sentence = sentence.strip()
+        if len(clean_sentence) > 20 and clean_sentence != title:
+            return clean_sentence
+    return ""
+
+
+class BingResultParser(ABC):
+    """Bing搜索结果解析器基类"""
+    name: str = ""
+
+    @abstractmethod
+    def parse(self, html: str) -> Tuple[List[SearchResultItem], int]:
+        """解析Bing搜索结果页，返回结果条目列表以及结果总数"""
+        raise NotImplementedError
+
+
+class SoupBingParser(BingResultParser):
+    """基于BeautifulSoup的解析器，树构建器可选lxml/html.parser"""
+
+    def __init__(self, features: str = "html.parser") -> None:
+        """构造函数，完成解析器初始化"""
+        self.features = features
+        self.name = f"soup[{features}]"
+
+    @classmethod
+    def _parse_item(cls, item: Tag) -> Optional[SearchResultItem]:
+        """一次遍历条目的所有子孙节点，提取标题、链接与摘要"""
+        title, url = "", ""
+        fallback_title, fallback_url = "", ""
+        class_snippet, p_snippet = "", ""
+
+        for node in item.descendants:
+            if not isinstance(node, Tag):
+                continue
+            name = node.name
+
+            # 1.h2下的第一个a标签作为标题
+            if name == "h2" and not title:
+                a_tag = node.find("a")
+                if a_tag:
+                    title = a_tag.get_text(strip=True)
+                    url = a_tag.get("href", "")
+            # 2.文本长度大于10且不是链接的a标签作为兜底标题
+            elif name == "a" and not fallback_title:
+                text = node.get_text(strip=True)
+                if len(text) > 10 and not text.startswith("http"):
+                    fallback_title, fallback_url = text, node.get("href", "")
+            # 3.带有摘要类名的p/div作为摘要，其次是文本长度大于20的p标签
+            if name in ("p", "div") and not class_snippet and has_class(node.get("class") or [], SNIPPET_CLASSES):
+                class_snippet = node.get_text(strip=True)
+            elif name == "p" and not p_snippet:
+                text = node.get_text(strip=True)
+                if len(text) > 20:
+                    p_snippet = text
+
+        if not title:
+            title, url = fallback_title, fallback_url
+        if not title:
+            return None
+
+        snippet = class_snippet or p_snippet or pick_sentence(item.get_text(strip=True), title)
+        return SearchResultItem(url=normalize_url(url), title=title, snippet=snippet)
+
+    def parse(self, html: str) -> Tuple[List[SearchResultItem], int]:
+        soup = BeautifulSoup(html, self.features)
+
+        # 1.解析结果条目
+        results = []
+        for item in soup.find_all("li", class_="b_algo"):
+            try:
+                result = self._parse_item(item)
+                if result:
+                    results.append(result)
+            except Exception as e:
+                logger.warning(f"Bing搜索结果解析失败: {str(e)}")
+
+        # 2.解析结果总数
+        total_results = 0
+        count_elements = soup.find_all(
+            ["span", "p", "div"],
+            class_=lambda value: bool(value) and value.startswith(COUNT_CLASSES),
+        )
+        for element in count_elements:
+            total_results = parse_total_results(element.get_text(strip=True))
+            if total_results:
+                break
+
+        return results, total_results
+
+
+class LxmlBingParser(BingResultParser):
+    """基于lxml(C实现)的解析器"""
+    name: str = "lxml"
+
+    @classmethod
+    def _text(cls, element) -> str:
+        """与BeautifulSoup的get_text(strip=True)保持一致: 拼接每一段去除首尾空白的文本"""
+        return "".join(text.strip() for text in element.itertext())
+
+    @classmethod
+    def _classes(cls, element) -> List[str]:
+        """获取元素的类名列表"""
+        class_attr = element.get("class")
+        return class_attr.split() if class_attr else []
+
+    def _parse_item(self, item) -> Optional[SearchResultItem]:
+        """一次遍历条目的所有子孙节点，提取标题、链接与摘要"""
+        title, url = "", ""
+        fallback_title, fallback_url = "", ""
+        class_snippet, p_snippet = "", ""
+
+        for node in item.iterdescendants():
+            name = node.tag
+            if not isinstance(name, str):
+                continue
+
+            # 1.h2下的第一个a标签作为标题
+            if name == "h2" and not title:
+                a_tag = next(node.iter("a"), None)
+                if a_tag is not None:
+                    title = self._text(a_tag)
+                    url = a_tag.get("href", "")
+            # 2.文本长度大于10且不是链接的a标签作为兜底标题
+            elif name == "a" and not fallback_title:
+                text = self._text(node)
+                if len(text) > 10 and not text.startswith("http"):
+                    fallback_title, fallback_url = text, node.get("href", "")
+            # 3.带有摘要类名的p/div作为摘要，其次是文本长度大于20的p标签
+            if name in ("p", "div") and not class_snippet and has_class(self._classes(node), SNIPPET_CLASSES):
+                class_snippet = self._text(node)
+            elif name == "p" and not p_snippet:
+                text = self._text(node)
+                if len(text) > 20:
+                    p_snippet = text
+
+        if not title:
+            title, url = fallback_title, fallback_url
+        if not title:
+            return None
+
+        snippet = class_snippet or p_snippet or pick_sentence(self._text(item), title)
+        return SearchResultItem(url=normalize_url(url), title=title, snippet=snippet)
+
+    def parse(self, html: str) -> Tuple[List[SearchResultItem], int]:
+        if not html.strip():
+            return [], 0
+        tree = lxml_html.fromstring(html)
+
+        # 1.一次遍历li/span/p/div元素，同时收集结果条目与结果总数
+        results = []
+        total_results = 0
+        for element in tree.iter("li", "span", "p", "div"):
+            classes = self._classes(element)
+            if not classes:
+                continue
+            if element.tag == "li" and "b_algo" in classes:
+                try:
+                    result = self._parse_item(element)
+                    if result:
+                        results.append(result)
+                except Exception as e:
+                    logger.warning(f"Bing搜索结果解析失败: {str(e)}")
+            elif not total_results and element.tag != "li" and has_class(classes, COUNT_CLASSES):
+                total_results = parse_total_results(self._text(element))
+
+        return results, total_results
+
+
+def create_bing_parser(backend: str = "auto") -> BingResultParser:
+    """根据后端名字创建解析器: auto/lxml/soup-lxml/soup，未安装lxml时回退到soup"""
+    if backend in ("auto", "lxml", "soup-lxml") and not LXML_AVAILABLE:
+        logger.warning(f"未安装lxml, Bing解析器[{backend}]回退为BeautifulSoup+html.parser")
+        return SoupBingParser("html.parser")
+    if backend in ("auto", "lxml"):
+        return LxmlBingParser()
+    if backend == "soup-lxml":
+        return SoupBingParser("lxml")
+    return SoupBingParser("html.parser")
+
+
+if __name__ == "__main__":
+    # 解析基准测试，传递保存的Bing结果页目录(*.html)，未传递时使用本地替身服务生成的页面:
+    # python -m app.infrastructure.external.search.bing_parser ./bing_pages
+    import sys
+    import time
+    from pathlib import Path
+
+    from app.infrastructure.external.search.bing_stub_server import render_bing_page
+
+    # 1.加载测试页面
+    if len(sys.argv) > 1:
+        pages = [path.read_text(encoding="utf-8") for path in sorted(Path(sys.argv[1]).glob("*.html"))]
+    else:
+        pages = [render_bing_page(f"query {i}", result_count=10) for i in range(20)]
+    print(f"测试页面数: {len(pages)}, 平均大小: {sum(len(page) for page in pages) // max(len(pages), 1)}字符")
+
+    # 2.依次测试各个解析器后端
+    rounds = 20
+    backends = ["soup"] + (["soup-lxml", "lxml"] if LXML_AVAILABLE else [])
+    baseline = None
+    for backend in backends:
+        parser = create_bing_parser(backend)
+        start_time = time.perf_counter()
+        for _ in range(rounds):
+            for page in pages:
+                items, total = parser.parse(page)
+        elapsed_ms = (time.perf_counter() - start_time) * 1000 / (rounds * len(pages))
+        baseline = baseline or elapsed_ms
+        print(f"{parser.name:<20} 每页耗时: {elapsed_ms:.2f}ms, 加速比: {baseline / elapsed_ms:.1f}x, "
+              f"最后一页条目数: {len(items)}, 总数: {total}")
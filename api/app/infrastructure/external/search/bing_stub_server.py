@@ -0,0 +1,176 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 17:58
+#Author  :Emcikem
+@File    :bing_stub_server.py
+"""
+import html
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Optional, List
+from urllib.parse import urlparse, parse_qs
+
+"""
+Bing本地替身服务设计思路：
+1.端到端测试BingSearchEngine时不应该依赖真实的Bing(有网络波动、风控、结果不稳定等问题)；
+2.替身服务基于标准库ThreadingHTTPServer实现，监听本地端口并模拟/search接口，
+    可以返回目录中保存的真实Bing结果页(按请求顺序轮流返回)，未提供目录时按query生成结构一致的结果页；
+3.配置BING_SEARCH_BASE_URL=http://127.0.0.1:<port>/search即可让搜索引擎请求替身服务；
+4.支持注入响应延迟与错误状态码(运行中也可以修改)，用于测试多后端搜索的对冲请求与熔断逻辑；
+"""
+
+
+def render_bing_page(query: str, result_count: int = 10, total_results: int = 1234567) -> str:
+    """生成与Bing结果页结构一致的HTML页面"""
+    escaped_query = html.escape(query)
+    items = []
+    for i in range(result_count):
+        items.append(f"""
+        <li class="b_algo" data-id="{i}">
+            <div class="b_tpcn"><a class="tilk" href="https://example{i}.com/"><div class="tptxt">example{i}.com</div></a></div>
+            <h2><a href="https://example{i}.com/{escaped_query.replace(' ', '-')}/{i}" h="ID=SERP,{i}">
+                {escaped_query} - 第{i + 1}条搜索结果标题</a></h2>
+            <div class="b_caption">
+                <p class="b_lineclamp2"><span class="news_dt">2026-10-19</span>&ensp;&#0183;&#32;
+                    这是关于{escaped_query}的第{i + 1}条搜索结果摘要，包含足够长的描述文本用于测试解析逻辑。</p>
+            </div>
+            <div class="b_attribution"><cite>https://example{i}.com</cite></div>
+        </li>""")
+
+    return f"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head><meta charset="utf-8"/><title>{escaped_query} - Search</title></head>
+<body>
+<div id="b_header"><form action="/search"><input name="q" value="{escaped_query}"/></form></div>
+<div id="b_content">
+    <main aria-label="Search Results">
+        <div id="b_tween"><span class="sb_count">About {total_results:,} results</span></div>
+        <ol id="b_results">{"".join(items)}
+            <li class="b_pag"><nav><a href="/search?q={escaped_query}&first=11">Next</a></nav></li>
+        </ol>
+    </main>
+</div>
+</body>
+</html>"""
+
+
+class BingStubServer:
+    """Bing搜索本地替身服务"""
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            pages_dir: Optional[str] = None,
+            delay: float = 0.0,  # 每次响应前的延迟(秒)
+            status_code: int = 200,  # 响应状态码，非200时返回错误页
+    ) -> None:
+        """构造函数，port为0时随机分配端口"""
+        self.delay = delay
+        self.status_code = status_code
+        self._pages: List[str] = []
+        if pages_dir:
+            self._pages = [path.read_text(encoding="utf-8") for path in sorted(Path(pages_dir).glob("*.html"))]
+        self._page_index = 0
+        self._lock = threading.Lock()
+        self.request_count = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 开启keep-alive，用于验证连接复用
+
+            def do_GET(self) -> None:
+                # 1.只模拟/search接口
+                parsed = urlparse(self.path)
+                if parsed.path != "/search":
+                    self.send_error(404)
+                    return
+
+                # 2.注入延迟与错误状态码
+                if stub.delay > 0:
+                    time.sleep(stub.delay)
+                if stub.status_code != 200:
+                    self.send_error(stub.status_code)
+                    return
+
+                # 3.生成结果页并返回
+                query = parse_qs(parsed.query).get("q", [""])[0]
+                body = stub.next_page(query).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端取消了请求(例如对冲请求落败)
+                    pass
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """替身服务的搜索地址"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/search"
+
+    def next_page(self, query: str) -> str:
+        """获取下一个结果页: 有保存的页面时轮流返回，否则按query生成"""
+        with self._lock:
+            self.request_count += 1
+            if not self._pages:
+                return render_bing_page(query)
+            page = self._pages[self._page_index % len(self._pages)]
+            self._page_index += 1
+            return page
+
+    def start(self) -> "BingStubServer":
+        """在后台线程中启动替身服务"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止替身服务"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    # 端到端测试: 启动替身服务并使用BingSearchEngine并发查询，验证连接复用与解析结果
+    # python -m app.infrastructure.external.search.bing_stub_server [保存的Bing结果页目录]
+    import asyncio
+    import sys
+
+    from app.infrastructure.external.search.bing_search import BingSearchEngine
+
+
+    async def main():
+        server = BingStubServer(pages_dir=sys.argv[1] if len(sys.argv) > 1 else None).start()
+        engine = BingSearchEngine(base_url=server.base_url)
+        try:
+            # 1.并发发起查询
+            concurrency = 50
+            start_time = time.perf_counter()
+            results = await asyncio.gather(*[engine.invoke(f"query {i}") for i in range(concurrency)])
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+            # 2.输出结果统计
+            success = sum(1 for result in results if result.success)
+            print(f"并发查询: {concurrency}, 成功: {success}, 总耗时: {elapsed_ms:.0f}ms, 解析器: {engine.parser.name}")
+            print(f"第一条查询结果数: {len(results[0].data.results)}, 总数: {results[0].data.total_results}")
+            print(results[0].data.results[0] if results[0].data.results else "无结果")
+        finally:
+            await engine.aclose()
+            server.stop()
+
+
+    asyncio.run(main())
@@ -0,0 +1,286 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 18:20
+#Author  :Emcikem
+@File    :cached_search.py
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import unicodedata
+import uuid
+from typing import Optional, Dict, Any
+
+from app.domain.external.search import SearchEngine
+from app.domain.models.search import SearchResults
+from app.domain.models.tool_result import ToolResult
+from app.infrastructure.storage.redis import RedisClient
+from core.metrics import get_metrics
+
+"""
+集群级搜索结果缓存设计思路：
+1.不同会话中的Agent经常会发起相同或者几乎相同的search_web查询，每一次都会请求到上游搜索引擎，
+    这里提供一个包装任意SearchEngine实现的Redis缓存，所有API实例共享同一份缓存；
+2.缓存键由归一化后的(query, date_range)生成：NFKC归一化(全角转半角)、转小写、压缩空白、去除末尾标点；
+3.每个date_range对应不同的新鲜期(past_hour只缓存几分钟，all可以缓存一天)，
+    超过新鲜期但仍在陈旧窗口内的结果会先返回旧值，同时在后台重新请求上游(stale-while-revalidate)；
+4.请求合并(single-flight)分两层：
+    - 进程内: 相同的键只会有一个请求在飞行中，其余协程等待同一个Future；
+    - 集群内: 通过Redis SET NX实现短租期锁，未抢到锁的实例轮询缓存等待结果，超时后才自己请求上游；
+5.只缓存成功的结果，Redis不可用时自动降级为直接请求上游；
+    上游可能临时返回空结果，空结果只缓存很短的时间(empty_ttl_seconds)且没有陈旧窗口，避免长时间固定返回空结果；
+6.缓存条目中记录了上游请求耗时，命中时据此统计节省的耗时，并导出命中率指标；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 不同时间筛选范围对应的缓存新鲜期(秒)
+DEFAULT_TTLS: Dict[str, int] = {
+    "past_hour": 5 * 60,
+    "past_day": 30 * 60,
+    "past_week": 6 * 60 * 60,
+    "past_month": 12 * 60 * 60,
+    "past_year": 24 * 60 * 60,
+    "all": 24 * 60 * 60,
+}
+
+# 查询末尾可以忽略的标点
+TRAILING_PUNCTUATION = " ?？.。!！,，;；"
+
+# 释放锁脚本，只有锁的持有者才能删除锁
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询，使得几乎相同的查询命中同一个缓存键"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    return " ".join(query.split()).strip(TRAILING_PUNCTUATION)
+
+
+class CachedSearchEngine(SearchEngine):
+    """基于Redis的搜索结果缓存，可包装任意搜索引擎"""
+
+    def __init__(
+            self,
+            search_engine: SearchEngine,
+            redis_client: RedisClient,
+            ttls: Optional[Dict[str, int]] = None,  # date_range->新鲜期(秒)
+            stale_seconds: int = 60 * 60,  # 超过新鲜期后仍可返回旧值的时间窗口(秒)
+            empty_ttl_seconds: int = 60,  # 空结果的缓存时间(秒)
+            lock_seconds: float = 15.0,  # 集群锁租期，同时也是等待其他实例结果的最长时间(秒)
+            poll_interval: float = 0.1,  # 等待其他实例结果时的轮询间隔(秒)
+            key_prefix: str = "search:cache",
+    ) -> None:
+        """构造函数，完成搜索缓存的初始化"""
+        self._search_engine = search_engine
+        self._redis_client = redis_client
+        self._ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self._stale_seconds = stale_seconds
+        self._empty_ttl_seconds = empty_ttl_seconds
+        self._lock_seconds = lock_seconds
+        self._poll_interval = poll_interval
+        self._key_prefix = key_prefix
+        self._inflight: Dict[str, asyncio.Future] = {}  # 缓存键->进程内飞行中的请求
+        self._revalidating: set = set()  # 后台重新验证任务引用，避免任务被回收
+        self._lookups = 0  # 总查询次数
+        self._hits = 0  # 命中次数(包含返回旧值)
+
+    def _build_key(self, query: str, date_range: Optional[str]) -> str:
+        """根据归一化的(query, date_range)构建缓存键"""
+        raw = f"{normalize_query(query)}\n{date_range or 'all'}"
+        return f"{self._key_prefix}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def _get_ttl(self, date_range: Optional[str]) -> int:
+        """获取date_range对应的新鲜期"""
+        return self._ttls.get(date_range or "all", self._ttls["all"])
+
+    def _record_lookup(self, result: str) -> None:
+        """记录查询结果(hit/stale/miss)并更新命中率"""
+        self._lookups += 1
+        if result != "miss":
+            self._hits += 1
+        metrics = get_metrics()
+        metrics.incr("search_cache_requests", result=result)
+        metrics.set_gauge("search_cache_hit_ratio", self._hits / self._lookups)
+
+    async def _read(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目，Redis不可用时返回None"""
+        try:
+            value = await self._redis_client.client.get(key)
+            return json.loads(value) if value else None
+        except Exception as e:
+            logger.warning(f"读取搜索缓存[{key}]失败: {str(e)}")
+            return None
+
+    async def _write(self, key: str, date_range: Optional[str], data: SearchResults, latency_ms: float) -> None:
+        """写入缓存条目，过期时间为新鲜期+陈旧窗口，空结果只缓存empty_ttl_seconds且不返回旧值"""
+        # 1.计算新鲜期与过期时间
+        if data.results:
+            ttl = self._get_ttl(date_range)
+            expire = ttl + self._stale_seconds
+        else:
+            ttl = expire = self._empty_ttl_seconds
+
+        # 2.写入缓存条目，条目中记录新鲜期
+        entry = {"fetched_at": time.time(), "latency_ms": latency_ms, "ttl": ttl, "data": data.model_dump(mode="json")}
+        try:
+            await self._redis_client.client.set(key, json.dumps(entry, ensure_ascii=False), ex=expire)
+        except Exception as e:
+            logger.warning(f"写入搜索缓存[{key}]失败: {str(e)}")
+
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        """尝试获取集群锁，成功返回锁令牌，Redis不可用时同样视为获取成功"""
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._redis_client.client.set(
+                f"{key}:lock", token, nx=True, px=int(self._lock_seconds * 1000),
+            )
+            return token if acquired else None
+        except Exception as e:
+            logger.warning(f"获取搜索缓存锁[{key}]失败: {str(e)}")
+            return token
+
+    async def _release_lock(self, key: str, token: str) -> None:
+        """释放集群锁"""
+        try:
+            await self._redis_client.client.eval(RELEASE_LOCK_SCRIPT, 1, f"{key}:lock", token)
+        except Exception as e:
+            logger.warning(f"释放搜索缓存锁[{key}]失败: {str(e)}")
+
+    async def _wait_for_peer(self, key: str, newer_than: float) -> Optional[Dict[str, Any]]:
+        """等待持有锁的其他实例写入比newer_than更新的缓存条目"""
+        deadline = time.monotonic() + self._lock_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self._poll_interval)
+            entry = await self._read(key)
+            if entry and entry["fetched_at"] > newer_than:
+                return entry
+        return None
+
+    async def _fetch(self, key: str, query: str, date_range: Optional[str], newer_than: float) -> Dict[str, Any]:
+        """在集群锁保护下请求上游并写入缓存，返回的结构与缓存条目一致(失败时包含result字段)"""
+        # 1.未抢到锁说明其他实例正在请求上游，等待其结果
+        token = await self._acquire_lock(key)
+        if token is None:
+            entry = await self._wait_for_peer(key, newer_than)
+            if entry:
+                get_metrics().incr("search_cache_coalesced", scope="cluster")
+                return entry
+            logger.warning(f"等待其他实例的搜索结果超时, 直接请求上游: {query}")
+
+        # 2.请求上游搜索引擎
+        try:
+            start_time = time.perf_counter()
+            result = await self._search_engine.invoke(query, date_range)
+            latency_ms = (time.perf_counter() - start_time) * 1000
+            get_metrics().observe("search_upstream_latency_ms", latency_ms)
+
+            # 3.只缓存成功的结果
+            if result.success and result.data:
+                await self._write(key, date_range, result.data, latency_ms)
+            return {"fetched_at": time.time(), "latency_ms": latency_ms, "result": result}
+        finally:
+            if token is not None:
+                await self._release_lock(key, token)
+
+    async def _single_flight(self, key: str, query: str, date_range: Optional[str], newer_than: float = 0.0):
+        """进程内请求合并，相同的键只会有一个请求在飞行中"""
+        future = self._inflight.get(key)
+        if future is not None:
+            get_metrics().incr("search_cache_coalesced", scope="local")
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._fetch(key, query, date_range, newer_than))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    def _revalidate(self, key: str, query: str, date_range: Optional[str], fetched_at: float) -> None:
+        """在后台重新请求上游刷新旧值"""
+        if key in self._inflight:
+            return
+
+        async def revalidate():
+            try:
+                await self._single_flight(key, query, date_range, fetched_at)
+            except Exception as e:
+                logger.warning(f"后台刷新搜索缓存失败: {str(e)}")
+
+        task = asyncio.create_task(revalidate())
+        self._revalidating.add(task)
+        task.add_done_callback(self._revalidating.discard)
+
+    @classmethod
+    def _to_result(cls, entry: Dict[str, Any], query: str, date_range: Optional[str]) -> ToolResult[SearchResults]:
+        """将缓存条目转换成工具结果，查询保持为调用方传递的原始查询"""
+        if "result" in entry:
+            result = entry["result"]
+            if result.data:
+                result = result.model_copy(update={"data": result.data.model_copy(update={"query": query})})
+            return result
+        data = SearchResults.model_validate(entry["data"])
+        return ToolResult(success=True, data=data.model_copy(update={"query": query, "date_range": date_range}))
+
+    async def invoke(self, query: str, date_range: Optional[str] = None) -> ToolResult[SearchResults]:
+        """先查询缓存，未命中时合并请求上游"""
+        key = self._build_key(query, date_range)
+
+        # 1.读取缓存条目并判断是否在新鲜期内
+        entry = await self._read(key)
+        if entry:
+            age = time.time() - entry["fetched_at"]
+            if age < entry.get("ttl", self._get_ttl(date_range)):
+                self._record_lookup("hit")
+            else:
+                # 2.超过新鲜期则返回旧值并在后台刷新
+                self._record_lookup("stale")
+                self._revalidate(key, query, date_range, entry["fetched_at"])
+            get_metrics().observe("search_cache_saved_ms", entry.get("latency_ms", 0.0))
+            return self._to_result(entry, query, date_range)
+
+        # 3.未命中则合并请求上游
+        self._record_lookup("miss")
+        entry = await self._single_flight(key, query, date_range)
+        return self._to_result(entry, query, date_range)
+
+
+if __name__ == "__main__":
+    # 使用本地Bing替身服务+本地Redis验证缓存命中与请求合并:
+    # python -m app.infrastructure.external.search.cached_search
+    from app.infrastructure.external.search.bing_search import BingSearchEngine
+    from app.infrastructure.external.search.bing_stub_server import BingStubServer
+    from app.infrastructure.storage.redis import get_redis
+
+
+    async def main():
+        server = BingStubServer()
+        server.start()
+        redis_client = get_redis()
+        await redis_client.init()
+        engine = BingSearchEngine(base_url=server.base_url)
+        cached_engine = CachedSearchEngine(engine, redis_client, key_prefix=f"search:cache:test:{uuid.uuid4().hex}")
+
+        # 1.50个并发的几乎相同的查询只会请求一次上游
+        queries = [f"Python asyncio{'?' * (i % 3)}" if i % 2 else "  python   ASYNCIO " for i in range(50)]
+        results = await asyncio.gather(*[cached_engine.invoke(query) for query in queries])
+        print(f"成功数: {sum(result.success for result in results)}, 上游请求数: {server.request_count}")
+
+        # 2.再次查询直接命中缓存
+        await cached_engine.invoke("python asyncio")
+        print(f"命中后上游请求数: {server.request_count}")
+        print(get_metrics().snapshot())
+
+        await engine.aclose()
+        await redis_client.shutdown()
+        server.stop()
+
+
+    asyncio.run(main())
@@ -0,0 +1,381 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 19:05
+#Author  :Emcikem
+@File    :multi_search.py
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import List, Optional, Dict, Deque, Tuple
+
+from app.domain.external.search import SearchEngine
+from app.domain.models.search import SearchResults, SearchResultItem
+from app.domain.models.tool_result import ToolResult
+from core.metrics import get_metrics
+
+"""
+多后端搜索设计思路：
+1.之前SearchTool只对接了一个BingSearchEngine，上游变慢或者被风控时所有搜索都会变慢甚至失败，
+    这里提供一个组合搜索引擎，按优先级对接多个后端，本身同样实现SearchEngine协议；
+2.first策略(默认)：先请求第一个可用后端，超过该后端历史耗时的分位数(例如p90)仍未返回时，
+    向下一个后端发送对冲请求，任意一个后端返回有效结果即取消其余请求并返回；后端失败时立即切换到下一个后端；
+3.fuse策略：同时请求所有可用后端，在截止时间内收集结果，使用倒数排名融合(RRF)合并去重；
+4.每个后端都有独立的熔断器：连续失败达到阈值后熔断一段时间，期间不再请求该后端，
+    冷却结束后进入半开状态只放行一个探测请求，成功则恢复，失败则继续熔断；
+5.整个搜索有统一的截止时间，超时仍未返回的后端记为失败；
+6.可以使用多个带延迟/错误注入的Bing替身服务在本地验证对冲与熔断逻辑；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 倒数排名融合常数
+RRF_K = 60
+
+
+class CircuitBreaker:
+    """后端熔断器: closed(正常)->open(熔断)->half_open(探测)"""
+
+    def __init__(self, failure_threshold: int = 3, reset_seconds: float = 30.0) -> None:
+        """构造函数，完成熔断器的初始化"""
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._failures = 0  # 连续失败次数
+        self._opened_at: Optional[float] = None  # 熔断开始时间
+        self._probing = False  # 半开状态下是否已有探测请求
+
+    @property
+    def state(self) -> str:
+        """熔断器当前状态"""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self._reset_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """判断是否允许请求，半开状态只放行一个探测请求"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """记录成功，恢复为closed"""
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        """记录失败，连续失败达到阈值或者探测失败时熔断"""
+        self._failures += 1
+        if self._probing or self._failures >= self._failure_threshold:
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self) -> None:
+        """请求被取消(对冲请求落败)时释放探测名额，不计入成功或失败"""
+        self._probing = False
+
+
+class SearchBackend:
+    """多后端搜索中的单个后端，记录熔断器与历史耗时"""
+
+    def __init__(self, name: str, engine: SearchEngine, breaker: Optional[CircuitBreaker] = None) -> None:
+        """构造函数，完成后端的初始化"""
+        self.name = name
+        self.engine = engine
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies: Deque[float] = deque(maxlen=100)  # 最近成功请求的耗时(秒)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """计算历史耗时的分位数，样本不足时返回None"""
+        if len(self.latencies) < 5:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(percentile * (len(values) - 1)))]
+
+
+class MultiSearchEngine(SearchEngine):
+    """多后端组合搜索引擎，支持对冲请求、结果融合与熔断"""
+
+    def __init__(
+            self,
+            backends: List[SearchBackend],
+            strategy: str = "first",  # first: 返回第一个有效结果, fuse: 截止时间内融合所有后端结果
+            deadline: float = 10.0,  # 整个搜索的截止时间(秒)
+            hedge_percentile: float = 0.9,  # 超过该分位数耗时后发送对冲请求
+            default_hedge_delay: float = 1.5,  # 历史样本不足时的对冲延迟(秒)
+            min_hedge_delay: float = 0.05,  # 对冲延迟下限(秒)
+    ) -> None:
+        """构造函数，完成多后端搜索引擎的初始化"""
+        if not backends:
+            raise ValueError("多后端搜索至少需要配置一个后端")
+        self._backends = backends
+        self._strategy = strategy
+        self._deadline = deadline
+        self._hedge_percentile = hedge_percentile
+        self._default_hedge_delay = default_hedge_delay
+        self._min_hedge_delay = min_hedge_delay
+
+    def _hedge_delay(self, backend: SearchBackend) -> float:
+        """计算向下一个后端发送对冲请求前的等待时间"""
+        delay = backend.latency_percentile(self._hedge_percentile)
+        if delay is None:
+            delay = self._default_hedge_delay
+        return max(self._min_hedge_delay, delay)
+
+    @classmethod
+    def _is_good(cls, result: ToolResult[SearchResults]) -> bool:
+        """判断结果是否为有效结果(成功并且有搜索条目)"""
+        return result.success and result.data is not None and len(result.data.results) > 0
+
+    @classmethod
+    def _update_circuit_gauge(cls, backend: SearchBackend) -> None:
+        """更新后端熔断状态指标"""
+        get_metrics().set_gauge("search_backend_circuit_open", int(backend.breaker.state != "closed"),
+                                backend=backend.name)
+
+    async def _call_backend(
+            self,
+            backend: SearchBackend,
+            query: str,
+            date_range: Optional[str],
+    ) -> ToolResult[SearchResults]:
+        """请求单个后端并记录耗时与熔断状态，异常会被转换为失败的工具结果"""
+        metrics = get_metrics()
+        start_time = time.perf_counter()
+        try:
+            result = await backend.engine.invoke(query, date_range)
+        except asyncio.CancelledError:
+            backend.breaker.release()
+            metrics.incr("search_backend_requests", backend=backend.name, status="cancelled")
+            raise
+        except Exception as e:
+            result = ToolResult(success=False, message=f"{backend.name}搜索出错: {str(e)}")
+        latency = time.perf_counter() - start_time
+
+        # 上游返回成功即视为后端健康，结果为空不计入失败
+        if result.success:
+            backend.breaker.record_success()
+            backend.latencies.append(latency)
+            metrics.observe("search_backend_latency_ms", latency * 1000, backend=backend.name)
+            metrics.incr("search_backend_requests", backend=backend.name, status="success")
+        else:
+            backend.breaker.record_failure()
+            metrics.incr("search_backend_requests", backend=backend.name, status="failure")
+        self._update_circuit_gauge(backend)
+        return result
+
+    def _cancel_pending(self, pending: Dict[asyncio.Task, SearchBackend], timed_out: bool) -> None:
+        """取消未完成的后端请求，超过截止时间的请求记为失败"""
+        for task, backend in pending.items():
+            if timed_out:
+                backend.breaker.record_failure()
+                get_metrics().incr("search_backend_timeouts", backend=backend.name)
+                self._update_circuit_gauge(backend)
+            task.cancel()
+
+    async def _invoke_first(
+            self,
+            backends: List[SearchBackend],
+            query: str,
+            date_range: Optional[str],
+    ) -> Tuple[Optional[str], Optional[ToolResult[SearchResults]]]:
+        """按优先级请求后端并在超过耗时分位数后发送对冲请求，返回(胜出后端, 结果)"""
+        metrics = get_metrics()
+        deadline = time.monotonic() + self._deadline
+        remaining = list(backends)
+        pending: Dict[asyncio.Task, SearchBackend] = {}
+        fallback: Tuple[Optional[str], Optional[ToolResult[SearchResults]]] = (None, None)
+        next_hedge_at = 0.0
+
+        def launch(hedged: bool) -> None:
+            nonlocal next_hedge_at
+            backend = remaining.pop(0)
+            pending[asyncio.create_task(self._call_backend(backend, query, date_range))] = backend
+            next_hedge_at = time.monotonic() + self._hedge_delay(backend)
+            if hedged:
+                metrics.incr("search_hedges", backend=backend.name)
+
+        try:
+            # 1.请求第一个可用后端
+            launch(hedged=False)
+            while pending or remaining:
+                # 2.超过截止时间则取消所有飞行中的请求
+                now = time.monotonic()
+                if now >= deadline:
+                    self._cancel_pending(pending, timed_out=True)
+                    break
+
+                # 3.没有飞行中的请求(前面的后端都失败了)时立即切换到下一个后端
+                if not pending:
+                    launch(hedged=False)
+                    continue
+
+                # 4.等待请求完成，或者到达对冲时间
+                timeout = deadline - now
+                if remaining:
+                    timeout = min(timeout, max(0.0, next_hedge_at - now))
+                done, _ = await asyncio.wait(pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                # 5.超过对冲时间仍未返回则向下一个后端发送对冲请求
+                if not done:
+                    if remaining and time.monotonic() >= next_hedge_at:
+                        launch(hedged=True)
+                    continue
+
+                # 6.任意后端返回有效结果则取消其余请求并返回
+                for task in done:
+                    backend = pending.pop(task)
+                    result = task.result()
+                    if self._is_good(result):
+                        self._cancel_pending(pending, timed_out=False)
+                        return backend.name, result
+                    if result.success and fallback[1] is None:
+                        fallback = (backend.name, result)
+
+            return fallback
+        finally:
+            # 7.调用方取消搜索时一并取消飞行中的请求，未被请求的后端释放半开状态下占用的探测名额
+            for task in pending:
+                task.cancel()
+            for backend in remaining:
+                backend.breaker.release()
+
+    @classmethod
+    def _fuse(cls, ranked: List[SearchResults], query: str, date_range: Optional[str]) -> SearchResults:
+        """使用倒数排名融合(RRF)合并多个后端的结果，按url去重，同一url保留优先级更高后端的条目"""
+        scores: Dict[str, float] = {}
+        items: Dict[str, SearchResultItem] = {}
+        for results in ranked:
+            for rank, item in enumerate(results.results):
+                key = item.url.rstrip("/").lower()
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+                items.setdefault(key, item)
+
+        fused = sorted(items.keys(), key=lambda key: scores[key], reverse=True)
+        return SearchResults(
+            query=query,
+            date_range=date_range,
+            total_results=max((results.total_results for results in ranked), default=0),
+            results=[items[key] for key in fused],
+        )
+
+    async def _invoke_fuse(
+            self,
+            backends: List[SearchBackend],
+            query: str,
+            date_range: Optional[str],
+    ) -> Tuple[Optional[str], Optional[ToolResult[SearchResults]]]:
+        """同时请求所有可用后端，在截止时间内融合所有成功的结果"""
+        # 1.同时请求所有后端并等待至截止时间
+        pending = {
+            asyncio.create_task(self._call_backend(backend, query, date_range)): backend
+            for backend in backends
+        }
+        tasks = list(pending.keys())
+        done, _ = await asyncio.wait(tasks, timeout=self._deadline)
+
+        # 2.取消超时的请求
+        for task in done:
+            pending.pop(task)
+        self._cancel_pending(pending, timed_out=True)
+
+        # 3.按后端优先级收集成功的结果并融合
+        succeeded = [task.result().data for task in tasks if task in done and self._is_good(task.result())]
+        if not succeeded:
+            return None, None
+        if len(succeeded) == 1:
+            return "fuse", ToolResult(success=True, data=succeeded[0])
+        return "fuse", ToolResult(success=True, data=self._fuse(succeeded, query, date_range))
+
+    async def invoke(self, query: str, date_range: Optional[str] = None) -> ToolResult[SearchResults]:
+        """根据配置的策略请求多个后端"""
+        metrics = get_metrics()
+
+        # 1.过滤掉熔断中的后端
+        backends = [backend for backend in self._backends if backend.breaker.allow()]
+        if not backends:
+            metrics.incr("search_multi_requests", winner="none")
+            return ToolResult(
+                success=False,
+                message="所有搜索后端均处于熔断状态，请稍后重试",
+                data=SearchResults(query=query, date_range=date_range, total_results=0, results=[]),
+            )
+
+        # 2.按策略请求后端
+        start_time = time.perf_counter()
+        if self._strategy == "fuse":
+            winner, result = await self._invoke_fuse(backends, query, date_range)
+        else:
+            winner, result = await self._invoke_first(backends, query, date_range)
+        metrics.observe("search_multi_latency_ms", (time.perf_counter() - start_time) * 1000)
+        metrics.incr("search_multi_requests", winner=winner or "none")
+
+        # 3.所有后端都失败时返回失败结果
+        if result is None:
+            return ToolResult(
+                success=False,
+                message=f"所有搜索后端均未在{self._deadline}秒内返回有效结果",
+                data=SearchResults(query=query, date_range=date_range, total_results=0, results=[]),
+            )
+        return result
+
+    async def aclose(self) -> None:
+        """关闭所有后端持有的连接"""
+        for backend in self._backends:
+            aclose = getattr(backend.engine, "aclose", None)
+            if aclose:
+                await aclose()
+
+
+if __name__ == "__main__":
+    # 使用多个带延迟/错误注入的Bing替身服务验证对冲与熔断:
+    # python -m app.infrastructure.external.search.multi_search
+    from app.infrastructure.external.search.bing_search import BingSearchEngine
+    from app.infrastructure.external.search.bing_stub_server import BingStubServer
+
+
+    async def main():
+        slow = BingStubServer(delay=0.5).start()
+        fast = BingStubServer(delay=0.02).start()
+        multi_engine = MultiSearchEngine(
+            backends=[
+                SearchBackend("slow", BingSearchEngine(base_url=slow.base_url)),
+                SearchBackend("fast", BingSearchEngine(base_url=fast.base_url)),
+            ],
+            default_hedge_delay=0.1,
+        )
+
+        try:
+            # 1.主后端较慢时，对冲请求会由备用后端胜出
+            start_time = time.perf_counter()
+            result = await multi_engine.invoke("hedged query")
+            print(f"对冲请求耗时: {(time.perf_counter() - start_time) * 1000:.0f}ms, 成功: {result.success}")
+
+            # 2.主后端连续返回错误后熔断，后续请求直接走备用后端
+            slow.delay, slow.status_code = 0.0, 503
+            for i in range(5):
+                result = await multi_engine.invoke(f"failover query {i}")
+                print(f"第{i + 1}次请求: 成功: {result.success}, 慢后端熔断状态: {multi_engine._backends[0].breaker.state}")
+
+            # 3.融合策略合并两个后端的结果
+            slow.status_code = 200
+            fuse_engine = MultiSearchEngine(backends=multi_engine._backends, strategy="fuse", deadline=2.0)
+            multi_engine._backends[0].breaker.record_success()
+            result = await fuse_engine.invoke("fused query")
+            print(f"融合结果数: {len(result.data.results)}")
+            print(get_metrics().snapshot())
+        finally:
+            await multi_engine.aclose()
+            slow.stop()
+            fast.stop()
+
+
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 18:45
+#Author  :Emcikem
+@File    :searxng_search.py
+"""
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import httpx
+
+from app.domain.external.search import SearchEngine
+from app.domain.models.search import SearchResults, SearchResultItem
+from app.domain.models.tool_result import ToolResult
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class SearxngSearchEngine(SearchEngine):
+    """SearXNG搜索引擎(自托管元搜索，使用JSON接口)，作为多后端搜索的备用后端"""
+
+    # date_range到SearXNG time_range的映射(SearXNG不支持按小时筛选，退化为按天)
+    TIME_RANGE_MAPPING = {
+        "past_hour": "day",
+        "past_day": "day",
+        "past_week": "week",
+        "past_month": "month",
+        "past_year": "year",
+    }
+
+    def __init__(self, base_url: str, max_connections: int = 20, timeout: float = 30) -> None:
+        """构造函数，base_url为SearXNG的搜索地址，例如: http://searxng:8080/search"""
+        self.base_url = base_url
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取长连接复用的httpx客户端(懒加载)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                ),
+            )
+        return self._client
+
+    async def invoke(self, query: str, date_range: Optional[str] = None) -> ToolResult[SearchResults]:
+        """调用SearXNG的JSON接口获取搜索结果"""
+        # 1.构建请求参数
+        params = {"q": query, "format": "json"}
+        if date_range in self.TIME_RANGE_MAPPING:
+            params["time_range"] = self.TIME_RANGE_MAPPING[date_range]
+
+        try:
+            # 2.发起请求并解析结果
+            response = await self._get_client().get(self.base_url, params=params)
+            response.raise_for_status()
+            data = response.json()
+
+            # 3.组装结果
+            search_results = [
+                SearchResultItem(url=item["url"], title=item.get("title", ""), snippet=item.get("content", ""))
+                for item in data.get("results", [])
+                if item.get("url")
+            ]
+            results = SearchResults(
+                query=query,
+                date_range=date_range,
+                total_results=data.get("number_of_results") or len(search_results),
+                results=search_results,
+            )
+            return ToolResult(success=True, data=results)
+        except Exception as e:
+            logger.error(f"SearXNG搜索出错: {str(e)}")
+            return ToolResult(
+                success=False,
+                message=f"SearXNG搜索出错: {str(e)}",
+                data=SearchResults(query=query, date_range=date_range, total_results=0, results=[]),
+            )
+
+    async def aclose(self) -> None:
+        """关闭复用的httpx客户端"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+@lru_cache()
+def get_searxng_search_engine() -> SearxngSearchEngine:
+    """使用lru_cache实现单例模式，获取进程内共享连接池的SearXNG搜索引擎"""
+    settings = get_settings()
+    return SearxngSearchEngine(base_url=settings.searxng_search_base_url)
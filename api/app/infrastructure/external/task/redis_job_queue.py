@@ -0,0 +1,104 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 23:40
+#Author  :Emcikem
+@File    :redis_job_queue.py
+"""
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from redis.exceptions import ResponseError
+
+from app.infrastructure.storage.redis import get_redis
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+"""
+任务队列设计思路：
+1.worker模式下API进程只负责投递任务与读取输出流，任务(会话id、任务id、是否从检查点恢复)写入Redis流agent:jobs；
+2.所有worker进程属于同一个消费者组，Redis保证每个任务只投递给一个消费者，新增worker进程即可水平扩展；
+3.worker开始执行任务(获取任务租约)后立即确认并删除任务，执行期间的宕机由任务租约+检查点负责恢复；
+4.worker读取任务后、开始执行前宕机时任务停留在消费者组的待确认列表中，其他worker空闲超过claim_idle_ms后认领重新执行；
+"""
+
+
+class RedisJobQueue:
+    """基于Redis流消费者组的Agent任务队列"""
+
+    def __init__(
+            self,
+            stream_name: Optional[str] = None,
+            group_name: str = "agent-workers",
+            claim_idle_ms: int = 60_000,
+    ) -> None:
+        """构造函数，完成任务队列初始化，涵盖流名字、消费者组、认领超时任务的空闲时长"""
+        self._stream_name = stream_name or get_settings().agent_job_stream
+        self._group_name = group_name
+        self._claim_idle_ms = claim_idle_ms
+        self._redis = get_redis()
+
+    async def init(self) -> None:
+        """创建消费者组(流不存在时一并创建)，消费者组已存在时忽略"""
+        try:
+            await self._redis.client.xgroup_create(self._stream_name, self._group_name, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def put(self, job: Dict[str, Any]) -> str:
+        """往任务队列中投递一个任务并返回id"""
+        logger.info(f"往任务队列[{self._stream_name}]中投递任务: {job}")
+        return await self._redis.client.xadd(self._stream_name, {"data": json.dumps(job)})
+
+    async def _claim(self, consumer: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """认领其他消费者读取后长时间未确认的任务"""
+        result = await self._redis.client.xautoclaim(
+            self._stream_name,
+            self._group_name,
+            consumer,
+            min_idle_time=self._claim_idle_ms,
+            start_id="0-0",
+            count=1,
+        )
+        messages = result[1] if result and len(result) > 1 else []
+        if not messages:
+            return None, None
+
+        job_id, job_data = messages[0]
+        logger.warning(f"消费者[{consumer}]认领超时未确认的任务[{job_id}]")
+        return job_id, json.loads(job_data["data"])
+
+    async def get(self, consumer: str, block_ms: int = 1000) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """以指定消费者身份获取一个任务，优先认领超时未确认的任务，没有任务时返回(None, None)"""
+        # 1.优先认领其他消费者宕机遗留的任务
+        job_id, job = await self._claim(consumer)
+        if job_id is not None:
+            return job_id, job
+
+        # 2.读取消费者组中尚未投递的新任务
+        messages = await self._redis.client.xreadgroup(
+            self._group_name,
+            consumer,
+            {self._stream_name: ">"},
+            count=1,
+            block=block_ms,
+        )
+        if not messages or not messages[0][1]:
+            return None, None
+
+        # 3.解析任务内容，内容损坏的任务直接确认丢弃
+        job_id, job_data = messages[0][1][0]
+        try:
+            return job_id, json.loads(job_data["data"])
+        except Exception as e:
+            logger.error(f"解析任务队列[{self._stream_name}]中的任务[{job_id}]失败: {str(e)}")
+            await self.ack(job_id)
+            return None, None
+
+    async def ack(self, job_id: str) -> None:
+        """确认并删除任务"""
+        await self._redis.client.xack(self._stream_name, self._group_name, job_id)
+        await self._redis.client.xdel(self._stream_name, job_id)
@@ -7,15 +7,52 @@
 """
 import asyncio
 import logging
+import os
+import socket
 import uuid
-from typing import Optional, Dict
+from typing import Optional, Dict, Set, Any
 
 from app.domain.external.message_queue import MessageQueue
 from app.domain.external.task import Task, TaskRunner
 from app.infrastructure.external.message_queue.redis_stream_message_queue import RedisStreamMessageQueue
+from app.infrastructure.external.task.redis_job_queue import RedisJobQueue
+from app.infrastructure.storage.redis import get_redis
+from core.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+"""
+分布式任务归属设计思路：
+1.原先任务只注册在进程内的_task_registry中，其他uvicorn进程/副本找不到任务，只能依赖粘性路由，否则会重复启动任务；
+2.任务开始执行前在Redis中获取租约(task:lease:{任务id}，值为当前进程的owner_id)，获取失败说明其他副本正在执行，
+    执行期间后台按租约时长的1/3续约(心跳)，执行结束后释放租约；
+3.非归属副本通过attach按任务id关联正在运行的任务：只读取输出流、写入输入流(由归属副本的任务运行器消费)，
+    取消任务时写入取消标记(task:cancel:{任务id})，由归属副本在心跳中检查并取消本地执行；
+4.归属副本宕机后心跳停止，租约到期自动删除，此时会话仍处于运行中但任何副本都关联不到任务，
+    由Agent服务基于检查点在当前副本重新创建任务(沿用原任务id)并获取租约，完成接管；
+5.续约时发现租约已经被其他副本接管，说明本地执行已经失效(例如事件循环长时间阻塞)，取消本地执行避免重复运行；
+6.worker模式下API进程通过dispatch创建关联任务，invoke时将任务投递到任务队列，由worker进程获取租约后执行；
+7.worker退出时对超时未完成的任务执行suspend：取消本地执行但不结束会话，释放租约后由其他worker从检查点恢复；
+"""
+
+# 续约脚本: 租约仍归属当前进程时刷新过期时间
+RENEW_LEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+else
+    return 0
+end
+"""
+
+# 释放脚本: 租约仍归属当前进程时删除
+RELEASE_LEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+else
+    return 0
+end
+"""
+
 
 class RedisStreamTask(Task):
     """基于Redis流的任务类"""
@@ -23,11 +60,22 @@ class RedisStreamTask(Task):
     # 定义一个全局变量用于存储所有已注册的任务
     _task_registry: Dict[str, "RedisStreamTask"] = {}
 
-    def __init__(self, task_runner: TaskRunner) -> None:
-        """构造函数，传递任务运行器完成Task初始化"""
+    # 当前进程的归属标识
+    _owner_id: str = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    # 关联任务发送取消请求的后台任务(保持引用避免被垃圾回收)
+    _background_tasks: Set[asyncio.Task] = set()
+
+    def __init__(self, task_runner: Optional[TaskRunner], task_id: Optional[str] = None) -> None:
+        """构造函数，传递任务运行器完成Task初始化，传递task_id时沿用已有任务的Redis流，任务运行器为None时为关联任务"""
         self._task_runner = task_runner
-        self._id = str(uuid.uuid4())
+        self._id = task_id or str(uuid.uuid4())
         self._execution_task: Optional[asyncio.Task] = None  # 定义在后台执行的任务
+        self._heartbeat_task: Optional[asyncio.Task] = None  # 租约心跳任务
+        self._job: Optional[Dict[str, Any]] = None  # 等待投递到任务队列的任务(worker模式)
+        self._suspended = False  # 是否被挂起
+        self._lease_lost = False  # 租约是否已被其他副本接管
+        self._lease_seconds = get_settings().task_lease_seconds
 
         input_stream_name = f"task:input:{self._id}"
         output_stream_name = f"task:output:{self._id}"
@@ -35,12 +83,75 @@ class RedisStreamTask(Task):
         self._input_stream = RedisStreamMessageQueue(input_stream_name)
         self._output_stream = RedisStreamMessageQueue(output_stream_name)
 
-        # 将当前类实例注册到全局变量中
-        RedisStreamTask._task_registry[self._id] = self
+        # 将当前类实例注册到全局变量中(关联任务不在当前进程执行，无需注册)
+        if task_runner is not None:
+            RedisStreamTask._task_registry[self._id] = self
+
+    @classmethod
+    def _lease_key(cls, task_id: str) -> str:
+        """任务租约的Redis键"""
+        return f"task:lease:{task_id}"
+
+    @classmethod
+    def _cancel_key(cls, task_id: str) -> str:
+        """任务取消标记的Redis键"""
+        return f"task:cancel:{task_id}"
+
+    @property
+    def attached(self) -> bool:
+        """只读属性，是否为关联其他副本中运行的任务"""
+        return self._task_runner is None
+
+    async def _acquire_lease(self) -> bool:
+        """获取任务租约，其他副本持有租约时返回False"""
+        result = await get_redis().client.set(
+            self._lease_key(self._id),
+            self._owner_id,
+            nx=True,
+            px=self._lease_seconds * 1000,
+        )
+        return bool(result)
+
+    async def _renew_lease(self) -> bool:
+        """续约任务租约，租约已经过期或被其他副本接管时返回False"""
+        script = get_redis().client.register_script(RENEW_LEASE_SCRIPT)
+        result = await script(keys=[self._lease_key(self._id)], args=[self._owner_id, self._lease_seconds * 1000])
+        return result == 1
+
+    async def _release_lease(self) -> None:
+        """释放任务租约"""
+        try:
+            script = get_redis().client.register_script(RELEASE_LEASE_SCRIPT)
+            await script(keys=[self._lease_key(self._id)], args=[self._owner_id])
+        except Exception as e:
+            logger.warning(f"任务[{self._id}]释放租约失败: {str(e)}")
+
+    async def _heartbeat(self) -> None:
+        """后台续约任务租约，并检查其他副本发送的取消请求"""
+        redis = get_redis().client
+        while True:
+            await asyncio.sleep(self._lease_seconds / 3)
+            try:
+                # 1.续约失败说明租约已被其他副本接管，先标记租约丢失再取消本地执行，
+                #   任务运行器按挂起处理，不能推送结束事件或修改会话状态，避免覆盖接管副本的执行
+                if not await self._renew_lease():
+                    logger.error(f"任务[{self._id}]租约已丢失，取消本地执行")
+                    self._lease_lost = True
+                    self._execution_task.cancel()
+                    return
+
+                # 2.其他副本请求取消任务时取消本地执行
+                if await redis.delete(self._cancel_key(self._id)):
+                    logger.info(f"任务[{self._id}]收到其他副本的取消请求")
+                    self._execution_task.cancel()
+                    return
+            except Exception as e:
+                # 3.Redis暂时不可用时等待下一次心跳，租约在过期前仍然有效
+                logger.warning(f"任务[{self._id}]续约失败: {str(e)}")
 
     def _cleanup_registry(self) -> None:
         """清除全局变量中当前注册的任务"""
-        if self._id in RedisStreamTask._task_registry:
+        if RedisStreamTask._task_registry.get(self._id) is self:
             del RedisStreamTask._task_registry[self.id]
             logger.info(f"任务[{self._id}]从注册中心移除")
 
@@ -58,35 +169,81 @@ class RedisStreamTask(Task):
         try:
             await self._task_runner.invoke(self)
         except asyncio.CancelledError:
-            logger.info(f"任务[{self._id}]执行被取消")
+            reason = "因租约丢失停止" if self._lease_lost else "被挂起" if self._suspended else "被取消"
+            logger.info(f"任务[{self._id}]执行{reason}")
             raise
         except Exception as e:
             logger.error(f"任务{self._id}执行出现异常：{str(e)}")
         finally:
+            # 停止心跳并释放租约，其他副本可以立即接管后续的任务
+            if self._heartbeat_task:
+                self._heartbeat_task.cancel()
+            await self._release_lease()
             self._on_task_done()
 
+    async def _request_cancel(self) -> None:
+        """关联任务写入取消标记，由归属副本在心跳中取消执行"""
+        try:
+            await get_redis().client.set(self._cancel_key(self._id), self._owner_id, ex=self._lease_seconds * 2)
+        except Exception as e:
+            logger.warning(f"任务[{self._id}]发送取消请求失败: {str(e)}")
+
     async def invoke(self) -> None:
-        """使用提供的task_runner来运行任务"""
-        # 1.判断任务是否结束
+        """使用提供的task_runner来运行任务，关联任务由归属副本运行，无需处理"""
+        # 1.关联任务的输入由归属副本的任务运行器消费，worker模式下首次调用时投递到任务队列
+        if self.attached:
+            if self._job is not None:
+                job, self._job = self._job, None
+                await RedisJobQueue().put(job)
+            return
+
+        # 2.判断任务是否结束，获取租约后开始执行
         if self.done:
+            if not await self._acquire_lease():
+                logger.warning(f"任务[{self._id}]租约已被其他副本持有，当前副本不执行该任务")
+                self._cleanup_registry()
+                return
             self._execution_task = asyncio.create_task(self._execute_task())
-            logger.info(f"任务[{self._id}]开始执行")
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+            logger.info(f"任务[{self._id}]开始执行，归属: {self._owner_id}")
 
     def cancel(self) -> bool:
         """取消当前执行的任务"""
+        # 1.关联任务通过Redis通知归属副本取消
+        if self.attached:
+            background_task = asyncio.create_task(self._request_cancel())
+            RedisStreamTask._background_tasks.add(background_task)
+            background_task.add_done_callback(RedisStreamTask._background_tasks.discard)
+            return True
+
         if not self.done:
-            # 1.取消任务
+            # 2.取消任务
             self._execution_task.cancel()
             logger.info(f"任务{self._id}已取消")
 
-            # 2.清除注册的当前任务
+            # 3.清除注册的当前任务
             self._cleanup_registry()
             return True
 
-        # 3.否则代表任务已结束，无需重复取消
+        # 4.否则代表任务已结束，无需重复取消
         self._cleanup_registry()
         return True
 
+    def suspend(self) -> bool:
+        """挂起当前执行的任务，执行结束后释放租约，会话状态与检查点保持不变"""
+        if self.attached or self.done:
+            return False
+
+        self._suspended = True
+        self._execution_task.cancel()
+        logger.info(f"任务[{self._id}]已挂起")
+        return True
+
+    @property
+    def suspended(self) -> bool:
+        """被挂起或租约已被其他副本接管时，本地执行停止后都不能修改会话状态"""
+        return self._suspended or self._lease_lost
+
     @property
     def input_stream(self) -> MessageQueue:
         return self._input_stream
@@ -101,6 +258,9 @@ class RedisStreamTask(Task):
 
     @property
     def done(self) -> bool:
+        # 关联任务的结束由输出流中的结束事件判断
+        if self.attached:
+            return False
         if self._execution_task is None:
             return True
         return self._execution_task.done()
@@ -110,12 +270,25 @@ class RedisStreamTask(Task):
         return RedisStreamTask._task_registry.get(task_id)
 
     @classmethod
-    def create(cls, task_runner: TaskRunner) -> "Task":
-        return cls(task_runner)
+    async def attach(cls, task_id: str) -> Optional["Task"]:
+        # 租约存在说明任务正在某个副本中运行
+        if not await get_redis().client.exists(cls._lease_key(task_id)):
+            return None
+        return cls(None, task_id)
+
+    @classmethod
+    def create(cls, task_runner: TaskRunner, task_id: Optional[str] = None) -> "Task":
+        return cls(task_runner, task_id)
+
+    @classmethod
+    def dispatch(cls, session_id: str, task_id: Optional[str] = None, resume: bool = False) -> "Task":
+        task = cls(None, task_id)
+        task._job = {"session_id": session_id, "task_id": task.id, "resume": resume}
+        return task
 
     @classmethod
     async def destroy(cls) -> None:
-        for task_id in RedisStreamTask._task_registry:
+        for task_id in list(RedisStreamTask._task_registry):
             # 1.获取对应的任务
             task = RedisStreamTask._task_registry.get(task_id)
             task.cancel()
@@ -0,0 +1,7 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 21:08
+#Author  :Emcikem
+@File    :__init__.py.py
+"""
@@ -0,0 +1,79 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 21:10
+#Author  :Emcikem
+@File    :local_tokenizer.py
+"""
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional
+
+from app.domain.external.tokenizer import Tokenizer
+from core.config import get_settings
+from core.tokens import estimate_tokens
+
+"""
+本地分词器设计思路：
+1.记忆预算管理需要在每次调用LLM前计算整个提示词的token数，不能为此额外请求LLM接口，所以需要一个本地分词器；
+2.配置了TOKENIZER_PATH(模型目录或HuggingFace仓库名，例如deepseek-ai/DeepSeek-V3)时，
+    使用transformers加载对应模型的分词器(底层为Rust实现的tokenizers)，计数结果与服务端基本一致；
+3.未配置或者加载失败时回退为启发式估算(中日韩字符1个token，其余4个字符1个token)；
+4.历史消息在每一次调用时都会被重复计数，这里按文本做LRU缓存，已计数过的消息不会重复分词；
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTokenizer(Tokenizer):
+    """带LRU缓存的本地分词器，优先使用transformers分词器，不可用时回退为启发式估算"""
+
+    def __init__(self, tokenizer_path: Optional[str] = None, cache_size: int = 4096) -> None:
+        """构造函数，完成本地分词器的初始化"""
+        self._tokenizer = None
+        self._cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()  # 文本->token数
+        self._lock = threading.Lock()
+        if tokenizer_path:
+            try:
+                from transformers import AutoTokenizer
+
+                self._tokenizer = AutoTokenizer.from_pretrained(tokenizer_path)
+                logger.info(f"加载本地分词器[{tokenizer_path}]成功")
+            except Exception as e:
+                logger.warning(f"加载本地分词器[{tokenizer_path}]失败, 回退为启发式估算: {str(e)}")
+
+    @property
+    def name(self) -> str:
+        """分词器名字"""
+        return getattr(self._tokenizer, "name_or_path", "heuristic") if self._tokenizer else "heuristic"
+
+    def _encode_count(self, text: str) -> int:
+        """不经过缓存计算token数"""
+        if self._tokenizer is None:
+            return estimate_tokens(text)
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
+    def count(self, text: str) -> int:
+        """计算文本的token数，命中缓存时直接返回"""
+        if not text:
+            return 0
+        with self._lock:
+            if text in self._cache:
+                self._cache.move_to_end(text)
+                return self._cache[text]
+
+        tokens = self._encode_count(text)
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+
+@lru_cache()
+def get_tokenizer() -> LocalTokenizer:
+    """使用lru_cache实现单例模式，获取进程内共享的本地分词器"""
+    return LocalTokenizer(get_settings().tokenizer_path)
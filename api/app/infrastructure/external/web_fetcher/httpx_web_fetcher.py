@@ -0,0 +1,262 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 19:55
+#Author  :Emcikem
+@File    :httpx_web_fetcher.py
+"""
+import asyncio
+import importlib.util
+import ipaddress
+import logging
+import re
+import socket
+import time
+from functools import lru_cache
+from typing import Optional, Tuple, List
+
+import httpx
+from bs4 import BeautifulSoup, Tag
+
+from app.domain.external.web_fetcher import WebFetcher
+from app.domain.models.search import WebPage
+from app.domain.models.tool_result import ToolResult
+from core.metrics import get_metrics
+
+"""
+轻量网页获取器设计思路：
+1.search_and_read需要并发读取多个搜索结果页，如果每个页面都通过沙箱浏览器导航+查看，耗时和资源占用都很高，
+    这里直接使用共享连接池的httpx客户端请求网页，只处理html/纯文本类型的响应；
+2.以流的方式读取响应体，超过字节上限后立即停止读取，避免超大页面占用带宽和内存；
+3.正文提取在线程中执行：
+    - 移除script/style/nav/footer等噪声元素；
+    - 在article/main等候选容器中选择文本最多的一个作为正文容器，没有候选时使用body；
+    - 按段落、标题、列表等块级元素输出文本，标题使用Markdown格式，嵌套的块级元素只输出最外层；
+4.lxml为可选依赖，安装时使用lxml树构建器加速解析；
+5.网页在API进程中请求(不经过沙箱)，为避免SSRF访问内网的Redis/MySQL或云厂商元数据服务，
+    每次请求(包括每一跳重定向)前都会解析域名，解析结果中存在非公网地址时拒绝请求，重定向由获取器手动处理；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 噪声元素，提取正文前移除
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "nav", "footer", "header", "aside", "form",
+              "button"]
+
+# 正文候选容器选择器
+MAIN_SELECTORS = ["article", "main", "[role=main]", "#content", "#main", ".content", ".article", ".post"]
+
+# 输出文本的块级元素
+BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote", "td", "dd", "dt"]
+
+# 支持的响应类型
+SUPPORTED_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# html中声明的字符集
+META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+# BeautifulSoup树构建器: 安装了lxml时使用lxml，否则使用标准库html.parser
+SOUP_FEATURES = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+
+# 最大重定向次数
+MAX_REDIRECTS = 5
+
+
+def _has_block_ancestor(element: Tag, container: Tag) -> bool:
+    """判断元素在容器内是否有块级祖先元素"""
+    parent = element.parent
+    while parent is not None and parent is not container:
+        if parent.name in BLOCK_TAGS:
+            return True
+        parent = parent.parent
+    return False
+
+
+def extract_main_content(html: str) -> Tuple[str, str]:
+    """从html中提取标题与正文，返回(标题, 正文)"""
+    soup = BeautifulSoup(html, SOUP_FEATURES)
+    title = soup.title.get_text(strip=True) if soup.title else ""
+
+    # 1.移除噪声元素
+    for element in soup.find_all(NOISE_TAGS):
+        element.decompose()
+
+    # 2.选择文本最多的候选容器作为正文容器
+    candidates = [element for selector in MAIN_SELECTORS for element in soup.select(selector)]
+    container = max(candidates, key=lambda element: len(element.get_text(strip=True)), default=None)
+    if container is None or not container.get_text(strip=True):
+        container = soup.body or soup
+
+    # 3.按块级元素输出文本，嵌套的块级元素只输出最外层
+    lines: List[str] = []
+    for block in container.find_all(BLOCK_TAGS):
+        if _has_block_ancestor(block, container):
+            continue
+        text = " ".join(block.get_text(" ", strip=True).split())
+        if not text or (lines and lines[-1].endswith(text)):
+            continue
+        if block.name.startswith("h"):
+            text = f"{'#' * int(block.name[1])} {text}"
+        elif block.name == "li":
+            text = f"- {text}"
+        lines.append(text)
+
+    # 4.没有块级元素(例如纯div布局)时直接输出容器文本
+    if not lines:
+        lines = [line.strip() for line in container.get_text("\n").splitlines() if line.strip()]
+
+    return title, "\n".join(lines)
+
+
+class HttpxWebFetcher(WebFetcher):
+    """基于httpx的轻量网页获取器"""
+
+    def __init__(
+            self,
+            max_connections: int = 20,  # 连接池最大连接数
+            timeout: float = 10.0,  # 单个页面的请求超时时间(秒)
+            user_agent: str = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                              "Chrome/131.0 Safari/537.36",
+    ) -> None:
+        """构造函数，完成网页获取器的初始化"""
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._headers = {
+            "User-Agent": user_agent,
+            "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取长连接复用的httpx客户端(懒加载)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self._headers,
+                timeout=self._timeout,
+                follow_redirects=False,  # 重定向手动处理，每一跳都需要校验目标地址
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                ),
+            )
+        return self._client
+
+    @classmethod
+    def _decode(cls, body: bytes, charset: Optional[str]) -> str:
+        """解码响应体: 优先使用响应头中的字符集，其次是html中声明的字符集，最后使用utf-8"""
+        if not charset:
+            match = META_CHARSET_PATTERN.search(body[:4096])
+            charset = match.group(1).decode("ascii") if match else "utf-8"
+        try:
+            return body.decode(charset, errors="replace")
+        except LookupError:
+            return body.decode("utf-8", errors="replace")
+
+    @classmethod
+    async def _ensure_public_url(cls, url: httpx.URL) -> None:
+        """校验URL的协议，并解析域名确保所有地址都是公网地址，否则抛出ValueError"""
+        # 1.只允许http/https协议
+        if url.scheme not in ("http", "https") or not url.host:
+            raise ValueError(f"不支持的网页地址: {url}")
+
+        # 2.解析域名(IP地址会原样返回)并校验每一个地址
+        port = url.port or (443 if url.scheme == "https" else 80)
+        addresses = await asyncio.get_running_loop().getaddrinfo(url.host, port, type=socket.SOCK_STREAM)
+        for address in addresses:
+            ip = ipaddress.ip_address(address[4][0].split("%")[0])
+            if ip.version == 6 and ip.ipv4_mapped:
+                ip = ip.ipv4_mapped
+            if not ip.is_global or ip.is_multicast:
+                raise ValueError(f"禁止访问非公网地址: {url.host}({ip})")
+
+    async def _open(self, url: str) -> httpx.Response:
+        """以流的方式请求网页，手动跟随重定向，每一跳请求前都校验目标地址"""
+        client = self._get_client()
+        request = client.build_request("GET", url)
+        for _ in range(MAX_REDIRECTS + 1):
+            await self._ensure_public_url(request.url)
+            response = await client.send(request, stream=True)
+            if not response.is_redirect or response.next_request is None:
+                return response
+            await response.aclose()
+            request = response.next_request
+        raise ValueError(f"重定向次数超过{MAX_REDIRECTS}次")
+
+    async def fetch(self, url: str, max_bytes: int) -> ToolResult[WebPage]:
+        """获取指定URL的网页并提取正文，最多读取max_bytes字节"""
+        metrics = get_metrics()
+        start_time = time.perf_counter()
+        try:
+            # 1.以流的方式请求网页(校验目标地址并手动跟随重定向)并校验响应类型
+            response = await self._open(url)
+            try:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_type and content_type not in SUPPORTED_CONTENT_TYPES:
+                    metrics.incr("web_fetch_requests", status="unsupported")
+                    return ToolResult(success=False, message=f"不支持的网页类型: {content_type}")
+
+                # 2.读取响应体，超过字节上限后停止读取
+                chunks, size, truncated = [], 0, False
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    if size >= max_bytes:
+                        truncated = True
+                        break
+                body = b"".join(chunks)[:max_bytes]
+                final_url = str(response.url)
+                charset = response.charset_encoding
+            finally:
+                await response.aclose()
+
+            # 3.在线程中解码并提取正文
+            text = self._decode(body, charset)
+            if content_type == "text/plain":
+                title, content = "", text.strip()
+            else:
+                title, content = await asyncio.to_thread(extract_main_content, text)
+
+            # 4.记录指标并返回
+            metrics.incr("web_fetch_requests", status="success")
+            metrics.observe("web_fetch_bytes", len(body))
+            metrics.observe("web_fetch_latency_ms", (time.perf_counter() - start_time) * 1000)
+            return ToolResult(
+                success=True,
+                data=WebPage(url=final_url, title=title, content=content, truncated=truncated),
+            )
+        except Exception as e:
+            logger.warning(f"获取网页[{url}]失败: {str(e)}")
+            metrics.incr("web_fetch_requests", status="failure")
+            return ToolResult(success=False, message=f"获取网页失败: {str(e)}")
+
+    async def aclose(self) -> None:
+        """关闭复用的httpx客户端"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+@lru_cache()
+def get_web_fetcher() -> HttpxWebFetcher:
+    """使用lru_cache实现单例模式，获取进程内共享连接池的网页获取器"""
+    return HttpxWebFetcher()
+
+
+if __name__ == "__main__":
+    # python -m app.infrastructure.external.web_fetcher.httpx_web_fetcher https://example.com
+    import sys
+
+
+    async def main():
+        fetcher = get_web_fetcher()
+        result = await fetcher.fetch(sys.argv[1] if len(sys.argv) > 1 else "https://example.com", 512 * 1024)
+        print(result.message or "")
+        if result.data:
+            print(result.data.title, result.data.truncated)
+            print(result.data.content[:2000])
+        await fetcher.aclose()
+
+
+    asyncio.run(main())
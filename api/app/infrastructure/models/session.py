@@ -7,7 +7,7 @@
 """
 import uuid
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 from sqlalchemy import (
     PrimaryKeyConstraint, String, text, Integer, Text, DateTime, JSON
@@ -72,6 +72,10 @@ class SessionModel(Base):
         nullable=False,
         server_default=text("''::character varying"),
     ) # 会话状态
+    checkpoint: Mapped[Optional[Dict[str, Any]]] = mapped_column(
+        JSON,
+        nullable=True,
+    ) # 流检查点
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
         nullable=False,
@@ -91,12 +95,12 @@ class SessionModel(Base):
             # 1.基础字段：使用BaseModel提供的python字典转换格式
             **session.model_dump(
                 mode="python",
-                exclude={"memories", "files", "events", "updated_at", "created_at"},
+                exclude={"memories", "files", "events", "checkpoint", "updated_at", "created_at"},
             ),
             # 2.复杂字段：使用BaseModel提供的json字典转换格式
             **session.model_dump(
                 mode="json",
-                include={"memories", "files", "events"},
+                include={"memories", "files", "events", "checkpoint"},
             )
         )
 
@@ -132,6 +136,7 @@ class SessionModel(Base):
             files=parse_json_list(self.files),
             memories=parse_json_dict(self.memories),
             status=SessionStatus(self.status),
+            checkpoint=parse_json_dict(self.checkpoint),
             updated_at=self.updated_at,
             created_at=self.created_at,
         )
@@ -141,13 +146,13 @@ class SessionModel(Base):
         # 1.基础字段：Python模式
         base_data = session.model_dump(
             mode="python",
-            exclude={"memories", "files", "events", "updated_at", "created_at"},
+            exclude={"memories", "files", "events", "checkpoint", "updated_at", "created_at"},
         )
 
         # 2.复杂字段：JSON模式
         json_data = session.model_dump(
             mode="json",
-            include={"memories", "files", "events"},
+            include={"memories", "files", "events", "checkpoint"},
         )
 
         # 3.合并更新
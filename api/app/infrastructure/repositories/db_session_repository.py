@@ -7,12 +7,13 @@
 """
 import json
 from datetime import datetime
-from typing import List, Optional, cast
+from typing import Any, List, Optional, cast
 
 from sqlalchemy import select, delete, update, func, case, text, JSON
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.domain.models.checkpoint import FlowCheckpoint
 from app.domain.models.event import BaseEvent
 from app.domain.models.file import File
 from app.domain.models.memory import Memory
@@ -210,6 +211,20 @@ class DBSessionRepository(SessionRepository):
         if result.rowcount == 0:
             raise ValueError(f"会话[{session_id}]不存在，请核实后重试")
 
+    async def save_checkpoint(self, session_id: str, checkpoint: Optional[FlowCheckpoint]) -> None:
+        """更新会话的流检查点，传递None时清除检查点"""
+        # 1.构建sql更新会话检查点并执行
+        stmt = (
+            update(SessionModel)
+            .where(SessionModel.id == session_id)
+            .values(checkpoint=checkpoint.model_dump(mode="json") if checkpoint else None)
+        )
+        result = await self.db_session.execute(stmt)
+
+        # 2.检查是否更新成功
+        if result.rowcount == 0:
+            raise ValueError(f"会话[{session_id}]不存在，请核实后重试")
+
     async def update_unread_message_count(self, session_id: str, count: int) -> None:
         """更新会话的未读消息数"""
         # 1.构建sql更新会话消息并执行
@@ -260,33 +275,68 @@ class DBSessionRepository(SessionRepository):
             raise ValueError(f"会话[{session_id}]不存在，请核实后重试")
 
     async def save_memory(self, session_id: str, agent_name: str, memory: Memory) -> None:
-        """存储或更新会话中的记忆（查询 → 修改 → 保存）"""
-
-        # 1. 先查询当前会话的 memories
-        stmt_select = select(SessionModel.memories).where(SessionModel.id == session_id)
-        result = await self.db_session.execute(stmt_select)
-        row = result.scalar_one_or_none()
-
-        if row is None:
-            raise ValueError(f"会话[{session_id}]不存在，请核实后重试")
-
-        # 2. 拿到现有记忆，确保是字典（不是列表！）
-        memories = row if isinstance(row, dict) else {}
-
-        # 3. 直接覆盖/新增当前 agent 的记忆
-        memory_data = memory.model_dump(mode="json")
-        memories[agent_name] = memory_data  # 字典赋值，覆盖式存储
+        """存储或更新会话中的记忆，有变更集时只写入变化的区间，否则整份写回"""
+        # 1.获取记忆的变更集，发生结构性变化或者从未持久化时整份写回
+        changes = memory.get_changes()
+        if changes.rewrite:
+            await self._rewrite_memory(session_id, agent_name, memory)
+            memory.mark_persisted()
+            return
 
-        # 4. 执行更新（标准 SQLAlchemy，无任何复杂函数）
-        stmt_update = (
+        # 2.使用JSON_SET更新压缩水位线与被修改的消息
+        agent_path = f'$."{agent_name}"'
+        set_args = [f"{agent_path}.compacted_index", memory.compacted_index]
+        for index, message in changes.updated.items():
+            set_args.extend([f"{agent_path}.messages[{index}]", self._to_json_value(message)])
+        memories = func.JSON_SET(SessionModel.memories, *set_args)
+
+        # 3.使用JSON_ARRAY_APPEND追加新消息
+        if changes.appended:
+            append_args = []
+            for message in changes.appended:
+                append_args.extend([f"{agent_path}.messages", self._to_json_value(message)])
+            memories = func.JSON_ARRAY_APPEND(memories, *append_args)
+
+        # 4.执行更新并检查是否更新成功
+        stmt = (
             update(SessionModel)
             .where(SessionModel.id == session_id)
             .values(memories=memories)
         )
-        update_result = await self.db_session.execute(stmt_update)
+        result = await self.db_session.execute(stmt)
+        if result.rowcount == 0:
+            raise ValueError(f"会话[{session_id}]不存在或更新失败")
+        memory.mark_persisted()
+
+    @classmethod
+    def _to_json_value(cls, value: Any) -> Any:
+        """将数据转换成MySQL中的JSON值(直接传递字符串会被当成JSON字符串而不是对象)"""
+        return func.JSON_EXTRACT(json.dumps(value, ensure_ascii=False), "$")
+
+    async def _rewrite_memory(self, session_id: str, agent_name: str, memory: Memory) -> None:
+        """整份写回会话中指定Agent的记忆
+
+        只使用JSON_SET写入当前Agent的key，不读取再写回整个memories，
+        避免并行执行者同时写回各自的记忆时相互覆盖(原先的查询 → 修改 → 保存没有加行锁)。
+        """
+        # 1.memories不是JSON对象(历史数据)时先替换为空对象，再写入当前Agent的记忆
+        memories = case(
+            (func.upper(func.JSON_TYPE(SessionModel.memories)) == "OBJECT", SessionModel.memories),
+            else_=func.JSON_OBJECT(),
+        )
+        stmt = (
+            update(SessionModel)
+            .where(SessionModel.id == session_id)
+            .values(memories=func.JSON_SET(
+                memories,
+                f'$."{agent_name}"',
+                self._to_json_value(memory.model_dump(mode="json")),
+            ))
+        )
+        result = await self.db_session.execute(stmt)
 
-        # 5. result 判断（你要的）
-        if update_result.rowcount == 0:
+        # 2.检查是否更新成功
+        if result.rowcount == 0:
             raise ValueError(f"会话[{session_id}]不存在或更新失败")
 
     async def get_memory(self, session_id: str, agent_name: str) -> Memory:
@@ -301,7 +351,9 @@ class DBSessionRepository(SessionRepository):
 
         # 2.如果记忆存在则转换成Domain返回
         if memory_data:
-            return Memory(**memory_data)
+            memory = Memory(**memory_data)
+            memory.mark_persisted()
+            return memory
 
         # 3.如果记忆不存在，则创建一个空记忆后返回
         return Memory(messages=[])
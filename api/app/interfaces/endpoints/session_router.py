@@ -10,12 +10,13 @@ from datetime import datetime
 from typing import Optional, Dict, AsyncGenerator
 
 import websockets
-from fastapi import Depends
+from fastapi import Depends, Header, Request
 import logging
 
 from fastapi import APIRouter
 from h11 import ConnectionClosed
 from sse_starlette import EventSourceResponse, ServerSentEvent
+from starlette.background import BackgroundTask
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
 from app.application.errors.exception import NotFoundError
@@ -150,9 +151,20 @@ async def delete_session(
 async def chat(
         session_id: str,
         request: ChatRequest,
+        http_request: Request,
+        x_user_id: Optional[str] = Header(default=None),
         agent_service: AgentService = Depends(get_agent_service),
 ) -> EventSourceResponse:
     """根据传递的会议id+chat请求数据向指定会话发起聊天请求"""
+    # 准入控制需要在开始流式响应之前完成，排队任务过多时直接返回429(用户标识优先使用X-User-Id请求头，否则使用客户端IP)
+    ticket = None
+    if request.message:
+        user_id = x_user_id or (http_request.client.host if http_request.client else "anonymous")
+        ticket = await agent_service.admit(session_id=session_id, user_id=user_id, priority=request.priority)
+
+    async def release_ticket() -> None:
+        """响应结束后归还未绑定到新任务的票据(事件生成器没有运行时chat的finally不会执行)"""
+        agent_service.release(ticket)
 
     async def event_generator() -> AsyncGenerator[ServerSentEvent, None]:
         """定义事件生成器，用于配合EventSourceResponse生成流式响应数据"""
@@ -163,6 +175,7 @@ async def chat(
             attachments=request.attachments,
             latest_event_id=request.event_id,
             timestamp=datetime.fromtimestamp(request.timestamp) if request.timestamp else None,
+            ticket=ticket,
         ):
             # 2.将Agent事件转换为sse数据（因为普通的event没法提供流式事件传输）
             sse_event = EventMapper.event_to_sse_event(event)
@@ -172,7 +185,7 @@ async def chat(
                     data=sse_event.data.model_dump_json()
                 )
 
-    return EventSourceResponse(event_generator())
+    return EventSourceResponse(event_generator(), background=BackgroundTask(release_ticket))
 
 @router.get(
     path="/{session_id}",
@@ -341,3 +354,58 @@ async def vnc_websocket(
         # 其他错误记录日志并关闭websocket
         logger.error(f"WebSocket异常: {str(e)}")
         await websocket.close(code=1011, reason=f"WebSocket异常: {str(e)}")
+
+
+@router.websocket(
+    path="/{session_id}/live",
+)
+async def live_view_websocket(
+        websocket: WebSocket,
+        session_id: str,
+        session_service: SessionService = Depends(get_session_service),
+) -> None:
+    """浏览器实时画面Websocket端点，基于CDP录屏将沙箱浏览器的JPEG帧推送给前端，比VNC代理更轻量"""
+    # 1.接收websocket连接
+    logger.info(f"为会话[{session_id}]开启浏览器实时画面连接")
+    await websocket.accept()
+
+    # 2.创建协程监听客户端断开(前端无需发送数据)
+    async def wait_for_disconnect():
+        try:
+            while True:
+                await websocket.receive()
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    disconnect_task = asyncio.create_task(wait_for_disconnect())
+    frames = session_service.live_view(session_id)
+    next_frame: Optional[asyncio.Task] = None
+    try:
+        # 3.同时等待下一帧与客户端断开(静态页面长时间没有新帧时也要及时感知断开)，客户端断开后停止
+        while True:
+            next_frame = asyncio.ensure_future(frames.__anext__())
+            done, _ = await asyncio.wait({next_frame, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect_task in done:
+                break
+            try:
+                frame = next_frame.result()
+            except StopAsyncIteration:
+                break
+            await websocket.send_bytes(frame)
+        logger.info(f"会话[{session_id}]浏览器实时画面连接已关闭")
+    except WebSocketDisconnect:
+        logger.info(f"会话[{session_id}]浏览器实时画面客户端已断开")
+    except Exception as e:
+        # 4.其他错误记录日志并关闭websocket
+        logger.error(f"浏览器实时画面异常: {str(e)}")
+        await websocket.close(code=1011, reason=f"浏览器实时画面异常: {str(e)}")
+    finally:
+        # 5.取消等待中的帧，关闭帧生成器(同时停止录屏与CDP会话)与断开监听任务
+        if next_frame is not None and not next_frame.done():
+            next_frame.cancel()
+            try:
+                await next_frame
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await frames.aclose()
+        disconnect_task.cancel()
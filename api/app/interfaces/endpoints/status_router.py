@@ -6,14 +6,16 @@
 @File    :status_router.py
 """
 import logging
-from typing import List
+from typing import List, Dict, Any, Optional
 
 from fastapi import APIRouter, Depends
 
 from app.application.services.status_service import StatusService
 from app.domain.models.health_status import HealthStatus
+from app.infrastructure.external.llm.rate_limiter import get_llm_rate_limiter
 from app.interfaces.schemas import Response
 from app.interfaces.service_dependencies import get_status_service
+from core.metrics import get_metrics
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/status", tags=["状态模块"])
@@ -34,3 +36,25 @@ async def get_status(
         return Response.fail(503, "系统存在服务异常", statues)
 
     return Response.success(msg="系统健康检查成功", data=statues)
+
+
+@router.get(
+    path="/metrics",
+    response_model=Response[Dict[str, Any]],
+    summary="获取系统运行指标",
+    description="获取当前进程内记录的计数器、仪表盘以及耗时/token分布等运行指标"
+)
+async def get_metrics_snapshot() -> Response[Dict[str, Any]]:
+    """获取当前进程内记录的运行指标快照"""
+    return Response.success(msg="获取系统运行指标成功", data=get_metrics().snapshot())
+
+
+@router.get(
+    path="/llm-waits",
+    response_model=Response[Dict[str, Any]],
+    summary="获取LLM限流排队情况",
+    description="获取当前因LLM集群限流而排队的会话及其已等待时长，传递session_id时只返回该会话"
+)
+async def get_llm_waits(session_id: Optional[str] = None) -> Response[Dict[str, Any]]:
+    """获取因LLM集群限流而排队的会话及其已等待时长"""
+    return Response.success(msg="获取LLM限流排队情况成功", data=await get_llm_rate_limiter().waits(session_id))
@@ -31,6 +31,7 @@ def register_exception_handlers(app: FastAPI) -> None:
                 msg=e.msg,
                 data={}
             ).model_dump(),
+            headers=e.headers,
         )
 
     @app.exception_handler(HTTPException)
@@ -117,6 +117,7 @@ class StepEventData(BaseEventData):
     id: str  # 步骤id
     status: ExecutionStatus  # 步骤执行状态
     description: str  # 步骤描述
+    screenshot: Optional[str] = None  # 步骤结束时的浏览器截图
 
 
 class StepSSEEvent(BaseSSEEvent):
@@ -131,7 +132,8 @@ class StepSSEEvent(BaseSSEEvent):
                 **BaseEventData.base_event_data(event),
                 status=event.step.status,
                 id=event.step.id,
-                description=event.step.description
+                description=event.step.description,
+                screenshot=event.screenshot,
             )
         )
 
@@ -216,6 +218,17 @@ class ErrorSSEEvent(BaseSSEEvent):
     data: ErrorEventData
 
 
+class QueueEventData(BaseEventData):
+    """排队事件数据"""
+    position: int
+
+
+class QueueSSEEvent(BaseSSEEvent):
+    """排队流式事件"""
+    event: Literal["queue"] = "queue"
+    data: QueueEventData
+
+
 # 定义Agent流式事件类型集合
 AgentSSEEvent = Union[
     CommonSSEEvent,
@@ -227,6 +240,7 @@ AgentSSEEvent = Union[
     DoneSSEEvent,
     ErrorSSEEvent,
     WaitSSEEvent,
+    QueueSSEEvent,
 ]
 
 
@@ -12,6 +12,7 @@ from pydantic import BaseModel, Field
 
 from app.domain.models.file import File
 from app.domain.models.session import SessionStatus
+from app.domain.services.task_scheduler import TaskPriority
 from app.interfaces.schemas.event import AgentSSEEvent
 
 
@@ -38,6 +39,7 @@ class ChatRequest(BaseModel):
     attachments: Optional[List[str]] = Field(default_factory=list) # 附件列表，传递的是文件id列表
     event_id: Optional[str] = None # 最新事件id
     timestamp: Optional[int] = None # 当前时间戳
+    priority: TaskPriority = TaskPriority.INTERACTIVE # 任务优先级(交互式/批处理)
 
 class GetSessionResponse(BaseModel):
     """获取会话详情响应结构"""
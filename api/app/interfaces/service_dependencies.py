@@ -6,6 +6,8 @@
 @File    :service_dependencies.py
 """
 import logging
+from functools import lru_cache
+from typing import Optional
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -18,11 +20,24 @@ from app.application.services.status_service import StatusService
 from app.infrastructure.external.file_storage.cos_file_storage import CosFileStorage
 from app.infrastructure.external.health_checker.mysql_health_checker import MysqlHealthChecker
 from app.infrastructure.external.health_checker.redis_health_checker import RedisHealthChecker
+from app.domain.external.llm import LLM
+from app.domain.models.app_config import AppConfig, LLMConfig, LLMRouterConfig
+from app.domain.external.search import SearchEngine
+from app.domain.services.agents.llm_profiles import LLMProfileSelector, LLMProfile
+from app.domain.services.task_scheduler import TaskScheduler, TaskPriority
 from app.infrastructure.external.json_parser.repair_json_parser import RepairJSONParser
+from app.infrastructure.external.llm.cached_llm import CachedLLM, get_llm_cache_backend, get_llm_recording
+from app.infrastructure.external.llm.llm_router import LLMRouter, LLMRoute
 from app.infrastructure.external.llm.openai_llm import OpenAILLM
+from app.infrastructure.external.llm.rate_limiter import get_llm_rate_limiter
 from app.infrastructure.external.sandbox.docker_sandbox import DockerSandbox
-from app.infrastructure.external.search.bing_search import BingSearchEngine
+from app.infrastructure.external.search.bing_search import get_bing_search_engine
+from app.infrastructure.external.search.cached_search import CachedSearchEngine
+from app.infrastructure.external.search.multi_search import MultiSearchEngine, SearchBackend
+from app.infrastructure.external.search.searxng_search import get_searxng_search_engine
 from app.infrastructure.external.task.redis_stream_task import RedisStreamTask
+from app.infrastructure.external.tokenizer.local_tokenizer import get_tokenizer
+from app.infrastructure.external.web_fetcher.httpx_web_fetcher import get_web_fetcher
 from app.infrastructure.repositories.file_app_config_repository import FileAppConfigRepository
 from app.infrastructure.storage.cos import Cos, get_cos
 from app.infrastructure.storage.mysql import get_db_session, get_uow
@@ -75,6 +90,115 @@ def get_file_service(
 def get_session_service() -> SessionService:
     return SessionService(uow_factory=get_uow, sandbox_cls=DockerSandbox)
 
+@lru_cache()
+def get_search_engine() -> SearchEngine:
+    """获取搜索引擎(进程内单例)，配置了多个后端时使用多后端搜索，开启搜索缓存时使用Redis缓存包装"""
+    # 1.根据配置构建搜索后端
+    engine_factories = {"bing": get_bing_search_engine, "searxng": get_searxng_search_engine}
+    backends = [
+        SearchBackend(name=name, engine=engine_factories[name]())
+        for name in (name.strip() for name in settings.search_backends.split(","))
+        if name in engine_factories
+    ]
+
+    # 2.未配置有效后端时默认使用bing，单个后端时直接使用，多个后端时组合为多后端搜索
+    search_engine: SearchEngine = backends[0].engine if backends else get_bing_search_engine()
+    if len(backends) > 1:
+        search_engine = MultiSearchEngine(
+            backends=backends,
+            strategy=settings.search_strategy,
+            deadline=settings.search_deadline_seconds,
+            hedge_percentile=settings.search_hedge_percentile,
+        )
+
+    # 3.开启缓存时使用Redis缓存包装
+    if settings.search_cache_enabled:
+        search_engine = CachedSearchEngine(
+            search_engine=search_engine,
+            redis_client=get_redis(),
+            stale_seconds=settings.search_cache_stale_seconds,
+            empty_ttl_seconds=settings.search_cache_empty_ttl_seconds,
+        )
+    return search_engine
+
+@lru_cache()
+def get_task_scheduler() -> Optional[TaskScheduler]:
+    """获取任务调度器(进程内单例)，未开启任务调度时返回None"""
+    if not settings.task_scheduler_enabled:
+        return None
+    return TaskScheduler(
+        max_concurrent_tasks=settings.max_concurrent_tasks,
+        max_concurrent_tasks_per_user=settings.max_concurrent_tasks_per_user,
+        max_queued_tasks=settings.max_queued_tasks,
+        weights={
+            TaskPriority.INTERACTIVE: settings.interactive_task_weight,
+            TaskPriority.BATCH: settings.batch_task_weight,
+        },
+    )
+
+def _create_llm(llm_config: LLMConfig, router_config: LLMRouterConfig, **kwargs) -> LLM:
+    """根据配置创建语言模型，配置了备用供应商时使用多供应商路由(llm_config作为主路由)"""
+    # 1.开启限流时所有LLM共享集群令牌桶
+    if settings.llm_rate_limit_enabled:
+        kwargs["rate_limiter"] = get_llm_rate_limiter()
+
+    # 2.未配置备用供应商时直接使用OpenAILLM
+    llm = OpenAILLM(llm_config, **kwargs)
+    if not router_config.providers:
+        return llm
+
+    # 3.组装多供应商路由
+    routes = [LLMRoute(LLMRoute.route_name(llm_config), llm)] + [
+        LLMRoute(LLMRoute.route_name(provider), OpenAILLM(provider, **kwargs))
+        for provider in router_config.providers
+    ]
+    return LLMRouter(routes=routes, router_config=router_config)
+
+def _with_llm_cache(llm: LLM) -> LLM:
+    """根据配置使用LLM响应缓存包装语言模型"""
+    if settings.llm_cache_mode == "off":
+        return llm
+    return CachedLLM(
+        llm=llm,
+        mode=settings.llm_cache_mode,
+        backend=get_llm_cache_backend(),
+        recording=get_llm_recording() if settings.llm_cache_mode in ("record", "replay") else None,
+        replay_strict=settings.llm_replay_strict,
+    )
+
+def _create_llm_profiles(app_config: AppConfig, llm: LLM) -> LLMProfileSelector:
+    """根据档位配置创建模型档位选择器，档位未填写的字段继承llm_config，default档位即llm本身(只读取单价)"""
+    # 1.创建默认档位
+    profiles_config = app_config.llm_profiles_config
+    default_config = profiles_config.profiles.get("default")
+    default = LLMProfile(
+        name="default",
+        llm=llm,
+        prompt_price=default_config.prompt_price if default_config else 0.0,
+        completion_price=default_config.completion_price if default_config else 0.0,
+    )
+
+    # 2.创建其余档位(只请求档位配置的供应商，不经过多供应商路由)
+    profiles = {}
+    for name, profile_config in profiles_config.profiles.items():
+        if name == "default":
+            continue
+        llm_config = app_config.llm_config.model_copy(update=profile_config.model_dump(
+            exclude={"prompt_price", "completion_price"},
+            exclude_none=True,
+        ))
+        profiles[name] = LLMProfile(
+            name=name,
+            llm=_with_llm_cache(_create_llm(
+                llm_config,
+                LLMRouterConfig(),
+                parallel_tool_calls=app_config.agent_config.parallel_tool_calls,
+            )),
+            prompt_price=profile_config.prompt_price,
+            completion_price=profile_config.completion_price,
+        )
+    return LLMProfileSelector(default=default, profiles=profiles, routes=profiles_config.routes)
+
 def get_agent_service(
         cos: Cos = Depends(get_cos),
 ) -> AgentService:
@@ -82,8 +206,16 @@ def get_agent_service(
     app_config_repository = FileAppConfigRepository(config_path=settings.app_config_filepath)
     app_config = app_config_repository.load()
 
-    # 2.构建依赖实例
-    llm = OpenAILLM(app_config.llm_config)
+    # 2.构建依赖实例(记忆摘要使用低成本模型并固定温度为0，只请求主供应商)
+    llm = _with_llm_cache(_create_llm(
+        app_config.llm_config,
+        app_config.llm_router_config,
+        parallel_tool_calls=app_config.agent_config.parallel_tool_calls,
+    ))
+    summary_llm = _with_llm_cache(_create_llm(app_config.llm_config.model_copy(update={
+        "model_name": settings.memory_summary_model or app_config.llm_config.model_name,
+        "temperature": 0,
+    }), LLMRouterConfig()))
     file_storage = CosFileStorage(
         bucket=settings.cos_bucket,
         cos=cos,
@@ -100,6 +232,12 @@ def get_agent_service(
         sandbox_cls=DockerSandbox,
         task_cls=RedisStreamTask,
         json_parser=RepairJSONParser(),
-        search_engine=BingSearchEngine(),
+        search_engine=get_search_engine(),
         file_storage=file_storage,
+        web_fetcher=get_web_fetcher(),
+        tokenizer=get_tokenizer(),
+        summary_llm=summary_llm,
+        llm_profiles=_create_llm_profiles(app_config, llm),
+        worker_mode=settings.agent_worker_mode,
+        task_scheduler=get_task_scheduler(),
     )
\ No newline at end of file
@@ -14,6 +14,10 @@ from alembic.config import Config
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.infrastructure.external.browser.playwright_manager import get_playwright_manager
+from app.infrastructure.external.search.bing_search import get_bing_search_engine
+from app.infrastructure.external.search.searxng_search import get_searxng_search_engine
+from app.infrastructure.external.web_fetcher.httpx_web_fetcher import get_web_fetcher
 from app.infrastructure.logging import setup_logging
 from app.infrastructure.storage.cos import get_cos
 from app.infrastructure.storage.mysql import get_mysql
@@ -69,6 +73,10 @@ async def lifespan(app: FastAPI):
             logger.error(f"Agent服务关闭期间出现错误：{str(e)}")
 
         # 5.应用关闭时执行
+        await get_playwright_manager().shutdown()
+        await get_bing_search_engine().aclose()
+        await get_searxng_search_engine().aclose()
+        await get_web_fetcher().aclose()
         await get_redis().shutdown()
         await get_mysql().shutdown()
         await get_cos().shutdown()
@@ -0,0 +1,206 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 23:50
+#Author  :Emcikem
+@File    :worker.py
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from typing import Dict, Any, Tuple
+
+from app.domain.external.task import Task
+from app.infrastructure.external.browser.playwright_manager import get_playwright_manager
+from app.infrastructure.external.search.bing_search import get_bing_search_engine
+from app.infrastructure.external.search.searxng_search import get_searxng_search_engine
+from app.infrastructure.external.task.redis_job_queue import RedisJobQueue
+from app.infrastructure.external.web_fetcher.httpx_web_fetcher import get_web_fetcher
+from app.infrastructure.logging import setup_logging
+from app.infrastructure.storage.cos import get_cos
+from app.infrastructure.storage.mysql import get_mysql
+from app.infrastructure.storage.redis import get_redis
+from app.interfaces.service_dependencies import get_agent_service
+from core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+"""
+Agent worker设计思路：
+1.原先Agent任务以asyncio任务的形式运行在API进程中，计划解析、工具结果处理、记忆压缩等CPU密集的工作会和SSE推送争抢同一个事件循环；
+2.开启agent_worker_mode后API进程只把任务投递到Redis任务队列并读取任务输出流，
+    任务由`python -m app.worker`启动的独立worker进程执行，worker与API可以分别扩缩容；
+3.每个worker进程使用消费者组消费任务队列，同时最多执行agent_worker_concurrency个任务，并发已满时不再读取任务，
+    多个worker进程(agent_worker_processes)之间由消费者组均衡分配任务；
+4.收到SIGTERM/SIGINT后进入排空(drain)阶段：停止读取新任务，等待执行中的任务最多agent_worker_drain_seconds，
+    超时仍未完成的任务被挂起(保留会话运行状态与检查点、释放租约)并重新投递为恢复任务，由其他worker从检查点继续执行；
+"""
+
+
+class AgentWorker:
+    """Agent任务worker，消费Redis任务队列并在当前进程中执行Agent任务"""
+
+    def __init__(self, concurrency: int, drain_seconds: int) -> None:
+        """构造函数，完成worker初始化，涵盖并发数、排空时长"""
+        self._concurrency = max(1, concurrency)
+        self._drain_seconds = drain_seconds
+        self._consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self._job_queue = RedisJobQueue()
+        self._stopping = asyncio.Event()
+        self._running: Dict[str, Tuple[Task, Dict[str, Any]]] = {}  # 执行中的任务: 任务id -> (任务, 任务内容)
+
+    def stop(self) -> None:
+        """请求停止worker，停止读取新任务并进入排空阶段"""
+        if not self._stopping.is_set():
+            logger.info(f"Agent worker[{self._consumer}]收到停止信号，开始排空任务")
+            self._stopping.set()
+
+    def _prune(self) -> None:
+        """移除已经执行结束的任务"""
+        for task_id in [task_id for task_id, (task, _) in self._running.items() if task.done]:
+            del self._running[task_id]
+
+    async def _execute(self, job_id: str, job: Dict[str, Any]) -> None:
+        """执行任务队列中的一个任务，开始执行后确认任务"""
+        try:
+            # 1.每个任务实时读取应用配置构建Agent服务(与API进程的行为保持一致)
+            agent_service = get_agent_service(cos=get_cos())
+            task = await agent_service.execute_task(
+                session_id=job["session_id"],
+                task_id=job["task_id"],
+                resume=job.get("resume", False),
+            )
+
+            # 2.记录执行中的任务，用于并发控制与排空
+            if task is not None:
+                self._running[task.id] = (task, job)
+        except Exception as e:
+            logger.error(f"Agent worker[{self._consumer}]执行任务[{job_id}]失败: {str(e)}")
+        finally:
+            # 3.任务已经开始执行(或无需执行)，执行期间的宕机由租约+检查点恢复
+            await self._job_queue.ack(job_id)
+
+    async def _drain(self) -> None:
+        """排空执行中的任务，超时未完成的任务挂起后重新投递"""
+        # 1.等待执行中的任务完成
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._drain_seconds
+        self._prune()
+        while self._running and loop.time() < deadline:
+            logger.info(f"Agent worker[{self._consumer}]等待{len(self._running)}个任务执行完成")
+            await asyncio.sleep(1)
+            self._prune()
+
+        if not self._running:
+            return
+
+        # 2.挂起超时未完成的任务并等待执行结束(释放租约)
+        suspended = list(self._running.values())
+        for task, _ in suspended:
+            task.suspend()
+        while not all(task.done for task, _ in suspended):
+            await asyncio.sleep(0.1)
+
+        # 3.重新投递为恢复任务，由其他worker从检查点继续执行
+        for task, job in suspended:
+            try:
+                await self._job_queue.put({"session_id": job["session_id"], "task_id": task.id, "resume": True})
+                logger.info(f"任务[{task.id}]已挂起并重新投递")
+            except Exception as e:
+                # 重新投递失败时会话仍可以在下一次对话时从检查点恢复
+                logger.error(f"任务[{task.id}]重新投递失败: {str(e)}")
+        self._running.clear()
+
+    async def run(self) -> None:
+        """运行worker，直到收到停止信号并完成排空"""
+        # 1.注册停止信号
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stop)
+
+        # 2.初始化Redis/MySQL/Cos客户端与任务队列
+        await get_redis().init()
+        await get_mysql().init()
+        await get_cos().init()
+        await self._job_queue.init()
+        logger.info(f"Agent worker[{self._consumer}]启动成功，并发数: {self._concurrency}")
+
+        try:
+            # 3.循环读取任务，并发已满时等待执行中的任务结束
+            while not self._stopping.is_set():
+                self._prune()
+                if len(self._running) >= self._concurrency:
+                    await asyncio.sleep(0.2)
+                    continue
+
+                try:
+                    job_id, job = await self._job_queue.get(self._consumer, block_ms=1000)
+                except Exception as e:
+                    logger.error(f"Agent worker[{self._consumer}]读取任务队列失败: {str(e)}")
+                    await asyncio.sleep(1)
+                    continue
+                if job_id is None:
+                    continue
+                await self._execute(job_id, job)
+
+            # 4.停止读取新任务，排空执行中的任务
+            await self._drain()
+        finally:
+            # 5.释放任务与资源
+            await get_agent_service(cos=get_cos()).shutdown()
+            await get_playwright_manager().shutdown()
+            await get_bing_search_engine().aclose()
+            await get_searxng_search_engine().aclose()
+            await get_web_fetcher().aclose()
+            await get_redis().shutdown()
+            await get_mysql().shutdown()
+            await get_cos().shutdown()
+            logger.info(f"Agent worker[{self._consumer}]已退出")
+
+
+def run_worker() -> None:
+    """在当前进程中运行一个Agent worker"""
+    setup_logging()
+    settings = get_settings()
+    asyncio.run(AgentWorker(
+        concurrency=settings.agent_worker_concurrency,
+        drain_seconds=settings.agent_worker_drain_seconds,
+    ).run())
+
+
+def main() -> None:
+    """启动agent_worker_processes个worker进程，并将停止信号转发给所有worker进程"""
+    # 1.只有一个worker进程时直接在当前进程运行
+    settings = get_settings()
+    if settings.agent_worker_processes <= 1:
+        run_worker()
+        return
+
+    # 2.使用spawn启动worker进程，避免子进程继承父进程的事件循环与连接
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker, name=f"agent-worker-{index}")
+        for index in range(settings.agent_worker_processes)
+    ]
+    for process in processes:
+        process.start()
+
+    # 3.转发停止信号，由每个worker进程自行排空任务
+    def _forward(signum, _frame) -> None:
+        for p in processes:
+            if p.is_alive():
+                os.kill(p.pid, signum)
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+
+    # 4.等待所有worker进程退出
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
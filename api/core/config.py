@@ -47,6 +47,67 @@ class Settings(BaseSettings):
     sandbox_http_proxy: Optional[str] = None
     sandbox_no_proxy: Optional[str] = None
 
+    # 浏览器页面编码配置(markdown: 可见内容Markdown+可交互元素列表, ax_tree: 紧凑无障碍树, ab: 按浏览器实例随机分流)
+    browser_page_encoding: str = "markdown"
+    browser_page_token_budget: int = 4000
+
+    # Bing搜索配置(解析器后端: auto/lxml/soup-lxml/soup)
+    bing_search_base_url: str = "https://www.bing.com/search"
+    bing_search_parser: str = "auto"
+    bing_search_max_connections: int = 20
+
+    # 多后端搜索配置(search_backends为逗号分隔的后端列表: bing/searxng，策略: first对冲请求, fuse结果融合)
+    search_backends: str = "bing"
+    searxng_search_base_url: str = "http://searxng:8080/search"
+    search_strategy: str = "first"
+    search_deadline_seconds: float = 10.0
+    search_hedge_percentile: float = 0.9
+
+    # 搜索结果缓存配置(Redis集群级缓存，陈旧窗口内返回旧值并在后台刷新)
+    search_cache_enabled: bool = True
+    search_cache_stale_seconds: int = 3600
+    search_cache_empty_ttl_seconds: int = 60  # 空结果的缓存时间(秒)
+
+    # LLM响应缓存配置(模式: off/cache/record/replay，后端: redis/disk)
+    llm_cache_mode: str = "cache"
+    llm_cache_backend: str = "redis"
+    llm_cache_dir: str = ".llm_cache"
+    llm_cache_max_entries: int = 10000
+    llm_record_path: str = "recordings/llm_session.jsonl"
+    llm_replay_strict: bool = True
+
+    # 记忆token预算配置(本地分词器路径/HuggingFace仓库名，摘要模型为空时使用主模型)
+    tokenizer_path: Optional[str] = None
+    memory_summary_model: Optional[str] = None
+
+    # 任务租约配置(执行任务的副本定期续约，租约过期后其他副本可以从检查点接管任务)
+    task_lease_seconds: int = 30
+
+    # Agent worker配置(worker模式下API进程只投递任务与读取输出流，任务由独立的worker进程消费Redis任务队列执行)
+    agent_worker_mode: bool = False
+    agent_worker_processes: int = 1  # worker进程数
+    agent_worker_concurrency: int = 4  # 每个worker进程同时执行的任务数
+    agent_worker_drain_seconds: int = 60  # 退出时等待执行中任务完成的时长，超时的任务挂起后重新投递
+    agent_job_stream: str = "agent:jobs"
+
+    # 任务调度配置(启动任务前的准入控制：全局/单用户并发上限、等待队列上限、优先级权重)
+    task_scheduler_enabled: bool = True
+    max_concurrent_tasks: int = 32
+    max_concurrent_tasks_per_user: int = 4
+    max_queued_tasks: int = 100
+    interactive_task_weight: int = 4
+    batch_task_weight: int = 1
+
+    # LLM集群限流配置(每个供应商+模型一个Redis令牌桶，供应商返回x-ratelimit-*响应头时以响应头为准)
+    llm_rate_limit_enabled: bool = True
+    llm_rate_limit_rpm: int = 500
+    llm_rate_limit_tpm: int = 200000
+    llm_rate_limit_max_wait_seconds: float = 120.0
+
+    # 浏览器实时画面配置(CDP录屏)
+    browser_live_view_max_fps: float = 5.0
+    browser_live_view_quality: int = 60
+    browser_live_view_keepalive_seconds: int = 60  # 实时画面打开期间刷新沙箱浏览器最近使用时间的间隔(秒)，需小于沙箱的空闲停止时间
 
     # 使用pydantic v2的写法来完成环境变量信息的告知
     model_config = SettingsConfigDict(
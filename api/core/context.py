@@ -0,0 +1,18 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/20 00:40
+#Author  :Emcikem
+@File    :context.py
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+"""
+请求上下文设计思路：
+1.部分基础设施(例如LLM限流)需要知道当前调用属于哪个会话，但LLM等协议的签名中没有会话信息；
+2.任务运行器开始执行时写入当前会话id，asyncio创建子任务时会复制上下文，并行步骤/并行工具调用中同样可以读取；
+"""
+
+# 当前执行的会话id
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
@@ -0,0 +1,101 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 10:12
+#Author  :Emcikem
+@File    :metrics.py
+"""
+import threading
+from collections import defaultdict, deque
+from functools import lru_cache
+from typing import Dict, Any, Deque
+
+"""
+进程内指标收集器设计思路：
+1.项目中没有引入Prometheus等监控依赖，为了方便对各种性能优化做A/B对比，这里提供一个轻量的进程内指标收集器；
+2.支持三种指标：计数器(counter)、仪表盘(gauge)、观测值分布(observe，保留最近N个样本计算均值/分位数)；
+3.指标支持传递标签(labels)，标签会被拼接到指标名字中，例如: browser_view_tokens{encoding=ax_tree}；
+4.使用lru_cache实现单例，所有模块通过get_metrics()获取同一个收集器，并在状态模块中统一导出；
+"""
+
+
+class Metrics:
+    """进程内指标收集器"""
+
+    def __init__(self, max_samples: int = 1000) -> None:
+        """构造函数，完成指标存储结构的初始化"""
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+
+    @classmethod
+    def _build_key(cls, name: str, labels: Dict[str, Any]) -> str:
+        """根据指标名字+标签构建指标键"""
+        if not labels:
+            return name
+        label_str = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def incr(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        """计数器累加指定的值"""
+        key = self._build_key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """设置仪表盘的当前值"""
+        key = self._build_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """记录一个观测值(耗时、token数等)，只保留最近max_samples个样本"""
+        key = self._build_key(name, labels)
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self._max_samples)
+            self._samples[key].append(value)
+
+    @classmethod
+    def _percentile(cls, sorted_values: list, percent: float) -> float:
+        """计算已排序样本的分位数"""
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, int(round(percent * (len(sorted_values) - 1))))
+        return sorted_values[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前所有指标的快照"""
+        with self._lock:
+            # 1.拷贝计数器与仪表盘
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+            # 2.统计观测值分布
+            observations = {}
+            for key, samples in self._samples.items():
+                values = sorted(samples)
+                observations[key] = {
+                    "count": len(values),
+                    "avg": sum(values) / len(values) if values else 0.0,
+                    "p50": self._percentile(values, 0.5),
+                    "p95": self._percentile(values, 0.95),
+                    "max": values[-1] if values else 0.0,
+                }
+
+        return {"counters": counters, "gauges": gauges, "observations": observations}
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._samples.clear()
+
+
+@lru_cache()
+def get_metrics() -> Metrics:
+    """使用lru_cache实现单例模式，获取进程内指标收集器"""
+    return Metrics()
@@ -0,0 +1,42 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 19:40
+#Author  :Emcikem
+@File    :tokens.py
+"""
+import re
+
+"""
+token估算设计思路：
+1.项目中多处需要在不引入分词器的前提下控制输出大小(浏览器页面编码、搜索阅读摘要等)，这里提供统一的粗略估算；
+2.中日韩字符按1个token计算，其余字符按4个字符1个token计算；
+3.截断时按估算比例直接定位截断位置，再逐步回退，避免逐字符扫描；
+"""
+
+# 中日韩字符正则，用于估算token
+CJK_PATTERN = re.compile(r"[一-鿿぀-ヿ가-힯]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数：中日韩字符按1个token计算，其余字符按4个字符1个token计算"""
+    if not text:
+        return 0
+    cjk_count = len(CJK_PATTERN.findall(text))
+    return cjk_count + (len(text) - cjk_count + 3) // 4
+
+
+def truncate_to_tokens(text: str, budget: int, suffix: str = "...") -> str:
+    """将文本截断到token预算以内，发生截断时追加后缀"""
+    # 1.预算内的文本直接返回
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return text
+    if budget <= 0:
+        return ""
+
+    # 2.按比例定位截断位置，超出预算时每次回退10%
+    end = max(1, len(text) * budget // tokens)
+    while end > 1 and estimate_tokens(text[:end]) + estimate_tokens(suffix) > budget:
+        end = int(end * 0.9)
+    return text[:end].rstrip() + suffix
@@ -0,0 +1,92 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/20 23:10
+#Author  :Emcikem
+@File    :test_fork_memory.py
+"""
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.domain.models.app_config import AgentConfig
+from app.domain.models.memory import Memory
+from app.domain.services.agents.react import ReActAgent
+from app.infrastructure.external.json_parser.repair_json_parser import RepairJSONParser
+from app.infrastructure.repositories.db_uow import DBUnitOfWork
+
+"""
+并行执行者继承记忆的并发测试：
+1.使用SQLite(支持JSON_SET/JSON_EXTRACT)代替MySQL，只创建测试需要的session表字段；
+2.并行轮次中所有执行者会同时继承主执行Agent的记忆并整份写回，写回不能相互覆盖；
+"""
+
+SESSION_ID = "session-1"
+
+
+class FakeLLM:
+    """测试用语言模型，执行者继承记忆时不会调用"""
+    model_name = "fake"
+    temperature = 0.0
+    max_tokens = 1024
+
+    async def invoke(self, messages, tools=None, response_format=None, tool_choice=None):
+        raise AssertionError("继承记忆时不应调用语言模型")
+
+
+def create_agent(uow_factory, name: str) -> ReActAgent:
+    """创建指定名字(记忆key)的执行Agent"""
+    agent = ReActAgent(
+        uow_factory=uow_factory,
+        session_id=SESSION_ID,
+        agent_config=AgentConfig(),
+        llm=FakeLLM(),
+        json_parser=RepairJSONParser(),
+        tools=[],
+    )
+    agent.name = name
+    return agent
+
+
+async def run_fork_concurrently(db_path: str, worker_count: int) -> dict:
+    """主执行Agent存在记忆时，多个执行者同时继承记忆，返回数据库中最终的memories"""
+    # 1.创建只包含所需字段的session表与会话记录
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE session (id VARCHAR(255) PRIMARY KEY, memories JSON NOT NULL DEFAULT '{}', updated_at DATETIME)"
+        ))
+        main_memory = {"messages": [{"role": "user", "content": "hello"}], "compacted_index": 0}
+        await conn.execute(
+            text("INSERT INTO session (id, memories) VALUES (:id, :memories)"),
+            {"id": SESSION_ID, "memories": json.dumps({ReActAgent.name: main_memory})},
+        )
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    uow_factory = lambda: DBUnitOfWork(session_factory=session_factory)
+
+    # 2.主执行Agent加载记忆后，所有执行者同时继承主执行Agent的记忆
+    react = create_agent(uow_factory, ReActAgent.name)
+    await react.get_memory_cursor()
+    workers = [create_agent(uow_factory, f"{ReActAgent.name}_{index}") for index in range(worker_count)]
+    await asyncio.gather(*[worker.fork_memory(react) for worker in workers])
+
+    # 3.读取最终的memories
+    async with engine.connect() as conn:
+        memories = (await conn.execute(text("SELECT memories FROM session"))).scalar_one()
+    await engine.dispose()
+    return json.loads(memories)
+
+
+def test_parallel_workers_fork_memory_without_lost_updates(tmp_path):
+    memories = asyncio.run(run_fork_concurrently(str(tmp_path / "session.db"), worker_count=2))
+
+    # 主执行Agent与每个执行者的记忆都需要保留，且执行者记忆与主执行Agent一致
+    assert set(memories) == {"react", "react_0", "react_1"}
+    for name in ("react_0", "react_1"):
+        assert Memory(**memories[name]).messages == memories["react"]["messages"]
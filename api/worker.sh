@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# 启动Agent worker进程消费任务队列（worker模式下使用，exec让worker成为主进程以便接收SIGTERM完成排空）
+exec python -m app.worker
\ No newline at end of file
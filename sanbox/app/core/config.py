@@ -15,6 +15,16 @@ class Settings(BaseSettings):
     log_level: str = "INFO"  # 日志等级
     server_timeout_minutes: int = 60  # 服务超时时间单位为分钟
 
+    # 浏览器卫生(内存/标签页)相关配置
+    browser_cdp_url: str = "http://127.0.0.1:8222"  # 沙箱内部Chrome的CDP地址
+    browser_headless: bool = True  # 默认以无头模式运行浏览器，只有VNC连接时切换为有头模式
+    browser_headed_linger_seconds: int = 60  # VNC断开超过该时间(秒)后切换回无头模式
+    browser_memory_limit_mb: int = 1536  # Chrome总RSS超过该值(MB)时在工具调用间隙重启浏览器
+    browser_max_tabs: int = 5  # 最多保留的标签页数
+    browser_stale_tab_seconds: int = 600  # 后台标签页超过该时间(秒)没有变化则关闭
+    browser_check_interval_seconds: int = 30  # 后台检查标签页的间隔(秒)，设置为0则关闭后台检查
+    browser_idle_timeout_seconds: int = 900  # 浏览器空闲超过该时间(秒)且无VNC连接时停止浏览器相关进程，设置为0则不停止
+
     # 使用pydantic v2提供的写法完成环境变量信息的声明
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,61 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 15:46
+#Author  :Emcikem
+@File    :browser.py
+"""
+from fastapi import APIRouter, Depends
+
+from app.interfaces.schemas.base import Response
+from app.interfaces.schemas.browser import BrowserStartRequest
+from app.interfaces.service_dependencies import get_browser_service
+from app.models.browser import BrowserHygieneResult, BrowserStats, BrowserStartResult
+from app.services.browser import BrowserService
+
+router = APIRouter(prefix="/browser", tags=["浏览器模块"])
+
+
+@router.post(
+    path="/start",
+    response_model=Response[BrowserStartResult],
+)
+async def start(
+        request: BrowserStartRequest,
+        browser_service: BrowserService = Depends(get_browser_service),
+) -> Response[BrowserStartResult]:
+    """按需启动浏览器(以及VNC)相关进程，并等待浏览器CDP服务就绪"""
+    result = await browser_service.ensure_started(request.vnc)
+    return Response.success(
+        msg="浏览器已就绪",
+        data=result,
+    )
+
+
+@router.post(
+    path="/maintain",
+    response_model=Response[BrowserHygieneResult],
+)
+async def maintain(
+        browser_service: BrowserService = Depends(get_browser_service),
+) -> Response[BrowserHygieneResult]:
+    """执行浏览器卫生检查，关闭过期标签页，内存超限时保留cookie/存储并重启浏览器(应在工具调用间隙调用)"""
+    result = await browser_service.maintain()
+    return Response.success(
+        msg="浏览器已重启" if result.restarted else "浏览器卫生检查完成",
+        data=result,
+    )
+
+
+@router.get(
+    path="/stats",
+    response_model=Response[BrowserStats],
+)
+async def get_stats(
+        browser_service: BrowserService = Depends(get_browser_service),
+) -> Response[BrowserStats]:
+    """获取浏览器回收统计信息，用于评估沙箱内存规格"""
+    return Response.success(
+        msg="获取浏览器回收统计成功",
+        data=await browser_service.get_stats(),
+    )
@@ -70,10 +70,10 @@ async def shutdown(
 async def restart(
         supervisor_service: SupervisorService = Depends(get_supervisor_service),
 ) -> Response[SupervisorActionResult]:
-    """重启supervisor管理的所有子进程"""
+    """重启supervisor管理的常驻子进程(浏览器等按需启动的进程由浏览器服务管理)"""
     result = await supervisor_service.restart()
     return Response.success(
-        msg="重启Supervisor所有进程服务成功",
+        msg="重启Supervisor常驻进程服务成功",
         data=result,
     )
 
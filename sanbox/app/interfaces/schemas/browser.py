@@ -0,0 +1,13 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 16:20
+#Author  :Emcikem
+@File    :browser.py
+"""
+from pydantic import BaseModel, Field
+
+
+class BrowserStartRequest(BaseModel):
+    """按需启动浏览器请求"""
+    vnc: bool = Field(default=False, description="是否同时启动VNC相关进程")
@@ -7,6 +7,7 @@
 """
 from functools import lru_cache
 
+from app.services.browser import BrowserService
 from app.services.file import FileService
 from app.services.shell import ShellService
 from app.services.supervisor import SupervisorService
@@ -25,3 +26,8 @@ def get_file_service() -> FileService:
 @lru_cache()
 def get_supervisor_service() -> SupervisorService:
     return SupervisorService()
+
+
+@lru_cache()
+def get_browser_service() -> BrowserService:
+    return BrowserService(get_supervisor_service())
@@ -5,6 +5,7 @@
 #Author  :Emcikem
 @File    :main.py
 """
+import asyncio
 import logging
 import sys
 from contextlib import asynccontextmanager
@@ -16,6 +17,7 @@ from app.core.config import get_settings
 from app.core.middleware import auto_extend_timeout_middleware
 from app.interfaces.endpoints.routes import router
 from app.interfaces.errors.exception_handler import register_exception_handlers
+from app.interfaces.service_dependencies import get_browser_service
 
 
 def setup_logging() -> None:
@@ -53,11 +55,21 @@ async def lifespan(app: FastAPI):
     # 1.应用开始运行之前的操作
     logger.info("MoocManus沙箱正在初始化")
 
+    # 2.启动后台浏览器检查任务(标签页清理+空闲停止)
+    settings = get_settings()
+    cleanup_task = None
+    if settings.browser_check_interval_seconds > 0:
+        cleanup_task = asyncio.create_task(
+            get_browser_service().run_background_checks(settings.browser_check_interval_seconds)
+        )
+
     try:
-        # 2.lifespan关键节点
+        # 3.lifespan关键节点
         yield
     finally:
-        # 3.应用结束后的操作
+        # 4.应用结束后的操作
+        if cleanup_task:
+            cleanup_task.cancel()
         logger.info("MoocManus沙箱关闭成功")
 
 
@@ -79,6 +91,10 @@ openapi_tags = [
         "name": "Supervisor模块",
         "description": "使用接口+Supervisor实现管理沙箱系统的程序逻辑",
     },
+    {
+        "name": "浏览器模块",
+        "description": "包含 **浏览器标签页清理、内存超限回收** 等 API 接口，用于保持沙箱浏览器的健康。",
+    },
 ]
 
 # 3.实例化FastAPI项目实例
@@ -0,0 +1,59 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 15:10
+#Author  :Emcikem
+@File    :browser.py
+"""
+from typing import Optional, List, Dict
+
+from pydantic import BaseModel, Field
+
+
+class BrowserStartResult(BaseModel):
+    """浏览器按需启动结果模型"""
+    started: List[str] = Field(default_factory=list, description="本次新启动的进程列表")
+    ready: bool = Field(default=False, description="浏览器CDP服务是否就绪")
+    vnc: bool = Field(default=False, description="VNC相关进程是否已启动")
+    mode: str = Field(default="headless", description="浏览器运行模式: headless/headed")
+    elapsed_ms: float = Field(default=0, description="启动并等待就绪的耗时(毫秒)")
+
+
+class BrowserTabInfo(BaseModel):
+    """浏览器标签页信息模型"""
+    target_id: str = Field(..., description="CDP目标id")
+    url: str = Field(default="", description="标签页地址")
+    title: str = Field(default="", description="标签页标题")
+    js_heap_mb: Optional[float] = Field(default=None, description="标签页JS堆内存占用(MB)")
+    dom_nodes: Optional[int] = Field(default=None, description="标签页DOM节点数")
+    idle_seconds: float = Field(default=0, description="标签页地址未变化的时长(秒)")
+    active: bool = Field(default=False, description="是否为当前活跃(最新)标签页")
+
+
+class BrowserHygieneResult(BaseModel):
+    """浏览器卫生检查结果模型"""
+    rss_mb: float = Field(default=0, description="Chrome所有进程的总RSS(MB)")
+    memory_limit_mb: int = Field(..., description="内存阈值(MB)")
+    tabs: List[BrowserTabInfo] = Field(default_factory=list, description="检查后剩余的标签页列表")
+    closed_tabs: List[str] = Field(default_factory=list, description="本次关闭的标签页地址列表")
+    restarted: bool = Field(default=False, description="本次是否重启或重新启动了浏览器，为true时调用方需要重新建立CDP连接")
+    restored_cookies: int = Field(default=0, description="重启后恢复的cookie数")
+
+
+class BrowserStats(BaseModel):
+    """浏览器回收统计模型，用于评估沙箱内存规格"""
+    rss_mb: float = Field(default=0, description="最近一次检查的Chrome总RSS(MB)")
+    peak_rss_mb: float = Field(default=0, description="Chrome总RSS峰值(MB)")
+    tab_count: int = Field(default=0, description="最近一次检查的标签页数")
+    checks: int = Field(default=0, description="卫生检查次数")
+    closed_tabs: int = Field(default=0, description="累计关闭的标签页数")
+    recycles: int = Field(default=0, description="累计因内存超限重启浏览器的次数")
+    recycle_rss_mb: List[float] = Field(default_factory=list, description="最近若干次重启前的RSS(MB)")
+    last_recycle_at: Optional[str] = Field(default=None, description="最近一次重启浏览器的时间")
+    running: bool = Field(default=False, description="浏览器相关进程是否正在运行")
+    lazy_starts: int = Field(default=0, description="累计按需启动浏览器的次数")
+    idle_stops: int = Field(default=0, description="累计因空闲停止浏览器的次数")
+    mode: Optional[str] = Field(default=None, description="浏览器运行模式: headless/headed，未运行时为空")
+    mode_switches: int = Field(default=0, description="累计无头/有头模式切换次数")
+    cpu_percent: float = Field(default=0, description="最近一次采样的浏览器相关进程CPU占用率(%)")
+    idle_cpu_percent: Dict[str, float] = Field(default_factory=dict, description="沙箱空闲时各模式的平均CPU占用率(%)")
@@ -0,0 +1,660 @@
+#!/usr/bin/eny python
+# -*- coding: utf-8 -*-
+"""
+@Time    :2026/10/19 15:18
+#Author  :Emcikem
+@File    :browser.py
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from websockets.asyncio.client import connect
+
+from app.core.config import get_settings
+from app.interfaces.errors.exceptions import AppException
+from app.models.browser import BrowserTabInfo, BrowserHygieneResult, BrowserStats, BrowserStartResult
+from app.services.supervisor import SupervisorService
+
+"""
+浏览器卫生服务设计思路：
+1.长会话中Agent会不断打开新标签页(API侧只跟随最新的标签页)，旧标签页一直驻留，Chrome的RSS持续增长直到沙箱变慢或OOM；
+2.通过/proc统计Chrome所有进程(browser+renderer+gpu等)的总RSS，通过CDP Performance.getMetrics统计每个标签页的JS堆与DOM节点数，
+    CDP没有提供标签页到渲染进程pid的映射，所以内存阈值基于总RSS判断，单个标签页的数据用于观察与排查；
+3.最新创建的标签页视为活跃标签页(与API侧pages[-1]保持一致)，其余后台标签页超过空闲时间或超出最大标签页数时关闭；
+4.总RSS超过阈值时，由API侧在工具调用间隙调用maintain触发重启：先通过CDP导出cookie与活跃页面的localStorage，
+    再通过supervisor重启Chrome进程，最后恢复cookie、重新打开活跃页面并回填localStorage；
+5.统计检查次数、关闭标签页数、回收次数与回收前RSS，通过接口导出方便评估沙箱内存规格；
+6.沙箱启动时只运行FastAPI应用，Xvfb/Chrome/socat在第一次浏览器请求时通过supervisor按需启动，
+    x11vnc/websockify在第一次VNC连接时启动，浏览器空闲超时且没有VNC连接时再统一停止，节省启动耗时与内存；
+7.浏览器默认以无头模式运行(不需要Xvfb)，只有VNC连接时才切换为有头模式(Xvfb+Chrome+VNC)，VNC断开一段时间后再切回无头模式，
+    两种模式共享同一个用户目录，切换时额外通过CDP快照保留会话cookie、活跃页面与localStorage；
+8.后台检查时采样浏览器相关进程的CPU占用，沙箱空闲时按模式记录，用于对比无头/有头模式下每个空闲沙箱的CPU开销；
+"""
+
+logger = logging.getLogger(__name__)
+
+# 读取localStorage的js代码
+GET_LOCAL_STORAGE_FUNC = "JSON.stringify(Object.entries(window.localStorage || {}))"
+
+# 回填localStorage的js代码模板
+SET_LOCAL_STORAGE_FUNC = """(() => {
+    const entries = %s;
+    for (const [key, value] of entries) {
+        window.localStorage.setItem(key, value);
+    }
+    return entries.length;
+})()"""
+
+# 浏览器运行模式
+MODE_HEADLESS = "headless"
+MODE_HEADED = "headed"
+
+# 有头/无头Chrome进程
+HEADED_CHROME = "services:chrome"
+HEADLESS_CHROME = "services:chrome_headless"
+
+# 无头模式相关进程(按启动顺序)
+HEADLESS_PROGRAMS = [HEADLESS_CHROME, "services:socat"]
+
+# 有头模式相关进程(按启动顺序)
+HEADED_PROGRAMS = ["services:xvfb", HEADED_CHROME, "services:socat"]
+
+# VNC相关进程(按启动顺序)
+VNC_PROGRAMS = ["services:x11vnc", "services:websockify"]
+
+# 所有浏览器相关进程(按启动顺序)
+ALL_PROGRAMS = ["services:xvfb", HEADED_CHROME, HEADLESS_CHROME, "services:socat"] + VNC_PROGRAMS
+
+# 统计CPU占用时需要包含的进程名前缀
+CPU_PROCESS_PREFIXES = ("chrom", "Xvfb", "x11vnc", "websockify")
+
+# VNC相关端口，存在已建立的连接时视为有人正在观看
+VNC_PORTS = (5900, 5901)
+
+# Storage.setCookies支持的cookie字段
+COOKIE_FIELDS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires", "priority")
+
+
+class BrowserService:
+    """沙箱浏览器服务，负责按需启动、无头/有头模式切换、标签页清理与内存超限回收"""
+
+    def __init__(self, supervisor_service: SupervisorService) -> None:
+        """构造函数，完成浏览器卫生服务的初始化"""
+        settings = get_settings()
+        self._supervisor_service = supervisor_service
+        self._cdp_url = settings.browser_cdp_url.rstrip("/")
+        self._headless = settings.browser_headless
+        self._headed_linger_seconds = settings.browser_headed_linger_seconds
+        self._memory_limit_mb = settings.browser_memory_limit_mb
+        self._max_tabs = settings.browser_max_tabs
+        self._stale_tab_seconds = settings.browser_stale_tab_seconds
+        self._idle_timeout_seconds = settings.browser_idle_timeout_seconds
+        self._lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+        self._last_used: float = time.monotonic()
+        self._last_vnc_seen: float = 0.0
+        self._needs_reconnect = False
+        self._message_ids = itertools.count(1)
+
+        # 标签页跟踪信息: target_id -> (创建序号, 最近的url, url最近变化时间)
+        self._tabs: Dict[str, Tuple[int, str, float]] = {}
+        self._tab_sequence = itertools.count(1)
+
+        # 统计信息
+        self._stats = BrowserStats()
+        self._recycle_rss: deque = deque(maxlen=20)
+        self._last_cpu_sample: Optional[Tuple[float, float]] = None
+        self._idle_cpu_samples: Dict[str, deque] = {}
+
+    async def _http_json(self, path: str) -> Any:
+        """请求Chrome的/json系列http接口并返回解析后的数据"""
+
+        def _request() -> Any:
+            request = urllib.request.Request(f"{self._cdp_url}{path}", method="PUT" if "/json/new" in path else "GET")
+            with urllib.request.urlopen(request, timeout=5) as response:
+                body = response.read().decode("utf-8")
+                try:
+                    return json.loads(body)
+                except ValueError:
+                    return body
+
+        return await asyncio.to_thread(_request)
+
+    async def _cdp_send(
+            self,
+            ws_url: str,
+            commands: List[Tuple[str, Dict[str, Any]]],
+            timeout: float = 10,
+    ) -> List[Dict[str, Any]]:
+        """连接指定目标的CDP websocket并依次发送命令，返回每条命令的结果"""
+        results = []
+        async with connect(ws_url, max_size=None, open_timeout=timeout) as websocket:
+            for method, params in commands:
+                # 1.发送命令并等待相同id的响应，忽略期间推送的事件
+                message_id = next(self._message_ids)
+                await websocket.send(json.dumps({"id": message_id, "method": method, "params": params}))
+                while True:
+                    message = json.loads(await asyncio.wait_for(websocket.recv(), timeout))
+                    if message.get("id") == message_id:
+                        break
+
+                # 2.命令出错时记录错误并返回空结果
+                if "error" in message:
+                    logger.warning(f"CDP命令[{method}]执行失败: {message['error']}")
+                results.append(message.get("result", {}))
+        return results
+
+    @classmethod
+    def get_chrome_rss_mb(cls) -> float:
+        """通过/proc统计Chrome所有进程的总RSS(MB)"""
+        total_kb = 0
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                # 1.通过命令行判断是否为chrome/chromium进程
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    executable = f.read().split(b"\0", 1)[0]
+                if b"chrom" not in os.path.basename(executable):
+                    continue
+
+                # 2.读取VmRSS
+                with open(f"/proc/{pid}/status", "r") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+                            break
+            except (OSError, ValueError, IndexError):
+                continue
+        return round(total_kb / 1024, 1)
+
+    @classmethod
+    def has_established_connections(cls, ports: Tuple[int, ...]) -> bool:
+        """通过/proc/net/tcp判断指定的本地端口上是否存在已建立的连接"""
+        for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+            try:
+                with open(path, "r") as f:
+                    next(f, None)
+                    for line in f:
+                        fields = line.split()
+                        # 1.fields[1]为本地地址:端口(16进制)，fields[3]为连接状态，01表示ESTABLISHED
+                        if len(fields) > 3 and fields[3] == "01" and int(fields[1].rsplit(":", 1)[1], 16) in ports:
+                            return True
+            except OSError:
+                continue
+        return False
+
+    @classmethod
+    def get_browser_cpu_seconds(cls) -> float:
+        """通过/proc统计浏览器相关进程(Chrome/Xvfb/x11vnc/websockify)累计占用的CPU秒数"""
+        clock_ticks = os.sysconf("SC_CLK_TCK")
+        total_ticks = 0
+        for pid in os.listdir("/proc"):
+            if not pid.isdigit():
+                continue
+            try:
+                # 1.通过进程名字过滤浏览器相关进程
+                with open(f"/proc/{pid}/comm", "r") as f:
+                    comm = f.read().strip()
+                if not comm.startswith(CPU_PROCESS_PREFIXES):
+                    continue
+
+                # 2.读取utime+stime，进程名可能包含空格，所以从最后一个")"之后开始解析
+                with open(f"/proc/{pid}/stat", "r") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+                total_ticks += int(fields[11]) + int(fields[12])
+            except (OSError, ValueError, IndexError):
+                continue
+        return total_ticks / clock_ticks
+
+    async def _get_running_programs(self) -> Dict[str, bool]:
+        """获取浏览器与VNC相关进程是否正在运行"""
+        processes = await self._supervisor_service.get_all_processes()
+        running = {f"{process.group}:{process.name}": process.statename == "RUNNING" for process in processes}
+        return {program: running.get(program, False) for program in ALL_PROGRAMS}
+
+    @classmethod
+    def _get_mode(cls, running: Dict[str, bool]) -> Optional[str]:
+        """根据正在运行的浏览器进程判断当前模式，浏览器未运行时返回None"""
+        if running[HEADED_CHROME]:
+            return MODE_HEADED
+        if running[HEADLESS_CHROME]:
+            return MODE_HEADLESS
+        return None
+
+    async def is_running(self) -> bool:
+        """判断浏览器是否正在运行"""
+        return self._get_mode(await self._get_running_programs()) is not None
+
+    async def _start_programs(self, programs: List[str], running: Dict[str, bool]) -> List[str]:
+        """按顺序启动未运行的进程，返回本次启动的进程列表"""
+        started = []
+        for program in programs:
+            if not running[program]:
+                await self._supervisor_service.start_process(program)
+                running[program] = True
+                started.append(program)
+        return started
+
+    async def _stop_programs(self, programs: List[str], running: Dict[str, bool]) -> List[str]:
+        """按顺序停止正在运行的进程，返回本次停止的进程列表"""
+        stopped = []
+        for program in programs:
+            if running[program]:
+                await self._supervisor_service.stop_process(program)
+                running[program] = False
+                stopped.append(program)
+        return stopped
+
+    async def _switch_mode(self, mode: str, running: Dict[str, bool]) -> List[str]:
+        """在无头/有头模式间切换浏览器，切换前后通过CDP快照保留cookie、活跃页面与localStorage"""
+        # 1.导出当前浏览器状态，两种模式共享同一个用户目录，快照用于保留会话cookie与活跃页面
+        active_page, cookies, local_storage = None, [], []
+        try:
+            pages = await self._list_pages()
+            active_id = self._track_pages(pages)
+            active_page = next((page for page in pages if page["id"] == active_id), None)
+            cookies, local_storage = await self._export_state(active_page)
+        except Exception as e:
+            logger.warning(f"切换浏览器模式前导出状态失败: {str(e)}")
+
+        # 2.停止当前模式的进程并启动目标模式的进程(socat在两种模式下共用)
+        if mode == MODE_HEADED:
+            await self._stop_programs([HEADLESS_CHROME], running)
+            started = await self._start_programs(HEADED_PROGRAMS, running)
+        else:
+            await self._stop_programs(list(reversed(VNC_PROGRAMS)) + [HEADED_CHROME, "services:xvfb"], running)
+            started = await self._start_programs(HEADLESS_PROGRAMS, running)
+        await self._wait_for_cdp()
+        self._tabs.clear()
+
+        # 3.恢复浏览器状态并标记调用方需要重新建立CDP连接
+        try:
+            await self._restore_state(cookies, local_storage, (active_page or {}).get("url", ""))
+        except Exception as e:
+            logger.warning(f"切换浏览器模式后恢复状态失败: {str(e)}")
+        self._needs_reconnect = True
+        self._stats.mode_switches += 1
+        logger.info(f"浏览器已切换为{mode}模式, 启动进程: {started}")
+        return started
+
+    async def ensure_started(self, vnc: bool = False) -> BrowserStartResult:
+        """按需启动浏览器(以及VNC)相关进程并等待CDP就绪，同时刷新浏览器最近使用时间
+
+        默认以无头模式运行，传递vnc=true时切换为有头模式并启动VNC，直到VNC连接断开
+        """
+        start_time = time.perf_counter()
+        self._last_used = time.monotonic()
+        if vnc:
+            self._last_vnc_seen = time.monotonic()
+
+        async with self._start_lock:
+            # 1.计算目标模式: 请求VNC或关闭无头模式时使用有头模式，否则沿用当前模式(默认无头)
+            running = await self._get_running_programs()
+            current_mode = self._get_mode(running)
+            if vnc or not self._headless:
+                mode = MODE_HEADED
+            else:
+                mode = current_mode or MODE_HEADLESS
+
+            # 2.浏览器正在以其他模式运行则切换模式，否则按顺序启动未运行的进程
+            if current_mode and current_mode != mode:
+                started = await self._switch_mode(mode, running)
+            else:
+                started = await self._start_programs(HEADED_PROGRAMS if mode == MODE_HEADED else HEADLESS_PROGRAMS, running)
+                if HEADED_CHROME in started or HEADLESS_CHROME in started:
+                    await self._wait_for_cdp()
+                    self._tabs.clear()
+                    self._stats.lazy_starts += 1
+
+            # 3.按需启动VNC相关进程
+            if vnc:
+                started += await self._start_programs(VNC_PROGRAMS, running)
+            self._stats.mode = mode
+
+        elapsed_ms = round((time.perf_counter() - start_time) * 1000, 1)
+        if started:
+            logger.info(f"按需启动浏览器相关进程: {started}, 模式: {mode}, 耗时: {elapsed_ms}ms")
+        return BrowserStartResult(
+            started=started,
+            ready=True,
+            vnc=all(running[program] for program in VNC_PROGRAMS),
+            mode=mode,
+            elapsed_ms=elapsed_ms,
+        )
+
+    async def switch_to_headless_if_unwatched(self) -> bool:
+        """有头模式下VNC连接断开超过保留时间后切换回无头模式，返回是否执行了切换"""
+        if not self._headless:
+            return False
+
+        # 1.存在VNC连接时刷新最近观看时间
+        now = time.monotonic()
+        if await asyncio.to_thread(self.has_established_connections, VNC_PORTS):
+            self._last_vnc_seen = now
+            return False
+        if now - self._last_vnc_seen < self._headed_linger_seconds:
+            return False
+
+        # 2.当前为有头模式则切换回无头模式
+        async with self._start_lock:
+            running = await self._get_running_programs()
+            if self._get_mode(running) != MODE_HEADED:
+                return False
+            await self._switch_mode(MODE_HEADLESS, running)
+            self._stats.mode = MODE_HEADLESS
+        return True
+
+    async def stop_if_idle(self) -> bool:
+        """浏览器空闲超时且没有VNC连接时停止浏览器与VNC相关进程，返回是否执行了停止"""
+        # 1.未开启空闲停止或未到超时时间则跳过
+        if self._idle_timeout_seconds <= 0 or time.monotonic() - self._last_used < self._idle_timeout_seconds:
+            return False
+
+        # 2.有人正在通过VNC观看时视为活跃
+        if await asyncio.to_thread(self.has_established_connections, VNC_PORTS):
+            self._last_used = time.monotonic()
+            return False
+
+        async with self._start_lock:
+            # 3.逆序停止正在运行的进程
+            running = await self._get_running_programs()
+            stopped = await self._stop_programs(list(reversed(ALL_PROGRAMS)), running)
+            self._tabs.clear()
+            self._stats.mode = None
+
+        if stopped:
+            self._stats.idle_stops += 1
+            logger.info(f"浏览器空闲超过{self._idle_timeout_seconds}秒, 已停止进程: {stopped}")
+        return bool(stopped)
+
+    def _sample_cpu(self, mode: Optional[str]) -> None:
+        """采样浏览器相关进程的CPU占用率，沙箱空闲时按模式记录，用于对比无头/有头模式的空闲开销"""
+        now, cpu_seconds = time.monotonic(), self.get_browser_cpu_seconds()
+        last_sample, self._last_cpu_sample = self._last_cpu_sample, (now, cpu_seconds)
+        if last_sample is None or now <= last_sample[0]:
+            return
+
+        # 1.计算两次采样间的CPU占用率(100%表示占满一个核)
+        cpu_percent = round((cpu_seconds - last_sample[1]) / (now - last_sample[0]) * 100, 2)
+        self._stats.cpu_percent = cpu_percent
+
+        # 2.两次采样之间没有API调用时视为空闲，按模式记录
+        if mode and self._last_used < last_sample[0]:
+            samples = self._idle_cpu_samples.setdefault(mode, deque(maxlen=120))
+            samples.append(cpu_percent)
+            self._stats.idle_cpu_percent[mode] = round(sum(samples) / len(samples), 2)
+
+    async def _list_pages(self) -> List[Dict[str, Any]]:
+        """获取Chrome中所有的标签页目标"""
+        targets = await self._http_json("/json/list")
+        return [target for target in targets if target.get("type") == "page"]
+
+    def _track_pages(self, pages: List[Dict[str, Any]]) -> Optional[str]:
+        """更新标签页跟踪信息并返回活跃(最新)标签页id"""
+        now = time.monotonic()
+        page_ids = {page["id"] for page in pages}
+
+        # 1.移除已经关闭的标签页
+        for target_id in list(self._tabs.keys()):
+            if target_id not in page_ids:
+                self._tabs.pop(target_id)
+
+        # 2./json/list中越新的标签页越靠前，逆序遍历保证新标签页获得更大的创建序号
+        for page in reversed(pages):
+            target_id, url = page["id"], page.get("url", "")
+            if target_id not in self._tabs:
+                self._tabs[target_id] = (next(self._tab_sequence), url, now)
+            else:
+                sequence, last_url, last_change = self._tabs[target_id]
+                if url != last_url:
+                    self._tabs[target_id] = (sequence, url, now)
+
+        if not self._tabs:
+            return None
+        return max(self._tabs.items(), key=lambda item: item[1][0])[0]
+
+    async def _get_tab_metrics(self, page: Dict[str, Any]) -> Tuple[Optional[float], Optional[int]]:
+        """通过CDP Performance.getMetrics获取标签页的JS堆内存与DOM节点数"""
+        ws_url = page.get("webSocketDebuggerUrl")
+        if not ws_url:
+            return None, None
+        try:
+            _, result = await self._cdp_send(ws_url, [("Performance.enable", {}), ("Performance.getMetrics", {})], 5)
+            metrics = {metric["name"]: metric["value"] for metric in result.get("metrics", [])}
+            js_heap = metrics.get("JSHeapUsedSize")
+            nodes = metrics.get("Nodes")
+            return (
+                round(js_heap / 1024 / 1024, 1) if js_heap is not None else None,
+                int(nodes) if nodes is not None else None,
+            )
+        except Exception as e:
+            logger.debug(f"获取标签页[{page.get('url')}]内存指标失败: {str(e)}")
+            return None, None
+
+    async def _close_stale_tabs(self, pages: List[Dict[str, Any]], active_id: Optional[str]) -> List[str]:
+        """关闭空闲超时以及超出最大数量的后台标签页，返回关闭的标签页地址"""
+        now = time.monotonic()
+        page_map = {page["id"]: page for page in pages}
+
+        # 1.后台标签页按创建序号从旧到新排序
+        background = sorted(
+            [(target_id, info) for target_id, info in self._tabs.items() if target_id != active_id],
+            key=lambda item: item[1][0],
+        )
+
+        # 2.计算需要关闭的标签页: 空闲超时的以及超出数量上限的最旧标签页
+        overflow = max(0, len(self._tabs) - self._max_tabs)
+        to_close = []
+        for position, (target_id, (_, _, last_change)) in enumerate(background):
+            if position < overflow or now - last_change > self._stale_tab_seconds:
+                to_close.append(target_id)
+
+        # 3.逐个关闭标签页
+        closed_urls = []
+        for target_id in to_close:
+            try:
+                await self._http_json(f"/json/close/{target_id}")
+                self._tabs.pop(target_id, None)
+                closed_urls.append(page_map.get(target_id, {}).get("url", ""))
+            except Exception as e:
+                logger.warning(f"关闭标签页[{target_id}]失败: {str(e)}")
+
+        if closed_urls:
+            self._stats.closed_tabs += len(closed_urls)
+            logger.info(f"关闭了{len(closed_urls)}个后台标签页: {closed_urls}")
+        return closed_urls
+
+    async def _export_state(self, active_page: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Any]]:
+        """导出浏览器所有cookie以及活跃标签页的localStorage"""
+        # 1.通过浏览器级别的CDP连接导出所有cookie(包含会话cookie)
+        version = await self._http_json("/json/version")
+        [result] = await self._cdp_send(version["webSocketDebuggerUrl"], [("Storage.getCookies", {})])
+        cookies = result.get("cookies", [])
+
+        # 2.导出活跃标签页的localStorage
+        local_storage = []
+        if active_page and active_page.get("webSocketDebuggerUrl"):
+            try:
+                [result] = await self._cdp_send(
+                    active_page["webSocketDebuggerUrl"],
+                    [("Runtime.evaluate", {"expression": GET_LOCAL_STORAGE_FUNC, "returnByValue": True})],
+                )
+                local_storage = json.loads(result.get("result", {}).get("value") or "[]")
+            except Exception as e:
+                logger.warning(f"导出localStorage失败: {str(e)}")
+
+        return cookies, local_storage
+
+    async def _wait_for_cdp(self, timeout: float = 30) -> None:
+        """等待Chrome的CDP服务可用"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                await self._http_json("/json/version")
+                return
+            except Exception:
+                await asyncio.sleep(0.5)
+        raise AppException(f"浏览器在{timeout}秒内未能就绪")
+
+    async def _restore_state(self, cookies: List[Dict[str, Any]], local_storage: List[Any], url: str) -> int:
+        """恢复cookie、重新打开活跃页面并回填localStorage，返回恢复的cookie数"""
+        # 1.过滤cookie字段，会话cookie不携带过期时间
+        cookie_params = []
+        for cookie in cookies:
+            param = {field: cookie[field] for field in COOKIE_FIELDS if field in cookie}
+            if cookie.get("session") or param.get("expires", -1) < 0:
+                param.pop("expires", None)
+            cookie_params.append(param)
+
+        # 2.通过浏览器级别的CDP连接恢复cookie
+        version = await self._http_json("/json/version")
+        if cookie_params:
+            await self._cdp_send(version["webSocketDebuggerUrl"], [("Storage.setCookies", {"cookies": cookie_params})])
+
+        # 3.在重启后的标签页中重新打开活跃页面
+        if not url or url.startswith(("about:", "chrome:")):
+            return len(cookie_params)
+        pages = await self._list_pages()
+        if not pages:
+            return len(cookie_params)
+        ws_url = pages[0]["webSocketDebuggerUrl"]
+        await self._cdp_send(ws_url, [("Page.navigate", {"url": url})], 30)
+
+        # 4.页面加载完成后回填localStorage并刷新页面，让页面脚本读取到恢复的数据
+        if local_storage:
+            for _ in range(20):
+                [result] = await self._cdp_send(
+                    ws_url,
+                    [("Runtime.evaluate", {"expression": "document.readyState", "returnByValue": True})],
+                )
+                if result.get("result", {}).get("value") in ("interactive", "complete"):
+                    break
+                await asyncio.sleep(0.5)
+            await self._cdp_send(ws_url, [
+                ("Runtime.evaluate", {"expression": SET_LOCAL_STORAGE_FUNC % json.dumps(local_storage)}),
+                ("Page.reload", {}),
+            ], 30)
+
+        return len(cookie_params)
+
+    async def _recycle(self, active_page: Optional[Dict[str, Any]], rss_mb: float) -> int:
+        """导出状态后重启浏览器进程并恢复状态，返回恢复的cookie数"""
+        # 1.导出cookie与localStorage，导出失败也要继续重启，避免沙箱OOM
+        cookies, local_storage = [], []
+        try:
+            cookies, local_storage = await self._export_state(active_page)
+        except Exception as e:
+            logger.warning(f"导出浏览器状态失败, 重启后将无法恢复: {str(e)}")
+
+        # 2.通过supervisor重启当前模式的chrome进程
+        logger.info(f"Chrome总RSS[{rss_mb}MB]超过阈值[{self._memory_limit_mb}MB], 开始重启浏览器")
+        mode = self._get_mode(await self._get_running_programs())
+        await self._supervisor_service.restart_process(HEADED_CHROME if mode == MODE_HEADED else HEADLESS_CHROME)
+        await self._wait_for_cdp()
+        self._tabs.clear()
+
+        # 3.记录回收统计
+        self._stats.recycles += 1
+        self._stats.last_recycle_at = datetime.now().isoformat()
+        self._recycle_rss.append(rss_mb)
+        self._stats.recycle_rss_mb = list(self._recycle_rss)
+
+        # 4.恢复状态
+        try:
+            return await self._restore_state(cookies, local_storage, (active_page or {}).get("url", ""))
+        except Exception as e:
+            logger.warning(f"恢复浏览器状态失败: {str(e)}")
+            return 0
+
+    async def maintain(self, allow_restart: bool = True) -> BrowserHygieneResult:
+        """执行一次浏览器卫生检查: 关闭过期标签页，内存超限且允许时重启浏览器
+
+        allow_restart为true表示由API侧在工具调用间隙调用，此时浏览器未运行会按需启动，并刷新最近使用时间
+        """
+        # 1.API侧调用时确保浏览器已启动，新启动的浏览器同样需要调用方重新建立连接
+        lazy_started = False
+        if allow_restart:
+            lazy_started = bool((await self.ensure_started()).started) or self._needs_reconnect
+            self._needs_reconnect = False
+
+        async with self._lock:
+            # 2.获取所有标签页并更新跟踪信息
+            pages = await self._list_pages()
+            active_id = self._track_pages(pages)
+
+            # 3.关闭过期的后台标签页
+            closed_tabs = await self._close_stale_tabs(pages, active_id)
+            pages = [page for page in pages if page["id"] in self._tabs]
+            active_page = next((page for page in pages if page["id"] == active_id), None)
+
+            # 4.统计总RSS，超过阈值且允许重启时回收浏览器
+            rss_mb = await asyncio.to_thread(self.get_chrome_rss_mb)
+            self._stats.checks += 1
+            self._stats.peak_rss_mb = max(self._stats.peak_rss_mb, rss_mb)
+            restarted, restored_cookies = lazy_started, 0
+            if allow_restart and rss_mb > self._memory_limit_mb:
+                restored_cookies = await self._recycle(active_page, rss_mb)
+                restarted = True
+                pages = await self._list_pages()
+                active_id = self._track_pages(pages)
+                rss_mb = await asyncio.to_thread(self.get_chrome_rss_mb)
+
+            # 5.组装标签页信息
+            now = time.monotonic()
+            tabs = []
+            for page in pages:
+                js_heap_mb, dom_nodes = await self._get_tab_metrics(page)
+                tabs.append(BrowserTabInfo(
+                    target_id=page["id"],
+                    url=page.get("url", ""),
+                    title=page.get("title", ""),
+                    js_heap_mb=js_heap_mb,
+                    dom_nodes=dom_nodes,
+                    idle_seconds=round(now - self._tabs.get(page["id"], (0, "", now))[2], 1),
+                    active=page["id"] == active_id,
+                ))
+
+            self._stats.rss_mb = rss_mb
+            self._stats.tab_count = len(tabs)
+            return BrowserHygieneResult(
+                rss_mb=rss_mb,
+                memory_limit_mb=self._memory_limit_mb,
+                tabs=tabs,
+                closed_tabs=closed_tabs,
+                restarted=restarted,
+                restored_cookies=restored_cookies,
+            )
+
+    async def get_stats(self) -> BrowserStats:
+        """获取浏览器回收统计信息"""
+        stats = self._stats.model_copy()
+        try:
+            stats.running = await self.is_running()
+        except Exception as e:
+            logger.debug(f"获取浏览器进程状态失败: {str(e)}")
+        return stats
+
+    async def run_background_checks(self, interval: int) -> None:
+        """后台定时检查: 浏览器运行时清理过期标签页，空闲超时则停止浏览器(重启只在API侧的工具调用间隙触发)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mode = self._get_mode(await self._get_running_programs())
+                self._sample_cpu(mode)
+                if mode is None:
+                    continue
+                if await self.stop_if_idle():
+                    continue
+                await self.switch_to_headless_if_unwatched()
+                await self.maintain(allow_restart=False)
+            except Exception as e:
+                logger.debug(f"后台标签页清理失败: {str(e)}")
@@ -27,6 +27,9 @@ from app.models.supervisor import ProcessInfo, SupervisorActionResult, Superviso
 
 logger = logging.getLogger(__name__)
 
+# 整体重启时重启的常驻进程(autostart=true且autorestart=true)，浏览器/VNC等按需启动的进程由浏览器服务管理，不能在这里统一启动
+RESTART_PROGRAMS = ["services:app"]
+
 
 class UnixStreamHTTPConnection(http.client.HTTPConnection):
     """基于Unix流的HTTP连接处理器"""
@@ -169,19 +172,62 @@ class SupervisorService:
             raise AppException(f"关闭supervisord服务失败: {str(e)}")
 
     async def restart(self) -> SupervisorActionResult:
-        """重启Supervisor管理的进程"""
+        """重启Supervisor管理的常驻进程
+
+        chrome与chrome_headless共用调试端口与用户目录，不能同时启动，且浏览器/VNC等按需启动的进程
+        是否运行由浏览器服务决定，因此只重启RESTART_PROGRAMS，按需进程通过浏览器服务或restart_process重启。
+        常驻进程包含当前API服务本身，同步停止会在发起启动前结束当前请求，因此只发送SIGTERM，由supervisor自动重启。
+        """
         try:
-            stop_result = await self._call_rpc(self.server.supervisor.stopAllProcesses)
-            start_result = await self._call_rpc(self.server.supervisor.startAllProcesses)
-            return SupervisorActionResult(
-                status="restarted",
-                stop_result=stop_result,
-                start_result=start_result,
-            )
+            results = [
+                await self._call_rpc(self.server.supervisor.signalProcess, name, "TERM")
+                for name in RESTART_PROGRAMS
+            ]
+            return SupervisorActionResult(status="restarted", result=results)
         except Exception as _:
             logger.error(f"重启Supervisor进程服务失败")
             raise AppException(f"重启Supervisor进程服务失败")
 
+    async def get_process(self, name: str) -> ProcessInfo:
+        """根据进程名字(支持分组写法，例如services:chrome)获取单个进程信息"""
+        try:
+            process = await self._call_rpc(self.server.supervisor.getProcessInfo, name)
+            return ProcessInfo(**process)
+        except Exception as e:
+            logger.error(f"获取进程[{name}]信息失败: {str(e)}")
+            raise AppException(f"获取进程[{name}]信息失败: {str(e)}")
+
+    async def start_process(self, name: str, wait: bool = True) -> SupervisorActionResult:
+        """启动supervisor管理的单个进程"""
+        try:
+            result = await self._call_rpc(self.server.supervisor.startProcess, name, wait)
+            return SupervisorActionResult(status="started", start_result=result)
+        except Exception as e:
+            logger.error(f"启动进程[{name}]失败: {str(e)}")
+            raise AppException(f"启动进程[{name}]失败: {str(e)}")
+
+    async def stop_process(self, name: str, wait: bool = True) -> SupervisorActionResult:
+        """停止supervisor管理的单个进程"""
+        try:
+            result = await self._call_rpc(self.server.supervisor.stopProcess, name, wait)
+            return SupervisorActionResult(status="stopped", stop_result=result)
+        except Exception as e:
+            logger.error(f"停止进程[{name}]失败: {str(e)}")
+            raise AppException(f"停止进程[{name}]失败: {str(e)}")
+
+    async def restart_process(self, name: str) -> SupervisorActionResult:
+        """重启supervisor管理的单个进程，进程未运行时直接启动"""
+        stop_result = None
+        process = await self.get_process(name)
+        if process.statename in ("RUNNING", "STARTING"):
+            stop_result = (await self.stop_process(name)).stop_result
+        start_result = await self.start_process(name)
+        return SupervisorActionResult(
+            status="restarted",
+            stop_result=stop_result,
+            start_result=start_result.start_result,
+        )
+
     async def activate_timeout(self, minutes: Optional[int] = None) -> SupervisorTimeout:
         """传递指定分钟，并激活定时销毁任务同时关闭自动保活"""
         # 1.获取超时分钟数